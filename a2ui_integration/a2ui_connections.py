@@ -0,0 +1,143 @@
+"""
+A2UI WebSocket Connections
+Tracks A2UI update sockets per user, speaks each socket's negotiated wire
+encoding and, once a WebSocketBus is attached, reaches users whose socket is
+held by another worker. Shared by every router that serves A2UI websockets.
+"""
+
+import json
+import logging
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from fastapi import WebSocket
+
+from websocket_codec import WireEncoding, negotiate_encoding, encode_payload, decode_payload, send_payload, receive_frame
+
+logger = logging.getLogger(__name__)
+
+# A2UI WebSocket connection manager
+class A2UIConnectionManager:
+    BUS_PREFIX = "a2ui:"
+    BUS_BROADCAST_TOPIC = "a2ui:broadcast"
+
+    def __init__(self):
+        self.active_connections: List[WebSocket] = []
+        self.user_connections: Dict[str, WebSocket] = {}
+        self.encodings: Dict[WebSocket, WireEncoding] = {}  # negotiated per socket
+        self.bus = None  # Optional cross-worker WebSocketBus
+
+    def attach_bus(self, bus):
+        """Reach users whose A2UI socket is held by another worker"""
+        self.bus = bus
+        bus.add_handler(self.BUS_PREFIX, self._deliver_from_bus)
+        for user_email in self.user_connections:
+            bus.subscribe(f"{self.BUS_PREFIX}user:{user_email}")
+        if self.active_connections:
+            bus.subscribe(self.BUS_BROADCAST_TOPIC)
+
+    async def connect(self, websocket: WebSocket, user_email: str):
+        encoding, subprotocol = negotiate_encoding(websocket)
+        if subprotocol:
+            await websocket.accept(subprotocol=subprotocol)
+        else:
+            await websocket.accept()
+        self.encodings[websocket] = encoding
+        self.active_connections.append(websocket)
+        self.user_connections[user_email] = websocket
+        if self.bus is not None:
+            self.bus.subscribe(f"{self.BUS_PREFIX}user:{user_email}")
+            self.bus.subscribe(self.BUS_BROADCAST_TOPIC)
+        logger.info(f"A2UI WebSocket connected for user: {user_email}")
+
+    def disconnect(self, websocket: WebSocket, user_email: str):
+        if websocket in self.active_connections:
+            self.active_connections.remove(websocket)
+        self.encodings.pop(websocket, None)
+        if user_email in self.user_connections:
+            del self.user_connections[user_email]
+            if self.bus is not None:
+                self.bus.unsubscribe(f"{self.BUS_PREFIX}user:{user_email}")
+        if self.bus is not None and not self.active_connections:
+            self.bus.unsubscribe(self.BUS_BROADCAST_TOPIC)
+        logger.info(f"A2UI WebSocket disconnected for user: {user_email}")
+
+    @staticmethod
+    def _update_payload(a2ui_json: str) -> Dict[str, Any]:
+        return {
+            "type": "a2ui_update",
+            "a2ui_json": a2ui_json,
+            "timestamp": datetime.now().isoformat()
+        }
+
+    @staticmethod
+    def _wire_message(payload: Dict[str, Any], encoding: WireEncoding) -> Dict[str, Any]:
+        """Binary clients get the A2UI tree as ``a2ui``; JSON clients keep the ``a2ui_json`` string"""
+        if encoding.binary and isinstance(payload.get("a2ui_json"), str):
+            message = dict(payload)
+            message["a2ui"] = json.loads(message.pop("a2ui_json"))
+            return message
+        if not encoding.binary and "a2ui" in payload:
+            message = dict(payload)
+            message["a2ui_json"] = json.dumps(message.pop("a2ui"))
+            return message
+        return payload
+
+    def _encode_for(self, websocket: WebSocket, payload: Dict[str, Any],
+                    cache: Optional[Dict[WireEncoding, Any]] = None):
+        """Encode a payload for one socket, at most once per encoding when ``cache`` is shared"""
+        encoding = self.encodings.get(websocket, WireEncoding.JSON)
+        if cache is not None and encoding in cache:
+            return cache[encoding]
+        data = encode_payload(self._wire_message(payload, encoding), encoding)
+        if cache is not None:
+            cache[encoding] = data
+        return data
+
+    async def send(self, websocket: WebSocket, payload: Dict[str, Any]):
+        """Send a payload in the socket's negotiated encoding"""
+        await send_payload(websocket, self._encode_for(websocket, payload))
+
+    async def receive(self, websocket: WebSocket) -> Dict[str, Any]:
+        """Receive and decode the next client message"""
+        data = await receive_frame(websocket)
+        return decode_payload(data, self.encodings.get(websocket, WireEncoding.JSON))
+
+    async def _send_local(self, user_email: str, payload: Dict[str, Any]):
+        if user_email in self.user_connections:
+            websocket = self.user_connections[user_email]
+            try:
+                await self.send(websocket, payload)
+            except Exception as e:
+                logger.error(f"Error sending A2UI update to {user_email}: {e}")
+
+    async def _broadcast_local(self, payload: Dict[str, Any]):
+        encoded: Dict[WireEncoding, Any] = {}
+        for connection in list(self.active_connections):
+            try:
+                await send_payload(connection, self._encode_for(connection, payload, encoded))
+            except Exception as e:
+                logger.error(f"Error broadcasting A2UI update: {e}")
+
+    async def _deliver_from_bus(self, topic: str, payload: Dict[str, Any]):
+        if topic == self.BUS_BROADCAST_TOPIC:
+            await self._broadcast_local(payload)
+        else:
+            await self._send_local(topic[len(f"{self.BUS_PREFIX}user:"):], payload)
+
+    async def send_a2ui_update(self, user_email: str, a2ui_json: str):
+        """Send A2UI JSON update to specific user"""
+        payload = self._update_payload(a2ui_json)
+        await self._send_local(user_email, payload)
+        if self.bus is not None:
+            self.bus.publish(f"{self.BUS_PREFIX}user:{user_email}", payload)
+
+    async def broadcast_a2ui_update(self, a2ui_json: str):
+        """Broadcast A2UI JSON update to all connected users"""
+        payload = self._update_payload(a2ui_json)
+        await self._broadcast_local(payload)
+        if self.bus is not None:
+            self.bus.publish(self.BUS_BROADCAST_TOPIC, payload)
+
+# Initialize connection manager
+a2ui_manager = A2UIConnectionManager()
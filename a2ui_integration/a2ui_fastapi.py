@@ -52,51 +52,8 @@ class MeetingUpdateRequest(BaseModel):
     participants: Optional[List[str]] = None
     description: Optional[str] = None
 
-# A2UI WebSocket connection manager
-class A2UIConnectionManager:
-    def __init__(self):
-        self.active_connections: List[WebSocket] = []
-        self.user_connections: Dict[str, WebSocket] = {}
-
-    async def connect(self, websocket: WebSocket, user_email: str):
-        await websocket.accept()
-        self.active_connections.append(websocket)
-        self.user_connections[user_email] = websocket
-        logger.info(f"A2UI WebSocket connected for user: {user_email}")
-
-    def disconnect(self, websocket: WebSocket, user_email: str):
-        self.active_connections.remove(websocket)
-        if user_email in self.user_connections:
-            del self.user_connections[user_email]
-        logger.info(f"A2UI WebSocket disconnected for user: {user_email}")
-
-    async def send_a2ui_update(self, user_email: str, a2ui_json: str):
-        """Send A2UI JSON update to specific user"""
-        if user_email in self.user_connections:
-            websocket = self.user_connections[user_email]
-            try:
-                await websocket.send_json({
-                    "type": "a2ui_update",
-                    "a2ui_json": a2ui_json,
-                    "timestamp": datetime.now().isoformat()
-                })
-            except Exception as e:
-                logger.error(f"Error sending A2UI update to {user_email}: {e}")
-
-    async def broadcast_a2ui_update(self, a2ui_json: str):
-        """Broadcast A2UI JSON update to all connected users"""
-        for connection in self.active_connections:
-            try:
-                await connection.send_json({
-                    "type": "a2ui_update",
-                    "a2ui_json": a2ui_json,
-                    "timestamp": datetime.now().isoformat()
-                })
-            except Exception as e:
-                logger.error(f"Error broadcasting A2UI update: {e}")
-
-# Initialize connection manager
-a2ui_manager = A2UIConnectionManager()
+# The process-wide A2UI connection manager, so bus-relayed updates reach these sockets too
+from a2ui_integration.a2ui_connections import a2ui_manager
 
 # A2UI Endpoints - Integrated with existing dhii-mail backend
 @app.post("/api/a2ui/chat", response_model=A2UIResponse)
@@ -106,10 +63,14 @@ async def a2ui_chat(request: A2UIRequest, current_user: dict = Depends(get_curre
         # Use existing AI engine or meeting agent
         from a2ui_integration.agent.agent_updated_v2 import run_meeting_agent_async
         
+        # Generate new session ID if not provided; clients send it back to continue the conversation
+        session_id = request.session_id or f"session_{datetime.now().timestamp()}"
+        
         # Process the meeting request using existing agent
         agent_result = await run_meeting_agent_async(
             user_input=request.message,
-            user_email=current_user.email
+            user_email=current_user.email,
+            session_id=session_id
         )
         
         if agent_result.get("success"):
@@ -124,9 +85,6 @@ async def a2ui_chat(request: A2UIRequest, current_user: dict = Depends(get_curre
         
         a2ui_json = json.dumps(a2ui_components)
         
-        # Generate new session ID if not provided
-        session_id = request.session_id or f"session_{datetime.now().timestamp()}"
-        
         return A2UIResponse(
             a2ui_json=a2ui_json,
             session_id=session_id,
@@ -413,7 +371,7 @@ async def websocket_a2ui(websocket: WebSocket, user_email: str):
     try:
         while True:
             # Receive and process messages
-            data = await websocket.receive_json()
+            data = await a2ui_manager.receive(websocket)
             
             if data.get("type") == "a2ui_request":
                 # Process A2UI request
@@ -424,7 +382,7 @@ async def websocket_a2ui(websocket: WebSocket, user_email: str):
                 a2ui_json = await process_meeting_request(message, session_id)
                 
                 # Send response back
-                await websocket.send_json({
+                await a2ui_manager.send(websocket, {
                     "type": "a2ui_response",
                     "a2ui_json": a2ui_json,
                     "session_id": session_id,
@@ -433,7 +391,7 @@ async def websocket_a2ui(websocket: WebSocket, user_email: str):
             
             elif data.get("type") == "ping":
                 # Respond to ping
-                await websocket.send_json({
+                await a2ui_manager.send(websocket, {
                     "type": "pong",
                     "timestamp": datetime.now().isoformat()
                 })
@@ -20,6 +20,7 @@ from a2ui_integration.a2ui_components_extended import A2UIComponents, A2UITempla
 from a2ui_integration.whatsapp_analyzer import WhatsAppAnalyzer
 from a2ui_integration.plugin_manager import plugin_manager
 from a2ui_integration.skill_store_ui import create_kernel_dashboard_ui, create_plugin_store_ui
+from a2ui_integration.a2ui_connections import a2ui_manager
 
 logger = logging.getLogger(__name__)
 
@@ -53,53 +54,6 @@ class MeetingUpdateRequest(BaseModel):
     participants: Optional[List[str]] = None
     description: Optional[str] = None
 
-# A2UI WebSocket connection manager
-class A2UIConnectionManager:
-    def __init__(self):
-        self.active_connections: List[WebSocket] = []
-        self.user_connections: Dict[str, WebSocket] = {}
-
-    async def connect(self, websocket: WebSocket, user_email: str):
-        await websocket.accept()
-        self.active_connections.append(websocket)
-        self.user_connections[user_email] = websocket
-        logger.info(f"A2UI WebSocket connected for user: {user_email}")
-
-    def disconnect(self, websocket: WebSocket, user_email: str):
-        if websocket in self.active_connections:
-            self.active_connections.remove(websocket)
-        if user_email in self.user_connections:
-            del self.user_connections[user_email]
-        logger.info(f"A2UI WebSocket disconnected for user: {user_email}")
-
-    async def send_a2ui_update(self, user_email: str, a2ui_json: str):
-        """Send A2UI JSON update to specific user"""
-        if user_email in self.user_connections:
-            websocket = self.user_connections[user_email]
-            try:
-                await websocket.send_json({
-                    "type": "a2ui_update",
-                    "a2ui_json": a2ui_json,
-                    "timestamp": datetime.now().isoformat()
-                })
-            except Exception as e:
-                logger.error(f"Error sending A2UI update to {user_email}: {e}")
-
-    async def broadcast_a2ui_update(self, a2ui_json: str):
-        """Broadcast A2UI JSON update to all connected users"""
-        for connection in self.active_connections:
-            try:
-                await connection.send_json({
-                    "type": "a2ui_update",
-                    "a2ui_json": a2ui_json,
-                    "timestamp": datetime.now().isoformat()
-                })
-            except Exception as e:
-                logger.error(f"Error broadcasting A2UI update: {e}")
-
-# Initialize connection manager
-a2ui_manager = A2UIConnectionManager()
-
 # A2UI Endpoints - Integrated with existing dhii-mail backend
 @router.post("/chat", response_model=A2UIResponse)
 async def a2ui_chat(request: A2UIRequest):
@@ -108,10 +62,14 @@ async def a2ui_chat(request: A2UIRequest):
         # Use demo user for A2UI interface (can be enhanced with session-based auth)
         user_email = "demo@example.com"
         
+        # Generate new session ID if not provided; clients send it back to continue the conversation
+        session_id = request.session_id or f"session_{datetime.now().timestamp()}"
+        
         # Process the meeting request using existing agent
         agent_result = await run_meeting_agent_async(
             user_input=request.message,
-            user_email=user_email
+            user_email=user_email,
+            session_id=session_id
         )
         
         if agent_result.get("success"):
@@ -126,9 +84,6 @@ async def a2ui_chat(request: A2UIRequest):
         
         a2ui_json = json.dumps(a2ui_components)
         
-        # Generate new session ID if not provided
-        session_id = request.session_id or f"session_{datetime.now().timestamp()}"
-        
         return A2UIResponse(
             a2ui_json=a2ui_json,
             session_id=session_id,
@@ -269,12 +224,18 @@ async def get_a2ui_meeting_details(meeting_id: str, current_user: dict = Depends
 # A2UI WebSocket endpoint for real-time updates
 @router.websocket("/ws/{user_email}")
 async def websocket_a2ui(websocket: WebSocket, user_email: str):
-    """WebSocket endpoint for A2UI real-time updates"""
+    """WebSocket endpoint for A2UI real-time updates
+    
+    Offer one of the ``dhii.*`` subprotocols from ``/ws/codec`` to receive
+    MessagePack and/or deflated binary frames with the A2UI tree inline.
+    """
     await a2ui_manager.connect(websocket, user_email)
+    # Requests without a session_id share one agent session per connection
+    connection_session = f"ws_{uuid.uuid4().hex}"
     try:
         while True:
             # Receive and process messages
-            data = await websocket.receive_json()
+            data = await a2ui_manager.receive(websocket)
             
             if data.get("type") == "a2ui_request":
                 # Process A2UI request
@@ -284,7 +245,8 @@ async def websocket_a2ui(websocket: WebSocket, user_email: str):
                 # Process the request using agent
                 agent_result = await run_meeting_agent_async(
                     user_input=message,
-                    user_email=user_email
+                    user_email=user_email,
+                    session_id=session_id or connection_session
                 )
                 
                 if agent_result.get("success"):
@@ -297,19 +259,17 @@ async def websocket_a2ui(websocket: WebSocket, user_email: str):
                         agent_result.get("error", "Unknown error")
                     )
                 
-                a2ui_json = json.dumps(a2ui_components)
-                
-                # Send response back
-                await websocket.send_json({
+                # Send response back; the manager only stringifies the tree for JSON clients
+                await a2ui_manager.send(websocket, {
                     "type": "a2ui_response",
-                    "a2ui_json": a2ui_json,
+                    "a2ui": a2ui_components,
                     "session_id": session_id,
                     "timestamp": datetime.now().isoformat()
                 })
             
             elif data.get("type") == "ping":
                 # Respond to ping
-                await websocket.send_json({
+                await a2ui_manager.send(websocket, {
                     "type": "pong",
                     "timestamp": datetime.now().isoformat()
                 })
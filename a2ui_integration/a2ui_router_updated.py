@@ -13,6 +13,7 @@ from datetime import datetime
 
 from .a2ui_orchestrator import A2UIOrchestrator, UIState
 from .a2ui_components_extended import A2UIComponents, A2UITemplates
+from security_manager import security_manager
 
 logger = logging.getLogger(__name__)
 
@@ -34,9 +35,12 @@ class UIResponse(BaseModel):
     timestamp: str
 
 def create_ui_response_from_orchestrator(ui_data: Dict[str, Any]) -> UIResponse:
-    """Convert orchestrator output to UIResponse format"""
+    """Convert orchestrator output to UIResponse format, escaped and validated against the A2UI catalog"""
+    component, errors = security_manager.validate_a2ui_tree(ui_data.get("component", {}))
+    if errors:
+        logger.warning(f"Rendered A2UI component failed validation: {errors}")
     return UIResponse(
-        component=ui_data.get("component", {}),
+        component=component,
         state_info=ui_data.get("state_info", {}),
         timestamp=datetime.now().isoformat()
     )
@@ -0,0 +1,132 @@
+"""
+Reusable Agent Runtime for A2UI Agents
+Builds an ADK agent, its Runner and session service once per process and
+keeps a bounded LRU of per-user conversation sessions, so follow-up turns
+continue the same ADK session instead of starting from scratch.
+
+Sessions idle longer than ``idle_seconds``, or the least recently used ones
+beyond ``max_sessions``, are deleted from the session service.
+"""
+
+import time
+import asyncio
+import inspect
+import logging
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CONVERSATION = "default"
+
+class _Session:
+    __slots__ = ("session_id", "last_used", "turns", "lock")
+
+    def __init__(self, session_id: str):
+        self.session_id = session_id
+        self.last_used = time.monotonic()
+        self.turns = 0
+        self.lock = asyncio.Lock()
+
+class AgentRuntime:
+    """One Runner per process plus an LRU of live (user, conversation) sessions.
+
+    ``build`` returns ``(runner, session_service)`` and is called on first
+    use; a failed build (missing API key) is retried on the next turn.
+    Turns in the same session run one at a time.
+    """
+
+    def __init__(self, build: Callable[[], Tuple[Any, Any]], app_name: str,
+                 max_sessions: int = 1000, idle_seconds: float = 1800.0):
+        self._build = build
+        self.app_name = app_name
+        self.max_sessions = max_sessions
+        self.idle_seconds = idle_seconds
+        self.runner = None
+        self.session_service = None
+        self._sessions: "OrderedDict[Tuple[str, str], _Session]" = OrderedDict()
+        self.stats = {"builds": 0, "turns": 0, "sessions_created": 0, "sessions_reused": 0,
+                      "evicted_idle": 0, "evicted_lru": 0}
+
+    def configure(self, **options: Any):
+        for name, value in options.items():
+            if name not in ("max_sessions", "idle_seconds"):
+                raise ValueError(f"Unknown agent runtime option: {name}")
+            setattr(self, name, value)
+
+    def _ensure_runner(self):
+        if self.runner is None:
+            self.runner, self.session_service = self._build()
+            self.stats["builds"] += 1
+            logger.info(f"Built {self.app_name} agent runner")
+        return self.runner
+
+    async def _delete(self, user_id: str, entry: _Session):
+        try:
+            deleted = self.session_service.delete_session(app_name=self.app_name, user_id=user_id,
+                                                          session_id=entry.session_id)
+            if inspect.isawaitable(deleted):
+                await deleted
+        except Exception as e:
+            logger.debug(f"Could not delete {self.app_name} session {entry.session_id}: {e}")
+
+    async def _evict(self, now: float, keep: Tuple[str, str], room: int):
+        """Drop idle sessions (oldest first) and enough LRU ones to leave ``room`` free.
+
+        ``keep`` is the session about to run a turn; it and sessions mid-turn stay.
+        """
+        # A snapshot: other turns may add or end sessions while a delete is awaited
+        for key in list(self._sessions):
+            entry = self._sessions.get(key)
+            if entry is None or key == keep or entry.lock.locked():
+                continue
+            if now - entry.last_used >= self.idle_seconds:
+                self.stats["evicted_idle"] += 1
+            elif len(self._sessions) + room > self.max_sessions:
+                self.stats["evicted_lru"] += 1
+            else:
+                break
+            del self._sessions[key]
+            await self._delete(key[0], entry)
+
+    def _session(self, key: Tuple[str, str]) -> _Session:
+        entry = self._sessions.get(key)
+        if entry is None:
+            entry = _Session(key[1])
+            self._sessions[key] = entry
+            self.stats["sessions_created"] += 1
+        else:
+            self._sessions.move_to_end(key)
+            self.stats["sessions_reused"] += 1
+        entry.last_used = time.monotonic()
+        return entry
+
+    async def run(self, user_input: str, user_id: str, conversation_id: Optional[str] = None) -> List[Any]:
+        """Run one turn in the user's session for ``conversation_id``; returns the ADK events"""
+        runner = self._ensure_runner()
+        key = (user_id, conversation_id or DEFAULT_CONVERSATION)
+        # Make room before a new session goes in, so eviction never picks it
+        await self._evict(time.monotonic(), keep=key, room=0 if key in self._sessions else 1)
+        entry = self._session(key)
+        async with entry.lock:
+            entry.turns += 1
+            self.stats["turns"] += 1
+            events = await runner.run_debug(user_messages=user_input, user_id=user_id,
+                                            session_id=entry.session_id, quiet=True)
+            entry.last_used = time.monotonic()
+            return events
+
+    async def end_session(self, user_id: str, conversation_id: Optional[str] = None):
+        """Forget a conversation now instead of waiting for eviction"""
+        entry = self._sessions.pop((user_id, conversation_id or DEFAULT_CONVERSATION), None)
+        if entry is not None and self.session_service is not None:
+            await self._delete(user_id, entry)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            **self.stats,
+            "built": self.runner is not None,
+            "sessions": len(self._sessions),
+            "max_sessions": self.max_sessions,
+            "idle_seconds": self.idle_seconds
+        }
@@ -5,8 +5,7 @@ Uses the new database-compatible meeting tools
 
 import os
 import logging
-from typing import Dict, Any, List
-from datetime import datetime
+from typing import Dict, Any, List, Optional
 
 # Google ADK imports
 from google.adk import Agent
@@ -23,6 +22,7 @@ from .meeting_tools_updated_v2 import (
     update_meeting,
     get_user_meeting_preferences
 )
+from .agent_runtime import AgentRuntime
 
 logger = logging.getLogger(__name__)
 
@@ -143,36 +143,45 @@ def extract_time_from_input(user_input: str) -> str:
     
     return None
 
-async def run_meeting_agent_async(user_input: str, user_email: str = "demo@example.com") -> Dict[str, Any]:
-    """Run the meeting assistant agent with user input (async version)"""
+def _build_meeting_runner():
+    """Agent, Runner and session service shared by every meeting assistant turn"""
+    from google.adk import Runner, sessions
+    session_service = sessions.InMemorySessionService()
+    runner = Runner(agent=create_meeting_agent(), session_service=session_service, app_name="meeting_assistant")
+    return runner, session_service
+
+# Built on first use; sessions persist across turns until idle or evicted
+meeting_agent_runtime = AgentRuntime(
+    _build_meeting_runner,
+    app_name="meeting_assistant",
+    max_sessions=int(os.getenv("MEETING_AGENT_MAX_SESSIONS", "1000")),
+    idle_seconds=float(os.getenv("MEETING_AGENT_SESSION_IDLE_SECONDS", "1800"))
+)
+
+def _events_to_text(events) -> str:
+    """Extract response from events"""
+    response_parts = []
+    for event in events:
+        if hasattr(event, 'text'):
+            response_parts.append(event.text)
+        elif hasattr(event, 'content'):
+            response_parts.append(event.content)
+        elif isinstance(event, str):
+            response_parts.append(event)
+    
+    return ''.join(response_parts) if response_parts else "I processed your request successfully."
+
+async def run_meeting_agent_async(user_input: str, user_email: str = "demo@example.com",
+                                  session_id: Optional[str] = None) -> Dict[str, Any]:
+    """Run the meeting assistant agent with user input (async version).
+    
+    Turns with the same ``session_id`` continue one agent session, so a
+    multi-turn booking flow keeps its context.
+    """
     
     try:
-        # Create the agent
-        agent = create_meeting_agent()
-        
-        # Create a session service and runner for the agent
-        from google.adk import Runner, sessions
-        session_service = sessions.InMemorySessionService()
-        runner = Runner(agent=agent, session_service=session_service, app_name="meeting_assistant")
-        
-        # Run the agent with user input using debug method (async)
-        events = await runner.run_debug(
-            user_messages=user_input,
-            user_id=user_email,
-            session_id=f"session_{datetime.now().timestamp()}"
-        )
-        
-        # Extract response from events
-        response_parts = []
-        for event in events:
-            if hasattr(event, 'text'):
-                response_parts.append(event.text)
-            elif hasattr(event, 'content'):
-                response_parts.append(event.content)
-            elif isinstance(event, str):
-                response_parts.append(event)
-        
-        response = ''.join(response_parts) if response_parts else "I processed your request successfully."
+        events = await meeting_agent_runtime.run(user_input, user_email, session_id)
+        response = _events_to_text(events)
         
         return {
             "success": True,
@@ -201,45 +210,22 @@ async def run_meeting_agent_async(user_input: str, user_email: str = "demo@examp
         }
 
 # Keep the sync version for backward compatibility
-def run_meeting_agent(user_input: str, user_email: str = "demo@example.com") -> Dict[str, Any]:
-    """Run the meeting assistant agent with user input (sync version)"""
+def run_meeting_agent(user_input: str, user_email: str = "demo@example.com",
+                      session_id: Optional[str] = None) -> Dict[str, Any]:
+    """Run the meeting assistant agent with user input (sync version).
+    
+    Each call runs in its own event loop, so it builds its own runner rather
+    than sharing the process-wide one (and its session locks) across loops.
+    """
     
     try:
-        # Create the agent
-        agent = create_meeting_agent()
-        
-        # Create a session service and runner for the agent
-        from google.adk import Runner, sessions
-        session_service = sessions.InMemorySessionService()
-        runner = Runner(agent=agent, session_service=session_service, app_name="meeting_assistant")
-        
-        # Run the agent with user input using debug method (async)
         import asyncio
-        
-        async def run_agent():
-            events = await runner.run_debug(
-                user_messages=user_input,
-                user_id=user_email,
-                session_id=f"session_{datetime.now().timestamp()}"
-            )
-            
-            # Extract response from events
-            response_parts = []
-            for event in events:
-                if hasattr(event, 'text'):
-                    response_parts.append(event.text)
-                elif hasattr(event, 'content'):
-                    response_parts.append(event.content)
-                elif isinstance(event, str):
-                    response_parts.append(event)
-            
-            return ''.join(response_parts) if response_parts else "I processed your request successfully."
-        
-        response = asyncio.run(run_agent())
+        runtime = AgentRuntime(_build_meeting_runner, app_name="meeting_assistant")
+        events = asyncio.run(runtime.run(user_input, user_email, session_id))
         
         return {
             "success": True,
-            "response": response,
+            "response": _events_to_text(events),
             "user_email": user_email
         }
         
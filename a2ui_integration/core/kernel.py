@@ -15,6 +15,7 @@ from .types import (
     PluginStatus, Capability, A2UIComponent, AdjacencyOperation
 )
 from ..plugin_manager import PluginManager
+import realtime_topics
 
 logger = logging.getLogger(__name__)
 
@@ -176,12 +177,19 @@ class Kernel(KernelInterface):
             self._plugin_configs[plugin_config.id] = plugin_config
             
             logger.info(f"Plugin {plugin_config.id} registered successfully")
+            self._publish_plugin_state(plugin_config.id, PluginStatus.INSTALLED)
             return True
             
         except Exception as e:
             logger.error(f"Failed to register plugin {plugin_config.id}: {e}")
             return False
     
+    def _publish_plugin_state(self, plugin_id: str, status: PluginStatus):
+        """Push a plugin state change to the plugin and plugin-list topics"""
+        event = {"type": "plugin_update", "plugin_id": plugin_id, "status": status.value}
+        realtime_topics.publish(realtime_topics.plugin_topic(plugin_id), event)
+        realtime_topics.publish(realtime_topics.PLUGINS_TOPIC, event)
+    
     async def enable_plugin(self, plugin_id: str) -> bool:
         """Enable a plugin"""
         if plugin_id not in self._plugin_configs:
@@ -209,6 +217,7 @@ class Kernel(KernelInterface):
                 self._capability_to_plugin[capability.id] = plugin_id
             
             logger.info(f"Plugin {plugin_id} enabled successfully")
+            self._publish_plugin_state(plugin_id, PluginStatus.ENABLED)
             return True
             
         except Exception as e:
@@ -241,6 +250,7 @@ class Kernel(KernelInterface):
                         del self._capability_to_plugin[capability.id]
             
             logger.info(f"Plugin {plugin_id} disabled successfully")
+            self._publish_plugin_state(plugin_id, PluginStatus.DISABLED)
             return True
             
         except Exception as e:
@@ -3,6 +3,7 @@ Plugin Manager for A2UI Integration
 Manages plugin registration, lifecycle, and analytics for Skill Store
 """
 
+import os
 import sqlite3
 import json
 import logging
@@ -106,8 +107,8 @@ class PluginInfo:
 class PluginManager:
     """Plugin management system for A2UI Skill Store"""
     
-    def __init__(self, db_path: str = "plugins.db"):
-        self.db_path = db_path
+    def __init__(self, db_path: Optional[str] = None):
+        self.db_path = db_path or os.getenv("PLUGINS_DB_PATH", "plugins.db")
         self.plugins: Dict[str, PluginInfo] = {}
         self.init_database()
         self.load_plugins()
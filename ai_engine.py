@@ -9,9 +9,18 @@ import logging
 import asyncio
 import aiohttp
 import re
-from typing import Dict, List, Optional, Any
+import time
+import random
+from contextlib import AsyncExitStack
+from typing import AsyncIterator, Callable, Dict, List, Optional, Any
 from datetime import datetime, timezone, timedelta
 from pydantic import BaseModel
+from http_client_pool import shared_http_client
+from llm_cache import LLMResponseCache, llm_response_cache
+from llm_dispatch import PRIORITY_BACKGROUND, PRIORITY_INTERACTIVE, llm_dispatcher
+from llm_routing import CLOSED, ModelRouter, llm_model_router
+from intent_classifier import IntentClassifier, local_intent_classifier
+from prompt_assembler import AssembledPrompt, PromptAssembler, llm_prompt_assembler
 
 # Import managers (avoid circular import)
 from calendar_manager import CalendarManager, calendar_manager
@@ -19,6 +28,69 @@ from email_manager import EmailManager, email_manager
 
 logger = logging.getLogger(__name__)
 
+# Markers that disqualify a model reply; checked while streaming too
+UNSAFE_REPLY_MARKERS = ['<script', 'javascript:', 'data:', 'vbscript:', 'onload', 'onerror']
+MAX_REPLY_LENGTH = 2000
+
+# Static half of the OpenRouter system prompt; per-turn context follows it
+RESPONSE_GUIDELINES = """You are dhii, a specialized AI assistant for email and calendar management. Your responses should be:
+- Helpful and specific to email/calendar tasks
+- Natural and conversational
+- Action-oriented with clear next steps
+- Context-aware of the user's previous requests
+- Professional but friendly
+
+When responding:
+1. Acknowledge the user's request clearly
+2. Provide relevant, actionable information
+3. Suggest specific next steps or alternatives
+4. Keep responses concise but comprehensive
+5. Use appropriate formatting (bullet points, emojis) when helpful"""
+
+# Seconds an email-account status line is reused before querying again
+ACCOUNT_STATUS_TTL = 60.0
+
+# Phrases that decide an intent ahead of intent_patterns, in precedence order
+PRIORITY_INTENT_PHRASES = [
+    ('check_calendar', ['what\'s on my calendar', 'check my calendar', 'show my calendar', 'what\'s on my schedule']),
+    ('send_email', ['send an email to', 'email', 'compose email', 'write email to', 'send message to'])
+]
+
+def _phrase_trie_pattern(phrases: List[str]) -> str:
+    """Regex matching the longest of ``phrases`` at a position, nested as a trie.
+    
+    Alternatives share their prefixes, so the engine does one character
+    comparison per trie level instead of trying every phrase in turn.
+    """
+    trie: Dict[str, Any] = {}
+    for phrase in phrases:
+        node = trie
+        for char in phrase:
+            node = node.setdefault(char, {})
+        node[''] = True
+    
+    def emit(node: Dict[str, Any]) -> str:
+        branches = [re.escape(char) + emit(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ''
+        body = branches[0] if len(branches) == 1 else '(?:' + '|'.join(branches) + ')'
+        if '' in node:
+            # Greedy optional tail: prefer the longer phrase
+            return ('(?:' + body + ')?') if len(branches) > 1 or len(body) > 1 else body + '?'
+        return body
+    
+    return emit(trie)
+
+class ModelReply(str):
+    """Reply text that remembers which model produced it (the requested one or a fallback)"""
+    
+    model: Optional[str] = None
+    
+    def __new__(cls, text: str, model: Optional[str] = None):
+        reply = super().__new__(cls, text)
+        reply.model = model
+        return reply
+
 class AIIntent(BaseModel):
     """AI intent recognition model"""
     intent: str  # 'schedule_meeting', 'send_email', 'check_calendar', 'general_chat'
@@ -34,6 +106,7 @@ class AIResponse(BaseModel):
     ui_components: Optional[Dict[str, Any]] = None
     requires_user_input: bool = False
     session_data: Optional[Dict[str, Any]] = None
+    prompt_tokens: Optional[int] = None  # estimated size of the LLM prompt, when one was sent
 
 class AIEngine:
     """AI Engine for processing user messages and generating responses"""
@@ -70,6 +143,24 @@ Always confirm details before taking actions, and provide clear feedback about w
         self.openrouter_api_key = os.getenv('OPENROUTER_API_KEY')
         self.openrouter_api_url = "https://openrouter.ai/api/v1/chat/completions"
         self.use_openrouter = bool(self.openrouter_api_key)
+        # Attempts per OpenRouter call and the first backoff (doubled per attempt, plus jitter)
+        self.max_retries = 3
+        self.retry_base_delay = 1.0
+        
+        # Per-model circuit breakers; the first configured model is the default
+        self.model_router: ModelRouter = llm_model_router
+        self.model_router.set_probe(self._probe_openrouter)
+        self.openrouter_model = self.model_router.primary
+        
+        # Validated OpenRouter replies for repeated requests; None disables caching
+        self.response_cache: Optional[LLMResponseCache] = llm_response_cache
+        
+        # Confidently classified routine requests skip the LLM; None escalates everything
+        self.intent_classifier: Optional[IntentClassifier] = local_intent_classifier
+        
+        # Token-budgeted prompts around a memoized static system prefix
+        self.prompt_assembler: PromptAssembler = llm_prompt_assembler
+        self._account_status: Dict[str, tuple] = {}
         
         # Fallback model when OpenRouter is not available
         self.fallback_model = "pattern-based"
@@ -101,54 +192,79 @@ Always confirm details before taking actions, and provide clear feedback about w
                 'virtual meeting', 'online meeting'
             ]
         }
+        self.compile_intent_patterns()
+    
+    def compile_intent_patterns(self):
+        """Build the single-pass intent matcher; call again after changing intent_patterns.
+        
+        Every priority phrase and keyword goes into one trie-shaped regex. A
+        zero-width lookahead reports the longest phrase starting at each
+        position, and each phrase maps to every rule it satisfies, including
+        rules for shorter phrases it contains ("email address" -> "email").
+        One scan of the message therefore finds every substring hit.
+        """
+        rules = []  # (rank, intent, confidence rule, phrase)
+        for rank, (intent_type, phrases) in enumerate(PRIORITY_INTENT_PHRASES):
+            rules.extend((rank, intent_type, 'priority', phrase) for phrase in phrases)
+        base = len(PRIORITY_INTENT_PHRASES)
+        for offset, (intent_type, keywords) in enumerate(self.intent_patterns.items()):
+            for index, keyword in enumerate(keywords):
+                rules.append((base + offset, intent_type, 'strong' if index < 3 else 'weak', keyword))
+        
+        phrases = sorted({rule[3] for rule in rules if rule[3]})
+        confidences = {'priority': 0.9, 'strong': 0.8, 'weak': 0.6}
+        # Any of an intent's first three keywords makes it a strong match
+        self._phrase_hits: Dict[str, List[tuple]] = {
+            phrase: [(rank, intent_type, confidences[rule]) for rank, intent_type, rule, other in rules if other in phrase]
+            for phrase in phrases
+        }
+        self._intent_matcher = re.compile('(?=(' + _phrase_trie_pattern(phrases) + '))') if phrases else None
+    
+    def _match_intents(self, message_lower: str) -> List[tuple]:
+        """All (rank, intent, confidence) candidates for a message, best first"""
+        if self._intent_matcher is None:
+            return []
+        best: Dict[int, tuple] = {}
+        for phrase in set(self._intent_matcher.findall(message_lower)):
+            for hit in self._phrase_hits[phrase]:
+                rank = hit[0]
+                if rank not in best or hit[2] > best[rank][2]:
+                    best[rank] = hit
+        return [best[rank] for rank in sorted(best)]
     
     def detect_intent(self, message: str) -> AIIntent:
         """Detect user intent from message"""
-        message_lower = message.lower()
-        
-        # Enhanced calendar intent detection
-        if any(phrase in message_lower for phrase in ['what\'s on my calendar', 'check my calendar', 'show my calendar', 'what\'s on my schedule']):
-            entities = self._extract_entities(message, 'check_calendar')
-            return AIIntent(
-                intent='check_calendar',
-                confidence=0.9,
-                entities=entities,
-                response_type='text'
-            )
-        
-        # Enhanced email intent detection
-        if any(phrase in message_lower for phrase in ['send an email to', 'email', 'compose email', 'write email to', 'send message to']):
-            entities = self._extract_entities(message, 'send_email')
+        return self._intent_from_candidates(message, self._match_intents(message.lower()))
+    
+    def detect_intents_batch(self, messages: List[str]) -> List[AIIntent]:
+        """Classify many messages (bulk enrichment, inbox triage); repeated texts are matched once"""
+        matched: Dict[str, List[tuple]] = {}
+        results = []
+        for message in messages:
+            message_lower = message.lower()
+            candidates = matched.get(message_lower)
+            if candidates is None:
+                candidates = matched[message_lower] = self._match_intents(message_lower)
+            results.append(self._intent_from_candidates(message, candidates))
+        return results
+    
+    def _intent_from_candidates(self, message: str, candidates: List[tuple]) -> AIIntent:
+        if not candidates:
+            # Default to general chat
             return AIIntent(
-                intent='send_email',
+                intent='general_chat',
                 confidence=0.9,
-                entities=entities,
+                entities={},
                 response_type='text'
             )
         
-        # Check for specific intents
-        for intent_type, keywords in self.intent_patterns.items():
-            for keyword in keywords:
-                if keyword in message_lower:
-                    # Calculate confidence based on keyword matches
-                    confidence = 0.8 if any(kw in message_lower for kw in keywords[:3]) else 0.6
-                    
-                    # Extract entities based on intent
-                    entities = self._extract_entities(message, intent_type)
-                    
-                    return AIIntent(
-                        intent=intent_type,
-                        confidence=confidence,
-                        entities=entities,
-                        response_type=self._get_response_type(intent_type)
-                    )
-        
-        # Default to general chat
+        # Priority phrases first, then intent_patterns in declaration order
+        rank, intent_type, confidence = candidates[0]
         return AIIntent(
-            intent='general_chat',
-            confidence=0.9,
-            entities={},
-            response_type='text'
+            intent=intent_type,
+            confidence=confidence,
+            entities=self._extract_entities(message, intent_type),
+            response_type='text' if rank < len(PRIORITY_INTENT_PHRASES) else self._get_response_type(intent_type)
         )
     
     def _extract_entities(self, message: str, intent_type: str) -> Dict[str, Any]:
@@ -251,19 +367,30 @@ Always confirm details before taking actions, and provide clear feedback about w
         }
         return response_types.get(intent_type, 'text')
     
-    async def process_message(self, message: str, context: Optional[Dict[str, Any]] = None) -> AIResponse:
-        """Process user message and generate AI response"""
+    async def process_message(self, message: str, context: Optional[Dict[str, Any]] = None,
+                              priority: int = PRIORITY_INTERACTIVE) -> AIResponse:
+        """Process user message and generate AI response.
+        
+        Background work (summaries, enrichment) passes PRIORITY_BACKGROUND so
+        interactive chat gets upstream capacity first.
+        """
         if context is None:
             context = {}
         
         # Detect intent
         intent = self.detect_intent(message)
+        local_intent = self._local_intent(message)
+        if local_intent is not None:
+            intent = local_intent
         
         # Try to get response from OpenRouter first
         response_message = None
-        if self.use_openrouter:
+        prompt = None
+        if self.use_openrouter and local_intent is None:
             try:
-                response_message = await self._generate_openrouter_response(message, context)
+                prompt = self._assemble_prompt(message, context)
+                response_message = await self._generate_openrouter_response(message, context, intent.intent,
+                                                                            priority, prompt)
                 logger.info(f"Using OpenRouter for response generation")
             except Exception as e:
                 logger.warning(f"OpenRouter failed, falling back to pattern-based: {e}")
@@ -272,6 +399,34 @@ Always confirm details before taking actions, and provide clear feedback about w
         if not response_message:
             response_message = self._generate_response(message, intent, context)
         
+        ai_response = self._build_ai_response(intent, context, response_message)
+        if prompt is not None:
+            ai_response.prompt_tokens = prompt.tokens
+        return ai_response
+    
+    def _local_intent(self, message: str) -> Optional[AIIntent]:
+        """Intent to answer with the pattern-based path instead of the LLM, if the classifier is confident"""
+        if not self.use_openrouter or self.intent_classifier is None:
+            return None
+        routed = self.intent_classifier.route(message)
+        if routed is None:
+            return None
+        intent_type, confidence = routed
+        logger.info(f"Answering {intent_type} locally (confidence {confidence:.2f})")
+        return AIIntent(
+            intent=intent_type,
+            confidence=round(confidence, 3),
+            entities=self._extract_entities(message, intent_type),
+            response_type=self._get_response_type(intent_type)
+        )
+    
+    def stream_message(self, message: str, context: Optional[Dict[str, Any]] = None,
+                       priority: int = PRIORITY_INTERACTIVE) -> "AIResponseStream":
+        """Process a user message, streaming the model's reply token by token"""
+        return AIResponseStream(self, message, context if context is not None else {}, priority)
+    
+    def _build_ai_response(self, intent: AIIntent, context: Dict[str, Any], response_message: str) -> AIResponse:
+        """Attach actions, UI components and session data to a reply"""
         # Generate actions if needed
         actions = self._generate_actions(intent, context)
         
@@ -738,8 +893,20 @@ Always confirm details before taking actions, and provide clear feedback about w
         
         return session_data
     
-    async def _call_openrouter_api(self, messages: List[Dict[str, str]], model: str = "meta-llama/llama-3.1-8b-instruct") -> Optional[str]:
-        """Call OpenRouter API for AI response with enhanced error handling and retry logic"""
+    def _openrouter_headers(self) -> Dict[str, str]:
+        return {
+            "Authorization": f"Bearer {self.openrouter_api_key}",
+            "Content-Type": "application/json",
+            "HTTP-Referer": "https://dhii-mail.local",
+            "X-Title": "dhii Mail AI Assistant"
+        }
+    
+    async def _call_openrouter_api(self, messages: List[Dict[str, str]], model: Optional[str] = None,
+                                   priority: int = PRIORITY_INTERACTIVE) -> Optional[str]:
+        """Call OpenRouter API for AI response with enhanced error handling and retry logic.
+        
+        Concurrent identical requests share one upstream call.
+        """
         if not self.use_openrouter:
             return None
         
@@ -748,131 +915,279 @@ Always confirm details before taking actions, and provide clear feedback about w
             logger.warning("OpenRouter API key not configured")
             return None
         
-        headers = {
-            "Authorization": f"Bearer {self.openrouter_api_key}",
-            "Content-Type": "application/json",
-            "HTTP-Referer": "https://dhii-mail.local",
-            "X-Title": "dhii Mail AI Assistant"
-        }
-        
         payload = {
-            "model": model,
+            "model": model or self.openrouter_model,
             "messages": messages,
             "temperature": 0.7,
             "max_tokens": 1000,
             "stream": False
         }
+        return await llm_dispatcher.coalesce(llm_dispatcher.request_key(payload),
+                                             lambda: self._post_openrouter(payload, priority), priority)
+    
+    def _retry_delay(self, attempt: int, base_delay: float, response: Optional[aiohttp.ClientResponse] = None) -> float:
+        """Exponential backoff with jitter, or the provider's Retry-After when it sends one"""
+        if response is not None:
+            try:
+                return min(float(response.headers["Retry-After"]), 60.0)
+            except (KeyError, ValueError):
+                pass
+        delay = base_delay * (2 ** attempt)
+        # Jitter keeps callers rejected together from retrying together
+        return delay + random.uniform(0, delay / 2)
+    
+    async def _probe_openrouter(self, model: str) -> bool:
+        """Minimal request used to test whether an open circuit can close"""
+        if not self.use_openrouter:
+            return False
+        payload = {"model": model, "messages": [{"role": "user", "content": "ping"}], "max_tokens": 1}
+        try:
+            session = await shared_http_client.get_session()
+            async with session.post(self.openrouter_api_url, headers=self._openrouter_headers(), json=payload,
+                                    timeout=aiohttp.ClientTimeout(total=10)) as response:
+                return response.status == 200
+        except (asyncio.TimeoutError, aiohttp.ClientError):
+            return False
+    
+    async def _post_openrouter(self, payload: Dict[str, Any], priority: int) -> Optional[str]:
+        """One chat-completions request with retries; each attempt holds a dispatcher slot.
+        
+        Each attempt goes to the requested model or, if its circuit is open,
+        the first healthy fallback. With every circuit open this returns None
+        at once so the caller uses the pattern-based reply.
+        """
+        headers = self._openrouter_headers()
         
         # Implement retry logic with exponential backoff
-        max_retries = 3
-        base_delay = 1  # seconds
+        max_retries = self.max_retries
+        base_delay = self.retry_base_delay
+        
+        # Keep-alive pool shared by every call and retry; no per-attempt handshakes
+        session = await shared_http_client.get_session()
         
         for attempt in range(max_retries):
+            model = self.model_router.pick(payload["model"])
+            if model is None:
+                logger.warning("All OpenRouter model circuits are open, skipping the API call")
+                return None
+            delay = self._retry_delay(attempt, base_delay)
+            ok: Optional[bool] = False
             try:
-                async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=30)) as session:
-                    async with session.post(self.openrouter_api_url, headers=headers, json=payload) as response:
-                        if response.status == 200:
-                            result = await response.json()
-                            if 'choices' in result and len(result['choices']) > 0:
-                                content = result['choices'][0]['message']['content'].strip()
-                                logger.info(f"OpenRouter API call successful on attempt {attempt + 1}")
-                                return content
-                            else:
-                                logger.warning(f"OpenRouter API returned empty choices on attempt {attempt + 1}")
-                                return None
-                        elif response.status == 429:  # Rate limit
-                            logger.warning(f"OpenRouter API rate limit hit on attempt {attempt + 1}")
-                            if attempt < max_retries - 1:
-                                delay = base_delay * (2 ** attempt)  # Exponential backoff
-                                await asyncio.sleep(delay)
-                                continue
-                            else:
-                                logger.error("OpenRouter API rate limit exceeded after all retries")
-                                return None
-                        elif response.status >= 500:  # Server error
-                            logger.warning(f"OpenRouter API server error {response.status} on attempt {attempt + 1}")
-                            if attempt < max_retries - 1:
-                                delay = base_delay * (2 ** attempt)  # Exponential backoff
-                                await asyncio.sleep(delay)
-                                continue
+                # The slot is handed back before any backoff sleep
+                async with llm_dispatcher.slot(priority):
+                    started = time.perf_counter()
+                    try:
+                        # A degraded model gets a short deadline so callers fail over fast
+                        deadline = (self.model_router.call_timeout(model, 30.0)
+                                    if priority < PRIORITY_BACKGROUND else 30.0)
+                        async with session.post(self.openrouter_api_url, headers=headers,
+                                                json={**payload, "model": model},
+                                                timeout=aiohttp.ClientTimeout(total=deadline)) as response:
+                            if response.status == 200:
+                                ok = True
+                                result = await response.json()
+                                if 'choices' in result and len(result['choices']) > 0:
+                                    content = result['choices'][0]['message']['content'].strip()
+                                    logger.info(f"OpenRouter API call successful on attempt {attempt + 1}")
+                                    return ModelReply(content, model)
+                                else:
+                                    logger.warning(f"OpenRouter API returned empty choices on attempt {attempt + 1}")
+                                    return None
+                            elif response.status == 429:  # Rate limit
+                                ok = None  # the dispatcher cool-down handles it; not a model failure
+                                logger.warning(f"OpenRouter API rate limit hit on attempt {attempt + 1}")
+                                if attempt == max_retries - 1:
+                                    logger.error("OpenRouter API rate limit exceeded after all retries")
+                                    return None
+                                # Every caller backs off, not just this one
+                                delay = self._retry_delay(attempt, base_delay, response)
+                                llm_dispatcher.cool_down(delay)
+                            elif response.status >= 500:  # Server error
+                                logger.warning(f"OpenRouter API server error {response.status} on attempt {attempt + 1}")
+                                if attempt == max_retries - 1:
+                                    logger.error(f"OpenRouter API server error {response.status} after all retries")
+                                    return None
                             else:
-                                logger.error(f"OpenRouter API server error {response.status} after all retries")
+                                error_text = await response.text()
+                                logger.error(f"OpenRouter API error: {response.status} - {error_text}")
                                 return None
-                        else:
-                            error_text = await response.text()
-                            logger.error(f"OpenRouter API error: {response.status} - {error_text}")
-                            return None
-                            
+                    except asyncio.CancelledError:
+                        ok = None  # the caller went away; says nothing about the model
+                        raise
+                    finally:
+                        if ok is not None:
+                            # Background batches are slow by design; only their failures count
+                            self.model_router.record(model, ok, time.perf_counter() - started,
+                                                     score_latency=priority < PRIORITY_BACKGROUND)
+                        
             except asyncio.TimeoutError:
                 logger.warning(f"OpenRouter API timeout on attempt {attempt + 1}")
-                if attempt < max_retries - 1:
-                    delay = base_delay * (2 ** attempt)
-                    await asyncio.sleep(delay)
-                    continue
-                else:
+                if attempt == max_retries - 1:
                     logger.error("OpenRouter API timeout after all retries")
                     return None
                     
             except aiohttp.ClientError as e:
                 logger.warning(f"OpenRouter API client error on attempt {attempt + 1}: {e}")
-                if attempt < max_retries - 1:
-                    delay = base_delay * (2 ** attempt)
-                    await asyncio.sleep(delay)
-                    continue
-                else:
+                if attempt == max_retries - 1:
                     logger.error(f"OpenRouter API client error after all retries: {e}")
                     return None
                     
             except Exception as e:
                 logger.error(f"OpenRouter API unexpected error on attempt {attempt + 1}: {e}")
-                if attempt < max_retries - 1:
-                    delay = base_delay * (2 ** attempt)
-                    await asyncio.sleep(delay)
-                    continue
-                else:
+                if attempt == max_retries - 1:
                     logger.error(f"OpenRouter API unexpected error after all retries: {e}")
                     return None
+            
+            # No backoff when this failure opened the circuit; the next attempt uses another model
+            if self.model_router.breaker(model).state == CLOSED:
+                await asyncio.sleep(delay)
         
         logger.error("OpenRouter API call failed after all retry attempts")
         return None
     
-    async def _generate_openrouter_response(self, message: str, context: Dict[str, Any]) -> Optional[str]:
+    async def _stream_openrouter_api(self, messages: List[Dict[str, str]],
+                                     model: Optional[str] = None,
+                                     priority: int = PRIORITY_INTERACTIVE,
+                                     on_model: Optional[Callable[[str], None]] = None) -> AsyncIterator[str]:
+        """Stream completion tokens from OpenRouter (server-sent events).
+        
+        Failures before the first token are retried like _call_openrouter_api,
+        including the fallback to healthy models; once tokens have been
+        yielded an error propagates to the caller. ``on_model`` is told which
+        model is answering before its first token.
+        """
+        if not self.use_openrouter or not self.openrouter_api_key or not self.openrouter_api_key.strip():
+            return
+        
+        payload = {
+            "model": model or self.openrouter_model,
+            "messages": messages,
+            "temperature": 0.7,
+            "max_tokens": 1000,
+            "stream": True
+        }
+        session = await shared_http_client.get_session()
+        max_retries = self.max_retries
+        base_delay = self.retry_base_delay
+        started = False
+        
+        for attempt in range(max_retries):
+            routed = self.model_router.pick(payload["model"])
+            if routed is None:
+                logger.warning("All OpenRouter model circuits are open, skipping the stream")
+                return
+            # No total deadline for a stream, only for connecting and between chunks;
+            # the gap between chunks shrinks while the model is degraded
+            timeout = aiohttp.ClientTimeout(total=None, sock_connect=10,
+                                            sock_read=self.model_router.call_timeout(routed, 30.0))
+            try:
+                async with AsyncExitStack() as slot:
+                    await slot.enter_async_context(llm_dispatcher.slot(priority))
+                    attempt_started = time.perf_counter()
+                    async with session.post(self.openrouter_api_url, headers=self._openrouter_headers(),
+                                            json={**payload, "model": routed}, timeout=timeout) as response:
+                        # The slot admits the request; a stream can last far longer than a
+                        # completion, so it gives the slot back once the headers are in
+                        # rather than shutting other chats and enrichment out until its last token
+                        await slot.aclose()
+                        if response.status == 200:
+                            async for token in self._iter_sse_tokens(response):
+                                if not started:
+                                    started = True
+                                    self.model_router.record(routed, True, time.perf_counter() - attempt_started)
+                                    if on_model is not None:
+                                        on_model(routed)
+                                yield token
+                            return
+                        
+                        if response.status != 429:
+                            self.model_router.record(routed, False, time.perf_counter() - attempt_started)
+                        retryable = response.status == 429 or response.status >= 500
+                        if not retryable or attempt == max_retries - 1:
+                            error_text = await response.text()
+                            logger.error(f"OpenRouter streaming error: {response.status} - {error_text[:200]}")
+                            return
+                        logger.warning(f"OpenRouter streaming status {response.status} on attempt {attempt + 1}")
+                        delay = self._retry_delay(attempt, base_delay, response if response.status == 429 else None)
+                        if response.status == 429:
+                            llm_dispatcher.cool_down(delay)
+            except (asyncio.TimeoutError, aiohttp.ClientError) as e:
+                if started:
+                    raise
+                self.model_router.record(routed, False, time.perf_counter() - attempt_started)
+                logger.warning(f"OpenRouter streaming failed on attempt {attempt + 1}: {e}")
+                if attempt == max_retries - 1:
+                    return
+                delay = self._retry_delay(attempt, base_delay)
+            if self.model_router.breaker(routed).state == CLOSED:
+                await asyncio.sleep(delay)
+    
+    async def _iter_sse_tokens(self, response: aiohttp.ClientResponse) -> AsyncIterator[str]:
+        """Content deltas from an OpenAI-style SSE body"""
+        async for raw_line in response.content:
+            line = raw_line.decode("utf-8", "replace").strip()
+            # Blank lines separate events; ":" lines are keep-alive comments
+            if not line or line.startswith(":") or not line.startswith("data:"):
+                continue
+            data = line[5:].strip()
+            if data == "[DONE]":
+                return
+            try:
+                chunk = json.loads(data)
+            except ValueError:
+                logger.debug(f"Skipping malformed SSE chunk: {data[:80]}")
+                continue
+            if chunk.get("error"):
+                raise aiohttp.ClientPayloadError(f"OpenRouter stream error: {chunk['error']}")
+            choices = chunk.get("choices") or []
+            if choices:
+                content = (choices[0].get("delta") or {}).get("content")
+                if content:
+                    yield content
+    
+    def _cache_key(self, messages: List[Dict[str, str]], intent: Optional[str]) -> Optional[str]:
+        """Response cache key for a request, or None when it must not be cached.
+        
+        Keyed on the model the router would send the request to now, so a
+        reply from a fallback model is only served while that fallback answers.
+        """
+        cache = self.response_cache
+        if cache is None or not cache.should_cache(intent):
+            return None
+        return cache.make_key(self._routed_model(), messages)
+    
+    def _routed_model(self) -> str:
+        return self.model_router.route(self.openrouter_model) or self.openrouter_model
+    
+    def _cache_reply(self, messages: List[Dict[str, str]], reply: str, model: Optional[str]):
+        """Store a validated reply under the model that actually produced it"""
+        model = model or self.openrouter_model
+        self.response_cache.set(self.response_cache.make_key(model, messages), model, str(reply))
+    
+    async def _generate_openrouter_response(self, message: str, context: Dict[str, Any],
+                                            intent: Optional[str] = None,
+                                            priority: int = PRIORITY_INTERACTIVE,
+                                            prompt: Optional[AssembledPrompt] = None) -> Optional[str]:
         """Generate response using OpenRouter API with enhanced context and error handling"""
         try:
-            # Build enhanced system prompt with current context
-            enhanced_system_prompt = self._build_enhanced_system_prompt(context)
-            
-            # Build conversation history with better context preservation
-            messages = [{"role": "system", "content": enhanced_system_prompt}]
-            
-            # Add recent conversation history for context (last 5 interactions)
-            if 'conversation_history' in context and context['conversation_history']:
-                recent_history = context['conversation_history'][-5:]
-                for item in recent_history:
-                    if 'intent' in item and 'entities' in item:
-                        # Add user intent as user message
-                        user_content = f"Previous request: Intent was '{item['intent']}'"
-                        if item['entities']:
-                            user_content += f" with entities: {json.dumps(item['entities'])}"
-                        messages.append({"role": "user", "content": user_content})
-                        
-                        # Add assistant response as assistant message
-                        assistant_content = "I processed that request and am ready for your next question."
-                        messages.append({"role": "assistant", "content": assistant_content})
-            
-            # Add current message with context about available capabilities
-            current_context = self._get_current_context_for_openrouter(context)
-            enhanced_user_message = f"{message}\n\nContext: {current_context}"
-            messages.append({"role": "user", "content": enhanced_user_message})
+            messages = (prompt or self._assemble_prompt(message, context)).messages
+            cache_key = self._cache_key(messages, intent)
+            if cache_key:
+                cached = self.response_cache.get(cache_key)
+                if cached:
+                    logger.info("Serving OpenRouter response from cache")
+                    return cached
             
             # Try to get response from OpenRouter with fallback handling
-            response = await self._call_openrouter_api(messages)
+            response = await self._call_openrouter_api(messages, self.openrouter_model, priority)
             
             if response:
                 logger.info(f"OpenRouter response generated successfully")
                 
                 # Validate response quality
                 if self._is_valid_openrouter_response(response):
+                    if cache_key:
+                        self._cache_reply(messages, response, getattr(response, "model", None))
                     return response
                 else:
                     logger.warning("OpenRouter response failed quality validation, falling back to pattern-based")
@@ -885,69 +1200,78 @@ Always confirm details before taking actions, and provide clear feedback about w
             logger.error(f"Error generating OpenRouter response: {e}")
             return None
     
-    def _build_enhanced_system_prompt(self, context: Dict[str, Any]) -> str:
-        """Build enhanced system prompt with current context"""
-        base_prompt = self.system_prompt
-        
-        # Add user context if available
-        user_context = ""
-        if context and 'user_id' in context:
-            user_context += f" You are assisting user {context['user_id']}."
-        
-        # Add email/calendar context if available
-        if context and 'user_email' in context:
-            user_context += f" User email: {context['user_email']}."
-        
-        # Add current time context
-        current_time = datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M UTC")
-        user_context += f" Current time: {current_time}."
-        
-        enhanced_prompt = f"""{base_prompt}
-
-Current Context:{user_context}
-
-You are dhii, a specialized AI assistant for email and calendar management. Your responses should be:
-- Helpful and specific to email/calendar tasks
-- Natural and conversational
-- Action-oriented with clear next steps
-- Context-aware of the user's previous requests
-- Professional but friendly
-
-When responding:
-1. Acknowledge the user's request clearly
-2. Provide relevant, actionable information
-3. Suggest specific next steps or alternatives
-4. Keep responses concise but comprehensive
-5. Use appropriate formatting (bullet points, emojis) when helpful"""
-        
-        return enhanced_prompt
+    def _build_openrouter_messages(self, message: str, context: Dict[str, Any]) -> List[Dict[str, str]]:
+        """Chat-completions messages for a user message and its context"""
+        return self._assemble_prompt(message, context).messages
+    
+    def _assemble_prompt(self, message: str, context: Dict[str, Any]) -> AssembledPrompt:
+        """Budgeted prompt: static system prefix, per-turn context, recent history and the message"""
+        prompt = self.prompt_assembler.assemble(
+            self.system_prompt,
+            RESPONSE_GUIDELINES,
+            self._get_current_context_for_openrouter(context),
+            message,
+            self._prompt_history(message, context)
+        )
+        logger.info(f"OpenRouter prompt: {prompt.tokens} tokens (budget {prompt.budget}, "
+                    f"{prompt.history_kept} history turns kept, {prompt.history_summarized} summarized)")
+        return prompt
+    
+    def _prompt_history(self, message: str, context: Dict[str, Any]) -> List[Dict[str, str]]:
+        """Prior chat turns, oldest first, as chat-completions messages"""
+        history = [
+            {"role": "user" if item.get("sender") == "user" else "assistant", "content": item["content"]}
+            for item in (context or {}).get("message_history") or []
+            if item.get("sender") in ("user", "ai") and item.get("content")
+        ]
+        # The session log already holds the message being answered
+        if history and history[-1]["role"] == "user" and history[-1]["content"] == message:
+            history.pop()
+        return history
     
     def _get_current_context_for_openrouter(self, context: Dict[str, Any]) -> str:
-        """Get current context information for OpenRouter"""
+        """Per-turn facts appended after the static system prefix"""
         context_parts = []
         
-        # Add email account context
-        if context and 'user_id' in context:
-            from email_manager import email_manager
-            try:
-                email_accounts = email_manager.get_email_accounts(context['user_id'])
-                if email_accounts:
-                    context_parts.append(f"User has {len(email_accounts)} email account(s) configured")
-                else:
-                    context_parts.append("User has no email accounts configured yet")
-            except Exception:
-                context_parts.append("Email account status unknown")
+        # Add user context if available
+        if context and context.get('user_id'):
+            context_parts.append(f"You are assisting user {context['user_id']}")
+            if context.get('user_email'):
+                context_parts.append(f"User email: {context['user_email']}")
+            context_parts.append(self._email_account_status(context['user_id']))
+        
+        # Add current time context
+        context_parts.append(f"Current time: {datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M UTC')}")
         
         # Add calendar context
         context_parts.append("Calendar integration available")
         
         # Add recent activity context
-        if context and 'conversation_history' in context and context['conversation_history']:
+        if context and context.get('conversation_history'):
             recent_intents = [item['intent'] for item in context['conversation_history'][-3:] if 'intent' in item]
             if recent_intents:
-                context_parts.append(f"Recent user activities: {', '.join(set(recent_intents))}")
+                context_parts.append(f"Recent user activities: {', '.join(dict.fromkeys(recent_intents))}")
         
-        return "; ".join(context_parts) if context_parts else "Email and calendar management system ready"
+        return "; ".join(context_parts)
+    
+    def _email_account_status(self, user_id: str) -> str:
+        """Email account summary for the prompt, reused for ACCOUNT_STATUS_TTL seconds"""
+        now = time.monotonic()
+        cached = self._account_status.get(user_id)
+        if cached and cached[0] > now:
+            return cached[1]
+        try:
+            email_accounts = email_manager.get_email_accounts(user_id)
+            if email_accounts:
+                status = f"User has {len(email_accounts)} email account(s) configured"
+            else:
+                status = "User has no email accounts configured yet"
+        except Exception:
+            return "Email account status unknown"
+        if len(self._account_status) >= 1024:
+            self._account_status.clear()
+        self._account_status[user_id] = (now + ACCOUNT_STATUS_TTL, status)
+        return status
     
     def _is_valid_openrouter_response(self, response: str) -> bool:
         """Validate OpenRouter response quality"""
@@ -960,7 +1284,7 @@ When responding:
         if len(response) < 5:  # Too short
             return False
         
-        if len(response) > 2000:  # Too long for typical responses
+        if len(response) > MAX_REPLY_LENGTH:  # Too long for typical responses
             return False
         
         # Check for repetitive or nonsensical patterns
@@ -968,8 +1292,7 @@ When responding:
             return False
         
         # Check for inappropriate content (basic filter)
-        inappropriate_words = ['<script', 'javascript:', 'data:', 'vbscript:', 'onload', 'onerror']
-        if any(word in response.lower() for word in inappropriate_words):
+        if any(word in response.lower() for word in UNSAFE_REPLY_MARKERS):
             return False
         
         # Check if response is relevant to email/calendar context
@@ -983,6 +1306,88 @@ When responding:
         
         return True
 
+class AIResponseStream:
+    """Tokens of one AI reply as they arrive from the model.
+    
+    Iterate to receive text deltas; once exhausted, ``response`` holds the
+    final AIResponse. If the assembled text fails quality validation, trips an
+    unsafe marker mid-stream or the model fails, the final message is the
+    pattern-based reply and ``replaced`` tells clients to discard the deltas.
+    """
+    
+    def __init__(self, engine: AIEngine, message: str, context: Dict[str, Any],
+                 priority: int = PRIORITY_INTERACTIVE):
+        self.engine = engine
+        self.message = message
+        self.context = context
+        self.priority = priority
+        self.response: Optional[AIResponse] = None
+        self.streamed = False
+        self.replaced = False
+        self.time_to_first_token: Optional[float] = None
+    
+    def __aiter__(self) -> AsyncIterator[str]:
+        return self._run()
+    
+    async def _run(self) -> AsyncIterator[str]:
+        engine = self.engine
+        intent = engine.detect_intent(self.message)
+        local_intent = engine._local_intent(self.message)
+        if local_intent is not None:
+            intent = local_intent
+        started = time.perf_counter()
+        text = None
+        
+        prompt = (engine._assemble_prompt(self.message, self.context)
+                  if engine.use_openrouter and local_intent is None else None)
+        messages = prompt.messages if prompt else None
+        cache_key = engine._cache_key(messages, intent.intent) if messages else None
+        cached = engine.response_cache.get(cache_key) if cache_key else None
+        if cached:
+            # A cache hit arrives as a single delta
+            self.streamed = True
+            self.time_to_first_token = time.perf_counter() - started
+            text = cached
+            yield cached
+        elif messages:
+            assembled = ""
+            complete = False
+            answered = []
+            tokens = engine._stream_openrouter_api(messages, engine.openrouter_model, self.priority,
+                                                   on_model=answered.append)
+            try:
+                async for token in tokens:
+                    if not self.streamed:
+                        self.streamed = True
+                        self.time_to_first_token = time.perf_counter() - started
+                    window = (assembled[-16:] + token).lower()
+                    assembled += token
+                    if len(assembled) > MAX_REPLY_LENGTH or any(m in window for m in UNSAFE_REPLY_MARKERS):
+                        logger.warning("Streamed OpenRouter reply rejected mid-stream, falling back to pattern-based")
+                        break
+                    yield token
+                else:
+                    complete = True
+            except Exception as e:
+                logger.warning(f"OpenRouter stream failed, falling back to pattern-based: {e}")
+            finally:
+                # Closes the HTTP response when we stop early or the turn is cancelled
+                await tokens.aclose()
+            
+            if complete and engine._is_valid_openrouter_response(assembled):
+                text = assembled.strip()
+                if cache_key:
+                    engine._cache_reply(messages, text, answered[0] if answered else None)
+            elif complete and assembled:
+                logger.warning("Streamed OpenRouter reply failed quality validation, falling back to pattern-based")
+        
+        if not text:
+            self.replaced = self.streamed
+            text = engine._generate_response(self.message, intent, self.context)
+        self.response = engine._build_ai_response(intent, self.context, text)
+        if prompt is not None:
+            self.response.prompt_tokens = prompt.tokens
+
 # Global AI engine instance
 ai_engine = AIEngine()
 
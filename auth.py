@@ -7,9 +7,12 @@ import pyseto
 from datetime import datetime, timezone, timedelta
 import secrets
 import bcrypt
-from typing import Optional, Dict, Any, List
+from typing import Optional, Dict, Any, List, Callable
 import json
+import time
 import logging
+import threading
+from collections import OrderedDict
 from database import get_db
 
 # FastAPI imports (only used in get_current_user function)
@@ -22,6 +25,21 @@ except ImportError:
 
 logger = logging.getLogger(__name__)
 
+# Permission scopes granted by each tenant role
+ROLE_SCOPES = {
+    'admin': ['read', 'write', 'delete', 'admin', 'manage_users', 'manage_tenants'],
+    'moderator': ['read', 'write', 'delete', 'moderate'],
+    'member': ['read', 'write'],
+    'guest': ['read']
+}
+
+_USER_ROLES_QUERY = """SELECT ut.user_id, ut.tenant_id, t.slug, ut.role, ut.permissions 
+                       FROM user_tenants ut 
+                       JOIN tenants t ON ut.tenant_id = t.id 
+                       WHERE ut.user_id IN ({})"""
+# Users per roles query; stays under SQLite's bound-parameter limit (999 on older builds)
+_PERMISSION_BATCH_SIZE = 500
+
 class AuthManager:
     """Manages user authentication using PASETO tokens."""
     
@@ -33,6 +51,13 @@ class AuthManager:
             'refresh': timedelta(days=30),
             'api': timedelta(days=365)
         }
+        # Per-user tenant role rows, keyed by user_id: (loaded_at, rows)
+        self.permission_cache_ttl = 300
+        self.permission_cache_size = 10000
+        self._permission_cache: "OrderedDict[int, tuple]" = OrderedDict()
+        self._permission_lock = threading.Lock()
+        # Callbacks notified as listener(user_id=..., token_id=...) when tokens are revoked
+        self._revocation_listeners: List[Callable[..., None]] = []
     
     def hash_password(self, password: str) -> str:
         """Hash a password using bcrypt."""
@@ -86,6 +111,7 @@ class AuthManager:
                     "INSERT INTO user_tenants (user_id, tenant_id, role) VALUES (?, ?, ?)",
                     (user_data['id'], tenant_id, 'member')
                 )
+                self.invalidate_user_permissions(user_data['id'])
             
             logger.info(f"User created successfully: {email}")
             return user_data
@@ -267,6 +293,7 @@ class AuthManager:
             success = result > 0
             if success:
                 logger.info(f"Token revoked: {token_id}")
+                self._notify_revocation(token_id=token_id)
             return success
         except Exception as e:
             logger.error(f"Token revocation failed: {e}")
@@ -280,11 +307,24 @@ class AuthManager:
                 (user_id,)
             )
             logger.info(f"Revoked {result} tokens for user {user_id}")
+            self._notify_revocation(user_id=user_id)
             return result
         except Exception as e:
             logger.error(f"User token revocation failed: {e}")
             return 0
     
+    def add_revocation_listener(self, listener: Callable[..., None]):
+        """Register a callback invoked as listener(user_id=..., token_id=...) on token revocation."""
+        self._revocation_listeners.append(listener)
+    
+    def _notify_revocation(self, user_id: Optional[int] = None, token_id: Optional[str] = None):
+        """Tell listeners (e.g. open websockets) that tokens were revoked."""
+        for listener in self._revocation_listeners:
+            try:
+                listener(user_id=user_id, token_id=token_id)
+            except Exception as e:
+                logger.error(f"Revocation listener failed: {e}")
+    
     def cleanup_expired_tokens(self) -> int:
         """Remove expired tokens from database."""
         try:
@@ -304,45 +344,137 @@ class AuthManager:
         return hashlib.sha256(token.encode('utf-8')).hexdigest()
     
     def get_user_permissions(self, user_id: int, tenant_id: Optional[int] = None) -> Dict[str, Any]:
-        """Get user permissions and roles."""
+        """Get user permissions and roles (served from the permission cache)."""
         try:
-            # Get user roles across tenants
-            roles = self.db.execute_query(
-                """SELECT t.slug, ut.role, ut.permissions 
-                   FROM user_tenants ut 
-                   JOIN tenants t ON ut.tenant_id = t.id 
-                   WHERE ut.user_id = ?""",
-                (user_id,)
-            )
-            
-            # Get specific tenant role if requested
-            tenant_role = None
-            if tenant_id:
-                tenant_result = self.db.execute_query(
-                    "SELECT role, permissions FROM user_tenants WHERE user_id = ? AND tenant_id = ?",
-                    (user_id, tenant_id)
-                )
-                if tenant_result:
-                    tenant_role = tenant_result[0]
-            
-            return {
-                'global_roles': [{'tenant': r['slug'], 'role': r['role'], 'permissions': json.loads(r['permissions'] or '{}')} for r in roles],
-                'tenant_role': tenant_role,
-                'scopes': self._calculate_scopes(tenant_role['role'] if tenant_role else 'member')
-            }
+            rows = self._cached_role_rows(user_id)
+            if rows is None:
+                rows = self.load_user_permissions([user_id]).get(user_id, [])
+            return self._build_permissions(rows, tenant_id)
         except Exception as e:
             logger.error(f"Permission retrieval failed: {e}")
             return {'global_roles': [], 'tenant_role': None, 'scopes': ['read']}
     
+    def load_user_permissions(self, user_ids: List[int]) -> Dict[int, List[Dict[str, Any]]]:
+        """Load tenant roles for many users with one query per batch and populate the cache."""
+        user_ids = list(dict.fromkeys(user_ids))
+        if not user_ids:
+            return {}
+        
+        roles_by_user: Dict[int, List[Dict[str, Any]]] = {user_id: [] for user_id in user_ids}
+        for start in range(0, len(user_ids), _PERMISSION_BATCH_SIZE):
+            batch = user_ids[start:start + _PERMISSION_BATCH_SIZE]
+            rows = self.db.execute_query(_USER_ROLES_QUERY.format(", ".join("?" for _ in batch)), tuple(batch))
+            for row in rows:
+                roles_by_user.setdefault(row['user_id'], []).append(row)
+        
+        loaded_at = time.monotonic()
+        with self._permission_lock:
+            for user_id, user_rows in roles_by_user.items():
+                self._permission_cache[user_id] = (loaded_at, user_rows)
+                self._permission_cache.move_to_end(user_id)
+            while len(self._permission_cache) > self.permission_cache_size:
+                self._permission_cache.popitem(last=False)
+        return roles_by_user
+    
+    def warm_user_permissions(self, user_ids: List[int]) -> int:
+        """Batch-load permissions for the users that are not cached yet; returns how many were loaded.
+        
+        Called from a worker thread when a websocket identity is bound, with
+        just the user being bound.
+        """
+        missing = [user_id for user_id in dict.fromkeys(user_ids) if self._cached_role_rows(user_id) is None]
+        if not missing:
+            return 0
+        try:
+            return len(self.load_user_permissions(missing))
+        except Exception as e:
+            logger.error(f"Permission warm-up failed: {e}")
+            return 0
+    
+    def invalidate_user_permissions(self, user_id: Optional[int] = None):
+        """Drop cached permissions for one user, or for everyone when user_id is None."""
+        with self._permission_lock:
+            if user_id is None:
+                self._permission_cache.clear()
+            else:
+                self._permission_cache.pop(user_id, None)
+    
+    def set_user_role(self, user_id: int, tenant_id: int, role: str) -> bool:
+        """Change a user's role in a tenant and invalidate their cached permissions."""
+        if role not in ROLE_SCOPES:
+            raise ValueError(f"Invalid role: {role}")
+        try:
+            result = self.db.execute_update(
+                "UPDATE user_tenants SET role = ? WHERE user_id = ? AND tenant_id = ?",
+                (role, user_id, tenant_id)
+            )
+            return result > 0
+        finally:
+            self.invalidate_user_permissions(user_id)
+    
+    def authenticate_and_authorize(self, token: str, required_scopes: Optional[List[str]] = None,
+                                   tenant_id: Optional[int] = None,
+                                   token_type: str = 'access') -> Optional[Dict[str, Any]]:
+        """Verify a token and resolve the user's permissions in one call.
+        
+        Returns the user data with a ``permissions`` entry, or None when the token
+        is invalid or the user lacks any of ``required_scopes``. Permissions come
+        from the cache, so warm calls cost no queries beyond token verification.
+        """
+        user = self.verify_token(token, token_type)
+        if not user:
+            return None
+        
+        permissions = self.get_user_permissions(user['id'], tenant_id)
+        user['permissions'] = permissions
+        
+        if required_scopes:
+            granted = set(permissions['scopes'])
+            missing = [scope for scope in required_scopes if scope not in granted]
+            if missing:
+                logger.warning(f"User {user['id']} missing scopes: {missing}")
+                return None
+        
+        return user
+    
+    def _cached_role_rows(self, user_id: int) -> Optional[List[Dict[str, Any]]]:
+        """Return cached tenant role rows for a user, or None on miss/expiry."""
+        with self._permission_lock:
+            entry = self._permission_cache.get(user_id)
+            if entry is None:
+                return None
+            loaded_at, rows = entry
+            if time.monotonic() - loaded_at > self.permission_cache_ttl:
+                del self._permission_cache[user_id]
+                return None
+            self._permission_cache.move_to_end(user_id)
+            return rows
+    
+    def _build_permissions(self, rows: List[Dict[str, Any]], tenant_id: Optional[int]) -> Dict[str, Any]:
+        """Shape cached tenant role rows into the permissions response."""
+        tenant_role = None
+        if tenant_id:
+            for row in rows:
+                if row['tenant_id'] == tenant_id:
+                    tenant_role = {'role': row['role'], 'permissions': row['permissions']}
+                    break
+        
+        return {
+            'global_roles': [{'tenant': r['slug'], 'role': r['role'], 'permissions': self._parse_permissions(r['permissions'])} for r in rows],
+            'tenant_role': tenant_role,
+            'scopes': self._calculate_scopes(tenant_role['role'] if tenant_role else 'member')
+        }
+    
+    @staticmethod
+    def _parse_permissions(permissions: Any) -> Dict[str, Any]:
+        """Normalise a permissions column that may already have been decoded from JSON."""
+        if isinstance(permissions, str):
+            return json.loads(permissions or '{}')
+        return permissions or {}
+    
     def _calculate_scopes(self, role: str) -> List[str]:
         """Calculate permission scopes based on role."""
-        role_scopes = {
-            'admin': ['read', 'write', 'delete', 'admin', 'manage_users', 'manage_tenants'],
-            'moderator': ['read', 'write', 'delete', 'moderate'],
-            'member': ['read', 'write'],
-            'guest': ['read']
-        }
-        return role_scopes.get(role, ['read'])
+        return list(ROLE_SCOPES.get(role, ['read']))
 
 # Global auth manager instance - will be set by main.py
 auth_manager = None
@@ -366,7 +498,7 @@ def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(HTTPBea
             headers={"WWW-Authenticate": "Bearer"},
         )
     
-    user = auth_manager.verify_token(token, 'access')
+    user = auth_manager.authenticate_and_authorize(token)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -376,6 +508,19 @@ def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(HTTPBea
     
     return user
 
+def require_scopes(*scopes: str):
+    """Build a FastAPI dependency that requires the current user to hold all ``scopes``."""
+    def dependency(user: Dict[str, Any] = Depends(get_current_user)) -> Dict[str, Any]:
+        granted = set(user.get('permissions', {}).get('scopes', []))
+        missing = [scope for scope in scopes if scope not in granted]
+        if missing:
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail=f"Missing required scopes: {', '.join(missing)}",
+            )
+        return user
+    return dependency
+
 def get_auth() -> AuthManager:
     """Get the global authentication manager instance."""
     return auth_manager
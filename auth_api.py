@@ -15,7 +15,6 @@ import bcrypt
 from uuid import uuid4
 
 # Import existing components
-from security_manager import SecurityManager
 from a2ui_card_implementation import A2UICardRenderer
 from config import settings
 from auth import get_auth  # Import unified AuthManager
@@ -32,7 +31,6 @@ app.add_middleware(
 )
 
 # Initialize components
-security_manager = SecurityManager()
 card_renderer = A2UICardRenderer()
 auth_manager = get_auth()  # Use unified AuthManager
 
@@ -0,0 +1,234 @@
+#!/usr/bin/env python3
+"""
+Benchmark: AIEngine against a local OpenRouter stand-in
+
+Starts fake_openrouter.FakeOpenRouter in-process with the requested latency,
+error and rate-limit injection, points a real AIEngine at it (real prompt
+assembly, dispatcher, retries and circuit breakers; the response cache and
+local intent classifier only when asked for) and drives ``process_message``
+- or ``stream_message`` with --stream - from N concurrent callers. Reports:
+
+- throughput (turns per second) and turn latency p50/p90/p99/max
+- how many turns got the model's reply versus the pattern-based fallback
+- retry amplification: upstream requests per turn that wanted the model
+  (below 1 when open circuits sent turns straight to the fallback)
+- dispatcher queueing, cool-downs and circuits opened along the way
+
+Messages are unique unless --repeat is set, so coalescing and caching only
+show up when asked for. Use it to compare retry, pooling and caching
+settings under the same simulated provider.
+
+Usage: python bench_ai_engine.py [--turns N] [--concurrency N] [--latency-ms MS]
+       [--error-rate R] [--rate-limit-rate R] [--capacity N] [--stream] [--json]
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import logging
+import argparse
+from typing import Any, Dict, List, Optional
+
+# Add the current directory to Python path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from bench_websocket_load import percentile
+from fake_openrouter import FakeOpenRouter
+
+MESSAGES = [
+    "Can you help me plan the offsite agenda",
+    "What should I say to the client about the delay",
+    "Draft a friendly follow up for the vendor",
+    "Summarize what we discussed about the budget",
+    "How do I politely decline this meeting",
+    "Give me three subject lines for the launch email",
+]
+
+def _bench_engine(url: str, models: List[str], max_retries: int, retry_base_delay: float,
+                  cache: bool, local_intents: bool, breaker_options: Dict[str, Any]):
+    """AIEngine wired to the fake server with its own router, cache and classifier"""
+    from ai_engine import AIEngine
+    from llm_cache import LLMResponseCache
+    from llm_routing import ModelRouter
+    from intent_classifier import IntentClassifier
+    from prompt_assembler import PromptAssembler
+
+    engine = AIEngine()
+    engine.openrouter_api_key = "bench-key"
+    engine.openrouter_api_url = url
+    engine.use_openrouter = True
+    engine.max_retries = max_retries
+    engine.retry_base_delay = retry_base_delay
+    engine.response_cache = LLMResponseCache(db_path=None) if cache else None
+    engine.intent_classifier = IntentClassifier().fit_seed() if local_intents else None
+    engine.prompt_assembler = PromptAssembler()
+    engine.model_router = ModelRouter(models, **breaker_options)
+    engine.model_router.set_probe(engine._probe_openrouter)
+    engine.openrouter_model = engine.model_router.primary
+    return engine
+
+async def run_benchmark(server: FakeOpenRouter, turns: int, concurrency: int, stream: bool = False,
+                        repeat: float = 0.0, models: Optional[List[str]] = None, max_retries: int = 3,
+                        retry_base_delay: float = 1.0, max_upstream: int = 8, cache: bool = False,
+                        local_intents: bool = False, breaker_options: Optional[Dict[str, Any]] = None
+                        ) -> Dict[str, Any]:
+    from llm_dispatch import llm_dispatcher
+    from http_client_pool import shared_http_client
+
+    url = await server.start()
+    engine = _bench_engine(url, models or ["meta-llama/llama-3.1-8b-instruct"], max_retries,
+                           retry_base_delay, cache, local_intents, breaker_options or {})
+    llm_dispatcher.configure(max_concurrency=max_upstream)
+    dispatch_before = dict(llm_dispatcher.stats)
+    latencies: List[float] = []
+    first_tokens: List[float] = []
+    outcome = {"model": 0, "fallback": 0, "errors": 0}
+    next_turn = iter(range(turns))
+
+    async def caller():
+        for index in next_turn:
+            if repeat and random.random() < repeat:
+                message = random.choice(MESSAGES)
+            else:
+                message = f"{MESSAGES[index % len(MESSAGES)]} (request {index})"
+            started = time.perf_counter()
+            try:
+                if stream:
+                    reply = engine.stream_message(message, {})
+                    async for _ in reply:
+                        pass
+                    response = reply.response
+                    if reply.time_to_first_token is not None:
+                        first_tokens.append(reply.time_to_first_token)
+                else:
+                    response = await engine.process_message(message, {})
+            except Exception:
+                outcome["errors"] += 1
+                continue
+            latencies.append(time.perf_counter() - started)
+            outcome["model" if response.message == server.reply else "fallback"] += 1
+
+    started = time.perf_counter()
+    try:
+        await asyncio.gather(*(caller() for _ in range(concurrency)))
+        wall = time.perf_counter() - started
+    finally:
+        await engine.model_router.close()
+        await shared_http_client.close()
+        await server.stop()
+
+    upstream = server.get_stats()
+    dispatch = {key: llm_dispatcher.stats[key] - dispatch_before.get(key, 0) for key in llm_dispatcher.stats}
+    model_turns = engine.prompt_assembler.get_stats()["prompts"]
+    result = {
+        "turns": turns,
+        "concurrency": concurrency,
+        "stream": stream,
+        "wall_s": wall,
+        "throughput_rps": len(latencies) / wall if wall else 0.0,
+        "latency_p50_ms": percentile(latencies, 50) * 1000,
+        "latency_p90_ms": percentile(latencies, 90) * 1000,
+        "latency_p99_ms": percentile(latencies, 99) * 1000,
+        "latency_max_ms": max(latencies, default=0.0) * 1000,
+        "ttft_p50_ms": percentile(first_tokens, 50) * 1000,
+        "ttft_p99_ms": percentile(first_tokens, 99) * 1000,
+        "model_replies": outcome["model"],
+        "fallback_replies": outcome["fallback"],
+        "errors": outcome["errors"],
+        "model_turns": model_turns,
+        "upstream_requests": upstream["requests"],
+        "upstream_ok": upstream["ok"],
+        "upstream_errors": upstream["errors"],
+        "upstream_rate_limited": upstream["rate_limited"],
+        "upstream_peak_in_flight": upstream["peak_in_flight"],
+        "probes": upstream["probes"],
+        "retry_amplification": upstream["requests"] / model_turns if model_turns else 0.0,
+        "coalesced": dispatch["coalesced"],
+        "queued": dispatch["queued"],
+        "cool_downs": dispatch["cool_downs"],
+        "circuits_opened": sum(b.stats["opened"] for b in engine.model_router.breakers.values()),
+        "cache_hits": engine.response_cache.stats["hits"] if engine.response_cache else 0,
+        "avg_prompt_tokens": engine.prompt_assembler.get_stats()["avg_prompt_tokens"]
+    }
+    return result
+
+def run_ai_benchmark(turns: int = 500, concurrency: int = 32, latency: float = 0.2, jitter: float = 0.0,
+                     error_rate: float = 0.0, rate_limit_rate: float = 0.0, retry_after: Optional[float] = 1.0,
+                     capacity: Optional[int] = None, token_delay: float = 0.0, seed: Optional[int] = None,
+                     **options: Any) -> Dict[str, Any]:
+    """Run one benchmark against a fresh fake server and return its metrics"""
+    server = FakeOpenRouter(latency=latency, jitter=jitter, error_rate=error_rate,
+                            rate_limit_rate=rate_limit_rate, retry_after=retry_after, capacity=capacity,
+                            token_delay=token_delay, seed=seed)
+    if seed is not None:
+        random.seed(seed)
+    # Per-turn INFO logging would dominate the measurement
+    logging.disable(logging.WARNING)
+    try:
+        return asyncio.run(run_benchmark(server, turns, concurrency, **options))
+    finally:
+        logging.disable(logging.NOTSET)
+
+def main():
+    parser = argparse.ArgumentParser(description="AIEngine benchmark against a local OpenRouter stand-in")
+    parser.add_argument("--turns", type=int, default=500, help="process_message calls in total")
+    parser.add_argument("--concurrency", type=int, default=32, help="concurrent callers")
+    parser.add_argument("--stream", action="store_true", help="drive stream_message instead")
+    parser.add_argument("--repeat", type=float, default=0.0, help="share of turns reusing a common message")
+    parser.add_argument("--latency-ms", type=float, default=200.0, help="fake model latency")
+    parser.add_argument("--jitter-ms", type=float, default=0.0, help="extra random latency, up to this much")
+    parser.add_argument("--token-delay-ms", type=float, default=0.0, help="delay between streamed words")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of upstream requests failing with 503")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="share answered with 429")
+    parser.add_argument("--retry-after", type=float, default=1.0, help="Retry-After seconds sent with 429s")
+    parser.add_argument("--capacity", type=int, default=None, help="fake provider concurrency before 429s")
+    parser.add_argument("--models", default="meta-llama/llama-3.1-8b-instruct",
+                        help="comma-separated models, primary first")
+    parser.add_argument("--max-retries", type=int, default=3, help="AIEngine attempts per call")
+    parser.add_argument("--retry-base-ms", type=float, default=1000.0, help="AIEngine first backoff")
+    parser.add_argument("--max-upstream", type=int, default=8, help="dispatcher concurrency (LLM_MAX_CONCURRENCY)")
+    parser.add_argument("--circuit-min-calls", type=int, default=20, help="outcomes before a circuit may open")
+    parser.add_argument("--circuit-failure-threshold", type=float, default=0.5,
+                        help="failed or slow share that opens a circuit")
+    parser.add_argument("--cache", action="store_true", help="enable an in-memory response cache")
+    parser.add_argument("--local-intents", action="store_true", help="answer routine turns locally")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--json", action="store_true", help="print the metrics as JSON")
+    args = parser.parse_args()
+
+    result = run_ai_benchmark(
+        args.turns, args.concurrency, args.latency_ms / 1000, args.jitter_ms / 1000, args.error_rate,
+        args.rate_limit_rate, args.retry_after, args.capacity, args.token_delay_ms / 1000, args.seed,
+        stream=args.stream, repeat=args.repeat,
+        models=[m.strip() for m in args.models.split(",") if m.strip()],
+        max_retries=args.max_retries, retry_base_delay=args.retry_base_ms / 1000,
+        max_upstream=args.max_upstream, cache=args.cache, local_intents=args.local_intents,
+        breaker_options={"min_calls": args.circuit_min_calls,
+                         "failure_threshold": args.circuit_failure_threshold}
+    )
+    if args.json:
+        print(json.dumps(result, indent=2))
+        return
+
+    print(f"turns       {result['turns']} with {result['concurrency']} callers in {result['wall_s']:.2f}s, "
+          f"{result['throughput_rps']:.1f}/s")
+    print(f"latency     p50 {result['latency_p50_ms']:.1f} ms   p90 {result['latency_p90_ms']:.1f} ms   "
+          f"p99 {result['latency_p99_ms']:.1f} ms   max {result['latency_max_ms']:.1f} ms")
+    if result["stream"]:
+        print(f"first token p50 {result['ttft_p50_ms']:.1f} ms   p99 {result['ttft_p99_ms']:.1f} ms")
+    print(f"replies     {result['model_replies']} from the model, {result['fallback_replies']} pattern-based, "
+          f"{result['errors']} errors")
+    print(f"upstream    {result['upstream_requests']} requests for {result['model_turns']} model turns "
+          f"(x{result['retry_amplification']:.2f}), {result['upstream_errors']} 5xx, "
+          f"{result['upstream_rate_limited']} 429, peak {result['upstream_peak_in_flight']} in flight, "
+          f"{result['probes']} probes")
+    print(f"dispatcher  {result['queued']} queued, {result['coalesced']} coalesced, "
+          f"{result['cool_downs']} cool-downs, {result['circuits_opened']} circuits opened, "
+          f"{result['cache_hits']} cache hits")
+    print(f"prompt      {result['avg_prompt_tokens']:.0f} tokens on average")
+
+if __name__ == "__main__":
+    main()
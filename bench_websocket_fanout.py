@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark: per-recipient JSON encoding vs. serialize-once fan-out
+
+Compares the CPU time spent queueing one broadcast on N connections when every
+connection encodes the message itself (the old send_message path) against
+encoding it once and sharing the frame (EnhancedWebSocketManager._fan_out).
+
+Usage: python bench_websocket_fanout.py [recipients ...]
+"""
+
+import os
+import sys
+import json
+import time
+
+# Add the current directory to Python path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from enhanced_websocket_manager import EnhancedWebSocketManager, EnhancedWebSocketConnection, orjson
+
+DEFAULT_RECIPIENTS = [1_000, 10_000, 50_000]
+
+# Representative A2UI update: a short inbox list with actions
+MESSAGE = {
+    "type": "ui_update",
+    "timestamp": "2026-01-01T00:00:00+00:00",
+    "components": [
+        {
+            "id": f"email_{i}",
+            "type": "email_row",
+            "properties": {
+                "subject": f"Quarterly planning follow-up #{i}",
+                "from": "Alice Example <alice@example.com>",
+                "snippet": "Here are the notes from today's sync and the action items we agreed on...",
+                "unread": i % 3 == 0,
+                "labels": ["inbox", "work"]
+            },
+            "actions": [{"name": "open", "label": "Open"}, {"name": "archive", "label": "Archive"}]
+        }
+        for i in range(20)
+    ]
+}
+
+class NullWebSocket:
+    """WebSocket stand-in; the benchmark only measures queueing"""
+    async def send_text(self, data):
+        pass
+
+def _build_manager(recipients: int) -> EnhancedWebSocketManager:
+    manager = EnhancedWebSocketManager(send_queue_size=4)
+    for i in range(recipients):
+        client_id = f"client_{i}"
+        manager.connections[client_id] = EnhancedWebSocketConnection(
+            NullWebSocket(), client_id, "bench", send_queue_size=4
+        )
+        # Keep the writer from starting so only encoding/queueing is measured
+        manager.connections[client_id].start_writer = lambda: None
+    return manager
+
+def _drain(manager: EnhancedWebSocketManager):
+    for connection in manager.connections.values():
+        connection.send_queue.clear()
+
+def bench(recipients: int, rounds: int = 3) -> dict:
+    manager = _build_manager(recipients)
+
+    # Old path: every connection runs json.dumps on the same message
+    start = time.process_time()
+    for _ in range(rounds):
+        for connection in manager.connections.values():
+            connection.send_queue.append(json.dumps(MESSAGE))
+        _drain(manager)
+    per_recipient = (time.process_time() - start) / rounds
+
+    # New path: encode once, share the frame
+    start = time.process_time()
+    for _ in range(rounds):
+        manager._fan_out(manager.connections, MESSAGE)
+        _drain(manager)
+    encode_once = (time.process_time() - start) / rounds
+
+    return {
+        "recipients": recipients,
+        "per_recipient_encode_s": per_recipient,
+        "encode_once_s": encode_once,
+        "cpu_saved_s": per_recipient - encode_once,
+        "speedup": per_recipient / encode_once if encode_once else float("inf")
+    }
+
+def main():
+    recipients_list = [int(arg) for arg in sys.argv[1:]] or DEFAULT_RECIPIENTS
+    print(f"Message size: {len(json.dumps(MESSAGE))} bytes, encoder: {'orjson' if orjson else 'json'}")
+    print(f"{'recipients':>10} {'per-recipient (ms)':>19} {'encode-once (ms)':>17} {'saved (ms)':>11} {'speedup':>8}")
+    for recipients in recipients_list:
+        result = bench(recipients)
+        print(f"{result['recipients']:>10} "
+              f"{result['per_recipient_encode_s'] * 1000:>19.1f} "
+              f"{result['encode_once_s'] * 1000:>17.1f} "
+              f"{result['cpu_saved_s'] * 1000:>11.1f} "
+              f"{result['speedup']:>7.1f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,432 @@
+#!/usr/bin/env python3
+"""
+Load test: thousands of simulated chat clients against /ws/{client_id}
+
+Starts the real FastAPI app on an in-process uvicorn server (its own thread and
+event loop) with a stubbed AIEngine whose OpenRouter call is replaced by a
+fixed delay, then opens N concurrent websocket clients that send chat
+messages at an aggregate target rate. Reports:
+
+- connect time (handshake until ``connection_established``)
+- round-trip latency (chat message until its ``ai_message``), p50/p99, and
+  time to the first streamed ``ai_message_delta``
+- memory per connection (process RSS delta, and with --trace-memory the
+  allocations made under the server stack only; tracing slows the ramp-up,
+  so read connect times from a run without it)
+- event-loop lag of the server loop while messages are flowing
+
+Clients share the process (and the GIL) with the server, so absolute numbers
+are pessimistic; compare runs with the same parameters to size nodes and to
+catch regressions in EnhancedWebSocketManager.
+
+Usage: python bench_websocket_load.py [--clients N] [--rate MSGS_PER_S]
+       [--duration S] [--ai-latency MS] [--trace-memory] [--json]
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import socket
+import asyncio
+import logging
+import argparse
+import tempfile
+import threading
+import tracemalloc
+from collections import deque
+from typing import Any, Dict, List, Optional
+
+import aiohttp
+import uvicorn
+
+# Add the current directory to Python path
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, REPO_DIR)
+
+# Allocations whose stack passes through these paths count as server-side
+SERVER_PATHS = (f"{os.sep}uvicorn{os.sep}", f"{os.sep}websockets{os.sep}", f"{os.sep}starlette{os.sep}",
+                f"{os.sep}fastapi{os.sep}")
+TRACE_FRAMES = 16
+
+def percentile(samples: List[float], pct: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+def _is_server_stack(traceback: tracemalloc.Traceback) -> bool:
+    return any(
+        frame.filename.startswith(REPO_DIR) and not frame.filename.endswith("bench_websocket_load.py")
+        or any(path in frame.filename for path in SERVER_PATHS)
+        for frame in traceback
+    )
+
+def rss_bytes() -> int:
+    """Resident set size of this process"""
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+def raise_fd_limit(needed: int):
+    """Each in-process connection costs two descriptors"""
+    try:
+        import resource
+        soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+        if soft < needed:
+            resource.setrlimit(resource.RLIMIT_NOFILE, (min(needed, hard), hard))
+    except (ImportError, ValueError, OSError):
+        pass
+
+STUB_REPLY = "Sure, I can help schedule that meeting. Which time works best for you tomorrow?"
+
+def _stub_ai_engine(latency: float):
+    """AIEngine whose OpenRouter calls are a fixed sleep; intent detection stays real"""
+    from ai_engine import AIEngine
+
+    class StubAIEngine(AIEngine):
+        def __init__(self):
+            super().__init__()
+            self.use_openrouter = True
+            self.latency = latency
+            # Every turn pays the model latency; cache hits and local answers would hide the load
+            self.response_cache = None
+            self.intent_classifier = None
+
+        async def _generate_openrouter_response(self, message: str, context: Dict[str, Any],
+                                                intent: Optional[str] = None, priority: int = 0,
+                                                prompt=None) -> Optional[str]:
+            await asyncio.sleep(self.latency)
+            return STUB_REPLY
+
+        async def _stream_openrouter_api(self, messages, model=None, priority=0):
+            # Time to first token, then the words of the reply
+            await asyncio.sleep(self.latency)
+            for word in STUB_REPLY.split(" "):
+                yield word + " "
+
+    return StubAIEngine()
+
+class InProcessServer:
+    """Runs main.app on uvicorn in a background thread, sampling its loop lag"""
+
+    def __init__(self, ai_latency: float, lag_interval: float = 0.05):
+        self.ai_latency = ai_latency
+        self.lag_interval = lag_interval
+        self.lag_samples: List[float] = []
+        self.port = self._free_port()
+        self.server: Optional[uvicorn.Server] = None
+        self.app_module = None
+        self._thread: Optional[threading.Thread] = None
+        self._workdir = tempfile.TemporaryDirectory(prefix="dhii-load-", ignore_cleanup_errors=True)
+
+    @staticmethod
+    def _free_port() -> int:
+        with socket.socket() as sock:
+            sock.bind(("127.0.0.1", 0))
+            return sock.getsockname()[1]
+
+    @property
+    def url(self) -> str:
+        return f"ws://127.0.0.1:{self.port}"
+
+    def start(self):
+        # The app writes its SQLite files to the working directory
+        os.chdir(self._workdir.name)
+        import main
+        main.ai_engine = _stub_ai_engine(self.ai_latency)
+        self.app_module = main
+
+        config = uvicorn.Config(main.app, host="127.0.0.1", port=self.port, log_level="warning",
+                                access_log=False, backlog=4096, ws_max_queue=64)
+        self.server = uvicorn.Server(config)
+        self._thread = threading.Thread(target=asyncio.run, args=(self._serve(),), name="load-server", daemon=True)
+        self._thread.start()
+        deadline = time.monotonic() + 15
+        while not self.server.started:
+            if time.monotonic() > deadline or not self._thread.is_alive():
+                raise RuntimeError("In-process server failed to start")
+            time.sleep(0.05)
+
+    async def _serve(self):
+        monitor = asyncio.create_task(self._monitor_lag())
+        try:
+            await self.server.serve()
+        finally:
+            monitor.cancel()
+
+    async def _monitor_lag(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            started = loop.time()
+            await asyncio.sleep(self.lag_interval)
+            self.lag_samples.append(max(0.0, loop.time() - started - self.lag_interval))
+
+    def stop(self):
+        if self.server is not None:
+            self.server.should_exit = True
+        if self._thread is not None:
+            self._thread.join(timeout=15)
+        self._workdir.cleanup()
+
+class LoadStats:
+    def __init__(self):
+        self.connect_times: List[float] = []
+        self.round_trips: List[float] = []
+        self.first_tokens: List[float] = []
+        self.connect_errors = 0
+        self.message_errors = 0
+        self.sent = 0
+        self.received = 0
+        self.disconnected = 0
+        self.superseded = 0
+        self.first_send: Optional[float] = None
+        self.last_reply: Optional[float] = None
+
+class ServerLogCounter(logging.Handler):
+    """Counts server warnings/errors instead of printing one line per client"""
+
+    def __init__(self):
+        super().__init__(logging.WARNING)
+        self.counts: Dict[str, int] = {}
+
+    def emit(self, record: logging.LogRecord):
+        key = f"{record.name}:{record.levelname}"
+        self.counts[key] = self.counts.get(key, 0) + 1
+
+async def run_client(session: aiohttp.ClientSession, url: str, index: int, stats: LoadStats,
+                     handshakes: asyncio.Semaphore, connected: asyncio.Event, go: asyncio.Event,
+                     interval: float, duration: float, drain_timeout: float, ready: List[int], clients: int):
+    client_id = f"load_{index}"
+    session_id = f"load_session_{index}"
+    try:
+        async with handshakes:
+            started = time.perf_counter()
+            ws = await session.ws_connect(f"{url}/ws/{client_id}", heartbeat=None, autoping=True)
+            while True:
+                frame = await ws.receive_json(timeout=30)
+                if frame.get("type") == "connection_established":
+                    break
+            stats.connect_times.append(time.perf_counter() - started)
+    except Exception:
+        stats.connect_errors += 1
+        ready[0] += 1
+        if ready[0] == clients:
+            connected.set()
+        return
+
+    ready[0] += 1
+    if ready[0] == clients:
+        connected.set()
+
+    # Turns run off the receive loop and a newer message can supersede older ones,
+    # so replies are matched by id. The user_message echo comes back in send order
+    # and carries the id that deltas, ai_message, ai_cancelled and errors reply to.
+    unacked: deque = deque()  # send times still waiting for their echo
+    in_flight: Dict[str, float] = {}  # user message id -> send time
+    done_sending = asyncio.Event()
+
+    async def reader():
+        async for msg in ws:
+            if msg.type != aiohttp.WSMsgType.TEXT:
+                break
+            frame = json.loads(msg.data)
+            kind = frame.get("type")
+            if kind == "heartbeat_ping":
+                await ws.send_json({"type": "heartbeat_pong", "timestamp": frame.get("timestamp")})
+            elif kind == "user_message" and unacked:
+                in_flight[frame.get("message_id")] = unacked.popleft()
+            elif kind == "ai_message_delta" and frame.get("index") == 0 and frame.get("reply_to") in in_flight:
+                stats.first_tokens.append(time.perf_counter() - in_flight[frame["reply_to"]])
+            elif kind == "ai_message" and frame.get("reply_to") in in_flight:
+                now = time.perf_counter()
+                stats.round_trips.append(now - in_flight.pop(frame["reply_to"]))
+                stats.received += 1
+                stats.last_reply = now
+            elif kind == "ai_cancelled" and frame.get("reply_to") in in_flight:
+                # A newer message from this client made the reply obsolete
+                in_flight.pop(frame["reply_to"])
+                stats.superseded += 1
+            elif kind == "error":
+                # Rejected turns reply to their message; frames rejected before the echo do not
+                if frame.get("reply_to") in in_flight:
+                    in_flight.pop(frame["reply_to"])
+                elif unacked:
+                    unacked.popleft()
+                else:
+                    continue
+                stats.message_errors += 1
+            if done_sending.is_set() and not in_flight and not unacked:
+                break
+        else:
+            stats.disconnected += 1
+
+    reader_task = asyncio.create_task(reader())
+    try:
+        await go.wait()
+        # Spread the clients over one interval so the rate is smooth
+        await asyncio.sleep(random.uniform(0, interval))
+        end = time.perf_counter() + duration
+        sequence = 0
+        while time.perf_counter() < end and not reader_task.done():
+            sent_at = time.perf_counter()
+            if stats.first_send is None:
+                stats.first_send = sent_at
+            unacked.append(sent_at)
+            await ws.send_json({"message": f"Can we meet tomorrow about item {sequence}?", "session_id": session_id})
+            stats.sent += 1
+            sequence += 1
+            await asyncio.sleep(interval)
+        done_sending.set()
+        if in_flight or unacked:
+            await asyncio.wait_for(reader_task, drain_timeout)
+    except (asyncio.TimeoutError, aiohttp.ClientError, ConnectionError):
+        stats.message_errors += len(in_flight) + len(unacked)
+    finally:
+        reader_task.cancel()
+        await ws.close()
+
+async def run_load(server: InProcessServer, clients: int, rate: float, duration: float,
+                   concurrent_handshakes: int, trace_memory: bool, drain_timeout: float) -> Dict[str, Any]:
+    stats = LoadStats()
+    handshakes = asyncio.Semaphore(concurrent_handshakes)
+    connected, go = asyncio.Event(), asyncio.Event()
+    ready = [0]
+    interval = clients / rate if rate > 0 else duration
+
+    # One throwaway connection pays for lazy imports and first-use caches
+    async with aiohttp.ClientSession() as session:
+        async with session.ws_connect(f"{server.url}/ws/load_warmup") as ws:
+            await ws.receive_json(timeout=30)
+
+    rss_before = rss_bytes()
+    if trace_memory:
+        tracemalloc.start(TRACE_FRAMES)
+        baseline = tracemalloc.take_snapshot()
+
+    connector = aiohttp.TCPConnector(limit=0)
+    async with aiohttp.ClientSession(connector=connector) as session:
+        connect_started = time.perf_counter()
+        tasks = [
+            asyncio.create_task(run_client(session, server.url, i, stats, handshakes, connected, go,
+                                           interval, duration, drain_timeout, ready, clients))
+            for i in range(clients)
+        ]
+        await connected.wait()
+        ramp_seconds = time.perf_counter() - connect_started
+
+        rss_after = rss_bytes()
+        server_bytes = None
+        if trace_memory:
+            snapshot = tracemalloc.take_snapshot()
+            tracemalloc.stop()
+            server_bytes = sum(
+                stat.size_diff for stat in snapshot.compare_to(baseline, "traceback")
+                if _is_server_stack(stat.traceback)
+            )
+
+        peak_connections = len(server.app_module.enhanced_websocket_manager.connections)
+        server.lag_samples.clear()
+        go.set()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        lag = list(server.lag_samples)
+
+    answered_over = (stats.last_reply - stats.first_send) if stats.first_send and stats.last_reply else 0.0
+
+    established = len(stats.connect_times) or 1
+    return {
+        "clients": clients,
+        "connected": len(stats.connect_times),
+        "connect_errors": stats.connect_errors,
+        "peak_server_connections": peak_connections,
+        "ramp_s": ramp_seconds,
+        "connect_p50_ms": percentile(stats.connect_times, 50) * 1000,
+        "connect_p99_ms": percentile(stats.connect_times, 99) * 1000,
+        "target_rate": rate,
+        "achieved_rate": stats.received / answered_over if answered_over else 0.0,
+        "sent": stats.sent,
+        "received": stats.received,
+        "message_errors": stats.message_errors,
+        "superseded": stats.superseded,
+        "disconnected": stats.disconnected,
+        "rtt_p50_ms": percentile(stats.round_trips, 50) * 1000,
+        "rtt_p99_ms": percentile(stats.round_trips, 99) * 1000,
+        "rtt_max_ms": max(stats.round_trips, default=0.0) * 1000,
+        "ttft_p50_ms": percentile(stats.first_tokens, 50) * 1000,
+        "ttft_p99_ms": percentile(stats.first_tokens, 99) * 1000,
+        "rss_per_connection_kb": (rss_after - rss_before) / established / 1024,
+        "server_alloc_per_connection_kb": server_bytes / established / 1024 if server_bytes is not None else None,
+        "loop_lag_p50_ms": percentile(lag, 50) * 1000,
+        "loop_lag_p99_ms": percentile(lag, 99) * 1000,
+        "loop_lag_max_ms": max(lag, default=0.0) * 1000
+    }
+
+def run_load_test(clients: int = 1000, rate: float = 500.0, duration: float = 10.0, ai_latency: float = 0.05,
+                  concurrent_handshakes: int = 200, trace_memory: bool = False,
+                  drain_timeout: float = 30.0) -> Dict[str, Any]:
+    """Run one load test against a fresh in-process server and return its metrics"""
+    raise_fd_limit(clients * 2 + 256)
+    # Per-message INFO logging would dominate the measurement
+    logging.disable(logging.INFO)
+    root = logging.getLogger()
+    handlers, counter = root.handlers[:], ServerLogCounter()
+    root.handlers = [counter]
+    cwd = os.getcwd()
+    server = InProcessServer(ai_latency)
+    try:
+        server.start()
+        # main configures logging on import; keep counting instead of printing
+        root.handlers = [counter]
+        result = asyncio.run(run_load(server, clients, rate, duration, concurrent_handshakes,
+                                      trace_memory, drain_timeout))
+        result["server_log_counts"] = dict(counter.counts)
+        return result
+    finally:
+        os.chdir(cwd)
+        server.stop()
+        root.handlers = handlers
+        logging.disable(logging.NOTSET)
+
+def main():
+    parser = argparse.ArgumentParser(description="Websocket chat load test")
+    parser.add_argument("--clients", type=int, default=1000, help="concurrent websocket clients")
+    parser.add_argument("--rate", type=float, default=500.0, help="aggregate chat messages per second")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds of message traffic")
+    parser.add_argument("--ai-latency", type=float, default=50.0, help="stubbed OpenRouter latency in ms")
+    parser.add_argument("--handshakes", type=int, default=200, help="concurrent handshakes while ramping up")
+    parser.add_argument("--trace-memory", action="store_true", help="attribute allocations to the server stack")
+    parser.add_argument("--json", action="store_true", help="print the metrics as JSON")
+    args = parser.parse_args()
+
+    result = run_load_test(args.clients, args.rate, args.duration, args.ai_latency / 1000,
+                           args.handshakes, args.trace_memory)
+    if args.json:
+        print(json.dumps(result, indent=2))
+        return
+
+    print(f"clients     {result['connected']}/{result['clients']} connected "
+          f"({result['connect_errors']} failed) in {result['ramp_s']:.2f}s")
+    print(f"connect     p50 {result['connect_p50_ms']:.1f} ms   p99 {result['connect_p99_ms']:.1f} ms")
+    print(f"messages    {result['received']}/{result['sent']} answered, "
+          f"{result['achieved_rate']:.0f}/s of {result['target_rate']:.0f}/s target, "
+          f"{result['superseded']} superseded, {result['message_errors']} errors, "
+          f"{result['disconnected']} dropped sockets")
+    print(f"round trip  p50 {result['rtt_p50_ms']:.1f} ms   p99 {result['rtt_p99_ms']:.1f} ms   "
+          f"max {result['rtt_max_ms']:.1f} ms")
+    if result["ttft_p50_ms"]:
+        print(f"first token p50 {result['ttft_p50_ms']:.1f} ms   p99 {result['ttft_p99_ms']:.1f} ms")
+    print(f"loop lag    p50 {result['loop_lag_p50_ms']:.1f} ms   p99 {result['loop_lag_p99_ms']:.1f} ms   "
+          f"max {result['loop_lag_max_ms']:.1f} ms")
+    memory = f"memory      {result['rss_per_connection_kb']:.1f} KiB RSS per connection (client + server)"
+    if result["server_alloc_per_connection_kb"] is not None:
+        memory += f", {result['server_alloc_per_connection_kb']:.1f} KiB allocated by the server stack"
+    print(memory)
+    for key, count in sorted(result["server_log_counts"].items()):
+        print(f"server log  {count} x {key}")
+
+if __name__ == "__main__":
+    main()
@@ -10,6 +10,7 @@ from datetime import datetime, timedelta, timezone
 from typing import Dict, List, Optional, Any
 from pydantic import BaseModel, validator
 import sqlite3
+import realtime_topics
 
 logger = logging.getLogger(__name__)
 
@@ -132,6 +133,7 @@ class CalendarManager:
             conn.close()
             
             logger.info(f"Event created successfully: {event.title} (ID: {event_id})")
+            self._publish_change(user_id, "created", str(event_id))
             return str(event_id)
             
         except Exception as e:
@@ -337,6 +339,21 @@ class CalendarManager:
         
         return cursor.fetchone()[0] > 0
     
+    def _event_owner(self, cursor, event_id: str) -> Optional[int]:
+        cursor.execute("SELECT user_id FROM calendar_events WHERE id = ?", (event_id,))
+        row = cursor.fetchone()
+        return row[0] if row else None
+    
+    def _publish_change(self, user_id: Optional[int], change: str, event_id: str):
+        """Push a calendar change to the owner's calendar topic"""
+        if user_id is None:
+            return
+        realtime_topics.publish(realtime_topics.calendar_topic(user_id), {
+            "type": "calendar_update",
+            "change": change,
+            "event_id": event_id
+        })
+    
     def update_event(self, event_id: str, updates: Dict[str, Any]) -> bool:
         """Update an existing calendar event"""
         try:
@@ -379,6 +396,7 @@ class CalendarManager:
             
             query = f"UPDATE calendar_events SET {', '.join(update_fields)} WHERE id = ?"
             
+            owner_id = self._event_owner(cursor, event_id)
             cursor.execute(query, values)
             updated = cursor.rowcount > 0
             
@@ -387,6 +405,9 @@ class CalendarManager:
             
             if updated:
                 logger.info(f"Event updated successfully: {event_id}")
+                self._publish_change(owner_id, "updated", event_id)
+                if 'user_id' in updates and updates['user_id'] != owner_id:
+                    self._publish_change(updates['user_id'], "created", event_id)
             
             return updated
             
@@ -400,6 +421,7 @@ class CalendarManager:
             conn = sqlite3.connect(self.db_path)
             cursor = conn.cursor()
             
+            owner_id = self._event_owner(cursor, event_id)
             cursor.execute("DELETE FROM calendar_events WHERE id = ?", (event_id,))
             deleted = cursor.rowcount > 0
             
@@ -408,6 +430,7 @@ class CalendarManager:
             
             if deleted:
                 logger.info(f"Event deleted successfully: {event_id}")
+                self._publish_change(owner_id, "deleted", event_id)
             
             return deleted
             
@@ -0,0 +1,193 @@
+"""
+dhii Mail - Chat Turn Scheduler
+Runs AI turns off the websocket receive loop. Turns of one chat session run
+strictly in order, a new message can supersede the turns it makes obsolete,
+and each user has a cap on AI turns running at the same time across all of
+their sockets.
+"""
+
+import asyncio
+import logging
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+class ChatTurn:
+    """One queued or running AI turn"""
+    __slots__ = ("turn_id", "session_id", "user_key", "owner", "factory", "task", "cancel_reason")
+
+    def __init__(self, turn_id: str, session_id: str, user_key: str, owner: str,
+                 factory: Callable[[], Awaitable[Any]]):
+        self.turn_id = turn_id
+        self.session_id = session_id
+        self.user_key = user_key
+        self.owner = owner
+        self.factory = factory
+        self.task: Optional[asyncio.Task] = None
+        self.cancel_reason: Optional[str] = None
+
+    @property
+    def running(self) -> bool:
+        return self.task is not None and not self.task.done()
+
+    def cancel(self, reason: str) -> bool:
+        """Cancel the turn; False if it already finished or was cancelled"""
+        if self.cancel_reason is not None or (self.task is not None and self.task.done()):
+            return False
+        self.cancel_reason = reason
+        if self.task is not None:
+            self.task.cancel()
+        return True
+
+class _UserSlots:
+    __slots__ = ("semaphore", "users")
+
+    def __init__(self, limit: int):
+        self.semaphore = asyncio.Semaphore(limit)
+        self.users = 0
+
+class ChatTurnScheduler:
+    """Per-session FIFO of AI turns with supersession and a per-user cap.
+
+    Each session with work has one drain task; it runs the session's turns one
+    after another so replies never overtake each other. ``submit`` with
+    ``supersede`` cancels the session's queued and running turns first, since
+    their replies would answer a question the user has moved past.
+    """
+
+    def __init__(self, max_turns_per_user: int = 2, max_pending_per_session: int = 8,
+                 supersede: bool = True):
+        self.max_turns_per_user = max_turns_per_user
+        self.max_pending_per_session = max_pending_per_session
+        self.supersede = supersede
+        self._pending: Dict[str, Deque[ChatTurn]] = {}
+        self._running: Dict[str, ChatTurn] = {}
+        self._drainers: Dict[str, asyncio.Task] = {}
+        self._owners: Dict[str, Set[str]] = {}  # client_id -> session_ids with turns
+        self._user_slots: Dict[str, _UserSlots] = {}
+        self.stats = {"submitted": 0, "completed": 0, "failed": 0, "cancelled": 0, "rejected": 0}
+
+    def submit(self, session_id: str, user_key: str, owner: str, turn_id: str,
+               factory: Callable[[], Awaitable[Any]],
+               supersede: Optional[bool] = None) -> List[ChatTurn]:
+        """Queue a turn; returns the turns it superseded.
+
+        Raises ValueError when the session already has too many queued turns.
+        """
+        superseded: List[ChatTurn] = []
+        if self.supersede if supersede is None else supersede:
+            superseded = self.cancel_session(session_id, "superseded", user_key)
+
+        pending = self._pending.setdefault(session_id, deque())
+        if len(pending) >= self.max_pending_per_session:
+            self.stats["rejected"] += 1
+            raise ValueError(f"Too many queued turns for session {session_id}")
+
+        pending.append(ChatTurn(turn_id, session_id, user_key, owner, factory))
+        self._owners.setdefault(owner, set()).add(session_id)
+        self.stats["submitted"] += 1
+        if session_id not in self._drainers:
+            self._drainers[session_id] = asyncio.create_task(self._drain(session_id))
+        return superseded
+
+    def cancel_session(self, session_id: str, reason: str = "cancelled",
+                       user_key: Optional[str] = None) -> List[ChatTurn]:
+        """Cancel the queued and running turns of a session (only ``user_key``'s if given)"""
+        cancelled = []
+        running = self._running.get(session_id)
+        if running is not None and user_key in (None, running.user_key) and running.cancel(reason):
+            cancelled.append(running)
+        pending = self._pending.get(session_id)
+        if pending:
+            for turn in [t for t in pending if user_key in (None, t.user_key)]:
+                pending.remove(turn)
+                if turn.cancel(reason):
+                    cancelled.append(turn)
+        self.stats["cancelled"] += len(cancelled)
+        return cancelled
+
+    def cancel_owner(self, owner: str, reason: str = "disconnected") -> List[ChatTurn]:
+        """Cancel the turns submitted by one connection"""
+        cancelled = []
+        for session_id in self._owners.pop(owner, set()):
+            running = self._running.get(session_id)
+            if running is not None and running.owner == owner and running.cancel(reason):
+                cancelled.append(running)
+            pending = self._pending.get(session_id)
+            if pending:
+                for turn in [t for t in pending if t.owner == owner]:
+                    pending.remove(turn)
+                    if turn.cancel(reason):
+                        cancelled.append(turn)
+        self.stats["cancelled"] += len(cancelled)
+        return cancelled
+
+    def _acquire_slots(self, user_key: str) -> _UserSlots:
+        slots = self._user_slots.get(user_key)
+        if slots is None:
+            slots = self._user_slots[user_key] = _UserSlots(self.max_turns_per_user)
+        slots.users += 1
+        return slots
+
+    def _release_slots(self, user_key: str, slots: _UserSlots):
+        slots.users -= 1
+        if slots.users == 0 and self._user_slots.get(user_key) is slots:
+            del self._user_slots[user_key]
+
+    async def _drain(self, session_id: str):
+        """Run a session's turns in submission order"""
+        owners: Set[str] = set()
+        try:
+            while True:
+                pending = self._pending.get(session_id)
+                if not pending:
+                    break
+                turn = pending.popleft()
+                owners.add(turn.owner)
+                if turn.cancel_reason is not None:
+                    continue
+                await self._run(turn)
+        finally:
+            self._drainers.pop(session_id, None)
+            self._pending.pop(session_id, None)
+            for owner in owners:
+                sessions = self._owners.get(owner)
+                if sessions is not None:
+                    sessions.discard(session_id)
+                    if not sessions:
+                        del self._owners[owner]
+
+    async def _run(self, turn: ChatTurn):
+        slots = self._acquire_slots(turn.user_key)
+        # Current turn of the session from here on, so it can be cancelled while
+        # it still waits behind the user's other sessions
+        self._running[turn.session_id] = turn
+        try:
+            async with slots.semaphore:
+                if turn.cancel_reason is not None:
+                    return
+                turn.task = asyncio.create_task(turn.factory())
+                # wait() instead of await: a cancelled turn must not stop the drain loop
+                await asyncio.wait((turn.task,))
+                if turn.task.cancelled():
+                    return
+                error = turn.task.exception()
+                if error is not None:
+                    self.stats["failed"] += 1
+                    logger.error(f"AI turn {turn.turn_id} failed: {error}")
+                else:
+                    self.stats["completed"] += 1
+        finally:
+            if self._running.get(turn.session_id) is turn:
+                del self._running[turn.session_id]
+            self._release_slots(turn.user_key, slots)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            **self.stats,
+            "in_progress": len(self._running),
+            "queued": sum(len(pending) for pending in self._pending.values()),
+            "active_sessions": len(self._drainers),
+            "active_users": len(self._user_slots)
+        }
@@ -62,6 +62,51 @@ class Settings(BaseSettings):
     uvicorn_workers: int = Field(default=4, env="UVICORN_WORKERS")
     uvicorn_port: int = Field(default=8005, env="UVICORN_PORT")
     uvicorn_host: str = Field(default="0.0.0.0", env="UVICORN_HOST")
+    # Unix socket for the cross-worker WebSocket bus; empty disables it (single worker)
+    ws_bus_socket: str = Field(default="", env="WS_BUS_SOCKET")
+    # Transport-level permessage-deflate; clients using the dhii.*.deflate
+    # subprotocols already compress, so disable it when most clients do
+    ws_per_message_deflate: bool = Field(default=True, env="WS_PER_MESSAGE_DEFLATE")
+    
+    # Outbound LLM/API HTTP pool (shared keep-alive connections per worker)
+    llm_http_pool_size: int = Field(default=100, env="LLM_HTTP_POOL_SIZE")
+    llm_http_pool_size_per_host: int = Field(default=32, env="LLM_HTTP_POOL_SIZE_PER_HOST")
+    llm_http_keepalive_timeout: float = Field(default=75.0, env="LLM_HTTP_KEEPALIVE_TIMEOUT")
+    # Upstream LLM calls in progress per worker; identical concurrent calls count once
+    llm_max_concurrency: int = Field(default=8, env="LLM_MAX_CONCURRENCY")
+    # Comma-separated OpenRouter models, primary first; later ones take over while a circuit is open
+    llm_models: str = Field(default="meta-llama/llama-3.1-8b-instruct", env="LLM_MODELS")
+    llm_circuit_failure_threshold: float = Field(default=0.5, env="LLM_CIRCUIT_FAILURE_THRESHOLD")
+    llm_circuit_min_calls: int = Field(default=20, env="LLM_CIRCUIT_MIN_CALLS")
+    # Failures in a row that open a circuit regardless of traffic
+    llm_circuit_consecutive_failures: int = Field(default=5, env="LLM_CIRCUIT_CONSECUTIVE_FAILURES")
+    llm_circuit_open_seconds: float = Field(default=15.0, env="LLM_CIRCUIT_OPEN_SECONDS")
+    llm_slow_call_seconds: float = Field(default=10.0, env="LLM_SLOW_CALL_SECONDS")
+    # Answer confidently classified routine requests without the LLM
+    ai_local_intents: bool = Field(default=True, env="AI_LOCAL_INTENTS")
+    ai_local_intent_threshold: float = Field(default=0.65, env="AI_LOCAL_INTENT_THRESHOLD")
+    # Trained classifier (intent_classifier.py train ...); empty uses the built-in seed examples
+    ai_intent_model_path: str = Field(default="", env="AI_INTENT_MODEL_PATH")
+    # Estimated tokens per LLM prompt; older history is summarized or dropped to fit
+    llm_prompt_budget_tokens: int = Field(default=1500, env="LLM_PROMPT_BUDGET_TOKENS")
+    llm_prompt_max_turn_tokens: int = Field(default=200, env="LLM_PROMPT_MAX_TURN_TOKENS")
+    # Background summaries, categories and sentiment for stored emails
+    email_enrichment_enabled: bool = Field(default=True, env="EMAIL_ENRICHMENT_ENABLED")
+    email_enrichment_interval: float = Field(default=60.0, env="EMAIL_ENRICHMENT_INTERVAL")
+    email_enrichment_batch_size: int = Field(default=64, env="EMAIL_ENRICHMENT_BATCH_SIZE")
+    email_enrichment_messages_per_request: int = Field(default=8, env="EMAIL_ENRICHMENT_MESSAGES_PER_REQUEST")
+    email_enrichment_max_request_tokens: int = Field(default=3000, env="EMAIL_ENRICHMENT_MAX_REQUEST_TOKENS")
+    email_enrichment_concurrency: int = Field(default=2, env="EMAIL_ENRICHMENT_CONCURRENCY")
+    # Stream model tokens to chat clients as ai_message_delta frames
+    ai_streaming: bool = Field(default=True, env="AI_STREAMING")
+    # Cache of validated LLM replies, persisted across restarts
+    llm_cache_enabled: bool = Field(default=True, env="LLM_CACHE_ENABLED")
+    # Empty: llm_cache.db next to llm_cache.py
+    llm_cache_path: str = Field(default="", env="LLM_CACHE_PATH")
+    llm_cache_ttl: int = Field(default=3600, env="LLM_CACHE_TTL")
+    llm_cache_max_entries: int = Field(default=5000, env="LLM_CACHE_MAX_ENTRIES")
+    # Comma-separated intents whose replies depend on live data and are never cached
+    llm_cache_skip_intents: str = Field(default="check_calendar,send_email", env="LLM_CACHE_SKIP_INTENTS")
     
     class Config:
         env_file = ".env"
@@ -0,0 +1,333 @@
+"""
+dhii Mail - Batch AI Email Enrichment
+Fills email_messages.ai_summary, ai_categories and ai_sentiment in the
+background so the inbox reads precomputed fields instead of calling the LLM
+when it renders.
+
+Each cycle selects unenriched messages, packs several of them into one LLM
+request (bounded by ``messages_per_request`` and a prompt token budget),
+runs up to ``concurrency`` requests at background priority, and writes the
+results plus per-message usage rows in ``ai_responses`` in one transaction.
+"""
+
+import re
+import json
+import time
+import asyncio
+import logging
+import sqlite3
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from prompt_assembler import estimate_tokens, MESSAGE_OVERHEAD_TOKENS
+from llm_dispatch import PRIORITY_BACKGROUND
+
+logger = logging.getLogger(__name__)
+
+CATEGORIES = ("work", "personal", "finance", "travel", "shopping", "social", "newsletter",
+              "promotions", "updates", "meetings", "support")
+SENTIMENTS = ("positive", "neutral", "negative")
+MAX_SUMMARY_LENGTH = 300
+
+ENRICHMENT_PROMPT = f"""You label emails for an inbox. For every email below return one JSON object with:
+- "id": the email's id, unchanged
+- "summary": one sentence of at most 30 words
+- "categories": one to three of {", ".join(CATEGORIES)}
+- "sentiment": one of {", ".join(SENTIMENTS)}
+
+Reply with only a JSON array of these objects, one per email, and no other text."""
+
+_OPTIONS = ("enabled", "batch_size", "messages_per_request", "max_request_tokens", "max_message_tokens",
+            "concurrency", "interval", "max_attempts")
+_JSON_ARRAY = re.compile(r"\[.*\]", re.DOTALL)
+
+Completion = Callable[[List[Dict[str, str]]], Awaitable[Optional[str]]]
+
+class EmailEnrichmentPipeline:
+    """Background summaries, categories and sentiment for stored emails.
+
+    ``complete`` sends chat messages to the LLM and returns the reply text;
+    by default it is AIEngine's OpenRouter call at background priority, so
+    chat keeps precedence for upstream capacity and the slow batch replies
+    do not count as slow calls against the model's circuit. Each packed email needs
+    roughly 80 reply tokens, so the default of 8 per request stays inside
+    AIEngine's 1000-token completion limit. A message whose reply cannot be
+    parsed is retried up to ``max_attempts`` times per process.
+    """
+
+    def __init__(self, db_path: str = "email_accounts.db", complete: Optional[Completion] = None,
+                 model: Optional[str] = None, enabled: bool = True, batch_size: int = 64,
+                 messages_per_request: int = 8, max_request_tokens: int = 3000, max_message_tokens: int = 300,
+                 concurrency: int = 2, interval: float = 60.0, max_attempts: int = 2):
+        self.db_path = db_path
+        self._complete = complete
+        self.model = model
+        self.enabled = enabled
+        self.batch_size = batch_size
+        self.messages_per_request = messages_per_request
+        self.max_request_tokens = max_request_tokens
+        self.max_message_tokens = max_message_tokens
+        self.concurrency = concurrency
+        self.interval = interval
+        self.max_attempts = max_attempts
+        self._attempts: Dict[int, int] = {}
+        self._task: Optional[asyncio.Task] = None
+        self.stats = {"cycles": 0, "requests": 0, "failed_requests": 0, "enriched": 0, "unparsed": 0,
+                      "tokens": 0, "last_cycle_ms": 0.0}
+
+    def configure(self, **options: Any):
+        for name, value in options.items():
+            if name not in _OPTIONS and name not in ("db_path", "complete", "model"):
+                raise ValueError(f"Unknown enrichment option: {name}")
+            setattr(self, "_complete" if name == "complete" else name, value)
+
+    def _engine_available(self) -> bool:
+        if self._complete is not None:
+            return True
+        from ai_engine import ai_engine
+        return ai_engine.use_openrouter
+
+    async def _call(self, messages: List[Dict[str, str]]) -> Optional[str]:
+        if self._complete is not None:
+            return await self._complete(messages)
+        from ai_engine import ai_engine
+        return await ai_engine._call_openrouter_api(messages, self.model, priority=PRIORITY_BACKGROUND)
+
+    def _model_name(self) -> str:
+        if self.model or self._complete is not None:
+            return self.model or "custom"
+        from ai_engine import ai_engine
+        return ai_engine.openrouter_model
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=10.0)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def _select_pending(self, limit: int, user_id: Optional[int] = None,
+                        message_ids: Optional[List[int]] = None) -> List[Dict[str, Any]]:
+        """Unenriched messages, newest first, skipping ones that keep failing"""
+        query = ("SELECT id, user_id, subject, sender, body FROM email_messages "
+                 "WHERE ai_enriched_at IS NULL")
+        params: List[Any] = []
+        if user_id is not None:
+            query += " AND user_id = ?"
+            params.append(user_id)
+        if message_ids:
+            query += f" AND id IN ({','.join('?' * len(message_ids))})"
+            params.extend(message_ids)
+        given_up = [i for i, attempts in self._attempts.items() if attempts >= self.max_attempts]
+        if given_up and not message_ids:
+            query += f" AND id NOT IN ({','.join('?' * len(given_up))})"
+            params.extend(given_up)
+        query += " ORDER BY date DESC LIMIT ?"
+        params.append(limit)
+        conn = self._connect()
+        try:
+            return [dict(row) for row in conn.execute(query, params)]
+        finally:
+            conn.close()
+
+    def _write(self, results: List[Tuple[Dict[str, Any], Dict[str, Any], Dict[str, Any]]]):
+        """Store every (row, enrichment, usage) triple in one transaction"""
+        now = datetime.now(timezone.utc).isoformat()
+        conn = self._connect()
+        try:
+            with conn:
+                conn.executemany(
+                    "UPDATE email_messages SET ai_summary = ?, ai_categories = ?, ai_sentiment = ?, "
+                    "ai_enriched_at = ? WHERE id = ?",
+                    [(result["summary"], json.dumps(result["categories"]), result["sentiment"], now, row["id"])
+                     for row, result, _ in results]
+                )
+                conn.executemany(
+                    "INSERT INTO ai_responses (user_id, message_id, response_type, prompt, response_text, "
+                    "model_used, tokens_used, generation_time_ms) VALUES (?, ?, 'enrichment', ?, ?, ?, ?, ?)",
+                    [(row["user_id"], row["id"], usage["prompt"], json.dumps(result), usage["model"],
+                      usage["tokens"], usage["generation_time_ms"]) for row, result, usage in results]
+                )
+        finally:
+            conn.close()
+
+    def _entry(self, row: Dict[str, Any]) -> str:
+        """One email as the model sees it, body clipped to max_message_tokens"""
+        body = " ".join((row.get("body") or "").split())
+        limit = self.max_message_tokens * 4
+        if len(body) > limit:
+            body = body[:limit].rstrip() + "…"
+        return f"id: {row['id']}\nfrom: {row.get('sender') or ''}\nsubject: {row.get('subject') or ''}\n{body}"
+
+    def pack(self, rows: List[Dict[str, Any]]) -> List[List[Tuple[Dict[str, Any], str]]]:
+        """Group rows into requests within the message-count and prompt token limits.
+
+        One request never carries more than one user's mail.
+        """
+        by_user: Dict[Any, List[Dict[str, Any]]] = {}
+        for row in rows:
+            by_user.setdefault(row.get("user_id"), []).append(row)
+        return [group for user_rows in by_user.values() for group in self._pack_user(user_rows)]
+
+    def _pack_user(self, rows: List[Dict[str, Any]]) -> List[List[Tuple[Dict[str, Any], str]]]:
+        base = estimate_tokens(ENRICHMENT_PROMPT) + 2 * MESSAGE_OVERHEAD_TOKENS
+        groups: List[List[Tuple[Dict[str, Any], str]]] = []
+        group: List[Tuple[Dict[str, Any], str]] = []
+        tokens = base
+        for row in rows:
+            entry = self._entry(row)
+            cost = estimate_tokens(entry) + 2
+            if group and (len(group) >= self.messages_per_request or tokens + cost > self.max_request_tokens):
+                groups.append(group)
+                group, tokens = [], base
+            group.append((row, entry))
+            tokens += cost
+        if group:
+            groups.append(group)
+        return groups
+
+    @staticmethod
+    def _request(group: List[Tuple[Dict[str, Any], str]]) -> List[Dict[str, str]]:
+        emails = "\n\n---\n\n".join(entry for _, entry in group)
+        return [{"role": "system", "content": ENRICHMENT_PROMPT}, {"role": "user", "content": emails}]
+
+    @staticmethod
+    def parse(reply: str) -> Dict[int, Dict[str, Any]]:
+        """Validated enrichment per message id from the model's JSON reply"""
+        match = _JSON_ARRAY.search(reply or "")
+        if not match:
+            return {}
+        try:
+            items = json.loads(match.group(0))
+        except ValueError:
+            return {}
+        results: Dict[int, Dict[str, Any]] = {}
+        for item in items if isinstance(items, list) else []:
+            if not isinstance(item, dict):
+                continue
+            try:
+                message_id = int(item.get("id"))
+            except (TypeError, ValueError):
+                continue
+            summary = " ".join(str(item.get("summary") or "").split())
+            sentiment = str(item.get("sentiment") or "").lower()
+            categories = item.get("categories") or []
+            if isinstance(categories, str):
+                categories = [categories]
+            categories = [c for c in dict.fromkeys(str(c).lower() for c in categories) if c in CATEGORIES][:3]
+            if not summary or sentiment not in SENTIMENTS:
+                continue
+            results[message_id] = {
+                "summary": summary[:MAX_SUMMARY_LENGTH],
+                "categories": categories,
+                "sentiment": sentiment
+            }
+        return results
+
+    async def _enrich_group(self, group, semaphore: asyncio.Semaphore):
+        messages = self._request(group)
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                reply = await self._call(messages)
+            except Exception as e:
+                logger.warning(f"Enrichment request failed: {e}")
+                reply = None
+            elapsed_ms = int((time.perf_counter() - started) * 1000)
+        self.stats["requests"] += 1
+        if not reply:
+            self.stats["failed_requests"] += 1
+            return []
+
+        parsed = self.parse(reply)
+        tokens = sum(estimate_tokens(m["content"]) + MESSAGE_OVERHEAD_TOKENS for m in messages) + estimate_tokens(reply)
+        self.stats["tokens"] += tokens
+        model = self._model_name()
+        results = []
+        for row, entry in group:
+            result = parsed.get(row["id"])
+            if result is None:
+                self._attempts[row["id"]] = self._attempts.get(row["id"], 0) + 1
+                self.stats["unparsed"] += 1
+                continue
+            # The request's cost is shared evenly by the messages packed into it
+            usage = {"prompt": entry, "model": model, "tokens": round(tokens / len(group)),
+                     "generation_time_ms": elapsed_ms}
+            results.append((row, result, usage))
+        return results
+
+    async def run_once(self, user_id: Optional[int] = None,
+                       message_ids: Optional[List[int]] = None) -> int:
+        """Enrich one batch of pending messages; returns how many were stored"""
+        if not self._engine_available():
+            return 0
+        started = time.perf_counter()
+        rows = await asyncio.to_thread(self._select_pending, self.batch_size, user_id, message_ids)
+        if not rows:
+            return 0
+        semaphore = asyncio.Semaphore(self.concurrency)
+        batches = await asyncio.gather(*(self._enrich_group(group, semaphore) for group in self.pack(rows)))
+        results = [result for batch in batches for result in batch]
+        if results:
+            await asyncio.to_thread(self._write, results)
+        self.stats["cycles"] += 1
+        self.stats["enriched"] += len(results)
+        self.stats["last_cycle_ms"] = (time.perf_counter() - started) * 1000
+        logger.info(f"Enriched {len(results)}/{len(rows)} emails in {self.stats['last_cycle_ms']:.0f} ms")
+        return len(results)
+
+    async def enrich_messages(self, user_id: int, message_ids: List[int]) -> int:
+        """Enrich specific messages now (those already enriched are left alone)"""
+        return await self.run_once(user_id=user_id, message_ids=message_ids)
+
+    def get_enrichment(self, user_id: int, message_id: int) -> Optional[Dict[str, Any]]:
+        """Stored AI fields of one message, or None if it does not exist for this user"""
+        conn = self._connect()
+        try:
+            row = conn.execute(
+                "SELECT ai_summary, ai_categories, ai_sentiment, ai_enriched_at FROM email_messages "
+                "WHERE id = ? AND user_id = ?", (message_id, user_id)
+            ).fetchone()
+        finally:
+            conn.close()
+        if row is None:
+            return None
+        return {
+            "email_id": message_id,
+            "summary": row["ai_summary"],
+            "categories": json.loads(row["ai_categories"]) if row["ai_categories"] else [],
+            "sentiment": row["ai_sentiment"],
+            "enriched_at": row["ai_enriched_at"]
+        }
+
+    async def _run_forever(self):
+        while True:
+            try:
+                # Keep going while full batches come back, then wait for the next interval
+                while self.enabled and await self.run_once() >= self.batch_size:
+                    pass
+            except Exception as e:
+                logger.error(f"Email enrichment cycle failed: {e}")
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        """Run the enrichment loop in the background (app startup)"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run_forever())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            **self.stats,
+            "enabled": self.enabled,
+            "running": self._task is not None and not self._task.done(),
+            "given_up": sum(1 for attempts in self._attempts.values() if attempts >= self.max_attempts)
+        }
+
+email_enrichment_pipeline = EmailEnrichmentPipeline()
@@ -24,6 +24,7 @@ from enum import Enum
 from pydantic import BaseModel
 from smtplib import SMTPException, SMTPAuthenticationError, SMTPConnectError, SMTPServerDisconnected
 from security_manager import security_manager
+import realtime_topics
 
 logger = logging.getLogger(__name__)
 
@@ -258,6 +259,10 @@ class EmailMessage(BaseModel):
     headers: Dict[str, str] = {}
     priority: str = "normal"
     labels: List[str] = []
+    # Precomputed by the enrichment pipeline; None until a message is enriched
+    ai_summary: Optional[str] = None
+    ai_categories: List[str] = []
+    ai_sentiment: Optional[str] = None
 
 class EmailAccount(BaseModel):
     """Email account configuration"""
@@ -353,12 +358,42 @@ class EmailManager:
             )
         """)
         
+        # AI enrichment columns, filled in the background by email_enrichment.py
+        columns = {row[1] for row in cursor.execute("PRAGMA table_info(email_messages)")}
+        for column, column_type in (("ai_summary", "TEXT"), ("ai_categories", "TEXT"),
+                                    ("ai_sentiment", "TEXT"), ("ai_enriched_at", "TIMESTAMP")):
+            if column not in columns:
+                cursor.execute(f"ALTER TABLE email_messages ADD COLUMN {column} {column_type}")
+        
+        # LLM usage per enriched message
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS ai_responses (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                user_id INTEGER NOT NULL,
+                message_id INTEGER,
+                response_type TEXT,
+                prompt TEXT,
+                response_text TEXT,
+                model_used TEXT,
+                tokens_used INTEGER,
+                generation_time_ms INTEGER,
+                confidence_score REAL,
+                is_used BOOLEAN DEFAULT 0,
+                feedback TEXT,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                FOREIGN KEY (message_id) REFERENCES email_messages(id)
+            )
+        """)
+        
         # Create indexes
         cursor.execute("CREATE INDEX IF NOT EXISTS idx_email_accounts_user_id ON email_accounts(user_id)")
         cursor.execute("CREATE INDEX IF NOT EXISTS idx_email_messages_user_id ON email_messages(user_id)")
         cursor.execute("CREATE INDEX IF NOT EXISTS idx_email_messages_account_id ON email_messages(account_id)")
         cursor.execute("CREATE INDEX IF NOT EXISTS idx_email_messages_date ON email_messages(date)")
         cursor.execute("CREATE INDEX IF NOT EXISTS idx_email_messages_folder ON email_messages(folder)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_email_messages_unenriched ON email_messages(date) "
+                       "WHERE ai_enriched_at IS NULL")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_ai_responses_message_id ON ai_responses(message_id)")
         
         conn.commit()
         conn.close()
@@ -704,6 +739,14 @@ class EmailManager:
             conn.commit()
             conn.close()
             
+            realtime_topics.publish(realtime_topics.mailbox_topic(account_id, "Sent"), {
+                "type": "mailbox_update",
+                "account_id": account_id,
+                "folder": "Sent",
+                "change": "new_messages",
+                "count": 1
+            })
+            
         except Exception as e:
             logger.error(f"Error saving sent message: {e}")
     
@@ -1103,6 +1146,7 @@ class EmailManager:
         try:
             conn = sqlite3.connect(self.db_path)
             cursor = conn.cursor()
+            new_per_mailbox: Dict[Tuple[Any, str], int] = {}
             
             for email_msg in emails:
                 # Check if email already exists
@@ -1123,11 +1167,21 @@ class EmailManager:
                     json.dumps(email_msg.attachments), email_msg.priority,
                     json.dumps(email_msg.labels)
                 ))
+                mailbox = (email_msg.account_id, email_msg.folder)
+                new_per_mailbox[mailbox] = new_per_mailbox.get(mailbox, 0) + 1
             
             conn.commit()
             conn.close()
             
             logger.info(f"Saved {len(emails)} fetched emails to database")
+            for (account_id, folder), count in new_per_mailbox.items():
+                realtime_topics.publish(realtime_topics.mailbox_topic(account_id, folder), {
+                    "type": "mailbox_update",
+                    "account_id": account_id,
+                    "folder": folder,
+                    "change": "new_messages",
+                    "count": count
+                })
             
         except Exception as e:
             logger.error(f"Error saving fetched emails: {e}")
@@ -1141,7 +1195,7 @@ class EmailManager:
             cursor.execute("""
                 SELECT id, account_id, message_id, subject, sender, recipient, body,
                        html_body, date, is_read, is_sent, folder, attachments, headers,
-                       priority, labels, created_at
+                       priority, labels, created_at, ai_summary, ai_categories, ai_sentiment
                 FROM email_messages
                 WHERE user_id = ? AND folder = ?
                 ORDER BY date DESC
@@ -1166,7 +1220,10 @@ class EmailManager:
                     attachments=json.loads(row[12]) if row[12] else [],
                     headers=json.loads(row[13]) if row[13] else {},
                     priority=row[14],
-                    labels=json.loads(row[15]) if row[15] else []
+                    labels=json.loads(row[15]) if row[15] else [],
+                    ai_summary=row[17],
+                    ai_categories=json.loads(row[18]) if row[18] else [],
+                    ai_sentiment=row[19]
                 )
                 emails.append(email_msg)
             
@@ -1177,12 +1234,20 @@ class EmailManager:
             logger.error(f"Error getting emails from database: {e}")
             return []
     
+    def _email_mailbox(self, cursor, email_id: str, user_id: int) -> Optional[Tuple[Any, str]]:
+        """(account_id, folder) of a stored email, for realtime mailbox topics"""
+        cursor.execute("SELECT account_id, folder FROM email_messages WHERE id = ? AND user_id = ?",
+                       (email_id, user_id))
+        row = cursor.fetchone()
+        return (row[0], row[1]) if row else None
+    
     def mark_as_read(self, email_id: str, user_id: int) -> bool:
         """Mark email as read"""
         try:
             conn = sqlite3.connect(self.db_path)
             cursor = conn.cursor()
             
+            mailbox = self._email_mailbox(cursor, email_id, user_id)
             cursor.execute("""
                 UPDATE email_messages
                 SET is_read = 1
@@ -1193,6 +1258,15 @@ class EmailManager:
             conn.close()
             
             logger.info(f"Email {email_id} marked as read")
+            if mailbox:
+                account_id, folder = mailbox
+                realtime_topics.publish(realtime_topics.mailbox_topic(account_id, folder), {
+                    "type": "mailbox_update",
+                    "account_id": account_id,
+                    "folder": folder,
+                    "change": "read",
+                    "email_id": email_id
+                })
             return True
             
         except Exception as e:
@@ -1205,6 +1279,7 @@ class EmailManager:
             conn = sqlite3.connect(self.db_path)
             cursor = conn.cursor()
             
+            mailbox = self._email_mailbox(cursor, email_id, user_id)
             cursor.execute("""
                 UPDATE email_messages
                 SET folder = 'Trash'
@@ -1215,6 +1290,16 @@ class EmailManager:
             conn.close()
             
             logger.info(f"Email {email_id} moved to trash")
+            if mailbox:
+                account_id, folder = mailbox
+                for topic_folder, change in ((folder, "removed"), ("Trash", "new_messages")):
+                    realtime_topics.publish(realtime_topics.mailbox_topic(account_id, topic_folder), {
+                        "type": "mailbox_update",
+                        "account_id": account_id,
+                        "folder": topic_folder,
+                        "change": change,
+                        "email_id": email_id
+                    })
             return True
             
         except Exception as e:
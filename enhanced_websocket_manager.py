@@ -6,15 +6,67 @@ Improved connection state management and error recovery
 import json
 import asyncio
 import logging
+import math
 import time
-from typing import Dict, List, Optional, Any, Set
+from collections import deque
+from enum import Enum
+from typing import Deque, Dict, List, Optional, Any, Set
 from datetime import datetime, timezone, timedelta
 from fastapi import WebSocket, WebSocketDisconnect
 from pydantic import BaseModel
+from session_history import SessionHistory, SessionMessage
+from realtime_topics import TopicRegistry
+from chat_turns import ChatTurnScheduler
+from websocket_codec import WireEncoding, negotiate_encoding, encode_payload, decode_payload, send_payload, receive_frame
 import threading
 
+try:
+    import orjson
+except ImportError:  # optional faster encoder
+    orjson = None
+
 logger = logging.getLogger(__name__)
 
+# Cross-worker bus topics: ws:user:<id>, ws:session:<id>, ws:topic:<topic> and ws:broadcast
+BUS_TOPIC_PREFIX = "ws:"
+BUS_SUBSCRIPTION_PREFIX = f"{BUS_TOPIC_PREFIX}topic:"
+BUS_BROADCAST_TOPIC = f"{BUS_TOPIC_PREFIX}broadcast"
+
+def encode_message(message: Dict[str, Any]) -> str:
+    """Encode a message as JSON text, using orjson when it is installed"""
+    if orjson is not None:
+        try:
+            return orjson.dumps(message).decode("utf-8")
+        except TypeError:
+            pass
+    return json.dumps(message)
+
+class OutboundFrame:
+    """A message encoded once; the same frame can be queued on many connections
+    
+    ``data`` is the JSON text; other wire encodings are produced on first use
+    and cached, so a fan-out encodes at most once per encoding in use.
+    """
+    __slots__ = ("type", "message", "data", "_encoded")
+
+    def __init__(self, message: Dict[str, Any]):
+        self.type = message.get("type")
+        self.message = message
+        self.data = encode_message(message)
+        self._encoded: Optional[Dict[WireEncoding, bytes]] = None
+
+    def payload(self, encoding: WireEncoding):
+        """Wire payload for ``encoding``: str for JSON, bytes for binary encodings"""
+        if encoding is WireEncoding.JSON:
+            return self.data
+        if self._encoded is None:
+            self._encoded = {}
+        payload = self._encoded.get(encoding)
+        if payload is None:
+            payload = encode_payload(self.message, encoding, self.data)
+            self._encoded[encoding] = payload
+        return payload
+
 class ConnectionState(BaseModel):
     """Connection state tracking"""
     connected: bool = False
@@ -23,6 +75,12 @@ class ConnectionState(BaseModel):
     last_connection_error: Optional[str] = None
     reconnect_scheduled: bool = False
 
+class OverflowPolicy(str, Enum):
+    """What a connection does when its outbound queue is full"""
+    DROP_OLDEST = "drop_oldest"    # discard the oldest queued message
+    COALESCE = "coalesce"          # replace the newest queued message of the same type
+    DISCONNECT = "disconnect"      # treat the client as a slow consumer and close it
+
 class ChatMessage(BaseModel):
     """Chat message model"""
     id: str
@@ -32,15 +90,75 @@ class ChatMessage(BaseModel):
     session_id: str
     metadata: Optional[Dict[str, Any]] = None
 
+async def _cancel_task(task: asyncio.Task):
+    """Cancel a task and wait for it, unless it is the task calling us"""
+    if task is asyncio.current_task():
+        return
+    task.cancel()
+    try:
+        await task
+    except asyncio.CancelledError:
+        pass
+
+class HeartbeatWheel:
+    """Hashed timer wheel: one slot per tick, entries keyed by client id
+    
+    Scheduling and cancelling are O(1); advancing a tick only looks at the
+    entries hashed into that slot, so a tick costs O(expired) as long as
+    delays stay below one revolution (``slots * tick_interval`` seconds).
+    """
+    
+    def __init__(self, tick_interval: float = 1.0, slots: int = 512):
+        self.tick_interval = tick_interval
+        self.slots: List[Set[str]] = [set() for _ in range(slots)]
+        self.deadlines: Dict[str, int] = {}  # client_id -> absolute tick
+        self.current_tick = 0
+    
+    def __len__(self) -> int:
+        return len(self.deadlines)
+    
+    def schedule(self, client_id: str, delay: float):
+        """(Re)schedule ``client_id`` to expire ``delay`` seconds from now"""
+        self.cancel(client_id)
+        tick = self.current_tick + max(1, math.ceil(delay / self.tick_interval))
+        self.deadlines[client_id] = tick
+        self.slots[tick % len(self.slots)].add(client_id)
+    
+    def cancel(self, client_id: str):
+        tick = self.deadlines.pop(client_id, None)
+        if tick is not None:
+            self.slots[tick % len(self.slots)].discard(client_id)
+    
+    def advance(self) -> List[str]:
+        """Move to the next tick and return the client ids that expired on it"""
+        self.current_tick += 1
+        slot = self.slots[self.current_tick % len(self.slots)]
+        if not slot:
+            return []
+        expired = [client_id for client_id in slot if self.deadlines[client_id] <= self.current_tick]
+        for client_id in expired:
+            slot.discard(client_id)
+            del self.deadlines[client_id]
+        return expired
+
 class EnhancedWebSocketConnection:
     """Enhanced WebSocket connection wrapper with state management and error recovery"""
     
-    def __init__(self, websocket: WebSocket, client_id: str, session_id: str):
+    def __init__(self, websocket: WebSocket, client_id: str, session_id: str,
+                 send_queue_size: int = 256,
+                 overflow_policy: OverflowPolicy = OverflowPolicy.DROP_OLDEST,
+                 encoding: WireEncoding = WireEncoding.JSON):
         self.websocket = websocket
+        self.encoding = encoding
         self.client_id = client_id
         self.session_id = session_id
         self.user_id: Optional[str] = None
         self.is_authenticated = False
+        # Connection-scoped identity: verified once, trusted until expiry or revocation
+        self.auth_token: Optional[str] = None
+        self.token_id: Optional[str] = None
+        self.auth_expires_at: Optional[datetime] = None
+        self.auth_timer: Optional[asyncio.TimerHandle] = None
         self.connected_at = datetime.now(timezone.utc)
         self.last_activity = datetime.now(timezone.utc)
         self.state = ConnectionState(
@@ -48,76 +166,114 @@ class EnhancedWebSocketConnection:
             last_heartbeat=datetime.now(timezone.utc)
         )
         self.message_queue: List[Dict[str, Any]] = []
-        self.heartbeat_task: Optional[asyncio.Task] = None
-        self.connection_timeout = 300  # 5 minutes
-        self.heartbeat_interval = 30   # 30 seconds
+        # Heartbeats are driven by the manager's HeartbeatWheel; these track the
+        # outstanding ping (monotonic seconds), the last inbound frame of any kind
+        # and the last client message that was not a heartbeat (the idle clock)
+        self.ping_sent_at: Optional[float] = None
+        self.pong_pending = False
+        self.last_seen = time.monotonic()
+        self.last_client_message = self.last_seen
+        # Outbound frames are queued and written by a writer task that only runs
+        # while the queue is non-empty, so a slow client never blocks senders
+        # fanning out to other clients and idle sockets cost no task
+        self.send_queue: Deque[OutboundFrame] = deque()
+        self.send_queue_size = send_queue_size
+        self.overflow_policy = OverflowPolicy(overflow_policy)
+        self.writer_task: Optional[asyncio.Task] = None
+        self.max_queue_depth = 0
+        self.dropped_messages = 0
+        self.coalesced_messages = 0
+        self.slow_consumer_disconnect = False
         self.max_reconnect_attempts = 3
         self.reconnect_delay = 1.0
         self.reconnect_backoff = 2.0
         
-    async def start_heartbeat(self):
-        """Start heartbeat monitoring"""
-        self.heartbeat_task = asyncio.create_task(self._heartbeat_loop())
-        
-    async def stop_heartbeat(self):
-        """Stop heartbeat monitoring"""
-        if self.heartbeat_task:
-            self.heartbeat_task.cancel()
-            try:
-                await self.heartbeat_task
-            except asyncio.CancelledError:
-                pass
-            self.heartbeat_task = None
+    def start_writer(self):
+        """Start the outbound writer task"""
+        if self.writer_task is None or self.writer_task.done():
+            self.writer_task = asyncio.create_task(self._writer_loop())
     
-    async def _heartbeat_loop(self):
-        """Heartbeat monitoring loop"""
+    async def stop_writer(self):
+        """Stop the outbound writer task"""
+        if self.writer_task:
+            await _cancel_task(self.writer_task)
+            self.writer_task = None
+    
+    async def _writer_loop(self):
+        """Drain the outbound queue to the socket"""
         try:
-            while self.state.connected:
-                await asyncio.sleep(self.heartbeat_interval)
-                
-                # Send heartbeat ping
+            while self.state.connected and self.send_queue:
+                frame = self.send_queue.popleft()
                 try:
-                    await self.send_message({
-                        "type": "heartbeat_ping",
-                        "timestamp": datetime.now(timezone.utc).isoformat()
-                    })
-                    
-                    # Wait for pong with timeout
-                    pong_received = await self._wait_for_pong(timeout=10)
-                    
-                    if pong_received:
-                        self.state.last_heartbeat = datetime.now(timezone.utc)
-                        self.last_activity = datetime.now(timezone.utc)
-                    else:
-                        logger.warning(f"Heartbeat timeout for client {self.client_id}")
-                        await self._handle_connection_failure("Heartbeat timeout")
-                        break
-                        
+                    await send_payload(self.websocket, frame.payload(self.encoding))
+                    self.last_activity = datetime.now(timezone.utc)
                 except Exception as e:
-                    logger.error(f"Heartbeat error for client {self.client_id}: {e}")
-                    await self._handle_connection_failure(f"Heartbeat error: {str(e)}")
+                    logger.error(f"Error sending message to {self.client_id}: {e}")
+                    # Queue message for retry
+                    self.message_queue.append(frame)
+                    await self._handle_connection_failure(f"Send error: {str(e)}")
                     break
-                    
-                # Check for connection timeout
-                time_since_activity = datetime.now(timezone.utc) - self.last_activity
-                if time_since_activity.total_seconds() > self.connection_timeout:
-                    logger.warning(f"Connection timeout for client {self.client_id}")
-                    await self._handle_connection_failure("Connection timeout")
-                    break
-                    
         except asyncio.CancelledError:
-            logger.info(f"Heartbeat loop cancelled for client {self.client_id}")
-        except Exception as e:
-            logger.error(f"Unexpected error in heartbeat loop for client {self.client_id}: {e}")
+            pass
     
-    async def _wait_for_pong(self, timeout: int = 10) -> bool:
-        """Wait for heartbeat pong response"""
-        try:
-            # This would need to be implemented with proper message handling
-            # For now, we'll assume the connection is alive if we can send the ping
-            return True
-        except Exception:
+    def enqueue(self, message: Dict[str, Any]) -> bool:
+        """Queue a message for the writer task, applying the overflow policy when full"""
+        return self.enqueue_frame(OutboundFrame(message))
+    
+    def enqueue_frame(self, frame: OutboundFrame) -> bool:
+        """Queue an already-encoded frame for the writer task"""
+        if not self.state.connected:
+            logger.warning(f"Attempting to send message to disconnected client {self.client_id}")
+            # Queue message for when connection is restored
+            self.message_queue.append(frame)
             return False
+        
+        if len(self.send_queue) >= self.send_queue_size:
+            if self.overflow_policy == OverflowPolicy.DISCONNECT:
+                self.dropped_messages += 1
+                self._disconnect_slow_consumer()
+                return False
+            if self.overflow_policy == OverflowPolicy.COALESCE and self._coalesce(frame):
+                return True
+            self.send_queue.popleft()
+            self.dropped_messages += 1
+        
+        self.send_queue.append(frame)
+        if len(self.send_queue) > self.max_queue_depth:
+            self.max_queue_depth = len(self.send_queue)
+        if self.writer_task is None or self.writer_task.done():
+            self.start_writer()
+        return True
+    
+    def _coalesce(self, frame: OutboundFrame) -> bool:
+        """Replace the newest queued frame of the same type; True if one was found"""
+        for index in range(len(self.send_queue) - 1, -1, -1):
+            if self.send_queue[index].type == frame.type:
+                self.send_queue[index] = frame
+                self.coalesced_messages += 1
+                return True
+        return False
+    
+    def _disconnect_slow_consumer(self):
+        """Close a client that cannot keep up with its outbound queue"""
+        if self.slow_consumer_disconnect:
+            return
+        self.slow_consumer_disconnect = True
+        logger.warning(f"Send queue overflow for client {self.client_id}, disconnecting slow consumer")
+        self.state.connected = False
+        self.send_queue.clear()
+        asyncio.create_task(self.close())
+    
+    @property
+    def queue_depth(self) -> int:
+        """Number of messages waiting to be written"""
+        return len(self.send_queue)
+    
+    def record_pong(self):
+        """Mark the outstanding heartbeat ping as answered"""
+        self.pong_pending = False
+        self.last_seen = time.monotonic()
+        self.state.last_heartbeat = datetime.now(timezone.utc)
     
     async def _handle_connection_failure(self, error_message: str):
         """Handle connection failure"""
@@ -149,23 +305,8 @@ class EnhancedWebSocketConnection:
             logger.info(f"Reconnection cancelled for client {self.client_id}")
     
     async def send_message(self, message: Dict[str, Any]) -> bool:
-        """Send message to this connection with error handling"""
-        if not self.state.connected:
-            logger.warning(f"Attempting to send message to disconnected client {self.client_id}")
-            # Queue message for when connection is restored
-            self.message_queue.append(message)
-            return False
-            
-        try:
-            await self.websocket.send_text(json.dumps(message))
-            self.last_activity = datetime.now(timezone.utc)
-            return True
-        except Exception as e:
-            logger.error(f"Error sending message to {self.client_id}: {e}")
-            # Queue message for retry
-            self.message_queue.append(message)
-            await self._handle_connection_failure(f"Send error: {str(e)}")
-            return False
+        """Queue message for this connection; delivery happens on the writer task"""
+        return self.enqueue(message)
     
     async def receive_message(self) -> Optional[Dict[str, Any]]:
         """Receive message from this connection with error handling"""
@@ -173,17 +314,22 @@ class EnhancedWebSocketConnection:
             return None
             
         try:
-            data = await self.websocket.receive_text()
-            message = json.loads(data)
-            self.last_activity = datetime.now(timezone.utc)
+            data = await receive_frame(self.websocket)
+            message = decode_payload(data, self.encoding)
+            if not isinstance(message, dict):
+                raise ValueError("Message must be an object")
             
-            # Handle heartbeat pong
+            # Heartbeat pongs are consumed here and never reach the caller
             if message.get("type") == "heartbeat_pong":
-                return message
-                
+                self.record_pong()
+                return None
+            
+            self.last_seen = self.last_client_message = time.monotonic()
+            self.last_activity = datetime.now(timezone.utc)
             return message
-        except json.JSONDecodeError as e:
-            logger.error(f"Invalid JSON from {self.client_id}: {e}")
+        except (ValueError, UnicodeDecodeError) as e:
+            # JSONDecodeError is a ValueError; so are msgpack and deflate failures
+            logger.error(f"Invalid message from {self.client_id}: {e}")
             await self.send_message({
                 "type": "error",
                 "message": "Invalid message format",
@@ -202,7 +348,8 @@ class EnhancedWebSocketConnection:
     async def close(self):
         """Close connection cleanly"""
         self.state.connected = False
-        await self.stop_heartbeat()
+        self.cancel_auth_timer()
+        await self.stop_writer()
         
         try:
             if self.websocket.client_state.CONNECTED:
@@ -215,26 +362,122 @@ class EnhancedWebSocketConnection:
         self.user_id = user_id
         self.is_authenticated = is_authenticated
         self.last_activity = datetime.now(timezone.utc)
+    
+    def has_valid_identity(self, access_token: Optional[str] = None) -> bool:
+        """Whether the bound identity is still usable (and matches ``access_token`` if given)."""
+        if not self.is_authenticated or self.auth_expires_at is None:
+            return False
+        if access_token is not None and access_token != self.auth_token:
+            return False
+        return datetime.now(timezone.utc) < self.auth_expires_at
+    
+    def cancel_auth_timer(self):
+        """Cancel the pending identity expiry timer"""
+        if self.auth_timer is not None:
+            self.auth_timer.cancel()
+            self.auth_timer = None
 
 class EnhancedWebSocketManager:
     """Enhanced WebSocket connection manager with state management and error recovery"""
     
-    def __init__(self):
+    def __init__(self, send_queue_size: int = 256,
+                 overflow_policy: OverflowPolicy = OverflowPolicy.DROP_OLDEST,
+                 history: Optional[SessionHistory] = None):
+        self.send_queue_size = send_queue_size
+        self.overflow_policy = OverflowPolicy(overflow_policy)
         self.connections: Dict[str, EnhancedWebSocketConnection] = {}
         self.session_connections: Dict[str, List[str]] = {}  # session_id -> [client_ids]
         self.user_connections: Dict[str, List[str]] = {}  # user_id -> [client_ids]
-        self.message_history: Dict[str, List[ChatMessage]] = {}  # session_id -> messages
+        # Ring buffer per session backed by a journal shared by all workers
+        self.history = history if history is not None else SessionHistory()
+        self.history_retention_days = 30
         self.connection_stats: Dict[str, Any] = {
             "total_connections": 0,
             "successful_connections": 0,
             "failed_connections": 0,
             "reconnections": 0,
+            "slow_consumer_disconnects": 0,
             "connection_errors": {}
         }
         self.cleanup_interval = 300  # 5 minutes
         self.max_session_age = 3600  # 1 hour
+        self.heartbeat_interval = 30  # seconds between pings
+        self.pong_timeout = 10  # seconds to answer a ping
+        self.idle_timeout = 3600  # seconds without a client message before eviction
+        self.heartbeat_wheel = HeartbeatWheel()
+        self.heartbeat_task = None
+        self.heartbeat_stats = {"pings_sent": 0, "heartbeat_timeouts": 0, "idle_timeouts": 0}
         self.cleanup_task = None  # Will be initialized when needed
         self._initialized = False
+        self.bus = None  # Cross-worker WebSocketBus, see attach_bus()
+        self._bus_keys: Dict[str, Any] = {}  # bus topic -> local index key
+        self.topics = TopicRegistry()  # mailbox:/calendar:/plugin: subscriptions
+        self.turns = ChatTurnScheduler()  # AI turns run outside the receive loops
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+    
+    def attach_bus(self, bus):
+        """Relay user/session/broadcast messages to sockets held by other workers"""
+        self.bus = bus
+        self.ensure_initialized()
+        bus.add_handler(BUS_TOPIC_PREFIX, self._deliver_from_bus)
+        for topic in self.topics.all_topics():
+            self._bus_subscribe(f"{BUS_SUBSCRIPTION_PREFIX}{topic}", topic)
+        for session_id in self.session_connections:
+            self._bus_subscribe(f"{BUS_TOPIC_PREFIX}session:{session_id}", session_id)
+        for user_id in self.user_connections:
+            self._bus_subscribe(f"{BUS_TOPIC_PREFIX}user:{user_id}", user_id)
+        if self.connections:
+            self._bus_subscribe(BUS_BROADCAST_TOPIC, None)
+    
+    def _bus_subscribe(self, topic: str, key: Any):
+        self._bus_keys[topic] = key
+        if self.bus is not None:
+            self.bus.subscribe(topic)
+    
+    def _bus_unsubscribe(self, topic: str):
+        self._bus_keys.pop(topic, None)
+        if self.bus is not None:
+            self.bus.unsubscribe(topic)
+    
+    def _bus_publish(self, topic: str, message: Dict[str, Any], exclude_client: Optional[str] = None):
+        if self.bus is not None:
+            self.bus.publish(topic, {"message": message, "exclude_client": exclude_client})
+    
+    async def _deliver_from_bus(self, topic: str, payload: Dict[str, Any]):
+        """Local delivery of a message published by another worker"""
+        message = payload.get("message") or {}
+        exclude_client = payload.get("exclude_client")
+        if topic == BUS_BROADCAST_TOPIC:
+            self._fan_out(self.connections, message, exclude_client)
+            return
+        if topic not in self._bus_keys:
+            return
+        key = self._bus_keys[topic]
+        if topic.startswith(BUS_SUBSCRIPTION_PREFIX):
+            self._fan_out(self.topics.subscribers(key), message, exclude_client)
+        elif topic.startswith(f"{BUS_TOPIC_PREFIX}session:"):
+            self._fan_out(self.session_connections.get(key, []), message, exclude_client)
+        else:
+            self._fan_out(self.user_connections.get(key, []), message, exclude_client)
+    
+    def _index_add(self, index: Dict[Any, List[str]], kind: str, key: Any, client_id: str):
+        """Track a client under a session/user key; subscribe on the first one"""
+        client_ids = index.setdefault(key, [])
+        if client_id not in client_ids:
+            client_ids.append(client_id)
+            if len(client_ids) == 1:
+                self._bus_subscribe(f"{BUS_TOPIC_PREFIX}{kind}:{key}", key)
+    
+    def _index_remove(self, index: Dict[Any, List[str]], kind: str, key: Any, client_id: str):
+        """Untrack a client; unsubscribe once the key has no local clients"""
+        client_ids = index.get(key)
+        if client_ids is None:
+            return
+        if client_id in client_ids:
+            client_ids.remove(client_id)
+        if not client_ids:
+            del index[key]
+            self._bus_unsubscribe(f"{BUS_TOPIC_PREFIX}{kind}:{key}")
     
     def start_cleanup_task(self):
         """Start background cleanup task"""
@@ -248,8 +491,90 @@ class EnhancedWebSocketManager:
     
     def ensure_initialized(self):
         """Ensure the manager is properly initialized with event loop"""
+        if self._loop is None:
+            try:
+                self._loop = asyncio.get_running_loop()
+            except RuntimeError:
+                pass
         if not self._initialized and self.cleanup_task is None:
             self.start_cleanup_task()
+        if self.heartbeat_task is None or self.heartbeat_task.done():
+            try:
+                self.heartbeat_task = asyncio.create_task(self._heartbeat_loop())
+            except RuntimeError:
+                logger.debug("No event loop available for heartbeat task initialization")
+    
+    async def stop_heartbeat_task(self):
+        """Stop the heartbeat wheel"""
+        if self.heartbeat_task:
+            await _cancel_task(self.heartbeat_task)
+            self.heartbeat_task = None
+    
+    async def _heartbeat_loop(self):
+        """Single task driving heartbeats for every connection"""
+        next_tick = time.monotonic()
+        try:
+            while True:
+                next_tick += self.heartbeat_wheel.tick_interval
+                await asyncio.sleep(max(0.0, next_tick - time.monotonic()))
+                expired = self.heartbeat_wheel.advance()
+                if expired:
+                    self._process_heartbeats(expired)
+        except asyncio.CancelledError:
+            logger.info("Heartbeat loop cancelled")
+    
+    def _process_heartbeats(self, client_ids: List[str]):
+        """Handle one tick's expired wheel entries: ping, reschedule or evict"""
+        now = time.monotonic()
+        wheel = self.heartbeat_wheel
+        ping_frame = None
+        timed_out: List[str] = []
+        idle: List[str] = []
+        
+        for client_id in client_ids:
+            connection = self.connections.get(client_id)
+            if connection is None or not connection.state.connected:
+                continue
+            
+            if connection.ping_sent_at is not None:
+                # Pong deadline
+                if connection.pong_pending:
+                    timed_out.append(client_id)
+                    continue
+                connection.ping_sent_at = None
+                wheel.schedule(client_id, max(0.0, self.heartbeat_interval - self.pong_timeout))
+                continue
+            
+            # Ping due; answering pings alone does not keep a connection from going idle
+            if now - connection.last_client_message > self.idle_timeout:
+                idle.append(client_id)
+                continue
+            if ping_frame is None:
+                ping_frame = OutboundFrame({
+                    "type": "heartbeat_ping",
+                    "timestamp": datetime.now(timezone.utc).isoformat()
+                })
+            connection.enqueue_frame(ping_frame)
+            connection.ping_sent_at = now
+            connection.pong_pending = True
+            self.heartbeat_stats["pings_sent"] += 1
+            wheel.schedule(client_id, self.pong_timeout)
+        
+        if timed_out:
+            self.heartbeat_stats["heartbeat_timeouts"] += len(timed_out)
+            asyncio.create_task(self._evict(timed_out, "Heartbeat timeout"))
+        if idle:
+            self.heartbeat_stats["idle_timeouts"] += len(idle)
+            asyncio.create_task(self._evict(idle, "Idle timeout"))
+    
+    async def _evict(self, client_ids: List[str], reason: str):
+        """Close connections that failed their heartbeat or went idle"""
+        logger.warning(f"{reason}: evicting {len(client_ids)} WebSocket connection(s)")
+        for client_id in client_ids:
+            connection = self.connections.get(client_id)
+            if connection is not None:
+                connection.state.last_connection_error = reason
+                await self._remove_connection(client_id)
     
     async def stop_cleanup_task(self):
         """Stop background cleanup task"""
@@ -288,23 +613,21 @@ class EnhancedWebSocketManager:
             logger.info(f"Cleaned up old connection for client {client_id}")
     
     async def _cleanup_old_sessions(self):
-        """Clean up old sessions"""
-        current_time = datetime.now(timezone.utc)
-        old_sessions = []
-        
-        for session_id, messages in self.message_history.items():
-            if messages:
-                last_message_time = messages[-1].timestamp
-                time_since_last_message = current_time - last_message_time
-                if time_since_last_message.total_seconds() > self.max_session_age:
-                    old_sessions.append(session_id)
+        """Drop idle session rings from memory and apply journal retention"""
+        old_sessions = [
+            session_id for session_id in self.history.idle_sessions(time.time() - self.max_session_age)
+            if session_id not in self.session_connections
+        ]
         
         for session_id in old_sessions:
-            if session_id in self.message_history:
-                del self.message_history[session_id]
-            if session_id in self.session_connections:
-                del self.session_connections[session_id]
+            self.history.evict(session_id)
             logger.info(f"Cleaned up old session {session_id}")
+        
+        retention_cutoff = datetime.now(timezone.utc) - timedelta(days=self.history_retention_days)
+        try:
+            await asyncio.to_thread(self.history.delete_before, retention_cutoff)
+        except Exception as e:
+            logger.error(f"Error applying session history retention: {e}")
     
     async def connect(self, websocket: WebSocket, client_id: str, session_id: str) -> EnhancedWebSocketConnection:
         """Accept new WebSocket connection with enhanced error handling"""
@@ -312,26 +635,32 @@ class EnhancedWebSocketManager:
             # Ensure manager is initialized
             self.ensure_initialized()
             
-            await websocket.accept()
+            encoding, subprotocol = negotiate_encoding(websocket)
+            if subprotocol:
+                await websocket.accept(subprotocol=subprotocol)
+            else:
+                await websocket.accept()
             self.connection_stats["total_connections"] += 1
             
-            connection = EnhancedWebSocketConnection(websocket, client_id, session_id)
+            connection = EnhancedWebSocketConnection(
+                websocket, client_id, session_id,
+                send_queue_size=self.send_queue_size,
+                overflow_policy=self.overflow_policy,
+                encoding=encoding
+            )
             self.connections[client_id] = connection
+            connection.start_writer()
             
             # Track by session
-            if session_id not in self.session_connections:
-                self.session_connections[session_id] = []
-            self.session_connections[session_id].append(client_id)
-            
-            # Initialize message history for new sessions
-            if session_id not in self.message_history:
-                self.message_history[session_id] = []
+            self._index_add(self.session_connections, "session", session_id, client_id)
+            if len(self.connections) == 1:
+                self._bus_subscribe(BUS_BROADCAST_TOPIC, None)
             
             # Start heartbeat monitoring
-            await connection.start_heartbeat()
+            self.heartbeat_wheel.schedule(client_id, self.heartbeat_interval)
             
             self.connection_stats["successful_connections"] += 1
-            logger.info(f"WebSocket connected: {client_id} (session: {session_id})")
+            logger.info(f"WebSocket connected: {client_id} (session: {session_id}, encoding: {encoding.value})")
             
             # Send welcome message
             await connection.send_message({
@@ -339,7 +668,8 @@ class EnhancedWebSocketManager:
                 "client_id": client_id,
                 "session_id": session_id,
                 "timestamp": datetime.now(timezone.utc).isoformat(),
-                "heartbeat_interval": connection.heartbeat_interval
+                "heartbeat_interval": self.heartbeat_interval,
+                "encoding": encoding.value
             })
             
             return connection
@@ -353,31 +683,36 @@ class EnhancedWebSocketManager:
             raise
     
     async def _remove_connection(self, client_id: str):
-        """Remove WebSocket connection"""
-        if client_id in self.connections:
-            connection = self.connections[client_id]
+        """Remove WebSocket connection; safe to call again for a connection already removed"""
+        # Taken out before any await, so an eviction racing the receive loop's own disconnect is a no-op
+        connection = self.connections.pop(client_id, None)
+        if connection is not None:
             session_id = connection.session_id
             user_id = connection.user_id
             
-            # Close connection cleanly
-            await connection.close()
+            self.heartbeat_wheel.cancel(client_id)
             
             # Remove from session tracking
-            if session_id in self.session_connections:
-                if client_id in self.session_connections[session_id]:
-                    self.session_connections[session_id].remove(client_id)
-                if not self.session_connections[session_id]:
-                    del self.session_connections[session_id]
+            self._index_remove(self.session_connections, "session", session_id, client_id)
             
             # Remove from user tracking
-            if user_id and user_id in self.user_connections:
-                if client_id in self.user_connections[user_id]:
-                    self.user_connections[user_id].remove(client_id)
-                if not self.user_connections[user_id]:
-                    del self.user_connections[user_id]
+            if user_id:
+                self._index_remove(self.user_connections, "user", user_id, client_id)
+            
+            # Nobody is left to read the replies of this socket's AI turns
+            self.turns.cancel_owner(client_id)
             
-            # Remove connection
-            del self.connections[client_id]
+            # Remove topic subscriptions
+            for topic in self.topics.remove_client(client_id):
+                self._bus_unsubscribe(f"{BUS_SUBSCRIPTION_PREFIX}{topic}")
+            
+            if not self.connections:
+                self._bus_unsubscribe(BUS_BROADCAST_TOPIC)
+            
+            # Close connection cleanly, once it can no longer be reached through the indexes
+            await connection.close()
+            if connection.slow_consumer_disconnect:
+                self.connection_stats["slow_consumer_disconnects"] += 1
             
             logger.info(f"WebSocket disconnected: {client_id}")
     
@@ -388,54 +723,156 @@ class EnhancedWebSocketManager:
     async def send_to_client(self, client_id: str, message: Dict[str, Any]) -> bool:
         """Send message to specific client with error handling"""
         if client_id in self.connections:
-            return await self.connections[client_id].send_message(message)
+            return self.connections[client_id].enqueue(message)
         return False
     
+    def _fan_out(self, client_ids: List[str], message: Dict[str, Any], exclude_client: Optional[str] = None) -> int:
+        """Encode a message once and queue the frame on several connections"""
+        frame = None
+        queued = 0
+        for client_id in list(client_ids):
+            if client_id == exclude_client:
+                continue
+            connection = self.connections.get(client_id)
+            if connection is None:
+                continue
+            if frame is None:
+                frame = OutboundFrame(message)
+            if connection.enqueue_frame(frame):
+                queued += 1
+        return queued
+    
     async def send_to_session(self, session_id: str, message: Dict[str, Any], exclude_client: Optional[str] = None):
-        """Send message to all clients in a session"""
+        """Send message to all clients in a session, on every worker"""
         if session_id in self.session_connections:
-            tasks = []
-            for client_id in self.session_connections[session_id]:
-                if client_id != exclude_client:
-                    tasks.append(self.send_to_client(client_id, message))
-            
-            if tasks:
-                await asyncio.gather(*tasks, return_exceptions=True)
+            self._fan_out(self.session_connections[session_id], message, exclude_client)
+        self._bus_publish(f"{BUS_TOPIC_PREFIX}session:{session_id}", message, exclude_client)
     
     async def send_to_user(self, user_id: str, message: Dict[str, Any]):
-        """Send message to all connections for a user"""
+        """Send message to all connections for a user, on every worker"""
         if user_id in self.user_connections:
-            tasks = []
-            for client_id in self.user_connections[user_id]:
-                tasks.append(self.send_to_client(client_id, message))
-            
-            if tasks:
-                await asyncio.gather(*tasks, return_exceptions=True)
+            self._fan_out(self.user_connections[user_id], message)
+        self._bus_publish(f"{BUS_TOPIC_PREFIX}user:{user_id}", message)
     
     async def broadcast(self, message: Dict[str, Any], exclude_client: Optional[str] = None):
-        """Send message to all connected clients"""
-        tasks = []
-        for client_id in self.connections:
-            if client_id != exclude_client:
-                tasks.append(self.send_to_client(client_id, message))
-        
-        if tasks:
-            await asyncio.gather(*tasks, return_exceptions=True)
+        """Send message to all connected clients, on every worker"""
+        self._fan_out(self.connections, message, exclude_client)
+        self._bus_publish(BUS_BROADCAST_TOPIC, message, exclude_client)
+    
+    def subscribe_topic(self, client_id: str, topic: str) -> bool:
+        """Subscribe a connection to a topic; callers authorize the topic first"""
+        if client_id not in self.connections:
+            return False
+        if self.topics.subscribe(client_id, topic):
+            self._bus_subscribe(f"{BUS_SUBSCRIPTION_PREFIX}{topic}", topic)
+        return True
     
-    def get_session_messages(self, session_id: str) -> List[ChatMessage]:
-        """Get message history for a session"""
-        return self.message_history.get(session_id, [])
+    def unsubscribe_topic(self, client_id: str, topic: str):
+        if self.topics.unsubscribe(client_id, topic):
+            self._bus_unsubscribe(f"{BUS_SUBSCRIPTION_PREFIX}{topic}")
+    
+    def _deliver_topic(self, topic: str, message: Dict[str, Any]) -> int:
+        queued = self._fan_out(self.topics.subscribers(topic), message)
+        self._bus_publish(f"{BUS_SUBSCRIPTION_PREFIX}{topic}", message)
+        return queued
+    
+    async def send_to_topic(self, topic: str, message: Dict[str, Any]) -> int:
+        """Send a message to every subscriber of a topic, on every worker"""
+        return self._deliver_topic(topic, message)
+    
+    def publish_topic(self, topic: str, event: Dict[str, Any]):
+        """realtime_topics sink: deliver a producer event from any thread"""
+        message = {"topic": topic, **event}
+        message.setdefault("type", "topic_event")
+        message.setdefault("timestamp", datetime.now(timezone.utc).isoformat())
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is not None and running is self._loop:
+            self._deliver_topic(topic, message)
+        elif self._loop is not None and not self._loop.is_closed():
+            # Producers such as IMAP sync run in worker threads
+            self._loop.call_soon_threadsafe(self._deliver_topic, topic, message)
     
-    def add_message(self, session_id: str, message: ChatMessage):
-        """Add message to session history"""
-        if session_id not in self.message_history:
-            self.message_history[session_id] = []
+    async def claim_session(self, session_id: str, user_id: Optional[Any]) -> bool:
+        """Whether ``user_id`` (None: anonymous) may write to a session, claiming it if unowned.
+
+        Anonymous sessions take anyone's messages but are never read back;
+        owned sessions only take their owner's.
+        """
+        try:
+            owner = await self.history.claim(session_id, user_id)
+        except Exception as e:
+            logger.error(f"Could not resolve owner of session {session_id}: {e}")
+            return False
+        return owner is None or (user_id is not None and owner == str(user_id))
+    
+    async def owns_session(self, user_id: Optional[Any], session_id: str) -> bool:
+        """Whether an authenticated user owns a session's history"""
+        if user_id is None:
+            return False
+        try:
+            owner = await self.history.owner(session_id)
+        except Exception as e:
+            logger.error(f"Could not resolve owner of session {session_id}: {e}")
+            return False
+        return owner is not None and owner == str(user_id)
+    
+    async def get_session_messages(self, session_id: str, user_id: Optional[Any],
+                                   limit: Optional[int] = None) -> List[SessionMessage]:
+        """Recent message history of a session owned by ``user_id``, oldest first; empty otherwise"""
+        if not await self.owns_session(user_id, session_id):
+            return []
+        return await self.history.recent(session_id, limit)
+    
+    async def get_messages_since(self, session_id: str, since_seq: int, limit: int = 500) -> List[SessionMessage]:
+        """Messages a reconnecting client missed after ``since_seq``"""
+        return await self.history.since(session_id, since_seq, limit)
+    
+    def add_message(self, session_id: str, message: ChatMessage) -> SessionMessage:
+        """Add message to session history; the returned record carries its seq"""
+        return self.history.append(
+            session_id,
+            message.id,
+            message.sender,
+            message.content,
+            message.timestamp,
+            message.metadata
+        )
+    
+    async def replay_history(self, client_id: str, session_id: str, since_seq: int = 0,
+                             limit: int = 500) -> int:
+        """Send a client the messages it missed as one ``history_delta`` frame.
         
-        self.message_history[session_id].append(message)
+        Only the authenticated owner of a session may replay it; anyone else
+        gets an error frame.
+        """
+        connection = self.connections.get(client_id)
+        if connection is None:
+            return 0
+        if not connection.has_valid_identity() or not await self.owns_session(connection.user_id, session_id):
+            await self.send_to_client(client_id, {
+                "type": "error",
+                "message": "Session history is only available to its owner. Please authenticate.",
+                "session_id": session_id,
+                "timestamp": datetime.now(timezone.utc).isoformat()
+            })
+            return 0
         
-        # Keep only last 100 messages to prevent memory issues
-        if len(self.message_history[session_id]) > 100:
-            self.message_history[session_id] = self.message_history[session_id][-100:]
+        messages = await self.get_messages_since(session_id, since_seq, limit + 1)
+        complete = len(messages) <= limit
+        messages = messages[:limit]
+        await self.send_to_client(client_id, {
+            "type": "history_delta",
+            "session_id": session_id,
+            "since": since_seq,
+            "messages": [message.to_dict() for message in messages],
+            "last_seq": messages[-1].seq if messages else since_seq,
+            "complete": complete,
+            "timestamp": datetime.now(timezone.utc).isoformat()
+        })
+        return len(messages)
     
     def update_user_authentication(self, client_id: str, user_id: str, is_authenticated: bool):
         """Update authentication status for a connection"""
@@ -445,10 +882,74 @@ class EnhancedWebSocketManager:
             
             # Track user connections
             if is_authenticated and user_id:
-                if user_id not in self.user_connections:
-                    self.user_connections[user_id] = []
-                if client_id not in self.user_connections[user_id]:
-                    self.user_connections[user_id].append(client_id)
+                self._index_add(self.user_connections, "user", user_id, client_id)
+    
+    def bind_identity(self, client_id: str, user_id: Any, token_id: Optional[str],
+                      expires_at: datetime, access_token: Optional[str] = None) -> bool:
+        """Bind a verified identity to a connection until the token expires"""
+        connection = self.connections.get(client_id)
+        if connection is None:
+            return False
+        
+        connection.cancel_auth_timer()
+        connection.auth_token = access_token
+        connection.token_id = token_id
+        connection.auth_expires_at = expires_at
+        self.update_user_authentication(client_id, user_id, True)
+        
+        delay = max(0.0, (expires_at - datetime.now(timezone.utc)).total_seconds())
+        try:
+            loop = asyncio.get_running_loop()
+            connection.auth_timer = loop.call_later(delay, self._expire_identity, client_id, token_id)
+        except RuntimeError:
+            # No running loop; has_valid_identity() still enforces expiry lazily
+            pass
+        return True
+    
+    def clear_identity(self, client_id: str, reason: str = "reauthentication_required"):
+        """Drop a connection's identity and ask the client to re-authenticate"""
+        connection = self.connections.get(client_id)
+        if connection is None:
+            return
+        
+        user_id = connection.user_id
+        connection.cancel_auth_timer()
+        connection.auth_token = None
+        connection.token_id = None
+        connection.auth_expires_at = None
+        connection.update_auth_status(None, False)
+        
+        if user_id is not None:
+            self._index_remove(self.user_connections, "user", user_id, client_id)
+        # Subscriptions were authorized for that identity
+        for topic in self.topics.remove_client(client_id):
+            self._bus_unsubscribe(f"{BUS_SUBSCRIPTION_PREFIX}{topic}")
+        
+        logger.info(f"Identity cleared for client {client_id}: {reason}")
+        try:
+            asyncio.get_running_loop().create_task(connection.send_message({
+                "type": "auth_required",
+                "reason": reason,
+                "timestamp": datetime.now(timezone.utc).isoformat()
+            }))
+        except RuntimeError:
+            pass
+    
+    def _expire_identity(self, client_id: str, token_id: Optional[str]):
+        """Expiry timer callback; ignores timers for identities already replaced"""
+        connection = self.connections.get(client_id)
+        if connection is not None and connection.token_id == token_id:
+            connection.auth_timer = None
+            self.clear_identity(client_id, "token_expired")
+    
+    def revoke_identity(self, user_id: Any = None, token_id: Optional[str] = None):
+        """Revocation hook: re-challenge sockets bound to a revoked token or user"""
+        for client_id, connection in list(self.connections.items()):
+            if not connection.is_authenticated:
+                continue
+            if (token_id is not None and connection.token_id == token_id) or \
+               (user_id is not None and connection.user_id == user_id):
+                self.clear_identity(client_id, "token_revoked")
     
     def get_connection_stats(self) -> Dict[str, Any]:
         """Get enhanced WebSocket connection statistics"""
@@ -467,6 +968,21 @@ class EnhancedWebSocketManager:
         active_connections = sum(1 for conn in self.connections.values() if conn.state.connected)
         reconnecting_connections = sum(1 for conn in self.connections.values() if conn.state.reconnect_scheduled)
         
+        # Outbound queue health
+        queue_depths = [conn.queue_depth for conn in self.connections.values()]
+        send_queue_stats = {
+            "overflow_policy": self.overflow_policy.value,
+            "max_queue_size": self.send_queue_size,
+            "total_queued_messages": sum(queue_depths),
+            "max_current_depth": max(queue_depths, default=0),
+            "max_observed_depth": max((conn.max_queue_depth for conn in self.connections.values()), default=0),
+            "dropped_messages": sum(conn.dropped_messages for conn in self.connections.values()),
+            "coalesced_messages": sum(conn.coalesced_messages for conn in self.connections.values()),
+            "slow_consumer_disconnects": self.connection_stats["slow_consumer_disconnects"] + sum(
+                1 for conn in self.connections.values() if conn.slow_consumer_disconnect
+            )
+        }
+        
         return {
             "total_connections": len(self.connections),
             "active_connections": active_connections,
@@ -485,6 +1001,16 @@ class EnhancedWebSocketManager:
             "connections_by_user": {
                 user_id: len(client_ids)
                 for user_id, client_ids in self.user_connections.items()
+            },
+            "send_queue": send_queue_stats,
+            "history": self.history.stats(),
+            "topics": self.topics.stats(),
+            "ai_turns": self.turns.get_stats(),
+            "heartbeat": {
+                **self.heartbeat_stats,
+                "scheduled": len(self.heartbeat_wheel),
+                "interval": self.heartbeat_interval,
+                "pong_timeout": self.pong_timeout
             }
         }
     
@@ -492,6 +1018,7 @@ class EnhancedWebSocketManager:
         """Handle heartbeat response from client"""
         if client_id in self.connections:
             connection = self.connections[client_id]
+            connection.record_pong()
             connection.state.last_heartbeat = datetime.fromisoformat(timestamp)
             logger.debug(f"Heartbeat response received from client {client_id}")
 
@@ -499,4 +1026,4 @@ class EnhancedWebSocketManager:
 enhanced_websocket_manager = EnhancedWebSocketManager()
 
 # Export the manager and models
-__all__ = ['EnhancedWebSocketManager', 'EnhancedWebSocketConnection', 'ChatMessage', 'ConnectionState', 'enhanced_websocket_manager']
\ No newline at end of file
+__all__ = ['EnhancedWebSocketManager', 'EnhancedWebSocketConnection', 'ChatMessage', 'ConnectionState', 'OverflowPolicy', 'OutboundFrame', 'HeartbeatWheel', 'SessionMessage', 'encode_message', 'enhanced_websocket_manager']
\ No newline at end of file
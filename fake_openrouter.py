@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+"""
+dhii Mail - Local OpenRouter Stand-In
+A fake OpenAI-style chat-completions server for measuring and testing
+AIEngine offline. Every request waits a configurable latency, then fails
+with a 5xx at ``error_rate``, is rate limited (429 with Retry-After) at
+``rate_limit_rate`` or beyond ``capacity`` concurrent requests, or answers
+with a fixed reply - as one JSON body or, for ``"stream": true``, as
+server-sent events one word at a time.
+
+Run standalone and point the engine at it:
+
+    python fake_openrouter.py --port 8099 --latency-ms 300 --error-rate 0.05
+    # AIEngine.openrouter_api_url = "http://127.0.0.1:8099/api/v1/chat/completions"
+
+or start it inside an event loop with ``await FakeOpenRouter(...).start()``.
+"""
+
+import sys
+import json
+import random
+import asyncio
+import logging
+import argparse
+from collections import Counter
+from typing import Any, Dict, Optional
+
+from aiohttp import web
+
+from prompt_assembler import estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+COMPLETIONS_PATH = "/api/v1/chat/completions"
+DEFAULT_REPLY = "Sure, I can help schedule that meeting. Which time works best for you tomorrow?"
+
+_OPTIONS = ("latency", "jitter", "error_rate", "rate_limit_rate", "retry_after", "capacity",
+            "token_delay", "reply")
+
+class FakeOpenRouter:
+    """Chat-completions endpoint with injected latency, errors and rate limits.
+
+    ``latency`` (plus up to ``jitter``) seconds pass before the status is
+    decided; streams then emit a word every ``token_delay`` seconds.
+    ``capacity`` bounds concurrent requests like a provider's per-key limit;
+    None means unlimited. ``seed`` makes the injected failures repeatable.
+    """
+
+    def __init__(self, latency: float = 0.05, jitter: float = 0.0, error_rate: float = 0.0,
+                 rate_limit_rate: float = 0.0, retry_after: Optional[float] = 1.0,
+                 capacity: Optional[int] = None, token_delay: float = 0.0,
+                 reply: str = DEFAULT_REPLY, seed: Optional[int] = None):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.retry_after = retry_after
+        self.capacity = capacity
+        self.token_delay = token_delay
+        self.reply = reply
+        self._random = random.Random(seed)
+        self._runner: Optional[web.AppRunner] = None
+        self._in_flight = 0
+        self.url: Optional[str] = None
+        self.reset_stats()
+
+    def configure(self, **options: Any):
+        for name, value in options.items():
+            if name not in _OPTIONS:
+                raise ValueError(f"Unknown fake OpenRouter option: {name}")
+            setattr(self, name, value)
+
+    def reset_stats(self):
+        self.stats = {"requests": 0, "probes": 0, "streams": 0, "ok": 0, "errors": 0,
+                      "rate_limited": 0, "over_capacity": 0, "peak_in_flight": 0,
+                      "prompt_tokens": 0, "completion_tokens": 0}
+        self.models: Counter = Counter()
+
+    def app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_post(COMPLETIONS_PATH, self._completions)
+        return app
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> str:
+        """Serve on ``host:port`` (0 picks a free port); returns the completions URL"""
+        self._runner = web.AppRunner(self.app(), access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        self.url = f"http://{host}:{port}{COMPLETIONS_PATH}"
+        return self.url
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    async def _completions(self, request: web.Request) -> web.StreamResponse:
+        body = await request.json()
+        # AIEngine probes open circuits with max_tokens=1; keep them out of the request count
+        if body.get("max_tokens") == 1:
+            self.stats["probes"] += 1
+        else:
+            self.stats["requests"] += 1
+            self.models[body.get("model")] += 1
+        self._in_flight += 1
+        self.stats["peak_in_flight"] = max(self.stats["peak_in_flight"], self._in_flight)
+        try:
+            if self.capacity is not None and self._in_flight > self.capacity:
+                self.stats["over_capacity"] += 1
+                return self._rate_limited()
+            await asyncio.sleep(self.latency + self._random.uniform(0, self.jitter))
+            roll = self._random.random()
+            if roll < self.error_rate:
+                self.stats["errors"] += 1
+                return web.json_response({"error": {"code": 503, "message": "upstream unavailable"}}, status=503)
+            if roll < self.error_rate + self.rate_limit_rate:
+                return self._rate_limited()
+
+            self.stats["ok"] += 1
+            prompt_tokens = sum(estimate_tokens(str(m.get("content", ""))) for m in body.get("messages", []))
+            completion_tokens = estimate_tokens(self.reply)
+            self.stats["prompt_tokens"] += prompt_tokens
+            self.stats["completion_tokens"] += completion_tokens
+            if body.get("stream"):
+                self.stats["streams"] += 1
+                return await self._stream(request, body)
+            return web.json_response({
+                "id": f"fake-{self.stats['ok']}",
+                "model": body.get("model"),
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": self.reply},
+                             "finish_reason": "stop"}],
+                "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                          "total_tokens": prompt_tokens + completion_tokens}
+            })
+        finally:
+            self._in_flight -= 1
+
+    def _rate_limited(self) -> web.Response:
+        self.stats["rate_limited"] += 1
+        headers = {"Retry-After": f"{self.retry_after:g}"} if self.retry_after is not None else None
+        return web.json_response({"error": {"code": 429, "message": "rate limited"}}, status=429,
+                                 headers=headers)
+
+    async def _stream(self, request: web.Request, body: Dict[str, Any]) -> web.StreamResponse:
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream", "Cache-Control": "no-cache"})
+        await response.prepare(request)
+        words = self.reply.split(" ")
+        for index, word in enumerate(words):
+            delta = word if index == len(words) - 1 else word + " "
+            chunk = {"model": body.get("model"), "choices": [{"index": 0, "delta": {"content": delta}}]}
+            await response.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+            if self.token_delay:
+                await asyncio.sleep(self.token_delay)
+        await response.write(b"data: [DONE]\n\n")
+        await response.write_eof()
+        return response
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {**self.stats, "in_flight": self._in_flight, "models": dict(self.models)}
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Local OpenRouter stand-in")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8099)
+    parser.add_argument("--latency-ms", type=float, default=50.0, help="time before the status is decided")
+    parser.add_argument("--jitter-ms", type=float, default=0.0, help="extra random latency, up to this much")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of requests answered with 503")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="share of requests answered with 429")
+    parser.add_argument("--retry-after", type=float, default=1.0, help="Retry-After seconds sent with 429s")
+    parser.add_argument("--capacity", type=int, default=None, help="concurrent requests before 429s")
+    parser.add_argument("--token-delay-ms", type=float, default=0.0, help="delay between streamed words")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args(argv)
+
+    server = FakeOpenRouter(latency=args.latency_ms / 1000, jitter=args.jitter_ms / 1000,
+                            error_rate=args.error_rate, rate_limit_rate=args.rate_limit_rate,
+                            retry_after=args.retry_after, capacity=args.capacity,
+                            token_delay=args.token_delay_ms / 1000, seed=args.seed)
+    print(f"Fake OpenRouter on http://{args.host}:{args.port}{COMPLETIONS_PATH}")
+    web.run_app(server.app(), host=args.host, port=args.port, print=None, access_log=None)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
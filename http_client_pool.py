@@ -0,0 +1,184 @@
+"""
+dhii Mail - Shared HTTP Client Pool
+One keep-alive aiohttp session per process for outbound API calls (OpenRouter
+and other LLM providers). Connections, DNS lookups and TLS sessions are reused
+across messages and retries instead of being set up for every attempt.
+
+The FastAPI lifespan starts and closes the pool; code running outside the app
+(scripts, tests) gets a lazily created session on first use.
+"""
+
+import time
+import asyncio
+import logging
+from typing import Any, Dict, Optional
+
+import aiohttp
+
+logger = logging.getLogger(__name__)
+
+class SharedHTTPClient:
+    """Process-wide aiohttp session with per-host connection limits and pool metrics.
+
+    aiohttp speaks HTTP/1.1 only, so concurrency to one provider comes from a
+    per-host pool of warm keep-alive connections rather than HTTP/2 streams.
+    """
+
+    def __init__(self, limit: int = 100, limit_per_host: int = 32, keepalive_timeout: float = 75.0,
+                 dns_cache_ttl: int = 300, timeout: float = 30.0):
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.keepalive_timeout = keepalive_timeout
+        self.dns_cache_ttl = dns_cache_ttl
+        self.timeout = timeout
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._lock: Optional[asyncio.Lock] = None
+        self._lock_loop: Optional[asyncio.AbstractEventLoop] = None
+        self.stats = {
+            "sessions_created": 0,
+            "requests": 0,
+            "in_flight": 0,
+            "request_errors": 0,
+            "connections_created": 0,
+            "connections_reused": 0,
+            "pool_waits": 0,
+            "dns_cache_hits": 0,
+            "dns_cache_misses": 0,
+            "connect_time_total": 0.0,
+            "time_to_headers_total": 0.0
+        }
+
+    def configure(self, **options: Any):
+        """Update pool settings; takes effect for the next session"""
+        for name, value in options.items():
+            if not hasattr(self, name) or name.startswith("_") or name == "stats":
+                raise ValueError(f"Unknown HTTP pool option: {name}")
+            setattr(self, name, value)
+
+    def _trace_config(self) -> aiohttp.TraceConfig:
+        trace = aiohttp.TraceConfig()
+        stats = self.stats
+
+        async def on_request_start(session, ctx, params):
+            ctx.started = time.perf_counter()
+            stats["requests"] += 1
+            stats["in_flight"] += 1
+
+        async def on_request_end(session, ctx, params):
+            # Fires once the response headers are in
+            stats["in_flight"] -= 1
+            stats["time_to_headers_total"] += time.perf_counter() - ctx.started
+
+        async def on_request_exception(session, ctx, params):
+            stats["in_flight"] -= 1
+            stats["request_errors"] += 1
+
+        async def on_connection_create_start(session, ctx, params):
+            ctx.connect_started = time.perf_counter()
+
+        async def on_connection_create_end(session, ctx, params):
+            stats["connections_created"] += 1
+            stats["connect_time_total"] += time.perf_counter() - ctx.connect_started
+
+        async def on_connection_reuseconn(session, ctx, params):
+            stats["connections_reused"] += 1
+
+        async def on_connection_queued_start(session, ctx, params):
+            stats["pool_waits"] += 1
+
+        async def on_dns_cache_hit(session, ctx, params):
+            stats["dns_cache_hits"] += 1
+
+        async def on_dns_cache_miss(session, ctx, params):
+            stats["dns_cache_misses"] += 1
+
+        trace.on_request_start.append(on_request_start)
+        trace.on_request_end.append(on_request_end)
+        trace.on_request_exception.append(on_request_exception)
+        trace.on_connection_create_start.append(on_connection_create_start)
+        trace.on_connection_create_end.append(on_connection_create_end)
+        trace.on_connection_reuseconn.append(on_connection_reuseconn)
+        trace.on_connection_queued_start.append(on_connection_queued_start)
+        trace.on_dns_cache_hit.append(on_dns_cache_hit)
+        trace.on_dns_cache_miss.append(on_dns_cache_miss)
+        return trace
+
+    def _new_session(self) -> aiohttp.ClientSession:
+        connector = aiohttp.TCPConnector(
+            limit=self.limit,
+            limit_per_host=self.limit_per_host,
+            keepalive_timeout=self.keepalive_timeout,
+            ttl_dns_cache=self.dns_cache_ttl,
+            enable_cleanup_closed=True
+        )
+        self.stats["sessions_created"] += 1
+        return aiohttp.ClientSession(
+            connector=connector,
+            timeout=aiohttp.ClientTimeout(total=self.timeout),
+            trace_configs=[self._trace_config()]
+        )
+
+    async def start(self):
+        """Create the session on the running loop (called from the app lifespan)"""
+        await self.get_session()
+
+    async def get_session(self) -> aiohttp.ClientSession:
+        """The shared session, created on first use in the running loop"""
+        loop = asyncio.get_running_loop()
+        if self._session is not None and not self._session.closed and self._loop is loop:
+            return self._session
+        # One lock per loop, swapped without an await in between, so concurrent
+        # first callers on a loop all wait on the same lock
+        if self._lock_loop is not loop:
+            self._lock = asyncio.Lock()
+            self._lock_loop = loop
+        async with self._lock:
+            if self._session is None or self._session.closed or self._loop is not loop:
+                if self._session is not None and not self._session.closed:
+                    # A session cannot move between event loops (e.g. separate asyncio.run calls)
+                    self._abandon(self._session, self._loop)
+                self._session = self._new_session()
+                self._loop = loop
+        return self._session
+
+    @staticmethod
+    def _abandon(session: aiohttp.ClientSession, loop: Optional[asyncio.AbstractEventLoop]):
+        """Close a session that belongs to another event loop, or report that it cannot be"""
+        if loop is not None and loop.is_running():
+            asyncio.run_coroutine_threadsafe(session.close(), loop)
+            logger.debug("Closing the shared HTTP session of another event loop")
+        else:
+            # Its loop has stopped, so the session can no longer be closed cleanly
+            logger.warning("Shared HTTP session was left open by an event loop that has stopped; "
+                           "call close() before the loop ends")
+
+    async def close(self):
+        """Close pooled connections (called on app shutdown)"""
+        session, self._session = self._session, None
+        if session is not None and not session.closed:
+            if self._loop is asyncio.get_running_loop():
+                await session.close()
+            else:
+                self._abandon(session, self._loop)
+        self._loop = None
+
+    def get_stats(self) -> Dict[str, Any]:
+        stats = dict(self.stats)
+        created = stats.pop("connect_time_total")
+        headers = stats.pop("time_to_headers_total")
+        completed = stats["requests"] - stats["in_flight"] - stats["request_errors"]
+        connector = self._session.connector if self._session is not None and not self._session.closed else None
+        return {
+            **stats,
+            "active": connector is not None,
+            "limit": self.limit,
+            "limit_per_host": self.limit_per_host,
+            "keepalive_timeout": self.keepalive_timeout,
+            "reuse_ratio": (stats["connections_reused"] /
+                            max(1, stats["connections_reused"] + stats["connections_created"])),
+            "avg_connect_ms": created / stats["connections_created"] * 1000 if stats["connections_created"] else 0.0,
+            "avg_time_to_headers_ms": headers / completed * 1000 if completed > 0 else 0.0
+        }
+
+shared_http_client = SharedHTTPClient()
@@ -0,0 +1,319 @@
+"""
+dhii Mail - Local Intent Classifier
+A small linear model over hashed TF-IDF features that labels chat messages
+with the AIEngine intents. Routine requests ("schedule a meeting tomorrow at
+3") that it classifies confidently are answered by the pattern-based path
+without a round trip to the LLM; everything else is escalated.
+
+Train offline from labeled JSONL ({"text": ..., "intent": ...} per line):
+
+    python intent_classifier.py train examples.jsonl --out intent_model.npz
+    python intent_classifier.py evaluate held_out.jsonl --model intent_model.npz
+
+Without a trained model file the classifier fits itself on SEED_EXAMPLES at
+startup, which takes a few milliseconds.
+"""
+
+import re
+import sys
+import json
+import zlib
+import logging
+import argparse
+from typing import Dict, Iterable, List, Optional, Tuple
+
+try:
+    import numpy as np
+except ImportError:  # optional; without NumPy every turn goes to the LLM
+    np = None
+
+logger = logging.getLogger(__name__)
+
+_TOKEN = re.compile(r"[a-z0-9']+")
+
+SEED_EXAMPLES: Dict[str, List[str]] = {
+    'schedule_meeting': [
+        "schedule a meeting tomorrow at 3",
+        "book a meeting with sarah on friday",
+        "set up a 30 minute sync next week",
+        "can we meet tomorrow afternoon",
+        "put a call with the design team on my calendar for monday",
+        "arrange an appointment with dr lee at 10am",
+        "find a time to meet with alex this week",
+        "schedule a one hour review on thursday at 2pm",
+        "book the conference room for a team meeting",
+        "let's meet next tuesday morning",
+        "create a meeting with john about the budget",
+        "reschedule my 4pm meeting to tomorrow",
+        "am i free at 11 tomorrow for a quick chat",
+        "plan a lunch meeting with the client on wednesday",
+    ],
+    'send_email': [
+        "send an email to bob@example.com",
+        "email the team about the launch",
+        "write an email to my manager saying i'll be late",
+        "reply to sarah's message",
+        "forward this to jane@example.com",
+        "compose a message to the client about the invoice",
+        "draft an email to hr regarding my leave",
+        "send a note to alex telling him the report is ready",
+        "write to customer support about my order",
+        "email john the meeting notes",
+        "send a follow up email to the vendor",
+        "message the marketing list with the newsletter",
+    ],
+    'check_calendar': [
+        "what's on my calendar today",
+        "show my schedule for tomorrow",
+        "what meetings do i have this week",
+        "check my calendar for friday",
+        "do i have anything on monday morning",
+        "list my upcoming events",
+        "what's my next meeting",
+        "am i busy this afternoon",
+        "show today's meetings",
+        "what does my week look like",
+        "any events next week",
+        "what's on my schedule for thursday",
+    ],
+    'create_contact': [
+        "add a new contact for maria",
+        "save john's phone number 555 0123",
+        "create a contact for the new vendor",
+        "add sarah@example.com to my contacts",
+        "save this email address as alex",
+        "store the contact info for dr lee",
+        "add a contact named priya with phone 555 9876",
+        "update the phone number for my accountant",
+        "new contact bob smith from acme",
+        "save the client's details to contacts",
+    ],
+    'video_conference': [
+        "start a zoom call",
+        "set up a video meeting with the team",
+        "create a teams link for tomorrow",
+        "open a video conference",
+        "start a google meet",
+        "send a zoom invite to the client",
+        "i need a virtual meeting room",
+        "host an online meeting for the workshop",
+        "generate a video call link",
+        "join the video conference now",
+    ],
+    'general_chat': [
+        "hello",
+        "hi there",
+        "thanks",
+        "thank you so much",
+        "how are you",
+        "what can you do",
+        "who are you",
+        "good morning",
+        "tell me a joke",
+        "help",
+        "ok great",
+        "what's the weather like",
+        "never mind",
+        "goodbye",
+    ],
+}
+
+def tokenize(text: str) -> List[str]:
+    """Word unigrams and bigrams of the lowercased text"""
+    words = _TOKEN.findall(text.lower())
+    return words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+
+class IntentClassifier:
+    """Softmax regression over hashed, L2-normalized TF-IDF features.
+
+    Features are hashed with CRC32 (stable across processes, unlike hash())
+    into ``n_features`` buckets, so there is no vocabulary to store.
+    ``threshold`` is the probability a prediction needs to be answered
+    locally.
+    """
+
+    def __init__(self, n_features: int = 2 ** 14, threshold: float = 0.65, enabled: bool = True):
+        self.n_features = n_features
+        self.threshold = threshold
+        self.enabled = enabled
+        self.labels: List[str] = []
+        self.idf = None
+        self.weights = None
+        self.bias = None
+        self.stats = {"classified": 0, "local": 0, "escalated": 0}
+
+    @property
+    def available(self) -> bool:
+        return np is not None and self.enabled
+
+    def configure(self, **options):
+        for name, value in options.items():
+            if name not in ("threshold", "enabled"):
+                raise ValueError(f"Unknown intent classifier option: {name}")
+            setattr(self, name, value)
+
+    def _hashed(self, texts: Iterable[str]) -> Tuple["np.ndarray", "np.ndarray", "np.ndarray"]:
+        """Flattened (row, feature, log term frequency) triples for a batch"""
+        rows, columns, counts = [], [], []
+        for row, text in enumerate(texts):
+            buckets: Dict[int, int] = {}
+            for token in tokenize(text):
+                bucket = zlib.crc32(token.encode("utf-8")) % self.n_features
+                buckets[bucket] = buckets.get(bucket, 0) + 1
+            rows.extend([row] * len(buckets))
+            columns.extend(buckets.keys())
+            counts.extend(buckets.values())
+        return (np.asarray(rows, dtype=np.int64), np.asarray(columns, dtype=np.int64),
+                np.log1p(np.asarray(counts, dtype=np.float32)))
+
+    def _tfidf(self, texts: List[str]) -> Tuple["np.ndarray", "np.ndarray", "np.ndarray"]:
+        rows, columns, values = self._hashed(texts)
+        values = values * self.idf[columns]
+        norms = np.zeros(len(texts), dtype=np.float32)
+        np.add.at(norms, rows, values * values)
+        values = values / np.sqrt(np.maximum(norms, 1e-12))[rows]
+        return rows, columns, values
+
+    def fit(self, texts: List[str], intents: List[str], epochs: int = 300, learning_rate: float = 2.0,
+            l2: float = 1e-4) -> "IntentClassifier":
+        """Full-batch gradient descent on the cross-entropy loss"""
+        self.labels = sorted(set(intents))
+        targets = np.eye(len(self.labels), dtype=np.float32)[[self.labels.index(i) for i in intents]]
+
+        rows, columns, _ = self._hashed(texts)
+        document_frequency = np.bincount(columns, minlength=self.n_features)
+        self.idf = (np.log((1 + len(texts)) / (1 + document_frequency)) + 1).astype(np.float32)
+
+        # Train on the buckets that occur (a few hundred), not all n_features
+        rows, columns, values = self._tfidf(texts)
+        used, compact = np.unique(columns, return_inverse=True)
+        features = np.zeros((len(texts), len(used)), dtype=np.float32)
+        features[rows, compact] = values
+        weights = np.zeros((len(used), len(self.labels)), dtype=np.float32)
+        bias = np.zeros(len(self.labels), dtype=np.float32)
+        for _ in range(epochs):
+            error = (self._softmax(features @ weights + bias) - targets) / len(texts)
+            weights -= learning_rate * (features.T @ error + l2 * weights)
+            bias -= learning_rate * error.sum(axis=0)
+
+        self.weights = np.zeros((self.n_features, len(self.labels)), dtype=np.float32)
+        self.weights[used] = weights
+        self.bias = bias
+        return self
+
+    @staticmethod
+    def _softmax(scores: "np.ndarray") -> "np.ndarray":
+        scores = scores - scores.max(axis=1, keepdims=True)
+        exp = np.exp(scores)
+        return exp / exp.sum(axis=1, keepdims=True)
+
+    def predict_proba(self, texts: List[str]) -> "np.ndarray":
+        """Class probabilities, one row per text, columns in ``labels`` order"""
+        rows, columns, values = self._tfidf(texts)
+        scores = np.tile(self.bias, (len(texts), 1))
+        np.add.at(scores, rows, self.weights[columns] * values[:, None])
+        return self._softmax(scores)
+
+    def classify_batch(self, texts: List[str]) -> List[Tuple[str, float]]:
+        """Most likely intent and its probability for every text"""
+        if np is None:
+            raise RuntimeError("NumPy is required for the local intent classifier")
+        if not texts:
+            return []
+        if self.weights is None:
+            self.fit_seed()
+        probabilities = self.predict_proba(texts)
+        best = probabilities.argmax(axis=1)
+        self.stats["classified"] += len(texts)
+        return [(self.labels[index], float(probabilities[row, index])) for row, index in enumerate(best)]
+
+    def classify(self, text: str) -> Tuple[str, float]:
+        return self.classify_batch([text])[0]
+
+    def route(self, text: str) -> Optional[Tuple[str, float]]:
+        """(intent, confidence) when the message can be answered locally, None to escalate.
+
+        General chat always escalates; the LLM is what makes small talk useful.
+        """
+        if not self.available:
+            return None
+        intent, confidence = self.classify(text)
+        if intent != 'general_chat' and confidence >= self.threshold:
+            self.stats["local"] += 1
+            return intent, confidence
+        self.stats["escalated"] += 1
+        return None
+
+    def fit_seed(self) -> "IntentClassifier":
+        texts = [text for examples in SEED_EXAMPLES.values() for text in examples]
+        intents = [intent for intent, examples in SEED_EXAMPLES.items() for _ in examples]
+        return self.fit(texts, intents)
+
+    def save(self, path: str):
+        np.savez_compressed(path, labels=np.array(self.labels), idf=self.idf, weights=self.weights,
+                            bias=self.bias, n_features=self.n_features)
+
+    def load(self, path: str) -> "IntentClassifier":
+        with np.load(path) as model:
+            self.n_features = int(model["n_features"])
+            self.labels = [str(label) for label in model["labels"]]
+            self.idf = model["idf"]
+            self.weights = model["weights"]
+            self.bias = model["bias"]
+        logger.info(f"Loaded intent classifier from {path} ({len(self.labels)} intents)")
+        return self
+
+    def get_stats(self) -> Dict[str, object]:
+        return {**self.stats, "available": self.available, "threshold": self.threshold,
+                "intents": list(self.labels)}
+
+def _read_examples(path: str) -> Tuple[List[str], List[str]]:
+    texts, intents = [], []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                example = json.loads(line)
+                texts.append(example["text"])
+                intents.append(example["intent"])
+    return texts, intents
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Train or evaluate the local intent classifier")
+    commands = parser.add_subparsers(dest="command", required=True)
+    train = commands.add_parser("train", help="fit a model on labeled JSONL examples")
+    train.add_argument("data", help='JSONL file of {"text", "intent"} objects')
+    train.add_argument("--out", default="intent_model.npz")
+    train.add_argument("--with-seed", action="store_true", help="also train on the built-in seed examples")
+    evaluate = commands.add_parser("evaluate", help="accuracy and local-answer rate on held-out examples")
+    evaluate.add_argument("data")
+    evaluate.add_argument("--model", help="trained .npz file (default: seed model)")
+    evaluate.add_argument("--threshold", type=float, default=0.65)
+    args = parser.parse_args(argv)
+
+    if np is None:
+        print("NumPy is required: pip install numpy", file=sys.stderr)
+        return 1
+    texts, intents = _read_examples(args.data)
+    if args.command == "train":
+        if args.with_seed:
+            texts += [text for examples in SEED_EXAMPLES.values() for text in examples]
+            intents += [intent for intent, examples in SEED_EXAMPLES.items() for _ in examples]
+        IntentClassifier().fit(texts, intents).save(args.out)
+        print(f"Trained on {len(texts)} examples, saved to {args.out}")
+        return 0
+
+    classifier = IntentClassifier(threshold=args.threshold)
+    classifier.load(args.model) if args.model else classifier.fit_seed()
+    predictions = classifier.classify_batch(texts)
+    correct = sum(1 for (intent, _), expected in zip(predictions, intents) if intent == expected)
+    local = [(intent, expected) for (intent, confidence), expected in zip(predictions, intents)
+             if intent != 'general_chat' and confidence >= args.threshold]
+    print(f"accuracy        {correct / len(texts):.1%} ({correct}/{len(texts)})")
+    print(f"answered locally {len(local) / len(texts):.1%}, "
+          f"of which correct {sum(1 for i, e in local if i == e) / max(1, len(local)):.1%}")
+    return 0
+
+local_intent_classifier = IntentClassifier()
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,239 @@
+"""
+dhii Mail - LLM Response Cache
+Caches validated model replies for near-identical chat turns (greetings, "what
+can you do", "show my calendar") so repeats are served from memory instead of
+a paid OpenRouter call. Entries expire after a TTL, the in-memory table is an
+LRU bounded by entry count, and a SQLite file keeps entries across restarts.
+"""
+
+import os
+import re
+import json
+import time
+import queue
+import atexit
+import hashlib
+import sqlite3
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Next to this module, not wherever the server happened to be started
+DEFAULT_CACHE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "llm_cache.db")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS llm_cache (
+    cache_key TEXT PRIMARY KEY,
+    model TEXT NOT NULL,
+    response TEXT NOT NULL,
+    expires_at REAL NOT NULL,
+    last_used REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_llm_cache_last_used ON llm_cache(last_used);
+"""
+
+_UPSERT = """INSERT INTO llm_cache (cache_key, model, response, expires_at, last_used)
+    VALUES (?, ?, ?, ?, ?)
+    ON CONFLICT(cache_key) DO UPDATE SET
+        response = excluded.response, expires_at = excluded.expires_at, last_used = excluded.last_used"""
+
+# The system prompt embeds the current minute. Minutes must not split the key
+# space, but the date and hour stay in it so a reply about "today" or
+# "tomorrow" is never served once the clock has moved past that hour.
+_TIMESTAMP = re.compile(r"(\d{4}-\d{2}-\d{2} \d{2}):\d{2}(:\d{2})?( UTC)?")
+_WHITESPACE = re.compile(r"\s+")
+_WORD_PUNCTUATION = re.compile(r"[!?.,;:]+(?=\s|$)")
+
+def normalize_text(text: str) -> str:
+    return _WHITESPACE.sub(" ", _TIMESTAMP.sub(r"\1:<minute>", text)).strip()
+
+def normalize_user_message(text: str) -> str:
+    """Case, spacing and punctuation after words don't change what was asked"""
+    return _WORD_PUNCTUATION.sub("", normalize_text(text).lower())
+
+class LLMResponseCache:
+    """TTL + LRU cache of model replies keyed on the normalized request.
+
+    Lookups only touch the in-memory table. Stores are written behind by a
+    daemon thread; the newest ``max_entries`` live rows are loaded back on
+    first use after a restart.
+    """
+
+    def __init__(self, db_path: Optional[str] = DEFAULT_CACHE_PATH, max_entries: int = 5000,
+                 ttl: float = 3600.0, history_turns: int = 6, enabled: bool = True,
+                 skip_intents: Iterable[str] = ("check_calendar", "send_email")):
+        self.db_path = db_path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.history_turns = history_turns
+        self.enabled = enabled
+        self.skip_intents = set(skip_intents)
+        self._entries: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        self._loaded = db_path is None
+        self._queue: "queue.Queue" = queue.Queue()
+        self._writer: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "stores": 0, "expired": 0, "evictions": 0, "skipped": 0}
+
+    def configure(self, **options: Any):
+        """Update cache settings; call before the first lookup (app lifespan)"""
+        for name, value in options.items():
+            if name not in ("db_path", "max_entries", "ttl", "history_turns", "enabled", "skip_intents"):
+                raise ValueError(f"Unknown LLM cache option: {name}")
+            setattr(self, name, set(value) if name == "skip_intents" else value)
+        if not self._entries:
+            self._loaded = self.db_path is None
+
+    def should_cache(self, intent: Optional[str]) -> bool:
+        """False when caching is off or the intent opted out (replies that depend on live data)"""
+        if not self.enabled:
+            return False
+        if intent in self.skip_intents:
+            self.stats["skipped"] += 1
+            return False
+        return True
+
+    def make_key(self, model: str, messages: List[Dict[str, str]]) -> str:
+        """Hash of the model, normalized system prompt, trimmed history and user message"""
+        system = [normalize_text(m["content"]) for m in messages if m.get("role") == "system"]
+        turns = [m for m in messages if m.get("role") != "system"]
+        history = [(m.get("role"), normalize_text(m.get("content", ""))) for m in turns[:-1]]
+        history = history[-self.history_turns:] if self.history_turns else []
+        user = normalize_user_message(turns[-1].get("content", "")) if turns else ""
+        material = json.dumps([model, system, history, user], separators=(",", ":"))
+        return hashlib.blake2b(material.encode("utf-8"), digest_size=20).hexdigest()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=5.0, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.executescript(_SCHEMA)
+        return conn
+
+    def _load(self):
+        """Warm the memory table from disk once per process"""
+        self._loaded = True
+        try:
+            conn = self._connect()
+            try:
+                rows = conn.execute(
+                    "SELECT cache_key, response, expires_at FROM llm_cache WHERE expires_at > ? "
+                    "ORDER BY last_used DESC LIMIT ?", (time.time(), self.max_entries)
+                ).fetchall()
+            finally:
+                conn.close()
+        except sqlite3.Error as e:
+            logger.error(f"Failed to load LLM cache from {self.db_path}: {e}")
+            return
+        for key, response, expires_at in reversed(rows):
+            self._entries[key] = (expires_at, response)
+        logger.info(f"Loaded {len(rows)} cached LLM responses")
+
+    def get(self, key: str) -> Optional[str]:
+        if not self._loaded:
+            self._load()
+        entry = self._entries.get(key)
+        if entry is None:
+            self.stats["misses"] += 1
+            return None
+        expires_at, response = entry
+        if expires_at <= time.time():
+            del self._entries[key]
+            self.stats["expired"] += 1
+            self.stats["misses"] += 1
+            return None
+        self._entries.move_to_end(key)
+        self.stats["hits"] += 1
+        return response
+
+    def set(self, key: str, model: str, response: str, ttl: Optional[float] = None):
+        if not self._loaded:
+            self._load()
+        now = time.time()
+        expires_at = now + (self.ttl if ttl is None else ttl)
+        self._entries[key] = (expires_at, response)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.stats["evictions"] += 1
+        self.stats["stores"] += 1
+        if self.db_path is not None:
+            self._ensure_writer()
+            self._queue.put((key, model, response, expires_at, now))
+
+    def _ensure_writer(self):
+        if self._writer is not None and self._writer.is_alive():
+            return
+        with self._start_lock:
+            if self._writer is not None and self._writer.is_alive():
+                return
+            self._writer = threading.Thread(target=self._run_writer, name="llm-cache-writer", daemon=True)
+            self._writer.start()
+            atexit.register(self.flush)
+
+    def _run_writer(self):
+        """Upsert stored entries in batches and trim the file to max_entries"""
+        conn = self._connect()
+        while True:
+            batch = []
+            waiters = []
+            item = self._queue.get()
+            while True:
+                if isinstance(item, threading.Event):
+                    waiters.append(item)
+                else:
+                    batch.append(item)
+                try:
+                    item = self._queue.get(timeout=0 if waiters else 0.2)
+                except queue.Empty:
+                    break
+            if batch:
+                try:
+                    with conn:
+                        conn.executemany(_UPSERT, batch)
+                        conn.execute("DELETE FROM llm_cache WHERE expires_at <= ?", (time.time(),))
+                        conn.execute(
+                            "DELETE FROM llm_cache WHERE cache_key NOT IN "
+                            "(SELECT cache_key FROM llm_cache ORDER BY last_used DESC LIMIT ?)",
+                            (self.max_entries,)
+                        )
+                except sqlite3.Error as e:
+                    logger.error(f"Failed to persist {len(batch)} LLM cache entries: {e}")
+            for waiter in waiters:
+                waiter.set()
+
+    def flush(self, timeout: float = 5.0) -> bool:
+        """Block until every stored entry is on disk"""
+        if self._writer is None or not self._writer.is_alive():
+            return True
+        done = threading.Event()
+        self._queue.put(done)
+        return done.wait(timeout)
+
+    def clear(self):
+        self._entries.clear()
+        if self.db_path is not None:
+            self.flush()
+            try:
+                conn = self._connect()
+                with conn:
+                    conn.execute("DELETE FROM llm_cache")
+                conn.close()
+            except sqlite3.Error as e:
+                logger.error(f"Failed to clear LLM cache: {e}")
+
+    def get_stats(self) -> Dict[str, Any]:
+        lookups = self.stats["hits"] + self.stats["misses"]
+        return {
+            **self.stats,
+            "enabled": self.enabled,
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl": self.ttl,
+            "hit_ratio": self.stats["hits"] / lookups if lookups else 0.0
+        }
+
+llm_response_cache = LLMResponseCache()
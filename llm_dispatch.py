@@ -0,0 +1,188 @@
+"""
+dhii Mail - LLM Request Dispatcher
+Bounds upstream load on the model provider when many users ask at once:
+
+- Identical concurrent requests are coalesced into one upstream call whose
+  result every caller awaits (single flight).
+- A global concurrency limit caps calls in progress per worker; callers queue
+  by priority so interactive chat goes ahead of background work.
+- A rate-limit response pauses every caller for the provider's cool-down
+  instead of letting each retry loop hammer it independently.
+"""
+
+import json
+import time
+import heapq
+import asyncio
+import hashlib
+import logging
+import itertools
+import contextvars
+from contextlib import asynccontextmanager
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BACKGROUND = 10
+
+class _Flight:
+    """One upstream call shared by every caller with the same request key"""
+    __slots__ = ("key", "priority", "task", "slot_waiter")
+
+    def __init__(self, key: str, priority: int):
+        self.key = key
+        self.priority = priority
+        self.task: Optional[asyncio.Task] = None
+        self.slot_waiter: Optional[Tuple[int, asyncio.Future]] = None
+
+_current_flight: contextvars.ContextVar[Optional[_Flight]] = contextvars.ContextVar("llm_flight", default=None)
+
+class LLMDispatcher:
+    """Single-flight coalescing plus a priority-ordered concurrency limit"""
+
+    def __init__(self, max_concurrency: int = 8):
+        self.max_concurrency = max_concurrency
+        self._active = 0
+        self._waiting: List[Tuple[int, int, asyncio.Future]] = []
+        self._seq = itertools.count()
+        self._flights: Dict[str, _Flight] = {}
+        self._resume_at = 0.0
+        self.stats = {
+            "calls": 0,
+            "coalesced": 0,
+            "slots_granted": 0,
+            "queued": 0,
+            "peak_active": 0,
+            "cool_downs": 0
+        }
+
+    def configure(self, **options: Any):
+        for name, value in options.items():
+            if name != "max_concurrency":
+                raise ValueError(f"Unknown LLM dispatch option: {name}")
+            setattr(self, name, value)
+
+    @staticmethod
+    def request_key(payload: Dict[str, Any]) -> str:
+        """Identity of an upstream request body"""
+        body = json.dumps(payload, sort_keys=True, separators=(",", ":"))
+        return hashlib.sha256(body.encode("utf-8")).hexdigest()
+
+    async def coalesce(self, key: str, factory: Callable[[], Awaitable[Any]],
+                       priority: int = PRIORITY_INTERACTIVE) -> Any:
+        """Run ``factory`` once for all concurrent callers with the same key.
+
+        The call runs in its own task, so a caller that goes away (cancelled
+        chat turn) does not cancel it for the others.
+        """
+        self.stats["calls"] += 1
+        flight = self._flights.get(key)
+        if flight is not None and not flight.task.done():
+            self.stats["coalesced"] += 1
+            if priority < flight.priority:
+                self._promote(flight, priority)
+        else:
+            flight = _Flight(key, priority)
+            token = _current_flight.set(flight)
+            try:
+                flight.task = asyncio.ensure_future(factory())
+            finally:
+                _current_flight.reset(token)
+            self._flights[key] = flight
+            flight.task.add_done_callback(lambda _, f=flight: self._finish(f))
+        return await asyncio.shield(flight.task)
+
+    def _finish(self, flight: _Flight):
+        if self._flights.get(flight.key) is flight:
+            del self._flights[flight.key]
+        if not flight.task.cancelled() and flight.task.exception() is not None:
+            # Retrieved here so a flight whose callers all left doesn't log "never retrieved"
+            logger.debug(f"Coalesced LLM call failed: {flight.task.exception()}")
+
+    def _promote(self, flight: _Flight, priority: int):
+        """A more urgent caller joined; let the flight's queued slot request jump ahead"""
+        flight.priority = priority
+        if flight.slot_waiter is not None:
+            seq, future = flight.slot_waiter
+            if not future.done():
+                heapq.heappush(self._waiting, (priority, seq, future))
+
+    @asynccontextmanager
+    async def slot(self, priority: int = PRIORITY_INTERACTIVE):
+        """Hold one of ``max_concurrency`` upstream call slots"""
+        await self._acquire(priority)
+        try:
+            while (pause := self._resume_at - time.monotonic()) > 0:
+                await asyncio.sleep(pause)
+            yield
+        finally:
+            self._release()
+
+    async def _acquire(self, priority: int):
+        flight = _current_flight.get()
+        if flight is not None:
+            priority = min(priority, flight.priority)
+
+        while self._waiting and self._waiting[0][2].done():
+            heapq.heappop(self._waiting)  # left behind by cancelled or promoted waiters
+        if self._active < self.max_concurrency and not self._waiting:
+            self._grant()
+            return
+
+        future = asyncio.get_running_loop().create_future()
+        seq = next(self._seq)
+        heapq.heappush(self._waiting, (priority, seq, future))
+        self.stats["queued"] += 1
+        if flight is not None:
+            flight.slot_waiter = (seq, future)
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # The slot was handed over just as we were cancelled; pass it on
+                self._release()
+            raise
+        finally:
+            if flight is not None:
+                flight.slot_waiter = None
+
+    def _grant(self):
+        self._active += 1
+        self.stats["slots_granted"] += 1
+        self.stats["peak_active"] = max(self.stats["peak_active"], self._active)
+
+    def _release(self):
+        self._active -= 1
+        while self._waiting and self._active < self.max_concurrency:
+            _, _, future = heapq.heappop(self._waiting)
+            if not future.done():
+                self._grant()
+                future.set_result(None)
+
+    def cool_down(self, seconds: float):
+        """Hold back new slot grants, e.g. after a 429 from the provider"""
+        resume_at = time.monotonic() + seconds
+        if resume_at > self._resume_at:
+            self._resume_at = resume_at
+            self.stats["cool_downs"] += 1
+            logger.warning(f"LLM provider rate limited; pausing upstream calls for {seconds:.1f}s")
+
+    def get_stats(self) -> Dict[str, Any]:
+        # A promoted flight has two heap entries; count its most urgent one
+        waiting = {}
+        for priority, _, future in self._waiting:
+            if not future.done():
+                waiting[id(future)] = min(priority, waiting.get(id(future), priority))
+        waiting = list(waiting.values())
+        return {
+            **self.stats,
+            "active": self._active,
+            "max_concurrency": self.max_concurrency,
+            "in_flight": len(self._flights),
+            "waiting_interactive": sum(1 for p in waiting if p < PRIORITY_BACKGROUND),
+            "waiting_background": sum(1 for p in waiting if p >= PRIORITY_BACKGROUND),
+            "cooling_down": max(0.0, self._resume_at - time.monotonic())
+        }
+
+llm_dispatcher = LLMDispatcher()
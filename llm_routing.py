@@ -0,0 +1,244 @@
+"""
+dhii Mail - LLM Circuit Breakers and Model Routing
+Tracks the recent error rate and latency of every configured model. A model
+whose calls keep failing or crawling is taken out of rotation (circuit open)
+so chat falls through to the next model, or straight to the pattern-based
+reply, instead of waiting out retries and timeouts on every message.
+
+An open circuit is probed in the background with a tiny request; user
+messages never serve as probes.
+"""
+
+import time
+import asyncio
+import logging
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+_BREAKER_OPTIONS = ("window_seconds", "min_calls", "failure_threshold", "consecutive_failures",
+                    "slow_call_seconds", "open_seconds", "max_open_seconds")
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+class CircuitBreaker:
+    """Rolling-window circuit breaker for one upstream model.
+
+    Calls slower than ``slow_call_seconds`` count against the model like
+    failures; rate limiting (429) is not recorded at all, since the dispatcher
+    cool-down handles it and it says nothing about the model's health.
+
+    The circuit opens when at least ``min_calls`` outcomes in the last
+    ``window_seconds`` reach ``failure_threshold``, or after
+    ``consecutive_failures`` failures in a row (so a quiet worker still fails
+    fast in an outage). Each failed probe doubles the open period up to
+    ``max_open_seconds``. While the model is degraded - failing, or within a
+    window of closing after a probe - callers should cap each call at
+    ``call_timeout()``.
+    """
+
+    def __init__(self, name: str, window_seconds: float = 60.0, min_calls: int = 20,
+                 failure_threshold: float = 0.5, consecutive_failures: int = 5,
+                 slow_call_seconds: float = 10.0, open_seconds: float = 15.0,
+                 max_open_seconds: float = 300.0):
+        self.name = name
+        self.window_seconds = window_seconds
+        self.min_calls = min_calls
+        self.failure_threshold = failure_threshold
+        self.consecutive_failures = consecutive_failures
+        self.slow_call_seconds = slow_call_seconds
+        self.open_seconds = open_seconds
+        self.max_open_seconds = max_open_seconds
+        self.state = CLOSED
+        self.opened_at = 0.0
+        self.current_open_seconds = open_seconds
+        self.closed_at: Optional[float] = None
+        self.failure_streak = 0
+        self._outcomes: Deque[Tuple[float, bool, float]] = deque()
+        self.stats = {"successes": 0, "failures": 0, "slow_calls": 0, "rejected": 0, "opened": 0}
+
+    def allow(self) -> bool:
+        """Whether a user request may go to this model right now"""
+        if self.state == CLOSED:
+            return True
+        self.stats["rejected"] += 1
+        return False
+
+    def _trim(self, now: float):
+        while self._outcomes and self._outcomes[0][0] < now - self.window_seconds:
+            self._outcomes.popleft()
+
+    def record(self, ok: bool, latency: float, score_latency: bool = True) -> bool:
+        """Record one call outcome; returns True if it opened the circuit.
+
+        ``score_latency=False`` is for calls expected to be slow (background
+        batches), which count only by success or failure.
+        """
+        now = time.monotonic()
+        slow = score_latency and ok and latency >= self.slow_call_seconds
+        self.stats["successes" if ok else "failures"] += 1
+        if slow:
+            self.stats["slow_calls"] += 1
+        if self.state != CLOSED:
+            return False
+        self.failure_streak = 0 if ok else self.failure_streak + 1
+        self._outcomes.append((now, ok and not slow, latency))
+        self._trim(now)
+        calls = len(self._outcomes)
+        bad = sum(1 for _, good, _ in self._outcomes if not good)
+        if calls >= self.min_calls and bad / calls >= self.failure_threshold:
+            self._open(now, f"{bad}/{calls} failed or slow calls")
+            return True
+        if self.failure_streak >= self.consecutive_failures:
+            self._open(now, f"{self.failure_streak} failures in a row")
+            return True
+        return False
+
+    def degraded(self) -> bool:
+        """Failing right now, not closed, or recently closed after a probe"""
+        if self.state != CLOSED or self.failure_streak:
+            return True
+        return self.closed_at is not None and time.monotonic() - self.closed_at < self.window_seconds
+
+    def call_timeout(self, default: float) -> float:
+        """Deadline for one call: ``default``, cut to ``slow_call_seconds`` while degraded"""
+        return min(default, self.slow_call_seconds) if self.degraded() else default
+
+    def _open(self, now: float, reason: str):
+        self.state = OPEN
+        self.opened_at = now
+        self.stats["opened"] += 1
+        self.failure_streak = 0
+        self._outcomes.clear()
+        logger.warning(f"Circuit for {self.name} opened ({reason}); probing again in {self.current_open_seconds:.1f}s")
+
+    def probe_result(self, ok: bool):
+        """Close after a successful probe, otherwise stay open for longer"""
+        if ok:
+            self.state = CLOSED
+            self.closed_at = time.monotonic()
+            self.current_open_seconds = self.open_seconds
+            logger.info(f"Circuit for {self.name} closed after a successful probe")
+        else:
+            self.current_open_seconds = min(self.current_open_seconds * 2, self.max_open_seconds)
+            self._open(time.monotonic(), "probe failed")
+
+    def get_stats(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        self._trim(now)
+        latencies = [latency for _, good, latency in self._outcomes if good]
+        calls = len(self._outcomes)
+        return {
+            **self.stats,
+            "state": self.state,
+            "degraded": self.degraded(),
+            "failure_streak": self.failure_streak,
+            "window_calls": calls,
+            "window_error_rate": sum(1 for _, good, _ in self._outcomes if not good) / calls if calls else 0.0,
+            "avg_latency_ms": sum(latencies) / len(latencies) * 1000 if latencies else 0.0,
+            "retry_in": (max(0.0, self.opened_at + self.current_open_seconds - now)
+                         if self.state != CLOSED else 0.0)
+        }
+
+class ModelRouter:
+    """Routes each LLM call to the first configured model whose circuit is closed"""
+
+    def __init__(self, models: Optional[List[str]] = None, **breaker_options: Any):
+        self._breaker_options = breaker_options
+        self.models: List[str] = []
+        self.breakers: Dict[str, CircuitBreaker] = {}
+        self._probe: Optional[Callable[[str], Awaitable[bool]]] = None
+        self._probe_tasks: Dict[str, asyncio.Task] = {}
+        self.configure(models=models or ["meta-llama/llama-3.1-8b-instruct"])
+
+    def configure(self, models: Optional[List[str]] = None, **breaker_options: Any):
+        """Set the model list (first is primary) and breaker options"""
+        for name in breaker_options:
+            if name not in _BREAKER_OPTIONS:
+                raise ValueError(f"Unknown circuit breaker option: {name}")
+        self._breaker_options.update(breaker_options)
+        if models is not None:
+            if not models:
+                raise ValueError("At least one model must be configured")
+            self.models = list(models)
+        self.breakers = {model: CircuitBreaker(model, **self._breaker_options) for model in self.models}
+
+    @property
+    def primary(self) -> str:
+        return self.models[0]
+
+    def set_probe(self, probe: Callable[[str], Awaitable[bool]]):
+        """Coroutine used to test an open model; returns True when it answered"""
+        self._probe = probe
+
+    def breaker(self, model: str) -> CircuitBreaker:
+        if model not in self.breakers:
+            # Callers may still name a model outside the configured list
+            self.breakers[model] = CircuitBreaker(model, **self._breaker_options)
+        return self.breakers[model]
+
+    def route(self, preferred: Optional[str] = None) -> Optional[str]:
+        """Where ``pick`` would send a call, without counting a rejection or arming probes"""
+        for model in dict.fromkeys(([preferred] if preferred else []) + self.models):
+            breaker = self.breakers.get(model)
+            if breaker is None or breaker.state == CLOSED:
+                return model
+        return None
+
+    def pick(self, preferred: Optional[str] = None) -> Optional[str]:
+        """The preferred model if its circuit is closed, else the first healthy fallback"""
+        for model in dict.fromkeys(([preferred] if preferred else []) + self.models):
+            breaker = self.breaker(model)
+            if breaker.allow():
+                return model
+            # Re-arm the probe if the loop that ran it is gone
+            self._schedule_probe(model)
+        return None
+
+    def call_timeout(self, model: str, default: float) -> float:
+        return self.breaker(model).call_timeout(default)
+
+    def record(self, model: str, ok: bool, latency: float, score_latency: bool = True):
+        if self.breaker(model).record(ok, latency, score_latency):
+            self._schedule_probe(model)
+
+    def _schedule_probe(self, model: str):
+        if self._probe is None:
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return  # no loop (sync caller); nothing can probe
+        task = self._probe_tasks.get(model)
+        if task is not None and not task.done() and task.get_loop() is loop:
+            return
+        self._probe_tasks[model] = loop.create_task(self._run_probes(model))
+
+    async def _run_probes(self, model: str):
+        breaker = self.breaker(model)
+        while breaker.state != CLOSED:
+            await asyncio.sleep(breaker.current_open_seconds)
+            breaker.state = HALF_OPEN
+            try:
+                ok = await self._probe(model)
+            except Exception as e:
+                logger.debug(f"Circuit probe for {model} raised: {e}")
+                ok = False
+            breaker.probe_result(ok)
+
+    async def close(self):
+        """Stop background probes (app shutdown)"""
+        for task in self._probe_tasks.values():
+            task.cancel()
+        self._probe_tasks.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "models": list(self.models),
+            "circuits": {model: breaker.get_stats() for model, breaker in self.breakers.items()}
+        }
+
+llm_model_router = ModelRouter()
@@ -5,11 +5,13 @@ Main application entry point with authentication, email, and AI endpoints.
 
 import os
 import json
+import asyncio
 import logging
 import sqlite3
 from datetime import datetime, timezone
 from typing import Optional, Dict, Any, List
 from contextlib import asynccontextmanager
+from functools import partial
 
 from fastapi import FastAPI, HTTPException, Depends, Request, WebSocket, WebSocketDisconnect, Query
 from fastapi.middleware.cors import CORSMiddleware
@@ -29,6 +31,17 @@ from error_handler import ErrorHandler, AppError, ValidationError, Authenticatio
 
 # Import WebSocket manager
 from enhanced_websocket_manager import EnhancedWebSocketManager, ChatMessage, enhanced_websocket_manager
+from websocket_bus import WebSocketBus
+from a2ui_integration.a2ui_connections import a2ui_manager
+from websocket_codec import codec_manifest
+from realtime_topics import add_topic_sink
+from http_client_pool import shared_http_client
+from llm_cache import DEFAULT_CACHE_PATH, llm_response_cache
+from llm_dispatch import llm_dispatcher
+from llm_routing import llm_model_router
+from intent_classifier import local_intent_classifier
+from prompt_assembler import llm_prompt_assembler
+from email_enrichment import email_enrichment_pipeline
 
 # Import AI engine
 from ai_engine import AIEngine, ai_engine
@@ -119,11 +132,79 @@ class ChatMessageResponse(BaseModel):
     ui_components: Optional[Dict[str, Any]] = None
     actions: Optional[List[Dict[str, Any]]] = None
 
+websocket_bus: Optional[WebSocketBus] = None
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Start and stop per-worker shared resources"""
+    global websocket_bus
+    shared_http_client.configure(
+        limit=settings.llm_http_pool_size,
+        limit_per_host=settings.llm_http_pool_size_per_host,
+        keepalive_timeout=settings.llm_http_keepalive_timeout
+    )
+    await shared_http_client.start()
+    llm_dispatcher.configure(max_concurrency=settings.llm_max_concurrency)
+    llm_model_router.configure(
+        models=[m.strip() for m in settings.llm_models.split(",") if m.strip()],
+        failure_threshold=settings.llm_circuit_failure_threshold,
+        min_calls=settings.llm_circuit_min_calls,
+        consecutive_failures=settings.llm_circuit_consecutive_failures,
+        open_seconds=settings.llm_circuit_open_seconds,
+        slow_call_seconds=settings.llm_slow_call_seconds
+    )
+    ai_engine.openrouter_model = llm_model_router.primary
+    local_intent_classifier.configure(enabled=settings.ai_local_intents,
+                                      threshold=settings.ai_local_intent_threshold)
+    if local_intent_classifier.available:
+        if settings.ai_intent_model_path:
+            local_intent_classifier.load(settings.ai_intent_model_path)
+        else:
+            local_intent_classifier.fit_seed()
+    llm_prompt_assembler.configure(
+        budget_tokens=settings.llm_prompt_budget_tokens,
+        max_turn_tokens=settings.llm_prompt_max_turn_tokens
+    )
+    llm_response_cache.configure(
+        enabled=settings.llm_cache_enabled,
+        db_path=settings.llm_cache_path or DEFAULT_CACHE_PATH,
+        ttl=settings.llm_cache_ttl,
+        max_entries=settings.llm_cache_max_entries,
+        skip_intents=[i.strip() for i in settings.llm_cache_skip_intents.split(",") if i.strip()]
+    )
+    email_enrichment_pipeline.configure(
+        db_path=email_manager.db_path,
+        enabled=settings.email_enrichment_enabled,
+        interval=settings.email_enrichment_interval,
+        batch_size=settings.email_enrichment_batch_size,
+        messages_per_request=settings.email_enrichment_messages_per_request,
+        max_request_tokens=settings.email_enrichment_max_request_tokens,
+        concurrency=settings.email_enrichment_concurrency
+    )
+    if settings.email_enrichment_enabled:
+        email_enrichment_pipeline.start()
+    if settings.ws_bus_socket:
+        websocket_bus = WebSocketBus(settings.ws_bus_socket)
+        await websocket_bus.start()
+        enhanced_websocket_manager.attach_bus(websocket_bus)
+        a2ui_manager.attach_bus(websocket_bus)
+    try:
+        yield
+    finally:
+        if websocket_bus is not None:
+            await websocket_bus.stop()
+            websocket_bus = None
+        await email_enrichment_pipeline.stop()
+        await llm_model_router.close()
+        await shared_http_client.close()
+        llm_response_cache.flush()
+
 # Create FastAPI application
 app = FastAPI(
     title="dhii Mail",
     description="AI-powered email management system",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # Import configuration
@@ -266,6 +347,13 @@ async def health_check():
                 "connected": True,
                 "stats": stats
             },
+            "llm_http_pool": shared_http_client.get_stats(),
+            "llm_cache": llm_response_cache.get_stats(),
+            "llm_dispatch": llm_dispatcher.get_stats(),
+            "llm_routing": llm_model_router.get_stats(),
+            "local_intents": local_intent_classifier.get_stats(),
+            "llm_prompts": llm_prompt_assembler.get_stats(),
+            "email_enrichment": email_enrichment_pipeline.get_stats(),
             "timestamp": datetime.now(timezone.utc).isoformat()
         }
         
@@ -1041,10 +1129,261 @@ async def chat_authenticate(request: ChatAuthRequest):
             session_id=request.session_id
         )
 
+# Re-challenge websocket clients when their token is revoked
+auth_manager.add_revocation_listener(enhanced_websocket_manager.revoke_identity)
+# Deliver mailbox, calendar and plugin changes to subscribed websocket clients
+add_topic_sink(enhanced_websocket_manager.publish_topic)
+
+async def authenticate_websocket_connection(client_id: str, access_token: str) -> bool:
+    """Verify a token once and bind the identity to the websocket connection."""
+    try:
+        token_data = auth_manager.verify_token(access_token)
+    except Exception as e:
+        logger.warning(f"Token verification failed for {client_id}: {e}")
+        return False
+    
+    if not token_data:
+        enhanced_websocket_manager.clear_identity(client_id, "invalid_token")
+        return False
+    
+    payload = token_data['token_payload']
+    bound = enhanced_websocket_manager.bind_identity(
+        client_id,
+        payload['user_id'],
+        payload['token_id'],
+        datetime.fromisoformat(payload['expires_at']),
+        access_token
+    )
+    if bound:
+        # Load the bound user's roles now, off the event loop, so their first message hits the cache
+        await asyncio.to_thread(auth_manager.warm_user_permissions, [payload['user_id']])
+    return bound
+
+def authorize_topic(user_id: Optional[str], topic: str) -> bool:
+    """Whether an authenticated user may subscribe to a realtime topic"""
+    if user_id is None:
+        return False
+    kind, _, rest = topic.partition(":")
+    if kind == "calendar":
+        return rest == str(user_id)
+    if kind == "mailbox":
+        account_id, _, folder = rest.partition(":")
+        if not folder:
+            return False
+        try:
+            accounts = email_manager.get_email_accounts(int(user_id))
+        except (TypeError, ValueError):
+            return False
+        return any(str(account.id) == account_id for account in accounts)
+    if kind == "plugin" or topic == "plugins":
+        return True
+    return False
+
+async def handle_topic_request(connection, client_id: str, message_data: Dict[str, Any]):
+    """Apply a ``subscribe``/``unsubscribe`` request and report the outcome"""
+    topics = message_data.get("topics") or []
+    if isinstance(topics, str):
+        topics = [topics]
+    subscribed, rejected = [], []
+    for topic in topics:
+        topic = str(topic)
+        if message_data["type"] == "unsubscribe":
+            enhanced_websocket_manager.unsubscribe_topic(client_id, topic)
+            continue
+        if not connection.has_valid_identity() or not authorize_topic(connection.user_id, topic):
+            rejected.append(topic)
+            continue
+        try:
+            enhanced_websocket_manager.subscribe_topic(client_id, topic)
+            subscribed.append(topic)
+        except ValueError as e:
+            logger.warning(f"Topic subscription rejected for {client_id}: {e}")
+            rejected.append(topic)
+    
+    await connection.send_message({
+        "type": "subscription_update",
+        "subscribed": subscribed,
+        "rejected": rejected,
+        "topics": sorted(enhanced_websocket_manager.topics.topics_for(client_id)),
+        "timestamp": datetime.now(timezone.utc).isoformat()
+    })
+
+async def run_ai_turn(connection, client_id: str, chat_request: ChatMessageRequest,
+                      user_id: Optional[str], is_authenticated: bool, reply_to: Optional[str] = None):
+    """Generate and send the AI reply to one chat message.
+    
+    Runs as a task of ``enhanced_websocket_manager.turns`` so the socket keeps
+    receiving (cancels, pongs, new prompts) while the model call is in flight.
+    """
+    try:
+        # Create context for AI
+        ai_context = {
+            "client_id": client_id,
+            "session_id": chat_request.session_id,
+            "user_id": user_id,
+            "is_authenticated": is_authenticated,
+            # Only the authenticated owner's own session reaches the prompt
+            "message_history": [
+                {
+                    "sender": msg.sender,
+                    "content": msg.content,
+                    "timestamp": msg.created_at.isoformat()
+                }
+                for msg in await enhanced_websocket_manager.get_session_messages(chat_request.session_id, user_id, 10)
+            ]
+        }
+        
+        ai_message_id = f"msg_ai_{datetime.now(timezone.utc).timestamp()}"
+        stream = None
+        if settings.ai_streaming and ai_engine.use_openrouter:
+            # Tokens reach the client as they are generated; the final
+            # ai_message below still carries the validated full reply
+            stream = ai_engine.stream_message(chat_request.message, ai_context)
+            await forward_ai_stream(connection, stream, ai_message_id, chat_request.session_id, reply_to)
+            ai_response = stream.response
+        else:
+            # Get AI response
+            ai_response = await ai_engine.process_message(chat_request.message, ai_context)
+        
+        # Create AI message
+        ai_message = ChatMessage(
+            id=ai_message_id,
+            sender="ai",
+            content=ai_response.message,
+            timestamp=datetime.now(timezone.utc),
+            session_id=chat_request.session_id,
+            metadata={
+                "intent": ai_response.intent.intent,
+                "confidence": ai_response.intent.confidence,
+                "entities": ai_response.intent.entities,
+                "prompt_tokens": ai_response.prompt_tokens
+            }
+        )
+        
+        # Add to message history
+        ai_record = enhanced_websocket_manager.add_message(chat_request.session_id, ai_message)
+        
+        # Send AI response
+        response_data = {
+            "type": "ai_message",
+            "message": ai_message.content,
+            "sender": ai_message.sender,
+            "timestamp": ai_message.timestamp.isoformat(),
+            "message_id": ai_message.id,
+            "seq": ai_record.seq,
+            "session_id": ai_message.session_id,
+            "intent": ai_response.intent.intent,
+            "confidence": ai_response.intent.confidence,
+            "requires_input": ai_response.requires_user_input,
+            "reply_to": reply_to
+        }
+        if stream is not None:
+            response_data["streamed"] = stream.streamed
+            # The deltas were discarded in favour of a fallback reply
+            response_data["replaces_deltas"] = stream.replaced
+        
+        # Add actions if available
+        if ai_response.actions:
+            response_data["actions"] = ai_response.actions
+        
+        # Add UI components if available
+        if ai_response.ui_components:
+            response_data["ui_components"] = ai_response.ui_components
+        
+        await connection.send_message(response_data)
+        
+        # Log AI response for debugging
+        logger.info(f"AI response to {client_id}: {ai_response.message[:50]}... (intent: {ai_response.intent.intent})")
+        
+    except Exception as e:
+        logger.error(f"AI processing error for {client_id}: {e}")
+        await connection.send_message({
+            "type": "error",
+            "message": "Sorry, I encountered an error processing your message. Please try again.",
+            "timestamp": datetime.now(timezone.utc).isoformat()
+        })
+
+# Tokens arriving within this window after a flush share one delta frame
+AI_DELTA_FLUSH_INTERVAL = 0.04
+
+async def forward_ai_stream(connection, stream, message_id: str, session_id: str, reply_to: Optional[str]):
+    """Relay streamed tokens as ``ai_message_delta`` frames.
+    
+    The first token goes out immediately; later ones are batched per
+    AI_DELTA_FLUSH_INTERVAL so fast models don't cost a frame per token.
+    """
+    index = 0
+    pending: List[str] = []
+    last_flush = 0.0
+    
+    async def flush():
+        nonlocal index, last_flush
+        await connection.send_message({
+            "type": "ai_message_delta",
+            "message_id": message_id,
+            "reply_to": reply_to,
+            "session_id": session_id,
+            "index": index,
+            "delta": "".join(pending)
+        })
+        index += 1
+        pending.clear()
+        last_flush = asyncio.get_running_loop().time()
+    
+    async for token in stream:
+        pending.append(token)
+        if asyncio.get_running_loop().time() - last_flush >= AI_DELTA_FLUSH_INTERVAL:
+            await flush()
+    if pending:
+        await flush()
+
+def turn_user_key(connection, client_id: str) -> str:
+    """Key for the per-user AI turn cap; anonymous sockets are capped individually"""
+    if connection.has_valid_identity():
+        return f"user:{connection.user_id}"
+    return f"client:{client_id}"
+
+async def send_cancelled_turns(connection, turns):
+    """Tell the client which of its prompts will not get a reply"""
+    for turn in turns:
+        await connection.send_message({
+            "type": "ai_cancelled",
+            "reply_to": turn.turn_id,
+            "session_id": turn.session_id,
+            "reason": turn.cancel_reason,
+            "timestamp": datetime.now(timezone.utc).isoformat()
+        })
+
 # Enhanced WebSocket endpoint for real-time chat
 @app.websocket("/ws/{client_id}")
 async def websocket_endpoint(websocket: WebSocket, client_id: str):
-    """Enhanced WebSocket endpoint for real-time chat with AI integration."""
+    """Enhanced WebSocket endpoint for real-time chat with AI integration.
+    
+    Clients authenticate once, either with a ``token`` query parameter at the
+    handshake or with ``access_token`` on the first message. The identity stays
+    bound to the connection until the token expires or is revoked, at which
+    point the server sends ``auth_required``.
+    
+    Reconnecting clients resume a chat with ``session_id`` and ``since`` (the
+    last ``seq`` they saw) as query parameters, or by sending
+    ``{"type": "resume", "session_id": ..., "since": ...}``; the server replies
+    with a single ``history_delta`` frame holding only the missed messages.
+    
+    AI replies are produced off the receive loop, in order per session, and
+    stream as ``ai_message_delta`` frames before the final ``ai_message``. A new
+    message supersedes the session's unanswered ones, and
+    ``{"type": "cancel", "session_id": ...}`` stops them; either way the client
+    gets ``ai_cancelled`` with ``reply_to`` set to the dropped message id.
+    
+    Payloads are JSON text unless the client offers one of the ``dhii.*``
+    subprotocols listed by ``/ws/codec`` (MessagePack and/or deflate).
+    
+    Authenticated clients receive targeted updates by sending
+    ``{"type": "subscribe", "topics": [...]}`` (and ``unsubscribe``) for
+    ``mailbox:{account_id}:{folder}``, ``calendar:{user_id}``, ``plugins`` or
+    ``plugin:{plugin_id}``; changes arrive as ``mailbox_update``,
+    ``calendar_update`` and ``plugin_update`` frames carrying the topic.
+    """
     
     # Generate session ID for this connection
     session_id = f"ws_{client_id}_{datetime.now(timezone.utc).strftime('%Y%m%d_%H%M%S')}"
@@ -1052,6 +1391,18 @@ async def websocket_endpoint(websocket: WebSocket, client_id: str):
     # Establish connection through enhanced WebSocket manager
     connection = await enhanced_websocket_manager.connect(websocket, client_id, session_id)
     
+    handshake_token = websocket.query_params.get("token")
+    if handshake_token:
+        await authenticate_websocket_connection(client_id, handshake_token)
+    
+    resume_session = websocket.query_params.get("session_id")
+    if resume_session:
+        try:
+            since_seq = int(websocket.query_params.get("since", 0))
+        except ValueError:
+            since_seq = 0
+        await enhanced_websocket_manager.replay_history(client_id, resume_session, since_seq)
+    
     try:
         # Send initial connection message
         await connection.send_message({
@@ -1070,6 +1421,34 @@ async def websocket_endpoint(websocket: WebSocket, client_id: str):
             message_data = await connection.receive_message()
             
             if not message_data:
+                if not connection.state.connected:
+                    await enhanced_websocket_manager.disconnect(client_id)
+                    break
+                continue
+            
+            # Delta replay for clients reconnecting to an existing session
+            if message_data.get("type") == "resume":
+                try:
+                    since_seq = int(message_data.get("since") or 0)
+                except (TypeError, ValueError):
+                    since_seq = 0
+                if message_data.get("session_id"):
+                    await enhanced_websocket_manager.replay_history(
+                        client_id, str(message_data["session_id"]), since_seq
+                    )
+                continue
+            
+            # Stop the AI turns of a session, e.g. a long OpenRouter call
+            if message_data.get("type") == "cancel":
+                if message_data.get("session_id"):
+                    await send_cancelled_turns(connection, enhanced_websocket_manager.turns.cancel_session(
+                        str(message_data["session_id"]), "cancelled", turn_user_key(connection, client_id)
+                    ))
+                continue
+            
+            # Topic subscriptions for targeted realtime updates
+            if message_data.get("type") in ("subscribe", "unsubscribe"):
+                await handle_topic_request(connection, client_id, message_data)
                 continue
             
             # Parse message
@@ -1087,18 +1466,22 @@ async def websocket_endpoint(websocket: WebSocket, client_id: str):
             # Process user message
             logger.info(f"Processing message from {client_id}: {chat_request.message[:50]}...")
             
-            # Check authentication if token provided
-            user_id = None
-            is_authenticated = False
-            if chat_request.access_token:
-                try:
-                    token_data = auth_manager.verify_token(chat_request.access_token)
-                    if token_data:
-                        user_id = token_data.get('user_id')
-                        is_authenticated = True
-                        enhanced_websocket_manager.update_user_authentication(client_id, user_id, True)
-                except Exception as e:
-                    logger.warning(f"Token verification failed for {client_id}: {e}")
+            # Authenticate only when no identity is bound yet, it expired, or the token changed
+            if chat_request.access_token and not connection.has_valid_identity(chat_request.access_token):
+                await authenticate_websocket_connection(client_id, chat_request.access_token)
+            
+            is_authenticated = connection.has_valid_identity()
+            user_id = connection.user_id if is_authenticated else None
+            
+            # A session written by another user is neither appended to nor read into the prompt
+            if not await enhanced_websocket_manager.claim_session(chat_request.session_id, user_id):
+                await connection.send_message({
+                    "type": "error",
+                    "message": "This chat session belongs to another user. Please start a new session.",
+                    "session_id": chat_request.session_id,
+                    "timestamp": datetime.now(timezone.utc).isoformat()
+                })
+                continue
             
             # Send user message acknowledgment
             user_message = ChatMessage(
@@ -1111,7 +1494,7 @@ async def websocket_endpoint(websocket: WebSocket, client_id: str):
             )
             
             # Add to message history
-            enhanced_websocket_manager.add_message(chat_request.session_id, user_message)
+            user_record = enhanced_websocket_manager.add_message(chat_request.session_id, user_message)
             
             # Echo user message back (with proper formatting)
             await connection.send_message({
@@ -1120,80 +1503,31 @@ async def websocket_endpoint(websocket: WebSocket, client_id: str):
                 "sender": user_message.sender,
                 "timestamp": user_message.timestamp.isoformat(),
                 "message_id": user_message.id,
+                "seq": user_record.seq,
                 "session_id": user_message.session_id
             })
             
-            # Process with AI engine
+            # Process with AI engine outside the receive loop; a newer message in the
+            # same session supersedes turns still queued or running for it
+            turn_id = user_message.id
             try:
-                # Create context for AI
-                ai_context = {
-                    "client_id": client_id,
-                    "session_id": chat_request.session_id,
-                    "user_id": user_id,
-                    "is_authenticated": is_authenticated,
-                    "message_history": [
-                        {
-                            "sender": msg.sender,
-                            "content": msg.content,
-                            "timestamp": msg.timestamp.isoformat()
-                        }
-                        for msg in enhanced_websocket_manager.get_session_messages(chat_request.session_id)[-10:]
-                    ]
-                }
-                
-                # Get AI response
-                ai_response = await ai_engine.process_message(chat_request.message, ai_context)
-                
-                # Create AI message
-                ai_message = ChatMessage(
-                    id=f"msg_ai_{datetime.now(timezone.utc).timestamp()}",
-                    sender="ai",
-                    content=ai_response.message,
-                    timestamp=datetime.now(timezone.utc),
-                    session_id=chat_request.session_id,
-                    metadata={
-                        "intent": ai_response.intent.intent,
-                        "confidence": ai_response.intent.confidence,
-                        "entities": ai_response.intent.entities
-                    }
+                superseded = enhanced_websocket_manager.turns.submit(
+                    chat_request.session_id,
+                    turn_user_key(connection, client_id),
+                    client_id,
+                    turn_id,
+                    partial(run_ai_turn, connection, client_id, chat_request, user_id, is_authenticated, turn_id)
                 )
-                
-                # Add to message history
-                enhanced_websocket_manager.add_message(chat_request.session_id, ai_message)
-                
-                # Send AI response
-                response_data = {
-                    "type": "ai_message",
-                    "message": ai_message.content,
-                    "sender": ai_message.sender,
-                    "timestamp": ai_message.timestamp.isoformat(),
-                    "message_id": ai_message.id,
-                    "session_id": ai_message.session_id,
-                    "intent": ai_response.intent.intent,
-                    "confidence": ai_response.intent.confidence,
-                    "requires_input": ai_response.requires_user_input
-                }
-                
-                # Add actions if available
-                if ai_response.actions:
-                    response_data["actions"] = ai_response.actions
-                
-                # Add UI components if available
-                if ai_response.ui_components:
-                    response_data["ui_components"] = ai_response.ui_components
-                
-                await connection.send_message(response_data)
-                
-                # Log AI response for debugging
-                logger.info(f"AI response to {client_id}: {ai_response.message[:50]}... (intent: {ai_response.intent.intent})")
-                
-            except Exception as e:
-                logger.error(f"AI processing error for {client_id}: {e}")
+            except ValueError as e:
+                logger.warning(f"AI turn rejected for {client_id}: {e}")
                 await connection.send_message({
                     "type": "error",
-                    "message": "Sorry, I encountered an error processing your message. Please try again.",
+                    "message": "Too many requests in progress. Please wait for the current replies.",
+                    "reply_to": turn_id,
                     "timestamp": datetime.now(timezone.utc).isoformat()
                 })
+                continue
+            await send_cancelled_turns(connection, superseded)
             
     except WebSocketDisconnect:
         logger.info(f"WebSocket client disconnected: {client_id}")
@@ -1207,12 +1541,20 @@ async def websocket_endpoint(websocket: WebSocket, client_id: str):
         except:
             pass
 
+# WebSocket codec negotiation details
+@app.get("/ws/codec")
+async def get_websocket_codec():
+    """Subprotocols and deflate dictionaries for binary websocket encodings"""
+    return codec_manifest()
+
 # WebSocket status endpoint
 @app.get("/ws/status")
 async def get_websocket_status():
     """Get WebSocket connection status and statistics"""
     try:
         stats = enhanced_websocket_manager.get_connection_stats()
+        if websocket_bus is not None:
+            stats["bus"] = websocket_bus.get_stats()
         return {
             "success": True,
             "status": stats,
@@ -2113,16 +2455,74 @@ async def send_email(
             content=error.to_dict()
         )
 
-# AI endpoints (placeholder)
+# AI endpoints
+class EmailAIRequest(BaseModel):
+    email_id: int
+
+async def _email_enrichment(email_id: int, user_id: int) -> Dict[str, Any]:
+    """Precomputed AI fields of an email, enriching it first if the pipeline has not reached it yet"""
+    enrichment = email_enrichment_pipeline.get_enrichment(user_id, email_id)
+    if enrichment is None:
+        raise ResourceNotFoundError("Email not found")
+    if enrichment["enriched_at"] is None:
+        await email_enrichment_pipeline.enrich_messages(user_id, [email_id])
+        enrichment = email_enrichment_pipeline.get_enrichment(user_id, email_id)
+    return enrichment
+
 @app.post("/ai/summarize")
-async def summarize_email():
-    """Summarize email content."""
-    return {"message": "AI summarize endpoint - coming soon"}
+async def summarize_email(
+    request: EmailAIRequest,
+    current_user: dict = Depends(get_current_user)
+):
+    """Summary of an email, precomputed by the enrichment pipeline."""
+    try:
+        enrichment = await _email_enrichment(request.email_id, current_user['id'])
+        return {
+            "success": True,
+            "email_id": request.email_id,
+            "summary": enrichment["summary"],
+            "enriched": enrichment["enriched_at"] is not None
+        }
+    except ResourceNotFoundError as e:
+        error = ErrorHandler.handle_error(e, {"endpoint": "summarize_email", "user_id": current_user.get('id')})
+        return JSONResponse(
+            status_code=404,
+            content=error.to_dict()
+        )
+    except Exception as e:
+        error = ErrorHandler.handle_error(e, {"endpoint": "summarize_email", "user_id": current_user.get('id')})
+        return JSONResponse(
+            status_code=500,
+            content=error.to_dict()
+        )
 
 @app.post("/ai/classify")
-async def classify_email():
-    """Classify email content."""
-    return {"message": "AI classify endpoint - coming soon"}
+async def classify_email(
+    request: EmailAIRequest,
+    current_user: dict = Depends(get_current_user)
+):
+    """Categories and sentiment of an email, precomputed by the enrichment pipeline."""
+    try:
+        enrichment = await _email_enrichment(request.email_id, current_user['id'])
+        return {
+            "success": True,
+            "email_id": request.email_id,
+            "categories": enrichment["categories"],
+            "sentiment": enrichment["sentiment"],
+            "enriched": enrichment["enriched_at"] is not None
+        }
+    except ResourceNotFoundError as e:
+        error = ErrorHandler.handle_error(e, {"endpoint": "classify_email", "user_id": current_user.get('id')})
+        return JSONResponse(
+            status_code=404,
+            content=error.to_dict()
+        )
+    except Exception as e:
+        error = ErrorHandler.handle_error(e, {"endpoint": "classify_email", "user_id": current_user.get('id')})
+        return JSONResponse(
+            status_code=500,
+            content=error.to_dict()
+        )
 
 # Calendar endpoints
 @app.post("/calendar/events")
@@ -2502,21 +2902,29 @@ async def get_security_events(
     user_email: Optional[str] = None,
     event_type: Optional[str] = None,
     severity: Optional[str] = None,
-    limit: int = 100,
+    cursor: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=1000),
     current_user: dict = Depends(get_current_user)
 ):
-    """Get security events (admin only) with standardized error handling."""
+    """Get a page of security events (admin only) with standardized error handling.
+    
+    Pass the returned ``next_cursor`` back as ``cursor`` to fetch the next page.
+    """
     try:
         # Check if user is admin (simplified check - in production, use proper role management)
         if current_user.get('email') != 'admin@dhii.ai':
             raise AuthorizationError("Admin access required")
         
-        events = security_manager.get_security_events(
-            user_email=user_email,
-            event_type=event_type,
-            severity=severity,
-            limit=limit
-        )
+        try:
+            events, next_cursor = security_manager.get_security_events_page(
+                user_email=user_email,
+                event_type=event_type,
+                severity=severity,
+                cursor=cursor,
+                limit=limit
+            )
+        except ValueError as e:
+            raise ValidationError(str(e))
         
         return {
             "success": True,
@@ -2532,7 +2940,8 @@ async def get_security_events(
                 }
                 for event in events
             ],
-            "total": len(events)
+            "total": len(events),
+            "next_cursor": next_cursor
         }
         
     except AuthorizationError as e:
@@ -2541,6 +2950,12 @@ async def get_security_events(
             status_code=403,
             content=error.to_dict()
         )
+    except ValidationError as e:
+        error = ErrorHandler.handle_error(e, {"endpoint": "get_security_events", "user_id": current_user.get('id')})
+        return JSONResponse(
+            status_code=400,
+            content=error.to_dict()
+        )
     except Exception as e:
         error = ErrorHandler.handle_error(e, {"endpoint": "get_security_events", "user_id": current_user.get('id')})
         return JSONResponse(
@@ -2552,7 +2967,7 @@ async def get_security_events(
 async def get_security_summary(
     current_user: dict = Depends(get_current_user)
 ):
-    """Get security summary statistics with standardized error handling."""
+    """Get security summary statistics (served from hourly rollups) with standardized error handling."""
     try:
         summary = security_manager.get_security_summary()
         return {
@@ -2664,7 +3079,8 @@ if __name__ == "__main__":
         host="0.0.0.0",
         port=8005,
         reload=True,
-        log_level="info"
+        log_level="info",
+        ws_per_message_deflate=settings.ws_per_message_deflate
     )
 
 # A2UI Meeting Assistant Integration
@@ -0,0 +1,206 @@
+"""
+dhii Mail - Token-Budgeted Prompt Assembly
+Builds the chat-completions messages for one LLM turn. The static part of the
+system prompt (persona and response guidelines) is assembled once and its
+token estimate memoized; per-turn facts (user, time, account status) go after
+it so the shared prefix stays byte-identical across requests. Conversation
+history is added newest first until the token budget is spent, and turns that
+do not fit are folded into a one-line summary instead of being dropped
+silently.
+
+Token counts are estimates (about four characters per token plus a small
+per-message overhead), which is close enough for budgeting without shipping
+the provider's tokenizer.
+"""
+
+import math
+import logging
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+CHARS_PER_TOKEN = 4
+MESSAGE_OVERHEAD_TOKENS = 4  # role and separators per chat message
+SUMMARY_TOKENS = 60  # held back for the summary of turns that do not fit
+
+_OPTIONS = ("budget_tokens", "max_turn_tokens", "max_history_turns")
+
+def estimate_tokens(text: str) -> int:
+    """Approximate token count of ``text``"""
+    return math.ceil(len(text) / CHARS_PER_TOKEN) if text else 0
+
+def _message_tokens(content: str) -> int:
+    return estimate_tokens(content) + MESSAGE_OVERHEAD_TOKENS
+
+def _clip(text: str, max_tokens: int) -> str:
+    """Cut ``text`` to roughly ``max_tokens``, on a word boundary where possible"""
+    limit = max_tokens * CHARS_PER_TOKEN
+    if len(text) <= limit:
+        return text
+    clipped = text[:limit - 1]
+    if " " in clipped[limit // 2:]:
+        clipped = clipped[:clipped.rindex(" ")]
+    return clipped.rstrip() + "…"
+
+@dataclass
+class AssembledPrompt:
+    """Messages for one LLM call and how the token budget was spent"""
+    messages: List[Dict[str, str]]
+    tokens: int
+    budget: int
+    system_tokens: int
+    history_tokens: int
+    user_tokens: int
+    history_kept: int = 0
+    history_summarized: int = 0
+    history_dropped: int = 0
+
+    @property
+    def over_budget(self) -> bool:
+        return self.tokens > self.budget
+
+    def as_dict(self) -> Dict[str, int]:
+        return {
+            "prompt_tokens": self.tokens,
+            "budget": self.budget,
+            "system_tokens": self.system_tokens,
+            "history_tokens": self.history_tokens,
+            "user_tokens": self.user_tokens,
+            "history_kept": self.history_kept,
+            "history_summarized": self.history_summarized,
+            "history_dropped": self.history_dropped
+        }
+
+class PromptAssembler:
+    """Assembles budgeted prompts around a memoized static system prefix.
+
+    ``budget_tokens`` covers the whole prompt (system, history and the new
+    message); a single history turn is clipped to ``max_turn_tokens`` and at
+    most ``max_history_turns`` recent turns are considered at all.
+    """
+
+    def __init__(self, budget_tokens: int = 1500, max_turn_tokens: int = 200, max_history_turns: int = 10):
+        self.budget_tokens = budget_tokens
+        self.max_turn_tokens = max_turn_tokens
+        self.max_history_turns = max_history_turns
+        self._prefixes: Dict[Tuple[str, str], Tuple[str, int]] = {}
+        self.stats = {"prompts": 0, "prompt_tokens": 0, "max_prompt_tokens": 0,
+                      "history_summarized": 0, "history_dropped": 0, "over_budget": 0}
+
+    def configure(self, **options):
+        for name, value in options.items():
+            if name not in _OPTIONS:
+                raise ValueError(f"Unknown prompt assembler option: {name}")
+            setattr(self, name, value)
+
+    def static_prefix(self, base_prompt: str, guidelines: str) -> Tuple[str, int]:
+        """The static system prefix and its token estimate, built once per prompt text"""
+        key = (base_prompt, guidelines)
+        prefix = self._prefixes.get(key)
+        if prefix is None:
+            text = f"{base_prompt.rstrip()}\n\n{guidelines.strip()}"
+            prefix = (text, estimate_tokens(text))
+            self._prefixes[key] = prefix
+        return prefix
+
+    def assemble(self, base_prompt: str, guidelines: str, dynamic_context: str, message: str,
+                 history: Optional[List[Dict[str, str]]] = None) -> AssembledPrompt:
+        """Messages for ``message`` within the budget.
+
+        ``history`` holds prior turns oldest first as {"role", "content"}
+        dicts; the new message is always included, even over budget.
+        """
+        prefix, prefix_tokens = self.static_prefix(base_prompt, guidelines)
+        dynamic = f"\n\nCurrent Context: {dynamic_context}" if dynamic_context else ""
+        system_tokens = prefix_tokens + estimate_tokens(dynamic) + MESSAGE_OVERHEAD_TOKENS
+        user_tokens = _message_tokens(message)
+        remaining = self.budget_tokens - system_tokens - user_tokens
+
+        turns = (history or [])[-self.max_history_turns:] if self.max_history_turns > 0 else []
+        dropped = len(history or []) - len(turns)
+        clipped = [_clip(turn["content"], self.max_turn_tokens) for turn in turns]
+        costs = [_message_tokens(content) for content in clipped]
+        # When not everything fits, leave room to summarize what gets cut
+        reserve = SUMMARY_TOKENS if sum(costs) > remaining else 0
+        remaining -= reserve
+
+        # Newest turns first, while they fit
+        kept: List[Dict[str, str]] = []
+        history_tokens = 0
+        for index in range(len(turns) - 1, -1, -1):
+            if costs[index] > remaining:
+                break
+            kept.append({"role": turns[index]["role"], "content": clipped[index]})
+            remaining -= costs[index]
+            history_tokens += costs[index]
+        kept.reverse()
+        remaining += reserve
+
+        older = turns[:len(turns) - len(kept)]
+        summarized = 0
+        if older:
+            summary, summarized = self._summarize(older, remaining)
+            if summary:
+                dynamic += summary
+                cost = estimate_tokens(summary)
+                system_tokens += cost
+                remaining -= cost
+            dropped += len(older) - summarized
+
+        messages = [{"role": "system", "content": prefix + dynamic}, *kept, {"role": "user", "content": message}]
+        prompt = AssembledPrompt(
+            messages=messages,
+            tokens=system_tokens + history_tokens + user_tokens,
+            budget=self.budget_tokens,
+            system_tokens=system_tokens,
+            history_tokens=history_tokens,
+            user_tokens=user_tokens,
+            history_kept=len(kept),
+            history_summarized=summarized,
+            history_dropped=dropped
+        )
+        self._record(prompt)
+        return prompt
+
+    @staticmethod
+    def _summarize(turns: List[Dict[str, str]], budget: int) -> Tuple[str, int]:
+        """One line naming the earlier user requests, newest kept first if space runs out"""
+        requests = [turn for turn in turns if turn["role"] == "user"]
+        lead = "\nEarlier in this conversation the user asked: "
+        budget -= estimate_tokens(lead)
+        topics: List[str] = []
+        for turn in reversed(requests):
+            topic = _clip(" ".join(turn["content"].split()), 12)
+            cost = estimate_tokens(topic) + 1
+            if cost > budget:
+                break
+            topics.insert(0, topic)
+            budget -= cost
+        if not topics:
+            return "", 0
+        # Assistant turns between summarized requests are covered by the summary too
+        oldest = requests[len(requests) - len(topics)]
+        first = next(index for index, turn in enumerate(turns) if turn is oldest)
+        return lead + "; ".join(topics), len(turns) - first
+
+    def _record(self, prompt: AssembledPrompt):
+        self.stats["prompts"] += 1
+        self.stats["prompt_tokens"] += prompt.tokens
+        self.stats["max_prompt_tokens"] = max(self.stats["max_prompt_tokens"], prompt.tokens)
+        self.stats["history_summarized"] += prompt.history_summarized
+        self.stats["history_dropped"] += prompt.history_dropped
+        if prompt.over_budget:
+            self.stats["over_budget"] += 1
+        logger.debug(f"Prompt assembled: {prompt.as_dict()}")
+
+    def get_stats(self) -> Dict[str, Any]:
+        prompts = self.stats["prompts"]
+        return {
+            **self.stats,
+            "avg_prompt_tokens": self.stats["prompt_tokens"] / prompts if prompts else 0.0,
+            "budget_tokens": self.budget_tokens,
+            "cached_prefixes": len(self._prefixes)
+        }
+
+llm_prompt_assembler = PromptAssembler()
@@ -0,0 +1,108 @@
+"""
+dhii Mail - Realtime Topics
+Topic subscription index for targeted websocket pushes, plus the publish hook
+domain managers call when something changes. Producers only depend on this
+module; the websocket manager registers itself as the delivery sink.
+"""
+
+import logging
+from typing import Any, Callable, Dict, List, Set
+
+logger = logging.getLogger(__name__)
+
+TopicSink = Callable[[str, Dict[str, Any]], None]
+
+def mailbox_topic(account_id: Any, folder: str) -> str:
+    return f"mailbox:{account_id}:{folder}"
+
+def calendar_topic(user_id: Any) -> str:
+    return f"calendar:{user_id}"
+
+def plugin_topic(plugin_id: str) -> str:
+    return f"plugin:{plugin_id}"
+
+PLUGINS_TOPIC = "plugins"
+
+class TopicRegistry:
+    """Two-way index between topics and the client ids subscribed to them"""
+
+    def __init__(self, max_topics_per_client: int = 100):
+        self.max_topics_per_client = max_topics_per_client
+        self._subscribers: Dict[str, Set[str]] = {}
+        self._client_topics: Dict[str, Set[str]] = {}
+
+    def subscribe(self, client_id: str, topic: str) -> bool:
+        """Add a subscription; True if ``topic`` had no subscribers before"""
+        topics = self._client_topics.setdefault(client_id, set())
+        if topic in topics:
+            return False
+        if len(topics) >= self.max_topics_per_client:
+            raise ValueError(f"Too many topic subscriptions (max {self.max_topics_per_client})")
+        topics.add(topic)
+        subscribers = self._subscribers.setdefault(topic, set())
+        subscribers.add(client_id)
+        return len(subscribers) == 1
+
+    def unsubscribe(self, client_id: str, topic: str) -> bool:
+        """Remove a subscription; True if ``topic`` has no subscribers left"""
+        topics = self._client_topics.get(client_id)
+        if not topics or topic not in topics:
+            return False
+        topics.discard(topic)
+        if not topics:
+            del self._client_topics[client_id]
+        subscribers = self._subscribers[topic]
+        subscribers.discard(client_id)
+        if not subscribers:
+            del self._subscribers[topic]
+            return True
+        return False
+
+    def remove_client(self, client_id: str) -> List[str]:
+        """Drop every subscription of a client; returns topics left without subscribers"""
+        emptied = []
+        for topic in self._client_topics.pop(client_id, set()):
+            subscribers = self._subscribers[topic]
+            subscribers.discard(client_id)
+            if not subscribers:
+                del self._subscribers[topic]
+                emptied.append(topic)
+        return emptied
+
+    def subscribers(self, topic: str) -> Set[str]:
+        return self._subscribers.get(topic, set())
+
+    def all_topics(self) -> List[str]:
+        return list(self._subscribers)
+
+    def topics_for(self, client_id: str) -> Set[str]:
+        return self._client_topics.get(client_id, set())
+
+    def __contains__(self, topic: str) -> bool:
+        return topic in self._subscribers
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "topics": len(self._subscribers),
+            "subscribed_clients": len(self._client_topics),
+            "subscriptions": sum(len(topics) for topics in self._client_topics.values())
+        }
+
+_sinks: List[TopicSink] = []
+
+def add_topic_sink(sink: TopicSink):
+    """Register a delivery sink (the websocket manager) for published topic events"""
+    if sink not in _sinks:
+        _sinks.append(sink)
+
+def remove_topic_sink(sink: TopicSink):
+    if sink in _sinks:
+        _sinks.remove(sink)
+
+def publish(topic: str, event: Dict[str, Any]):
+    """Publish a change to ``topic``; safe to call from any thread, no-op without sinks"""
+    for sink in _sinks:
+        try:
+            sink(topic, event)
+        except Exception as e:
+            logger.error(f"Failed to publish realtime event on {topic}: {e}")
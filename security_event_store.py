@@ -0,0 +1,259 @@
+"""
+dhii Mail - Security Event Store
+Append-only SQLite audit log for security events with batched background writes,
+cursor-paged queries and hourly rollups for dashboard summaries.
+"""
+
+import json
+import queue
+import sqlite3
+import atexit
+import logging
+import threading
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Any, Tuple
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS security_events (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    id TEXT NOT NULL,
+    timestamp REAL NOT NULL,
+    event_type TEXT NOT NULL,
+    user_email TEXT,
+    ip_address TEXT,
+    user_agent TEXT,
+    details TEXT,
+    severity TEXT NOT NULL DEFAULT 'info'
+);
+CREATE INDEX IF NOT EXISTS idx_security_events_timestamp ON security_events(timestamp);
+CREATE INDEX IF NOT EXISTS idx_security_events_user_email ON security_events(user_email, timestamp);
+CREATE INDEX IF NOT EXISTS idx_security_events_event_type ON security_events(event_type, timestamp);
+
+CREATE TABLE IF NOT EXISTS security_event_rollups (
+    bucket_hour INTEGER NOT NULL,
+    event_type TEXT NOT NULL,
+    severity TEXT NOT NULL,
+    count INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (bucket_hour, event_type, severity)
+);
+"""
+
+_INSERT_EVENT = """INSERT INTO security_events
+    (id, timestamp, event_type, user_email, ip_address, user_agent, details, severity)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?)"""
+
+_UPSERT_ROLLUP = """INSERT INTO security_event_rollups (bucket_hour, event_type, severity, count)
+    VALUES (?, ?, ?, ?)
+    ON CONFLICT(bucket_hour, event_type, severity) DO UPDATE SET count = count + excluded.count"""
+
+
+def encode_cursor(timestamp: float, seq: int) -> str:
+    """Encode a (timestamp, seq) position as an opaque page cursor."""
+    return f"{timestamp!r}:{seq}"
+
+
+def decode_cursor(cursor: str) -> Tuple[float, int]:
+    """Decode a page cursor produced by ``encode_cursor``."""
+    try:
+        timestamp, seq = cursor.rsplit(":", 1)
+        return float(timestamp), int(seq)
+    except (ValueError, AttributeError):
+        raise ValueError(f"Invalid cursor: {cursor!r}")
+
+
+class SecurityEventStore:
+    """Persistent security event log.
+
+    Writers only enqueue; a daemon thread drains the queue and commits events
+    and their hourly rollup counters in one transaction per batch. Readers use
+    a separate connection and never load more than one page into memory.
+    """
+
+    def __init__(self, db_path: str = "security_events.db", batch_size: int = 500,
+                 flush_interval: float = 0.5, max_queue_size: int = 10000):
+        self.db_path = db_path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue: "queue.Queue" = queue.Queue(maxsize=max_queue_size)
+        self._writer: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+        self._read_lock = threading.Lock()
+        self._read_conn: Optional[sqlite3.Connection] = None
+        self._schema_ready = False
+        self.dropped_events = 0
+
+    def _connect(self) -> sqlite3.Connection:
+        """Open a connection and make sure the schema exists."""
+        conn = sqlite3.connect(self.db_path, timeout=5.0, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        if not self._schema_ready:
+            conn.executescript(_SCHEMA)
+            self._schema_ready = True
+        return conn
+
+    def _ensure_writer(self):
+        """Start the background writer on first use."""
+        if self._writer is not None and self._writer.is_alive():
+            return
+        with self._start_lock:
+            if self._writer is not None and self._writer.is_alive():
+                return
+            self._writer = threading.Thread(target=self._run_writer, name="security-event-writer", daemon=True)
+            self._writer.start()
+            atexit.register(self.flush)
+
+    def append(self, event_id: str, timestamp: datetime, event_type: str, user_email: Optional[str],
+               ip_address: str, user_agent: str, details: Dict[str, Any], severity: str = "info"):
+        """Queue an event for persistence without blocking the caller."""
+        self._ensure_writer()
+        row = (
+            event_id,
+            timestamp.timestamp(),
+            event_type,
+            user_email,
+            ip_address,
+            user_agent,
+            json.dumps(details, default=str),
+            severity
+        )
+        try:
+            self._queue.put_nowait(row)
+        except queue.Full:
+            self.dropped_events += 1
+            logger.warning(f"Security event queue full, dropped event {event_type}")
+
+    def flush(self, timeout: float = 5.0) -> bool:
+        """Block until everything queued before this call has been committed."""
+        if self._writer is None or not self._writer.is_alive():
+            return True
+        done = threading.Event()
+        try:
+            self._queue.put(done, timeout=timeout)
+        except queue.Full:
+            return False
+        return done.wait(timeout)
+
+    def _run_writer(self):
+        """Drain the queue in batches until the process exits."""
+        conn = self._connect()
+        while True:
+            batch: List[tuple] = []
+            waiters: List[threading.Event] = []
+            item = self._queue.get()
+            while True:
+                if isinstance(item, threading.Event):
+                    waiters.append(item)
+                else:
+                    batch.append(item)
+                if len(batch) >= self.batch_size:
+                    break
+                try:
+                    item = self._queue.get(timeout=self.flush_interval if not waiters else 0)
+                except queue.Empty:
+                    break
+            if batch:
+                self._write_batch(conn, batch)
+            for waiter in waiters:
+                waiter.set()
+
+    def _write_batch(self, conn: sqlite3.Connection, batch: List[tuple]):
+        """Insert a batch of events and bump their rollup counters."""
+        rollups: Dict[Tuple[int, str, str], int] = {}
+        for row in batch:
+            key = (int(row[1] // 3600), row[2], row[7])
+            rollups[key] = rollups.get(key, 0) + 1
+        try:
+            with conn:
+                conn.executemany(_INSERT_EVENT, batch)
+                conn.executemany(_UPSERT_ROLLUP, [key + (count,) for key, count in rollups.items()])
+        except Exception as e:
+            logger.error(f"Failed to persist {len(batch)} security events: {e}")
+
+    def _reader(self) -> sqlite3.Connection:
+        if self._read_conn is None:
+            self._read_conn = self._connect()
+        return self._read_conn
+
+    def query(self, user_email: Optional[str] = None, event_type: Optional[str] = None,
+              severity: Optional[str] = None, cursor: Optional[str] = None,
+              limit: int = 100) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """Return one page of events, newest first, and the cursor for the next page."""
+        clauses = []
+        params: List[Any] = []
+        if user_email:
+            clauses.append("user_email = ?")
+            params.append(user_email)
+        if event_type:
+            clauses.append("event_type = ?")
+            params.append(event_type)
+        if severity:
+            clauses.append("severity = ?")
+            params.append(severity)
+        if cursor:
+            timestamp, seq = decode_cursor(cursor)
+            clauses.append("(timestamp, seq) < (?, ?)")
+            params.extend([timestamp, seq])
+
+        sql = "SELECT * FROM security_events"
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        sql += " ORDER BY timestamp DESC, seq DESC LIMIT ?"
+        params.append(limit + 1)
+
+        with self._read_lock:
+            rows = self._reader().execute(sql, params).fetchall()
+
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = encode_cursor(rows[-1]["timestamp"], rows[-1]["seq"])
+
+        events = [
+            {
+                "id": row["id"],
+                "timestamp": datetime.fromtimestamp(row["timestamp"], tz=timezone.utc),
+                "event_type": row["event_type"],
+                "user_email": row["user_email"],
+                "ip_address": row["ip_address"] or "",
+                "user_agent": row["user_agent"] or "",
+                "details": json.loads(row["details"]) if row["details"] else {},
+                "severity": row["severity"]
+            }
+            for row in rows
+        ]
+        return events, next_cursor
+
+    def rollup_counts(self, since: Optional[datetime] = None) -> Dict[Tuple[str, str], int]:
+        """Sum rollup counters by (event_type, severity), optionally from ``since`` onwards."""
+        sql = "SELECT event_type, severity, SUM(count) AS total FROM security_event_rollups"
+        params: List[Any] = []
+        if since is not None:
+            sql += " WHERE bucket_hour >= ?"
+            params.append(int(since.timestamp() // 3600))
+        sql += " GROUP BY event_type, severity"
+        with self._read_lock:
+            rows = self._reader().execute(sql, params).fetchall()
+        return {(row["event_type"], row["severity"]): row["total"] for row in rows}
+
+    def delete_before(self, cutoff: datetime) -> int:
+        """Apply retention: drop events and rollup buckets older than ``cutoff``."""
+        self.flush()
+        cutoff_ts = cutoff.timestamp()
+        with self._read_lock:
+            conn = self._reader()
+            with conn:
+                deleted = conn.execute("DELETE FROM security_events WHERE timestamp < ?", (cutoff_ts,)).rowcount
+                conn.execute("DELETE FROM security_event_rollups WHERE bucket_hour < ?", (int(cutoff_ts // 3600),))
+        return deleted
+
+    def close(self):
+        """Flush pending events and close the reader connection."""
+        self.flush()
+        with self._read_lock:
+            if self._read_conn is not None:
+                self._read_conn.close()
+                self._read_conn = None
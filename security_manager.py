@@ -3,19 +3,34 @@ dhii Mail - Security Manager
 Advanced security features for enterprise email management.
 """
 
+import os
+import html
+import json
 import hashlib
 import secrets
 import re
+import time
+import heapq
 import logging
+from array import array
+from collections import OrderedDict
+from functools import lru_cache
 from datetime import datetime, timedelta, timezone
-from typing import Dict, List, Optional, Any
+from typing import Dict, List, Optional, Any, Tuple
 from pydantic import BaseModel, EmailStr
 import jwt
 from cryptography.fernet import Fernet
 import bcrypt
+from security_event_store import SecurityEventStore
 
 logger = logging.getLogger(__name__)
 
+# Failed logins are counted over this sliding window for lockout decisions
+BRUTE_FORCE_WINDOW_MINUTES = 15
+
+# The audit log lives next to this module, not in whatever directory the process started in
+DEFAULT_EVENT_LOG_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "security_events.db")
+
 class SecurityConfig(BaseModel):
     """Security configuration settings."""
     password_min_length: int = 8
@@ -29,6 +44,7 @@ class SecurityConfig(BaseModel):
     enable_2fa: bool = False
     encryption_key_rotation_days: int = 90
     audit_log_retention_days: int = 365
+    event_log_path: str = DEFAULT_EVENT_LOG_PATH
 
 class SecurityEvent(BaseModel):
     """Security event for audit logging."""
@@ -41,24 +57,220 @@ class SecurityEvent(BaseModel):
     details: Dict[str, Any]
     severity: str = "info"  # info, warning, error, critical
 
-class LoginAttempt(BaseModel):
-    """Track login attempts for brute force protection."""
-    ip_address: str
-    email: Optional[str] = None
-    timestamp: datetime
-    success: bool
-    user_agent: str
+# A2UI component catalog: allowed properties and enum-constrained values per component type
+A2UI_COMPONENT_CATALOG: Dict[str, Dict[str, Any]] = {
+    "text": {
+        "properties": {"content", "variant", "size", "color", "align"},
+        "enums": {"variant": {"heading1", "heading2", "heading3", "body", "error"}},
+        "enum_error": "Text {name} '{value}' is not allowed"
+    },
+    "button": {
+        "properties": {"label", "variant", "size", "icon", "disabled"},
+        "enums": {"variant": {"primary", "secondary", "text", "danger"}},
+        "enum_error": "Button {name} '{value}' is not allowed"
+    },
+    "container": {"properties": {"orientation", "spacing", "alignment", "border", "border_radius"}},
+    "form": {"properties": {"fields", "submit_label", "validation"}},
+    "progress_indicator_card": {"properties": {"title", "current_step", "total_steps", "progress_percentage", "status"}},
+    "feature_card": {"properties": {"title", "description", "icon", "highlight"}},
+    "security_status_card": {"properties": {"overall_status", "security_score", "two_factor_enabled", "encryption_status", "recommendations"}}
+}
+
+# A2UI action allowlist with per-action parameter rules
+A2UI_ACTION_CATALOG: Dict[str, Dict[str, Any]] = {
+    "start_onboarding": {},
+    "submit_account_info": {"required": {"email", "password", "full_name"}},
+    "import_gmail": {"enums": {"provider": {"gmail", "outlook", "yahoo"}},
+                     "enum_error": "Import {name} '{value}' is not allowed"},
+    "import_outlook": {"enums": {"provider": {"gmail", "outlook", "yahoo"}},
+                       "enum_error": "Import {name} '{value}' is not allowed"},
+    "skip_import": {},
+    "enable_2fa": {},
+    "setup_authenticator": {},
+    "setup_sms": {},
+    "skip_2fa": {},
+    "learn_more_video": {},
+    "learn_more_marketing": {},
+    "learn_more_security": {},
+    "complete_onboarding": {},
+    "retry_import": {},
+    "view_security_details": {}
+}
+
+_A2UI_UNSAFE_PATTERN = re.compile(r'[<>"\'\\]|javascript:|on\w+\s*=', re.IGNORECASE)
+_A2UI_STRIP_CHARS = re.compile(r'[<>"\'\\]')
+_A2UI_STRIP_JAVASCRIPT = re.compile(r'javascript:', re.IGNORECASE)
+_A2UI_STRIP_HANDLERS = re.compile(r'on\w+\s*=', re.IGNORECASE)
+_A2UI_DANGEROUS_VALUE = re.compile(r'<script|javascript:|on\w+\s*=', re.IGNORECASE)
+_A2UI_MAX_STRING_LENGTH = 500
+_A2UI_ENUM_ERROR = "Value '{value}' is not allowed for '{name}'"
+_A2UI_VALIDATION_CACHE_SIZE = 4096
+
+@lru_cache(maxsize=8192)
+def _escape_a2ui_text(value: str) -> str:
+    """Escape markup in rendered A2UI text; unlike sanitizing, nothing the user reads is lost."""
+    return html.escape(value, quote=False)
+
+@lru_cache(maxsize=8192)
+def _sanitize_a2ui_string(value: str) -> str:
+    """Sanitize one A2UI string value; repeated labels and titles hit the cache."""
+    if _A2UI_UNSAFE_PATTERN.search(value) is None:
+        return value[:_A2UI_MAX_STRING_LENGTH]
+    value = _A2UI_STRIP_CHARS.sub('', value)
+    value = _A2UI_STRIP_JAVASCRIPT.sub('', value)
+    value = _A2UI_STRIP_HANDLERS.sub('', value)
+    return value[:_A2UI_MAX_STRING_LENGTH]
+
+def _sanitize_a2ui_dict(component_data: dict) -> dict:
+    """Sanitize one dict into a fresh copy the caller is free to mutate."""
+    sanitized_data = {}
+    
+    for key, value in component_data.items():
+        if isinstance(value, str):
+            sanitized_data[key] = _sanitize_a2ui_string(value)
+        elif isinstance(value, dict):
+            sanitized_data[key] = _sanitize_a2ui_dict(value)
+        elif isinstance(value, list):
+            sanitized_data[key] = [
+                _sanitize_a2ui_dict(item) if isinstance(item, dict) else item
+                for item in value
+            ]
+        else:
+            sanitized_data[key] = value
+    
+    return sanitized_data
+
+class _CompiledA2UIRule:
+    """Validator compiled once from a catalog entry."""
+    __slots__ = ("name", "allowed", "enums", "enum_error", "required")
+
+    def __init__(self, name: str, entry: Dict[str, Any]):
+        self.name = name
+        self.allowed = frozenset(entry["properties"]) if "properties" in entry else None
+        self.enums = tuple((key, frozenset(values)) for key, values in entry.get("enums", {}).items())
+        self.enum_error = entry.get("enum_error", _A2UI_ENUM_ERROR)
+        self.required = frozenset(entry.get("required", ()))
+
+    def enum_errors(self, values: dict) -> List[str]:
+        return [self.enum_error.format(name=key, value=values[key])
+                for key, allowed_values in self.enums
+                if key in values and values[key] not in allowed_values]
+
+def _compile_a2ui_rules(catalog: Dict[str, Dict[str, Any]]) -> Dict[str, _CompiledA2UIRule]:
+    return {name: _CompiledA2UIRule(name, entry) for name, entry in catalog.items()}
+
+_A2UI_COMPONENT_RULES = _compile_a2ui_rules(A2UI_COMPONENT_CATALOG)
+_A2UI_ACTION_RULES = _compile_a2ui_rules(A2UI_ACTION_CATALOG)
+
+
+class _AttemptRing:
+    """Fixed-size ring of failure timestamps (epoch seconds) for one key."""
+    __slots__ = ("stamps", "head", "last_seen")
+
+    def __init__(self, size: int):
+        self.stamps = array('q', bytes(8 * size))
+        self.head = 0
+        self.last_seen = 0
+
+class LoginAttemptTracker:
+    """Bounded brute-force tracker keyed by IP address (or any identifier).
+
+    Each key owns a ring buffer holding the timestamps of its last
+    ``max_failures`` failed attempts, so recording an attempt is O(1) and
+    no per-attempt objects are allocated. Keys are kept in least-recently
+    used order; idle keys are evicted periodically and the total number of
+    tracked keys is capped so memory stays bounded under credential stuffing.
+    """
+
+    def __init__(self, max_failures: int = 5, window_seconds: int = 900,
+                 max_keys: int = 100000, sweep_interval_seconds: int = 60):
+        self.max_failures = max(1, max_failures)
+        self.window_seconds = window_seconds
+        self.max_keys = max_keys
+        self.sweep_interval_seconds = sweep_interval_seconds
+        self._rings: "OrderedDict[str, _AttemptRing]" = OrderedDict()
+        self._next_sweep = 0
+
+    def __len__(self) -> int:
+        return len(self._rings)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._rings
+
+    def record_failure(self, key: str, now: Optional[int] = None) -> bool:
+        """Record a failed attempt; return True when the key crossed the threshold."""
+        now = int(time.time()) if now is None else now
+        ring = self._rings.get(key)
+        if ring is None:
+            ring = _AttemptRing(self.max_failures)
+            self._rings[key] = ring
+            if len(self._rings) > self.max_keys:
+                self._rings.popitem(last=False)
+        else:
+            self._rings.move_to_end(key)
+
+        ring.stamps[ring.head] = now
+        ring.head = (ring.head + 1) % self.max_failures
+        ring.last_seen = now
+
+        if now >= self._next_sweep:
+            self.evict_expired(now)
+
+        # After the write, ``head`` points at the oldest stored failure. If even
+        # that one is inside the window, the ring holds max_failures recent failures.
+        oldest = ring.stamps[ring.head]
+        return oldest > 0 and oldest > now - self.window_seconds
+
+    def recent_failures(self, key: str, now: Optional[int] = None) -> int:
+        """Count failures for ``key`` inside the tracking window."""
+        ring = self._rings.get(key)
+        if ring is None:
+            return 0
+        now = int(time.time()) if now is None else now
+        cutoff = now - self.window_seconds
+        return sum(1 for stamp in ring.stamps if stamp > 0 and stamp > cutoff)
+
+    def reset(self, key: str):
+        """Forget all failures recorded for ``key``."""
+        self._rings.pop(key, None)
+
+    def evict_expired(self, now: Optional[int] = None) -> int:
+        """Drop keys whose latest failure fell out of the window.
+
+        Keys are ordered by last activity, so only the expired prefix is visited.
+        """
+        now = int(time.time()) if now is None else now
+        cutoff = now - self.window_seconds
+        evicted = 0
+        while self._rings:
+            key, ring = next(iter(self._rings.items()))
+            if ring.last_seen > cutoff:
+                break
+            del self._rings[key]
+            evicted += 1
+        self._next_sweep = now + self.sweep_interval_seconds
+        return evicted
 
 class SecurityManager:
     """Advanced security management for dhii Mail."""
     
-    def __init__(self, config: SecurityConfig = SecurityConfig()):
+    def __init__(self, config: SecurityConfig = SecurityConfig(),
+                 event_store: Optional[SecurityEventStore] = None):
         self.config = config
         self.encryption_key = self._generate_encryption_key()
         self.cipher = Fernet(self.encryption_key)
-        self.failed_attempts: Dict[str, List[LoginAttempt]] = {}
+        self.failed_attempts = LoginAttemptTracker(
+            max_failures=config.max_login_attempts,
+            window_seconds=BRUTE_FORCE_WINDOW_MINUTES * 60
+        )
         self.locked_accounts: Dict[str, datetime] = {}
-        self.security_events: List[SecurityEvent] = []
+        # (lockout_end, identifier) min-heap; entries superseded by a newer lockout are skipped
+        self._lockout_expiries: List[Tuple[datetime, str]] = []
+        self.event_store = event_store or SecurityEventStore(config.event_log_path)
+        # Errors for (component type, properties) already validated, across payloads
+        self._a2ui_validation_cache: "OrderedDict[Tuple[str, tuple], Tuple[str, ...]]" = OrderedDict()
+        # Escaped JSON and errors of component subtrees, keyed by content hash
+        self._a2ui_subtree_cache: "OrderedDict[bytes, Tuple[str, Tuple[str, ...]]]" = OrderedDict()
         
     def _generate_encryption_key(self) -> bytes:
         """Generate encryption key for data protection."""
@@ -141,51 +353,42 @@ class SecurityManager:
     
     def record_login_attempt(self, ip_address: str, email: Optional[str], success: bool, user_agent: str):
         """Record login attempt for brute force protection."""
-        now = datetime.now(timezone.utc)
-        attempt = LoginAttempt(
-            ip_address=ip_address,
-            email=email,
-            timestamp=now,
-            success=success,
-            user_agent=user_agent
-        )
+        if success:
+            return
         
-        # Store attempt
-        if ip_address not in self.failed_attempts:
-            self.failed_attempts[ip_address] = []
-        self.failed_attempts[ip_address].append(attempt)
+        if not self.failed_attempts.record_failure(ip_address):
+            return
         
-        # Clean old attempts (keep last hour)
-        one_hour_ago = now - timedelta(hours=1)
-        self.failed_attempts[ip_address] = [
-            a for a in self.failed_attempts[ip_address] 
-            if a.timestamp > one_hour_ago
-        ]
-        
-        # Check for lockout conditions
-        if not success:
-            recent_failures = [
-                a for a in self.failed_attempts[ip_address] 
-                if not a.success and a.timestamp > (now - timedelta(minutes=15))
-            ]
-            
-            if len(recent_failures) >= self.config.max_login_attempts:
-                # Lock the IP address
-                lockout_end = now + timedelta(minutes=self.config.lockout_duration_minutes)
-                self.locked_accounts[ip_address] = lockout_end
-                
-                # Also lock the email if provided
-                if email:
-                    self.locked_accounts[email] = lockout_end
-                
-                self.log_security_event(
-                    "brute_force_detected",
-                    ip_address,
-                    email,
-                    user_agent,
-                    {"failures": len(recent_failures), "lockout_duration": self.config.lockout_duration_minutes},
-                    "warning"
-                )
+        # Lock the IP address
+        now = datetime.now(timezone.utc)
+        lockout_end = now + timedelta(minutes=self.config.lockout_duration_minutes)
+        self._evict_expired_lockouts(now)
+        self._lock(ip_address, lockout_end)
+        
+        # Also lock the email if provided
+        if email:
+            self._lock(email, lockout_end)
+        
+        self.log_security_event(
+            "brute_force_detected",
+            ip_address,
+            email,
+            user_agent,
+            {"failures": self.failed_attempts.recent_failures(ip_address), "lockout_duration": self.config.lockout_duration_minutes},
+            "warning"
+        )
+    
+    def _lock(self, identifier: str, lockout_end: datetime):
+        self.locked_accounts[identifier] = lockout_end
+        heapq.heappush(self._lockout_expiries, (lockout_end, identifier))
+    
+    def _evict_expired_lockouts(self, now: datetime):
+        """Drop lockouts that already ended, soonest first, so the lockout table stays bounded."""
+        expiries = self._lockout_expiries
+        while expiries and expiries[0][0] <= now:
+            lockout_end, identifier = heapq.heappop(expiries)
+            if self.locked_accounts.get(identifier) == lockout_end:
+                del self.locked_accounts[identifier]
     
     def encrypt_sensitive_data(self, data: str) -> str:
         """Encrypt sensitive data."""
@@ -211,112 +414,113 @@ class SecurityManager:
     
     def sanitize_a2ui_component_data(self, component_data: dict) -> dict:
         """Sanitize A2UI component data for secure rendering."""
-        sanitized_data = {}
-        
-        for key, value in component_data.items():
-            if isinstance(value, str):
-                # Apply stricter sanitization for component properties
-                sanitized_value = re.sub(r'[<>"\'\\]', '', value)
-                sanitized_value = re.sub(r'javascript:', '', sanitized_value, flags=re.IGNORECASE)
-                sanitized_value = re.sub(r'on\w+\s*=', '', sanitized_value, flags=re.IGNORECASE)
-                sanitized_data[key] = sanitized_value[:500]  # Stricter length limit
-            elif isinstance(value, dict):
-                sanitized_data[key] = self.sanitize_a2ui_component_data(value)
-            elif isinstance(value, list):
-                sanitized_data[key] = [
-                    self.sanitize_a2ui_component_data(item) if isinstance(item, dict) else item
-                    for item in value
-                ]
-            else:
-                sanitized_data[key] = value
-        
-        return sanitized_data
+        return _sanitize_a2ui_dict(component_data)
     
     def validate_a2ui_component_properties(self, component_type: str, properties: dict) -> tuple[bool, list[str]]:
-        """Validate A2UI component properties against security rules."""
-        errors = []
-        
-        # Define allowed properties for each component type
-        allowed_properties = {
-            "text": {"content", "variant", "size", "color", "align"},
-            "button": {"label", "variant", "size", "icon", "disabled"},
-            "container": {"orientation", "spacing", "alignment", "border", "border_radius"},
-            "form": {"fields", "submit_label", "validation"},
-            "progress_indicator_card": {"title", "current_step", "total_steps", "progress_percentage", "status"},
-            "feature_card": {"title", "description", "icon", "highlight"},
-            "security_status_card": {"overall_status", "security_score", "two_factor_enabled", "encryption_status", "recommendations"}
-        }
+        """Validate A2UI component properties against the compiled component catalog."""
+        rule = _A2UI_COMPONENT_RULES.get(component_type)
         
         # Check if component type is allowed
-        if component_type not in allowed_properties:
-            errors.append(f"Component type '{component_type}' is not allowed")
-            return False, errors
+        if rule is None:
+            return False, [f"Component type '{component_type}' is not allowed"]
         
-        # Check for suspicious property names
-        for prop_name in properties.keys():
-            if prop_name not in allowed_properties[component_type]:
+        errors = []
+        allowed = rule.allowed
+        for prop_name, value in properties.items():
+            if prop_name not in allowed:
                 errors.append(f"Property '{prop_name}' is not allowed for component '{component_type}'")
             
             # Check for suspicious property values
-            if isinstance(properties[prop_name], str):
-                if re.search(r'<script|javascript:|on\w+\s*=', properties[prop_name], re.IGNORECASE):
-                    errors.append(f"Property '{prop_name}' contains potentially dangerous content")
-        
-        # Validate specific property values
-        if component_type == "button" and "variant" in properties:
-            allowed_variants = {"primary", "secondary", "text", "danger"}
-            if properties["variant"] not in allowed_variants:
-                errors.append(f"Button variant '{properties['variant']}' is not allowed")
+            if isinstance(value, str) and _A2UI_DANGEROUS_VALUE.search(value):
+                errors.append(f"Property '{prop_name}' contains potentially dangerous content")
         
-        if component_type == "text" and "variant" in properties:
-            allowed_variants = {"heading1", "heading2", "heading3", "body", "error"}
-            if properties["variant"] not in allowed_variants:
-                errors.append(f"Text variant '{properties['variant']}' is not allowed")
+        # Validate enum-constrained property values
+        errors.extend(rule.enum_errors(properties))
         
         return len(errors) == 0, errors
     
     def validate_a2ui_action(self, action_name: str, action_params: dict) -> tuple[bool, list[str]]:
-        """Validate A2UI actions against security allowlist."""
-        errors = []
-        
-        # Define allowed actions
-        allowed_actions = {
-            "start_onboarding",
-            "submit_account_info",
-            "import_gmail",
-            "import_outlook",
-            "skip_import",
-            "enable_2fa",
-            "setup_authenticator",
-            "setup_sms",
-            "skip_2fa",
-            "learn_more_video",
-            "learn_more_marketing",
-            "learn_more_security",
-            "complete_onboarding",
-            "retry_import",
-            "view_security_details"
-        }
+        """Validate A2UI actions against the compiled action allowlist."""
+        rule = _A2UI_ACTION_RULES.get(action_name)
         
-        if action_name not in allowed_actions:
-            errors.append(f"Action '{action_name}' is not allowed")
-            return False, errors
+        if rule is None:
+            return False, [f"Action '{action_name}' is not allowed"]
         
-        # Validate action parameters
-        if action_name.startswith("import_"):
-            if "provider" in action_params:
-                allowed_providers = {"gmail", "outlook", "yahoo"}
-                if action_params["provider"] not in allowed_providers:
-                    errors.append(f"Import provider '{action_params['provider']}' is not allowed")
+        errors = rule.enum_errors(action_params)
         
-        if action_name == "submit_account_info":
-            required_fields = {"email", "password", "full_name"}
-            missing_fields = required_fields - set(action_params.keys())
+        if rule.required:
+            missing_fields = rule.required - action_params.keys()
             if missing_fields:
-                errors.append(f"Missing required fields: {missing_fields}")
+                errors.append(f"Missing required fields: {set(missing_fields)}")
         
         return len(errors) == 0, errors
     
+    def _a2ui_component_errors(self, component_type: str, properties: dict) -> Tuple[str, ...]:
+        """Component validation errors, memoized across payloads for hashable property sets."""
+        try:
+            key = (component_type, tuple(properties.items()))
+            hash(key)
+        except TypeError:
+            return tuple(self.validate_a2ui_component_properties(component_type, properties)[1])
+        
+        errors = self._a2ui_validation_cache.get(key)
+        if errors is not None:
+            self._a2ui_validation_cache.move_to_end(key)
+            return errors
+        errors = tuple(self.validate_a2ui_component_properties(component_type, properties)[1])
+        self._a2ui_validation_cache[key] = errors
+        if len(self._a2ui_validation_cache) > _A2UI_VALIDATION_CACHE_SIZE:
+            self._a2ui_validation_cache.popitem(last=False)
+        return errors
+    
+    def validate_a2ui_tree(self, tree: Any) -> tuple[Any, list[str]]:
+        """Escape and validate a rendered A2UI tree in a single pass.
+        
+        Every dict carrying a ``type`` from the component catalog has its
+        ``properties`` validated while text is escaped; text is never
+        shortened or stripped. Component subtrees are memoized by content
+        hash, so a subtree seen before (in this payload or an earlier one) is
+        not walked again. The returned tree is always a fresh copy.
+        """
+        errors: List[str] = []
+        
+        def visit(node: Any) -> Any:
+            if isinstance(node, str):
+                return _escape_a2ui_text(node)
+            if isinstance(node, list):
+                return [visit(item) for item in node]
+            if not isinstance(node, dict):
+                return node
+            
+            component_type = node.get("type")
+            if not isinstance(component_type, str):
+                return {key: visit(value) for key, value in node.items()}
+            
+            try:
+                digest = hashlib.blake2b(json.dumps(node, separators=(",", ":")).encode("utf-8"),
+                                         digest_size=16).digest()
+            except (TypeError, ValueError):
+                digest = None  # not JSON; walked every time
+            cached = self._a2ui_subtree_cache.get(digest) if digest is not None else None
+            if cached is not None:
+                self._a2ui_subtree_cache.move_to_end(digest)
+                escaped_json, subtree_errors = cached
+                errors.extend(subtree_errors)
+                return json.loads(escaped_json)
+            
+            start = len(errors)
+            properties = node.get("properties")
+            if isinstance(properties, dict) and component_type in _A2UI_COMPONENT_RULES:
+                errors.extend(self._a2ui_component_errors(component_type, properties))
+            escaped = {key: visit(value) for key, value in node.items()}
+            if digest is not None:
+                self._a2ui_subtree_cache[digest] = (json.dumps(escaped), tuple(errors[start:]))
+                if len(self._a2ui_subtree_cache) > _A2UI_VALIDATION_CACHE_SIZE:
+                    self._a2ui_subtree_cache.popitem(last=False)
+            return escaped
+        
+        return visit(tree), errors
+    
     def validate_email_format(self, email: str) -> bool:
         """Validate email format."""
         pattern = r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$'
@@ -336,7 +540,10 @@ class SecurityManager:
             severity=severity
         )
         
-        self.security_events.append(event)
+        self.event_store.append(
+            event.id, event.timestamp, event.event_type, event.user_email,
+            event.ip_address, event.user_agent, event.details, event.severity
+        )
         
         # Log to system logger
         log_message = f"Security Event: {event_type} from {ip_address}"
@@ -356,38 +563,39 @@ class SecurityManager:
                            event_type: Optional[str] = None, 
                            severity: Optional[str] = None,
                            limit: int = 100) -> List[SecurityEvent]:
-        """Get security events with optional filtering."""
-        events = self.security_events
-        
-        if user_email:
-            events = [e for e in events if e.user_email == user_email]
-        
-        if event_type:
-            events = [e for e in events if e.event_type == event_type]
-        
-        if severity:
-            events = [e for e in events if e.severity == severity]
-        
-        # Sort by timestamp (newest first)
-        events.sort(key=lambda x: x.timestamp, reverse=True)
-        
-        return events[:limit]
+        """Get the newest security events with optional filtering."""
+        events, _ = self.get_security_events_page(user_email, event_type, severity, limit=limit)
+        return events
+    
+    def get_security_events_page(self, user_email: Optional[str] = None,
+                                 event_type: Optional[str] = None,
+                                 severity: Optional[str] = None,
+                                 cursor: Optional[str] = None,
+                                 limit: int = 100) -> Tuple[List[SecurityEvent], Optional[str]]:
+        """Get one page of security events (newest first) and the cursor for the next page."""
+        rows, next_cursor = self.event_store.query(
+            user_email=user_email,
+            event_type=event_type,
+            severity=severity,
+            cursor=cursor,
+            limit=limit
+        )
+        return [SecurityEvent(**row) for row in rows], next_cursor
     
     def cleanup_old_events(self, days: int = 30):
         """Clean up old security events."""
         cutoff_date = datetime.now(timezone.utc) - timedelta(days=days)
-        self.security_events = [
-            e for e in self.security_events 
-            if e.timestamp > cutoff_date
-        ]
+        self.event_store.delete_before(cutoff_date)
     
     def get_security_summary(self) -> Dict[str, Any]:
-        """Get security summary statistics."""
+        """Get security summary statistics from hourly rollups.
+        
+        The 24 hour figures include the whole of the oldest hour bucket.
+        """
         now = datetime.now(timezone.utc)
         
-        # Count events in last 24 hours
-        last_24h = now - timedelta(hours=24)
-        recent_events = [e for e in self.security_events if e.timestamp > last_24h]
+        all_time = self.event_store.rollup_counts()
+        recent = self.event_store.rollup_counts(since=now - timedelta(hours=23))
         
         # Count locked accounts
         active_lockouts = [
@@ -396,21 +604,21 @@ class SecurityManager:
         ]
         
         return {
-            "total_events": len(self.security_events),
-            "events_last_24h": len(recent_events),
+            "total_events": sum(all_time.values()),
+            "events_last_24h": sum(recent.values()),
             "active_lockouts": len(active_lockouts),
-            "failed_login_attempts": len([
-                e for e in recent_events 
-                if e.event_type == "login_failed"
-            ]),
-            "brute_force_detections": len([
-                e for e in recent_events 
-                if e.event_type == "brute_force_detected"
-            ]),
-            "critical_events": len([
-                e for e in recent_events 
-                if e.severity == "critical"
-            ])
+            "failed_login_attempts": sum(
+                count for (event_type, _), count in recent.items()
+                if event_type == "login_failed"
+            ),
+            "brute_force_detections": sum(
+                count for (event_type, _), count in recent.items()
+                if event_type == "brute_force_detected"
+            ),
+            "critical_events": sum(
+                count for (_, severity), count in recent.items()
+                if severity == "critical"
+            )
         }
 
 # Global security manager instance
@@ -0,0 +1,362 @@
+"""
+dhii Mail - Session History
+Per-session chat history kept as a small in-memory ring of slotted records and
+persisted to an append-only SQLite journal, so history survives restarts and
+can be replayed to reconnecting clients as a delta. Each session records the
+user that owns it; only that user may read it back.
+
+The ring is a per-worker cache of the session's tail. Delta replay always reads
+the journal, so a client that reconnects to another worker gets every message
+the other workers have flushed (the writer flushes every ``flush_interval``).
+Journal reads run in a worker thread, never on the event loop.
+"""
+
+import os
+import json
+import time
+import queue
+import sqlite3
+import atexit
+import asyncio
+import logging
+import threading
+from collections import OrderedDict, deque
+from datetime import datetime, timezone
+from typing import Any, Deque, Dict, List, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+# Next to this module, not wherever the server happened to be started
+DEFAULT_HISTORY_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "session_history.db")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS session_messages (
+    session_id TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    message_id TEXT NOT NULL,
+    sender TEXT NOT NULL,
+    content TEXT NOT NULL,
+    timestamp REAL NOT NULL,
+    metadata TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_session_messages_session ON session_messages(session_id, seq);
+CREATE INDEX IF NOT EXISTS idx_session_messages_timestamp ON session_messages(timestamp);
+
+CREATE TABLE IF NOT EXISTS session_owners (
+    session_id TEXT PRIMARY KEY,
+    user_id TEXT,
+    created_at REAL NOT NULL
+);
+"""
+
+_INSERT_MESSAGE = """INSERT INTO session_messages
+    (session_id, seq, message_id, sender, content, timestamp, metadata)
+    VALUES (?, ?, ?, ?, ?, ?, ?)"""
+
+_SELECT_COLUMNS = "seq, message_id, sender, content, timestamp, metadata"
+
+_SELECT_OWNER = "SELECT user_id FROM session_owners WHERE session_id = ?"
+
+_UNKNOWN = object()
+
+class SessionMessage:
+    """One chat message in a session ring"""
+    __slots__ = ("seq", "id", "sender", "content", "timestamp", "metadata")
+
+    def __init__(self, seq: int, id: str, sender: str, content: str,
+                 timestamp: float, metadata: Optional[Dict[str, Any]] = None):
+        self.seq = seq
+        self.id = id
+        self.sender = sender
+        self.content = content
+        self.timestamp = timestamp
+        self.metadata = metadata
+
+    @property
+    def created_at(self) -> datetime:
+        return datetime.fromtimestamp(self.timestamp, tz=timezone.utc)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "seq": self.seq,
+            "message_id": self.id,
+            "sender": self.sender,
+            "message": self.content,
+            "timestamp": self.created_at.isoformat(),
+            "metadata": self.metadata or {}
+        }
+
+class SessionHistory:
+    """Bounded per-session rings in front of an append-only journal.
+
+    Sequence numbers are microsecond timestamps made strictly increasing per
+    process, so they order messages across workers without coordination and
+    double as the "since" cursor for reconnecting clients. Journal writes are
+    batched on a daemon thread. ``append`` never reads the journal; a ring is
+    filled from the journal the first time ``recent`` needs it.
+
+    A session is owned by the user that wrote to it first (``claim``), or by
+    nobody when that write was anonymous. Ownership never changes afterwards.
+    """
+
+    def __init__(self, db_path: str = DEFAULT_HISTORY_PATH, ring_size: int = 100,
+                 max_sessions: int = 10000, batch_size: int = 200, flush_interval: float = 0.2):
+        self.db_path = db_path
+        self.ring_size = ring_size
+        self.max_sessions = max_sessions
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._rings: "OrderedDict[str, Deque[SessionMessage]]" = OrderedDict()
+        self._unloaded: Set[str] = set()  # rings holding only this worker's appends so far
+        self._owners: "OrderedDict[str, Optional[str]]" = OrderedDict()
+        self._last_seq = 0
+        self._queue: "queue.Queue" = queue.Queue()
+        self._writer: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+        self._read_lock = threading.Lock()
+        self._read_conn: Optional[sqlite3.Connection] = None
+        self._schema_ready = False
+
+    def _next_seq(self) -> int:
+        seq = max(time.time_ns() // 1000, self._last_seq + 1)
+        self._last_seq = seq
+        return seq
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=5.0, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        if not self._schema_ready:
+            conn.executescript(_SCHEMA)
+            self._schema_ready = True
+        return conn
+
+    def _reader(self) -> sqlite3.Connection:
+        if self._read_conn is None:
+            self._read_conn = self._connect()
+        return self._read_conn
+
+    def _ensure_writer(self):
+        if self._writer is not None and self._writer.is_alive():
+            return
+        with self._start_lock:
+            if self._writer is not None and self._writer.is_alive():
+                return
+            self._writer = threading.Thread(target=self._run_writer, name="session-history-writer", daemon=True)
+            self._writer.start()
+            atexit.register(self.flush)
+
+    def _run_writer(self):
+        """Drain queued messages into the journal in batches"""
+        conn = self._connect()
+        while True:
+            batch: List[tuple] = []
+            waiters: List[threading.Event] = []
+            item = self._queue.get()
+            while True:
+                if isinstance(item, threading.Event):
+                    waiters.append(item)
+                else:
+                    batch.append(item)
+                if len(batch) >= self.batch_size:
+                    break
+                try:
+                    item = self._queue.get(timeout=self.flush_interval if not waiters else 0)
+                except queue.Empty:
+                    break
+            if batch:
+                try:
+                    with conn:
+                        conn.executemany(_INSERT_MESSAGE, batch)
+                except Exception as e:
+                    logger.error(f"Failed to journal {len(batch)} session messages: {e}")
+            for waiter in waiters:
+                waiter.set()
+
+    def flush(self, timeout: float = 5.0) -> bool:
+        """Block until every message appended so far is in the journal"""
+        if self._writer is None or not self._writer.is_alive():
+            return True
+        done = threading.Event()
+        self._queue.put(done)
+        return done.wait(timeout)
+
+    def _new_ring(self, session_id: str) -> Deque[SessionMessage]:
+        ring: Deque[SessionMessage] = deque(maxlen=self.ring_size)
+        self._rings[session_id] = ring
+        if len(self._rings) > self.max_sessions:
+            evicted, _ = self._rings.popitem(last=False)
+            self._unloaded.discard(evicted)
+        return ring
+
+    def _load_tail(self, session_id: str) -> List[SessionMessage]:
+        return list(reversed(self._query(
+            f"SELECT {_SELECT_COLUMNS} FROM session_messages WHERE session_id = ? ORDER BY seq DESC LIMIT ?",
+            (session_id, self.ring_size)
+        )))
+
+    async def _ring(self, session_id: str) -> Deque[SessionMessage]:
+        """Return the session ring, filling it from the journal on first use"""
+        ring = self._rings.get(session_id)
+        if ring is not None and session_id not in self._unloaded:
+            self._rings.move_to_end(session_id)
+            return ring
+        tail = await asyncio.to_thread(self._load_tail, session_id)
+        # Appends made while the journal was read are kept; the journal may hold some of them too
+        ring = self._rings.get(session_id)
+        local = list(ring) if ring is not None else []
+        merged = {m.seq: m for m in tail}
+        for message in local:
+            merged.setdefault(message.seq, message)
+        ring = self._rings.get(session_id) or self._new_ring(session_id)
+        ring.clear()
+        ring.extend(sorted(merged.values(), key=lambda m: m.seq))
+        self._unloaded.discard(session_id)
+        self._rings.move_to_end(session_id)
+        return ring
+
+    def _query(self, sql: str, params: tuple) -> List[SessionMessage]:
+        try:
+            with self._read_lock:
+                rows = self._reader().execute(sql, params).fetchall()
+        except sqlite3.Error as e:
+            logger.error(f"Failed to read session history: {e}")
+            return []
+        return [
+            SessionMessage(seq, message_id, sender, content, timestamp,
+                           json.loads(metadata) if metadata else None)
+            for seq, message_id, sender, content, timestamp, metadata in rows
+        ]
+
+    def _resolve_owner(self, session_id: str, user_id: Optional[str], claim: bool) -> Any:
+        """Owner from the journal (None when anonymous); claims an unowned session when ``claim``"""
+        with self._read_lock:
+            conn = self._reader()
+            row = conn.execute(_SELECT_OWNER, (session_id,)).fetchone()
+            if row is not None:
+                return row[0]
+            if not claim:
+                return _UNKNOWN
+            # Sessions journaled before owners were recorded stay anonymous
+            # instead of going to whoever writes to them next
+            journaled = conn.execute("SELECT 1 FROM session_messages WHERE session_id = ? LIMIT 1",
+                                     (session_id,)).fetchone()
+            with conn:
+                conn.execute("INSERT OR IGNORE INTO session_owners (session_id, user_id, created_at) "
+                             "VALUES (?, ?, ?)", (session_id, None if journaled else user_id, time.time()))
+            # Another worker may have claimed it first
+            return conn.execute(_SELECT_OWNER, (session_id,)).fetchone()[0]
+
+    def _remember_owner(self, session_id: str, owner: Optional[str]):
+        self._owners[session_id] = owner
+        self._owners.move_to_end(session_id)
+        if len(self._owners) > self.max_sessions:
+            self._owners.popitem(last=False)
+
+    async def claim(self, session_id: str, user_id: Optional[Any]) -> Optional[str]:
+        """The session's owner, claiming it for ``user_id`` (None: anonymous) if it has none yet"""
+        owner = self._owners.get(session_id, _UNKNOWN)
+        if owner is _UNKNOWN:
+            user = str(user_id) if user_id is not None else None
+            owner = await asyncio.to_thread(self._resolve_owner, session_id, user, True)
+            self._remember_owner(session_id, owner)
+        return owner
+
+    async def owner(self, session_id: str) -> Optional[str]:
+        """The user that owns a session, or None for anonymous and unclaimed sessions"""
+        owner = self._owners.get(session_id, _UNKNOWN)
+        if owner is _UNKNOWN:
+            owner = await asyncio.to_thread(self._resolve_owner, session_id, None, False)
+            if owner is _UNKNOWN:
+                return None
+            self._remember_owner(session_id, owner)
+        return owner
+
+    def append(self, session_id: str, message_id: str, sender: str, content: str,
+               timestamp: Optional[datetime] = None,
+               metadata: Optional[Dict[str, Any]] = None) -> SessionMessage:
+        """Add a message to the session ring and queue it for the journal"""
+        record = SessionMessage(
+            self._next_seq(),
+            message_id,
+            sender,
+            content,
+            (timestamp or datetime.now(timezone.utc)).timestamp(),
+            metadata
+        )
+        ring = self._rings.get(session_id)
+        if ring is None:
+            ring = self._new_ring(session_id)
+            self._unloaded.add(session_id)
+        else:
+            self._rings.move_to_end(session_id)
+        ring.append(record)
+        self._ensure_writer()
+        self._queue.put((
+            session_id, record.seq, record.id, record.sender, record.content, record.timestamp,
+            json.dumps(metadata, default=str) if metadata else None
+        ))
+        return record
+
+    async def recent(self, session_id: str, limit: Optional[int] = None) -> List[SessionMessage]:
+        """Newest ``limit`` messages of a session, oldest first, from this worker's ring"""
+        messages = list(await self._ring(session_id))
+        return messages[-limit:] if limit else messages
+
+    async def since(self, session_id: str, since_seq: int, limit: int = 500) -> List[SessionMessage]:
+        """Messages after ``since_seq``, oldest first, capped at ``limit``.
+
+        Reads the journal, so messages flushed by other workers are included;
+        this worker's appends that are not flushed yet come from its ring.
+        """
+        journaled = await asyncio.to_thread(
+            self._query,
+            f"SELECT {_SELECT_COLUMNS} FROM session_messages WHERE session_id = ? AND seq > ? ORDER BY seq LIMIT ?",
+            (session_id, since_seq, limit)
+        )
+        merged = {m.seq: m for m in journaled}
+        for message in self._rings.get(session_id, ()):
+            if message.seq > since_seq:
+                merged.setdefault(message.seq, message)
+        return sorted(merged.values(), key=lambda m: m.seq)[:limit]
+
+    async def last_seq(self, session_id: str) -> int:
+        ring = await self._ring(session_id)
+        return ring[-1].seq if ring else 0
+
+    def idle_sessions(self, cutoff: float) -> List[str]:
+        """Cached sessions whose newest message is older than ``cutoff`` (epoch seconds)"""
+        return [session_id for session_id, ring in self._rings.items() if not ring or ring[-1].timestamp < cutoff]
+
+    def evict(self, session_id: str):
+        """Drop a session from memory; its journal is kept"""
+        self._rings.pop(session_id, None)
+        self._unloaded.discard(session_id)
+        self._owners.pop(session_id, None)
+
+    def delete_before(self, cutoff: datetime) -> int:
+        """Apply retention to the journal"""
+        self.flush()
+        with self._read_lock:
+            conn = self._reader()
+            with conn:
+                removed = conn.execute("DELETE FROM session_messages WHERE timestamp < ?",
+                                       (cutoff.timestamp(),)).rowcount
+                conn.execute("DELETE FROM session_owners WHERE created_at < ? AND session_id NOT IN "
+                             "(SELECT DISTINCT session_id FROM session_messages)", (cutoff.timestamp(),))
+                return removed
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "cached_sessions": len(self._rings),
+            "cached_messages": sum(len(ring) for ring in self._rings.values()),
+            "cached_owners": len(self._owners),
+            "pending_writes": self._queue.qsize()
+        }
+
+    def close(self):
+        self.flush()
+        with self._read_lock:
+            if self._read_conn is not None:
+                self._read_conn.close()
+                self._read_conn = None
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Test script for the catalog-compiled A2UI sanitizers and validators
+"""
+
+import os
+import sys
+
+# Add the current directory to Python path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from security_manager import SecurityManager
+from security_event_store import SecurityEventStore
+
+manager = SecurityManager(event_store=SecurityEventStore(":memory:"))
+
+def test_sanitize_component_data():
+    """Test string sanitization across nested dicts and lists"""
+    shared_action = {"name": "open", "label": "<b>Open</b>"}
+    data = {
+        "title": "Click onclick=evil() javascript:alert('x')",
+        "count": 3,
+        "rows": [{"label": "Inbox"}, "raw <string>"],
+        "actions": [shared_action, shared_action]
+    }
+
+    sanitized = manager.sanitize_a2ui_component_data(data)
+    assert sanitized["title"] == "Click evil() alert(x)"
+    assert sanitized["count"] == 3
+    assert sanitized["rows"] == [{"label": "Inbox"}, "raw <string>"]
+    assert sanitized["actions"][0] == {"name": "open", "label": "bOpen/b"}
+    assert sanitized["actions"][1] == sanitized["actions"][0]
+    assert sanitized["actions"][0] is not sanitized["actions"][1]  # callers may mutate each copy
+    assert manager.sanitize_a2ui_component_data({"text": "x" * 600})["text"] == "x" * 500
+    print("✅ Component sanitization test passed!")
+
+def test_validate_component_properties():
+    """Test catalog-driven property validation"""
+    assert manager.validate_a2ui_component_properties("button", {"label": "Go", "variant": "primary"}) == (True, [])
+
+    valid, errors = manager.validate_a2ui_component_properties("button", {"label": "Go", "variant": "neon", "onclick": "x"})
+    assert not valid
+    assert errors == [
+        "Property 'onclick' is not allowed for component 'button'",
+        "Button variant 'neon' is not allowed"
+    ]
+
+    valid, errors = manager.validate_a2ui_component_properties("iframe", {})
+    assert errors == ["Component type 'iframe' is not allowed"]
+    print("✅ Component validation test passed!")
+
+def test_validate_action():
+    """Test the compiled action allowlist"""
+    assert manager.validate_a2ui_action("skip_2fa", {}) == (True, [])
+    assert not manager.validate_a2ui_action("drop_tables", {})[0]
+
+    valid, errors = manager.validate_a2ui_action("import_gmail", {"provider": "aol"})
+    assert errors == ["Import provider 'aol' is not allowed"]
+
+    valid, errors = manager.validate_a2ui_action("submit_account_info", {"email": "a@b.co", "password": "x"})
+    assert errors == ["Missing required fields: {'full_name'}"]
+    print("✅ Action validation test passed!")
+
+def test_validate_tree_single_pass():
+    """Test combined escape + validate over a rendered tree"""
+    tree = {
+        "type": "container",
+        "properties": {"spacing": "8"},
+        "children": [
+            {"type": "text", "properties": {"content": "Hi <there>", "variant": "shout"}},
+            {"type": "email_row", "properties": {"subject": "Re: it's done, \"finally\" " + "x" * 600}}
+        ]
+    }
+
+    sanitized, errors = manager.validate_a2ui_tree(tree)
+    assert sanitized["children"][0]["properties"]["content"] == "Hi &lt;there&gt;"
+    # Quotes, apostrophes and long text reach the user unchanged
+    assert sanitized["children"][1]["properties"]["subject"] == tree["children"][1]["properties"]["subject"]
+    assert errors == ["Text variant 'shout' is not allowed"]
+
+    # A second payload reuses the memoized subtree but still gets its own copy
+    cached = len(manager._a2ui_subtree_cache)
+    again, errors = manager.validate_a2ui_tree(tree)
+    assert errors == ["Text variant 'shout' is not allowed"]
+    assert again == sanitized and again["children"][0] is not sanitized["children"][0]
+    assert len(manager._a2ui_subtree_cache) == cached
+
+    # A known subtree inside a new tree is served from the memo with its errors
+    wrapper = {"type": "container", "properties": {}, "children": [tree]}
+    wrapped, errors = manager.validate_a2ui_tree(wrapper)
+    assert wrapped["children"][0] == sanitized and errors == ["Text variant 'shout' is not allowed"]
+    assert len(manager._a2ui_subtree_cache) == cached + 1
+    print("✅ Tree validation test passed!")
+
+def test_router_escapes_rendered_components():
+    """Test the A2UI router escapes and validates orchestrator output before responding"""
+    from a2ui_integration.a2ui_router_updated import create_ui_response_from_orchestrator
+
+    response = create_ui_response_from_orchestrator({
+        "component": {"type": "card", "properties": {"title": "Here's your workspace overview"},
+                      "children": [{"type": "text", "properties": {"content": "<script>x</script>", "variant": "body"}}]},
+        "state_info": {}
+    })
+    assert response.component["properties"]["title"] == "Here's your workspace overview"
+    assert response.component["children"][0]["properties"]["content"] == "&lt;script&gt;x&lt;/script&gt;"
+    print("✅ Router escaping test passed!")
+
+if __name__ == "__main__":
+    test_sanitize_component_data()
+    test_validate_component_properties()
+    test_validate_action()
+    test_validate_tree_single_pass()
+    test_router_escapes_rendered_components()
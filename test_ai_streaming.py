@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""
+Test script for streaming LLM tokens to chat websockets
+"""
+
+import os
+import sys
+import json
+import asyncio
+import tempfile
+
+from aiohttp import web
+
+# Add the current directory to Python path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from ai_engine import AIEngine
+from http_client_pool import shared_http_client
+from llm_dispatch import llm_dispatcher
+
+async def _start_fake_openrouter(chunks, fail_first: int = 0, delay: float = 0.0):
+    """SSE chat-completions endpoint streaming ``chunks`` as content deltas"""
+    calls = {"count": 0}
+
+    async def completions(request):
+        calls["count"] += 1
+        body = await request.json()
+        assert body["stream"] is True
+        if calls["count"] <= fail_first:
+            return web.json_response({"error": "overloaded"}, status=503)
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+        await response.prepare(request)
+        await response.write(b": OPENROUTER PROCESSING\n\n")
+        for chunk in chunks:
+            event = {"choices": [{"delta": {"content": chunk}}]}
+            await response.write(f"data: {json.dumps(event)}\n\n".encode())
+            await asyncio.sleep(delay)
+        await response.write(b"data: not-json\n\n")
+        await response.write(b'data: {"choices": [{"delta": {}, "finish_reason": "stop"}]}\n\n')
+        await response.write(b"data: [DONE]\n\n")
+        return response
+
+    app = web.Application()
+    app.router.add_post("/api/v1/chat/completions", completions)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    return runner, f"http://127.0.0.1:{port}/api/v1/chat/completions", calls
+
+def _engine(url: str) -> AIEngine:
+    engine = AIEngine()
+    engine.openrouter_api_key = "test-key"
+    engine.use_openrouter = True
+    engine.openrouter_api_url = url
+    engine.response_cache = None
+    engine.intent_classifier = None
+    return engine
+
+class FakeConnection:
+    def __init__(self):
+        self.sent = []
+
+    async def send_message(self, message):
+        self.sent.append(message)
+
+def test_sse_tokens_and_retry():
+    """Test SSE parsing skips comments and junk, and retries before the first token"""
+    async def run():
+        runner, url, calls = await _start_fake_openrouter(["Sure, ", "I can ", "schedule ", "that meeting."],
+                                                          fail_first=1)
+        tokens = [t async for t in _engine(url)._stream_openrouter_api([{"role": "user", "content": "hi"}])]
+        assert tokens == ["Sure, ", "I can ", "schedule ", "that meeting."]
+        assert calls["count"] == 2
+        await shared_http_client.close()
+        await runner.cleanup()
+
+    asyncio.run(run())
+    print("✅ SSE token parsing test passed!")
+
+def test_stream_assembles_validated_reply():
+    """Test the stream yields tokens and assembles the final AIResponse"""
+    async def run():
+        runner, url, _ = await _start_fake_openrouter(["Happy to help ", "with your ", "meeting ", "tomorrow."])
+        stream = _engine(url).stream_message("schedule a meeting tomorrow", {})
+        tokens = [t async for t in stream]
+        assert "".join(tokens) == "Happy to help with your meeting tomorrow."
+        assert stream.streamed and not stream.replaced
+        assert stream.time_to_first_token is not None
+        assert stream.response.message == "Happy to help with your meeting tomorrow."
+        assert stream.response.intent.intent == "schedule_meeting"
+        await shared_http_client.close()
+        await runner.cleanup()
+
+    asyncio.run(run())
+    print("✅ Stream assembly test passed!")
+
+def test_stream_releases_slot_after_headers():
+    """Test an open stream does not hold a dispatcher slot while its tokens arrive"""
+    async def run():
+        runner, url, _ = await _start_fake_openrouter(["One ", "token ", "at a time."])
+        tokens = _engine(url)._stream_openrouter_api([{"role": "user", "content": "hi"}])
+        assert await tokens.__anext__() == "One "
+        assert llm_dispatcher.get_stats()["active"] == 0
+        assert [t async for t in tokens] == ["token ", "at a time."]
+        await shared_http_client.close()
+        await runner.cleanup()
+
+    asyncio.run(run())
+    print("✅ Stream slot release test passed!")
+
+def test_unsafe_stream_falls_back():
+    """Test a reply tripping an unsafe marker mid-stream is replaced by the fallback"""
+    async def run():
+        runner, url, _ = await _start_fake_openrouter(["Click ", "<scr", "ipt>alert(1)", " for your meeting"])
+        engine = _engine(url)
+        stream = engine.stream_message("hello there", {})
+        tokens = [t async for t in stream]
+        assert "".join(tokens) == "Click <scr"  # stopped before the marker completed
+        assert stream.replaced
+        assert "<script" not in stream.response.message
+        await shared_http_client.close()
+        await runner.cleanup()
+
+    asyncio.run(run())
+    print("✅ Unsafe stream fallback test passed!")
+
+def test_forward_batches_deltas():
+    """Test the websocket relay sends the first token at once and batches the rest"""
+    # Importing main creates the plugin store; keep it out of the working tree
+    os.environ.setdefault("PLUGINS_DB_PATH", os.path.join(tempfile.mkdtemp(), "plugins.db"))
+    import main
+
+    async def run():
+        runner, url, _ = await _start_fake_openrouter([f"word{i} " for i in range(20)] + ["meeting"], delay=0.005)
+        connection = FakeConnection()
+        stream = _engine(url).stream_message("book a meeting", {})
+        await main.forward_ai_stream(connection, stream, "msg_ai_1", "chat-1", "msg_user_1")
+        deltas = [frame for frame in connection.sent if frame["type"] == "ai_message_delta"]
+        assert deltas[0]["delta"] == "word0 " and deltas[0]["index"] == 0
+        assert 1 < len(deltas) < 21
+        assert [d["index"] for d in deltas] == list(range(len(deltas)))
+        assert "".join(d["delta"] for d in deltas) == "".join(f"word{i} " for i in range(20)) + "meeting"
+        assert all(d["reply_to"] == "msg_user_1" and d["message_id"] == "msg_ai_1" for d in deltas)
+        await shared_http_client.close()
+        await runner.cleanup()
+
+    asyncio.run(run())
+    print("✅ Delta batching test passed!")
+
+if __name__ == "__main__":
+    test_sse_tokens_and_retry()
+    test_stream_assembles_validated_reply()
+    test_stream_releases_slot_after_headers()
+    test_unsafe_stream_falls_back()
+    test_forward_batches_deltas()
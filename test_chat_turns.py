@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+Test script for AI turns scheduled outside the websocket receive loop
+"""
+
+import os
+import sys
+import json
+import asyncio
+
+# Add the current directory to Python path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from chat_turns import ChatTurnScheduler
+from enhanced_websocket_manager import EnhancedWebSocketManager
+
+class FakeWebSocket:
+    """Minimal stand-in for a Starlette WebSocket"""
+    def __init__(self):
+        self.sent = []
+        self.client_state = type("State", (), {"CONNECTED": True})()
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, data):
+        self.sent.append(json.loads(data))
+
+    async def close(self):
+        pass
+
+def _turn(log, name, delay=0.01, gate=None):
+    async def run():
+        log.append(f"start {name}")
+        if gate is not None:
+            await gate.wait()
+        await asyncio.sleep(delay)
+        log.append(f"end {name}")
+    return run
+
+def test_session_order_without_supersede():
+    """Test turns of one session run one at a time, in submission order"""
+    async def run():
+        scheduler = ChatTurnScheduler(supersede=False)
+        log = []
+        for name in ("a", "b", "c"):
+            scheduler.submit("s1", "user:1", "c1", name, _turn(log, name))
+        await asyncio.sleep(0.1)
+        assert log == ["start a", "end a", "start b", "end b", "start c", "end c"]
+        assert scheduler.get_stats()["completed"] == 3
+        assert scheduler.get_stats()["active_sessions"] == 0
+
+    asyncio.run(run())
+    print("✅ Per-session ordering test passed!")
+
+def test_new_message_supersedes_pending_turns():
+    """Test a new message cancels the running and queued turns of its session"""
+    async def run():
+        scheduler = ChatTurnScheduler()
+        log = []
+        gate = asyncio.Event()
+        scheduler.submit("s1", "user:1", "c1", "slow", _turn(log, "slow", gate=gate))
+        await asyncio.sleep(0.01)
+        superseded = scheduler.submit("s1", "user:1", "c1", "fresh", _turn(log, "fresh"))
+        assert [t.turn_id for t in superseded] == ["slow"]
+        assert superseded[0].cancel_reason == "superseded"
+
+        # Another user's turn in the same session id is left alone
+        scheduler.submit("s1", "user:2", "c2", "other", _turn(log, "other"), supersede=False)
+        await asyncio.sleep(0.1)
+        assert "end slow" not in log
+        assert log[-4:] == ["start fresh", "end fresh", "start other", "end other"]
+
+        scheduler.submit("s2", "user:1", "c1", "long", _turn(log, "long", gate=asyncio.Event()))
+        await asyncio.sleep(0.01)
+        assert [t.turn_id for t in scheduler.cancel_session("s2", "cancelled", "user:2")] == []
+        assert [t.turn_id for t in scheduler.cancel_session("s2", "cancelled", "user:1")] == ["long"]
+        await asyncio.sleep(0.01)
+        assert scheduler.get_stats()["in_progress"] == 0
+
+    asyncio.run(run())
+    print("✅ Supersede and cancel test passed!")
+
+def test_per_user_cap():
+    """Test one user runs at most max_turns_per_user turns across sessions"""
+    async def run():
+        scheduler = ChatTurnScheduler(max_turns_per_user=2)
+        running, peak = [0], [0]
+
+        def counted():
+            async def run_turn():
+                running[0] += 1
+                peak[0] = max(peak[0], running[0])
+                await asyncio.sleep(0.02)
+                running[0] -= 1
+            return run_turn
+
+        for i in range(5):
+            scheduler.submit(f"s{i}", "user:1", "c1", f"t{i}", counted())
+        scheduler.submit("s9", "user:2", "c2", "t9", counted())
+        await asyncio.sleep(0.2)
+        assert peak[0] == 3  # two for user 1 plus user 2's turn
+        assert scheduler.get_stats()["completed"] == 6
+        assert scheduler.get_stats()["active_users"] == 0
+
+        try:
+            limited = ChatTurnScheduler(max_pending_per_session=1, supersede=False)
+            limited.submit("s1", "user:1", "c1", "a", counted())
+            limited.submit("s1", "user:1", "c1", "b", counted())
+            limited.submit("s1", "user:1", "c1", "c", counted())
+            assert False, "expected ValueError"
+        except ValueError:
+            pass
+        await asyncio.sleep(0.1)
+
+    asyncio.run(run())
+    print("✅ Per-user cap test passed!")
+
+def test_disconnect_cancels_turns():
+    """Test closing a socket cancels the AI turns it submitted"""
+    async def run():
+        manager = EnhancedWebSocketManager()
+        await manager.connect(FakeWebSocket(), "c1", "conn-1")
+        log = []
+        manager.turns.submit("chat-1", "client:c1", "c1", "m1", _turn(log, "m1", gate=asyncio.Event()))
+        await asyncio.sleep(0.01)
+        await manager.disconnect("c1")
+        await asyncio.sleep(0.01)
+        assert log == ["start m1"]
+        stats = manager.get_connection_stats()["ai_turns"]
+        assert stats["cancelled"] == 1 and stats["in_progress"] == 0
+
+    asyncio.run(run())
+    print("✅ Disconnect cancellation test passed!")
+
+if __name__ == "__main__":
+    test_session_order_without_supersede()
+    test_new_message_supersedes_pending_turns()
+    test_per_user_cap()
+    test_disconnect_cancels_turns()
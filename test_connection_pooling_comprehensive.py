@@ -7,6 +7,7 @@ import sys
 import os
 import concurrent.futures
 import time
+import tempfile
 
 sys.path.insert(0, '/root/dhii-mail')
 
@@ -18,7 +19,8 @@ def test_connection_pooling_comprehensive():
     
     # Test 1: Initialize with connection pooling
     print("1. Testing database initialization with connection pooling...")
-    db = init_database(db_path="test_comprehensive.db", max_connections=5)
+    tmp = tempfile.TemporaryDirectory()
+    db = init_database(db_path=os.path.join(tmp.name, "test_comprehensive.db"), max_connections=5)
     
     stats = db.get_database_stats()
     pool_stats = stats.get('connection_pool_stats', {})
@@ -145,10 +147,7 @@ def test_connection_pooling_comprehensive():
     db.close()
     
     # Remove test database
-    try:
-        os.remove("test_comprehensive.db")
-    except:
-        pass
+    tmp.cleanup()
     
     print("=== All Comprehensive Connection Pooling Tests Passed! ===")
     print("\nSummary:")
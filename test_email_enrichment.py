@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+Test script for the batch AI email enrichment pipeline
+"""
+
+import os
+import re
+import sys
+import json
+import sqlite3
+import asyncio
+import tempfile
+from datetime import datetime, timedelta
+
+# Add the current directory to Python path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from email_manager import EmailManager
+from email_enrichment import EmailEnrichmentPipeline
+
+def _mailbox(tmp: str, count: int, body: str = "Can we move the budget review to Friday?") -> str:
+    """Email database with ``count`` unenriched messages for user 1"""
+    db_path = os.path.join(tmp, "email_accounts.db")
+    EmailManager(db_path=db_path)
+    conn = sqlite3.connect(db_path)
+    now = datetime(2026, 1, 1)
+    conn.executemany(
+        "INSERT INTO email_messages (user_id, account_id, subject, sender, recipient, body, date) "
+        "VALUES (1, 1, ?, 'ana@example.com', 'me@example.com', ?, ?)",
+        [(f"Budget {i}", body, (now + timedelta(minutes=i)).isoformat()) for i in range(count)]
+    )
+    conn.commit()
+    conn.close()
+    return db_path
+
+def _fake_llm(calls):
+    async def complete(messages):
+        calls.append(messages)
+        ids = [int(i) for i in re.findall(r"^id: (\d+)$", messages[-1]["content"], re.MULTILINE)]
+        return "```json\n" + json.dumps([
+            {"id": i, "summary": f"Ana asks to move budget review {i}.", "categories": ["Work", "meetings", "bogus"],
+             "sentiment": "neutral"} for i in ids
+        ]) + "\n```"
+    return complete
+
+def test_pack_respects_limits():
+    """Test messages are packed by count and prompt token budget, long bodies clipped"""
+    pipeline = EmailEnrichmentPipeline(messages_per_request=3, max_request_tokens=400, max_message_tokens=50)
+    rows = [{"id": i, "subject": "s", "sender": "a", "body": "word " * 10} for i in range(7)]
+    assert [len(group) for group in pipeline.pack(rows)] == [3, 3, 1]
+
+    long_rows = [{"id": i, "subject": "s", "sender": "a", "body": "word " * 500} for i in range(4)]
+    groups = pipeline.pack(long_rows)
+    assert all(len(entry) < 50 * 4 + 60 for group in groups for _, entry in group)
+    assert len(groups) == 2  # two clipped emails fit in 400 tokens next to the instructions
+    print("✅ Packing test passed!")
+
+def test_parse_validates_reply():
+    """Test only well-formed results survive and labels are normalized"""
+    reply = 'Here you go: [{"id": "5", "summary": "  Invoice  overdue ", "categories": "Finance", ' \
+            '"sentiment": "Negative"}, {"id": 6, "summary": "x", "sentiment": "angry"}, {"summary": "no id"}]'
+    parsed = EmailEnrichmentPipeline.parse(reply)
+    assert parsed == {5: {"summary": "Invoice overdue", "categories": ["finance"], "sentiment": "negative"}}
+    assert EmailEnrichmentPipeline.parse("not json") == {}
+    print("✅ Reply parsing test passed!")
+
+def test_run_once_writes_in_bulk():
+    """Test one cycle enriches every pending message with few requests and records usage"""
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = _mailbox(tmp, 10)
+        calls = []
+        pipeline = EmailEnrichmentPipeline(db_path=db_path, complete=_fake_llm(calls), model="fake-model",
+                                           messages_per_request=4, concurrency=2)
+        assert asyncio.run(pipeline.run_once()) == 10
+        assert len(calls) == 3
+        assert asyncio.run(pipeline.run_once()) == 0  # nothing left to enrich
+        assert len(calls) == 3
+
+        emails = EmailManager(db_path=db_path).get_emails(1)
+        assert len(emails) == 10
+        assert all(e.ai_sentiment == "neutral" and e.ai_categories == ["work", "meetings"] for e in emails)
+        assert emails[0].ai_summary.startswith("Ana asks")
+
+        conn = sqlite3.connect(db_path)
+        rows = conn.execute("SELECT message_id, model_used, tokens_used, response_type FROM ai_responses").fetchall()
+        conn.close()
+        assert len(rows) == 10 and {r[1] for r in rows} == {"fake-model"}
+        assert all(r[2] > 0 and r[3] == "enrichment" for r in rows)
+        assert pipeline.get_stats()["enriched"] == 10
+    print("✅ Bulk enrichment test passed!")
+
+def test_unparsed_messages_are_retried_then_skipped():
+    """Test a message the model keeps skipping is retried max_attempts times, then left alone"""
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = _mailbox(tmp, 2)
+        calls = []
+
+        async def skips_first(messages):
+            calls.append(messages)
+            ids = [int(i) for i in re.findall(r"^id: (\d+)$", messages[-1]["content"], re.MULTILINE)]
+            return json.dumps([{"id": i, "summary": "ok", "sentiment": "positive"} for i in ids if i != 1])
+
+        pipeline = EmailEnrichmentPipeline(db_path=db_path, complete=skips_first, max_attempts=2)
+        assert asyncio.run(pipeline.run_once()) == 1
+        assert asyncio.run(pipeline.run_once()) == 0
+        assert asyncio.run(pipeline.run_once()) == 0
+        assert len(calls) == 2 and pipeline.get_stats()["given_up"] == 1
+
+        # On-demand enrichment still tries a given-up message
+        assert asyncio.run(pipeline.enrich_messages(1, [1])) == 0 and len(calls) == 3
+        assert pipeline.get_enrichment(1, 2)["sentiment"] == "positive"
+        assert pipeline.get_enrichment(1, 1)["enriched_at"] is None
+        assert pipeline.get_enrichment(2, 1) is None
+    print("✅ Retry and skip test passed!")
+
+def test_requests_never_mix_users():
+    """Test each LLM request carries the mail of a single user"""
+    rows = [{"id": i, "user_id": 1 + i % 2, "subject": "s", "sender": "a", "body": "hi"} for i in range(6)]
+    groups = EmailEnrichmentPipeline(messages_per_request=8).pack(rows)
+    assert [[row["id"] for row, _ in group] for group in groups] == [[0, 2, 4], [1, 3, 5]]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = _mailbox(tmp, 3)
+        conn = sqlite3.connect(db_path)
+        conn.execute("INSERT INTO email_messages (user_id, account_id, subject, sender, recipient, body, date) "
+                     "VALUES (2, 2, 'Lunch', 'raj@example.com', 'you@example.com', 'Lunch on Friday?', ?)",
+                     (datetime(2026, 1, 1, 0, 1, 30).isoformat(),))
+        conn.commit()
+        conn.close()
+        calls = []
+        pipeline = EmailEnrichmentPipeline(db_path=db_path, complete=_fake_llm(calls), messages_per_request=8)
+        assert asyncio.run(pipeline.run_once()) == 4
+        assert len(calls) == 2
+        assert sorted(len(re.findall(r"^id: ", c[-1]["content"], re.MULTILINE)) for c in calls) == [1, 3]
+    print("✅ Per-user request test passed!")
+
+if __name__ == "__main__":
+    test_pack_respects_limits()
+    test_parse_validates_reply()
+    test_run_once_writes_in_bulk()
+    test_unparsed_messages_are_retried_then_skipped()
+    test_requests_never_mix_users()
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Test script for the local OpenRouter stand-in and the AIEngine benchmark
+"""
+
+import os
+import sys
+import asyncio
+
+import aiohttp
+
+# Add the current directory to Python path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fake_openrouter import FakeOpenRouter, DEFAULT_REPLY
+from bench_ai_engine import run_ai_benchmark, _bench_engine
+from http_client_pool import shared_http_client
+
+MODEL = "meta-llama/llama-3.1-8b-instruct"
+
+def test_failure_injection():
+    """Test 5xx, 429 with Retry-After and capacity limits are injected as configured"""
+    async def run():
+        server = FakeOpenRouter(latency=0.0, error_rate=1.0)
+        url = await server.start()
+        body = {"model": MODEL, "messages": [{"role": "user", "content": "hi"}]}
+        async with aiohttp.ClientSession() as session:
+            async with session.post(url, json=body) as response:
+                assert response.status == 503
+
+            server.configure(error_rate=0.0, rate_limit_rate=1.0, retry_after=2)
+            async with session.post(url, json=body) as response:
+                assert response.status == 429 and response.headers["Retry-After"] == "2"
+
+            server.configure(rate_limit_rate=0.0, latency=0.1, capacity=1)
+            statuses = await asyncio.gather(*(session.post(url, json=body) for _ in range(2)))
+            assert sorted(r.status for r in statuses) == [200, 429]
+            ok = next(r for r in statuses if r.status == 200)
+            assert (await ok.json())["choices"][0]["message"]["content"] == DEFAULT_REPLY
+            for r in statuses:
+                r.release()
+        stats = server.get_stats()
+        assert stats["requests"] == 4 and stats["errors"] == 1 and stats["rate_limited"] == 2
+        assert stats["over_capacity"] == 1 and stats["models"] == {MODEL: 4}
+        await server.stop()
+
+    asyncio.run(run())
+    print("✅ Failure injection test passed!")
+
+def test_engine_streams_from_fake():
+    """Test AIEngine streams the fake reply word by word over SSE"""
+    async def run():
+        server = FakeOpenRouter(latency=0.0, token_delay=0.001)
+        url = await server.start()
+        engine = _bench_engine(url, [MODEL], 3, 0.01, cache=False, local_intents=False, breaker_options={})
+        stream = engine.stream_message("Help me plan the offsite", {})
+        tokens = [t async for t in stream]
+        assert len(tokens) == len(DEFAULT_REPLY.split(" ")) and "".join(tokens) == DEFAULT_REPLY
+        assert stream.response.message == DEFAULT_REPLY and stream.response.prompt_tokens > 0
+        assert server.get_stats()["streams"] == 1
+        await engine.model_router.close()
+        await shared_http_client.close()
+        await server.stop()
+
+    asyncio.run(run())
+    print("✅ Engine streaming test passed!")
+
+def test_benchmark_reports_retry_amplification():
+    """Test the benchmark counts retries caused by injected rate limits"""
+    result = run_ai_benchmark(turns=40, concurrency=8, latency=0.005, rate_limit_rate=0.3, retry_after=0.01,
+                              seed=7, retry_base_delay=0.01, breaker_options={"min_calls": 1000})
+    assert result["model_replies"] + result["fallback_replies"] == 40 and result["errors"] == 0
+    assert result["model_turns"] == 40
+    assert result["upstream_rate_limited"] > 0 and result["retry_amplification"] > 1.0
+    assert result["upstream_requests"] == result["upstream_ok"] + result["upstream_rate_limited"]
+    assert result["throughput_rps"] > 0 and result["latency_p99_ms"] >= result["latency_p50_ms"]
+    print("✅ Benchmark amplification test passed!")
+
+if __name__ == "__main__":
+    test_failure_injection()
+    test_engine_streams_from_fake()
+    test_benchmark_reports_retry_amplification()
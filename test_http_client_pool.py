@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+Test script for the shared keep-alive HTTP client used for LLM calls
+"""
+
+import os
+import sys
+import asyncio
+
+from aiohttp import web
+
+# Add the current directory to Python path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from http_client_pool import SharedHTTPClient, shared_http_client
+from ai_engine import AIEngine
+
+async def _start_fake_openrouter(fail_first: int = 0):
+    """Local chat-completions endpoint; the first ``fail_first`` calls return 500"""
+    calls = {"count": 0}
+
+    async def completions(request):
+        calls["count"] += 1
+        if calls["count"] <= fail_first:
+            return web.json_response({"error": "overloaded"}, status=500)
+        body = await request.json()
+        return web.json_response({"choices": [{"message": {"content": f"echo {body['messages'][-1]['content']}"}}]})
+
+    app = web.Application()
+    app.router.add_post("/api/v1/chat/completions", completions)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    return runner, f"http://127.0.0.1:{port}/api/v1/chat/completions", calls
+
+def _engine(url: str) -> AIEngine:
+    engine = AIEngine()
+    engine.openrouter_api_key = "test-key"
+    engine.use_openrouter = True
+    engine.openrouter_api_url = url
+    return engine
+
+def test_calls_reuse_one_connection():
+    """Test sequential LLM calls share one keep-alive connection"""
+    async def run():
+        runner, url, calls = await _start_fake_openrouter()
+        await shared_http_client.start()
+        before = shared_http_client.get_stats()
+        engine = _engine(url)
+        for i in range(5):
+            reply = await engine._call_openrouter_api([{"role": "user", "content": f"hi {i}"}])
+            assert reply == f"echo hi {i}"
+
+        stats = shared_http_client.get_stats()
+        assert stats["requests"] - before["requests"] == 5
+        assert stats["connections_created"] - before["connections_created"] == 1
+        assert stats["connections_reused"] - before["connections_reused"] == 4
+        assert stats["in_flight"] == 0 and stats["active"]
+        await shared_http_client.close()
+        await runner.cleanup()
+
+    asyncio.run(run())
+    print("✅ Keep-alive reuse test passed!")
+
+def test_retries_reuse_pool():
+    """Test the retry loop goes through the shared pool"""
+    async def run():
+        runner, url, calls = await _start_fake_openrouter(fail_first=1)
+        before = shared_http_client.get_stats()
+        reply = await _engine(url)._call_openrouter_api([{"role": "user", "content": "retry"}])
+        assert reply == "echo retry"
+        assert calls["count"] == 2
+        stats = shared_http_client.get_stats()
+        assert stats["requests"] - before["requests"] == 2
+        await shared_http_client.close()
+        await runner.cleanup()
+
+    asyncio.run(run())
+    print("✅ Retry pool reuse test passed!")
+
+def test_session_follows_event_loop():
+    """Test a new event loop gets its own session and options apply to it"""
+    client = SharedHTTPClient()
+    client.configure(limit=10, limit_per_host=2)
+    try:
+        client.configure(bogus=1)
+        assert False, "expected ValueError"
+    except ValueError:
+        pass
+
+    async def get():
+        session = await client.get_session()
+        assert session is await client.get_session()
+        assert session.connector.limit == 10 and session.connector.limit_per_host == 2
+        return session
+
+    first = asyncio.run(get())
+    second = asyncio.run(get())
+    assert first is not second
+    assert client.get_stats()["sessions_created"] == 2
+    for session in (first, second):
+        asyncio.run(session.close())
+    print("✅ Event loop affinity test passed!")
+
+def test_concurrent_first_calls_share_one_session():
+    """Test callers racing for the first session all get the same one"""
+    client = SharedHTTPClient()
+
+    async def run():
+        sessions = await asyncio.gather(*(client.get_session() for _ in range(20)))
+        assert all(session is sessions[0] for session in sessions)
+        assert client.get_stats()["sessions_created"] == 1
+        await client.close()
+        assert sessions[0].closed
+
+    asyncio.run(run())
+    print("✅ Concurrent first session test passed!")
+
+if __name__ == "__main__":
+    test_calls_reuse_one_connection()
+    test_retries_reuse_pool()
+    test_session_follows_event_loop()
+    test_concurrent_first_calls_share_one_session()
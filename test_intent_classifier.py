@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Test script for the local hashed TF-IDF intent classifier
+"""
+
+import os
+import sys
+import json
+import asyncio
+import tempfile
+
+# Add the current directory to Python path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from intent_classifier import IntentClassifier, main as classifier_cli
+from ai_engine import AIEngine
+
+ROUTINE = [
+    ("schedule a meeting tomorrow at 3", "schedule_meeting"),
+    ("Book a meeting with Ana on Thursday at 10", "schedule_meeting"),
+    ("what's on my calendar tomorrow", "check_calendar"),
+    ("start a zoom call with the sales team", "video_conference"),
+]
+
+def test_seed_model_batch():
+    """Test the seed model labels routine requests and batch matches single calls"""
+    classifier = IntentClassifier().fit_seed()
+    texts = [text for text, _ in ROUTINE] + ["hello there", ""]
+    batch = classifier.classify_batch(texts)
+    assert [intent for intent, _ in batch[:4]] == [intent for _, intent in ROUTINE]
+    assert batch[4][0] == "general_chat"
+    for text, (intent, confidence) in zip(texts, batch):
+        single = classifier.classify(text)
+        assert single[0] == intent and abs(single[1] - confidence) < 1e-5
+    probabilities = classifier.predict_proba(texts)
+    assert probabilities.shape == (6, len(classifier.labels))
+    assert abs(probabilities.sum(axis=1) - 1).max() < 1e-5
+    assert classifier.classify_batch([]) == []
+    print("✅ Seed model batch test passed!")
+
+def test_threshold_routing():
+    """Test confident routine intents stay local and chat or unsure messages escalate"""
+    classifier = IntentClassifier(threshold=0.65).fit_seed()
+    assert classifier.route("schedule a meeting tomorrow at 3")[0] == "schedule_meeting"
+    assert classifier.route("hi there") is None  # general chat always escalates
+    assert classifier.route("can you summarise the contract negotiations") is None
+
+    classifier.configure(threshold=0.999)
+    assert classifier.route("schedule a meeting tomorrow at 3") is None
+    classifier.configure(enabled=False)
+    assert classifier.route("schedule a meeting tomorrow at 3") is None
+    stats = classifier.get_stats()
+    assert stats["local"] == 1 and stats["escalated"] == 3
+    print("✅ Threshold routing test passed!")
+
+def test_train_save_load():
+    """Test the offline train command writes a model that loads with identical predictions"""
+    with tempfile.TemporaryDirectory() as tmp:
+        data = os.path.join(tmp, "examples.jsonl")
+        with open(data, "w") as f:
+            for text, intent in ROUTINE + [("thanks a lot", "general_chat"), ("cheers", "general_chat")]:
+                f.write(json.dumps({"text": text, "intent": intent}) + "\n")
+        model_path = os.path.join(tmp, "intent_model.npz")
+        assert classifier_cli(["train", data, "--out", model_path, "--with-seed"]) == 0
+
+        trained = IntentClassifier().fit_seed()
+        loaded = IntentClassifier().load(model_path)
+        texts = [text for text, _ in ROUTINE]
+        assert [i for i, _ in loaded.classify_batch(texts)] == [i for _, i in ROUTINE]
+        assert loaded.labels == trained.labels
+        assert classifier_cli(["evaluate", data, "--model", model_path]) == 0
+    print("✅ Train, save and load test passed!")
+
+def test_engine_answers_routine_turns_locally():
+    """Test routine turns skip the LLM while general chat still reaches it"""
+    calls = []
+
+    async def fake_call(messages, model=None, priority=None):
+        calls.append(messages[-1]["content"])
+        return "Happy to help with your email and calendar."
+
+    async def run():
+        engine = AIEngine()
+        engine.use_openrouter = True
+        engine.response_cache = None
+        engine.intent_classifier = IntentClassifier(threshold=0.65)
+        engine._call_openrouter_api = fake_call
+
+        response = await engine.process_message("Schedule a meeting tomorrow at 3pm", {})
+        assert calls == []
+        assert response.intent.intent == "schedule_meeting" and response.intent.confidence >= 0.65
+        assert response.intent.entities["date"] == "tomorrow"
+
+        response = await engine.process_message("hello, how are you?", {})
+        assert len(calls) == 1 and response.message == "Happy to help with your email and calendar."
+
+        stream = engine.stream_message("what's on my calendar tomorrow", {})
+        assert [t async for t in stream] == [] and stream.response.intent.intent == "check_calendar"
+        assert len(calls) == 1
+
+        # Without an LLM there is nothing to skip; the rule-based intent is kept
+        engine.use_openrouter = False
+        assert (await engine.process_message("Schedule a meeting tomorrow", {})).intent.confidence == 0.8
+
+    asyncio.run(run())
+    print("✅ Engine local answer test passed!")
+
+if __name__ == "__main__":
+    test_seed_model_batch()
+    test_threshold_routing()
+    test_train_save_load()
+    test_engine_answers_routine_turns_locally()
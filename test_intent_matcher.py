@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""
+Test script for the compiled single-pass intent matcher
+"""
+
+import os
+import sys
+
+# Add the current directory to Python path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from ai_engine import AIEngine
+
+def test_precedence_and_confidence():
+    """Test priority phrases win, then intent_patterns in order, with the existing confidences"""
+    engine = AIEngine()
+    cases = [
+        ("What's on my calendar tomorrow?", "check_calendar", 0.9, "text"),
+        ("Please send an email to bob@example.com", "send_email", 0.9, "text"),
+        ("What is her email address?", "send_email", 0.9, "text"),  # "email" inside "email address"
+        ("Book a slot with the team", "schedule_meeting", 0.8, "form"),
+        ("Are you busy on Friday?", "schedule_meeting", 0.6, "form"),
+        ("add contact for Dana", "send_email", 0.6, "form"),  # "contact" is also a send_email keyword
+        ("save her phone number", "create_contact", 0.6, "form"),
+        ("Start a ZOOM call", "video_conference", 0.8, "form"),
+        ("Set up an online meeting", "schedule_meeting", 0.8, "form"),  # "meeting" outranks video_conference
+        ("Thanks, that's all", "general_chat", 0.9, "text"),
+    ]
+    for message, intent, confidence, response_type in cases:
+        result = engine.detect_intent(message)
+        assert (result.intent, result.confidence, result.response_type) == (intent, confidence, response_type), \
+            f"{message!r}: {result}"
+    assert engine.detect_intent("Schedule a meeting tomorrow at 3pm").entities == {"date": "tomorrow", "time": "3pm"}
+    print("✅ Precedence and confidence test passed!")
+
+def test_single_pass_finds_overlapping_hits():
+    """Test one scan reports every intent hit, including phrases nested in or overlapping others"""
+    engine = AIEngine()
+    ranked = [intent for _, intent, _ in engine._match_intents("check my calendar and the video meeting with teams")]
+    assert ranked == ["check_calendar", "schedule_meeting", "video_conference"]
+
+    hits = {intent: confidence for _, intent, confidence in engine._match_intents("free time for a video call")}
+    assert hits == {"schedule_meeting": 0.6, "video_conference": 0.8}
+    assert engine._match_intents("nothing relevant here") == []
+    print("✅ Overlapping hits test passed!")
+
+def test_recompile_and_batch():
+    """Test new patterns take effect after recompiling and batch results match single calls"""
+    engine = AIEngine()
+    engine.intent_patterns["triage_inbox"] = ["triage", "clean up my inbox", "unread"]
+    assert engine.detect_intent("triage please").intent == "general_chat"
+    engine.compile_intent_patterns()
+    assert engine.detect_intent("Clean up my inbox").intent == "triage_inbox"
+
+    messages = ["Clean up my inbox", "Email bob@example.com", "clean up my INBOX", "hello", "Email bob@example.com"]
+    batch = engine.detect_intents_batch(messages)
+    assert [r.intent for r in batch] == ["triage_inbox", "send_email", "triage_inbox", "general_chat", "send_email"]
+    assert batch == [engine.detect_intent(m) for m in messages]
+    assert batch[1] is not batch[4]
+    assert engine.detect_intents_batch([]) == []
+    print("✅ Recompile and batch test passed!")
+
+if __name__ == "__main__":
+    test_precedence_and_confidence()
+    test_single_pass_finds_overlapping_hits()
+    test_recompile_and_batch()
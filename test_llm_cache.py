@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+Test script for the LLM response cache
+"""
+
+import os
+import sys
+import time
+import asyncio
+import tempfile
+
+# Add the current directory to Python path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from llm_cache import LLMResponseCache
+from ai_engine import AIEngine, ModelReply
+
+MODEL = "meta-llama/llama-3.1-8b-instruct"
+
+def _messages(user: str, system: str = "You are dhii. Current time: 2026-10-18 09:15 UTC.", history=()):
+    return [{"role": "system", "content": system}, *history, {"role": "user", "content": user}]
+
+def test_key_normalization():
+    """Test equivalent requests share a key and meaningful changes do not"""
+    cache = LLMResponseCache(db_path=None, history_turns=2)
+    key = cache.make_key(MODEL, _messages("What can you do?"))
+    assert key == cache.make_key(MODEL, _messages("  what can   you do "))
+    assert key == cache.make_key(MODEL, _messages("What can you do?", "You are dhii.  Current time: 2026-10-18 09:47 UTC."))
+    assert key != cache.make_key("openai/gpt-4o-mini", _messages("What can you do?"))
+    # The hour and date still split the key ("tomorrow" changes meaning at midnight)
+    assert key != cache.make_key(MODEL, _messages("What can you do?", "You are dhii. Current time: 2026-10-18 10:15 UTC."))
+    assert key != cache.make_key(MODEL, _messages("What can you do?", "You are dhii. Current time: 2026-10-19 09:15 UTC."))
+    assert key != cache.make_key(MODEL, _messages("What can you not do?"))
+    assert key != cache.make_key(MODEL, _messages("What can you do?", "You are dhii. You are assisting user 7."))
+
+    old = [{"role": "user", "content": "first"}, {"role": "assistant", "content": "ok"}]
+    recent = [{"role": "user", "content": "second"}, {"role": "assistant", "content": "ok"}]
+    # Only the last history_turns messages count
+    assert cache.make_key(MODEL, _messages("hi", history=old + recent)) == \
+        cache.make_key(MODEL, _messages("hi", history=[{"role": "user", "content": "x"}] + recent))
+    assert cache.make_key(MODEL, _messages("hi", history=recent)) != cache.make_key(MODEL, _messages("hi"))
+    print("✅ Key normalization test passed!")
+
+def test_ttl_and_lru():
+    """Test entries expire after their TTL and the oldest entry is evicted"""
+    cache = LLMResponseCache(db_path=None, max_entries=2, ttl=60)
+    cache.set("a", MODEL, "reply a")
+    cache.set("b", MODEL, "reply b")
+    assert cache.get("a") == "reply a"  # a is now most recently used
+    cache.set("c", MODEL, "reply c")
+    assert cache.get("b") is None
+    assert cache.get("a") == "reply a" and cache.get("c") == "reply c"
+
+    cache.set("short", MODEL, "soon gone", ttl=0.05)
+    time.sleep(0.06)
+    assert cache.get("short") is None
+    stats = cache.get_stats()
+    assert stats["evictions"] == 2 and stats["expired"] == 1
+    assert stats["hits"] == 3 and stats["misses"] == 2
+    print("✅ TTL and LRU eviction test passed!")
+
+def test_persists_across_restarts():
+    """Test stored replies are reloaded by a new cache on the same file"""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "llm_cache.db")
+        first = LLMResponseCache(db_path=path, max_entries=2)
+        first.set("a", MODEL, "reply a")
+        first.set("b", MODEL, "reply b")
+        first.set("c", MODEL, "reply c")
+        first.set("gone", MODEL, "expired", ttl=-1)
+        assert first.flush()
+
+        second = LLMResponseCache(db_path=path, max_entries=2)
+        assert second.get("c") == "reply c" and second.get("b") == "reply b"
+        assert second.get("a") is None and second.get("gone") is None
+
+        second.clear()
+        assert LLMResponseCache(db_path=path).get("c") is None
+    print("✅ Persistence test passed!")
+
+def test_engine_serves_cached_reply():
+    """Test a repeated message skips the model call and opted-out intents always call it"""
+    calls = []
+
+    async def fake_call(messages, model=None, priority=None):
+        calls.append(messages[-1]["content"])
+        return "I can help you with your email and calendar."
+
+    async def run():
+        engine = AIEngine()
+        engine.use_openrouter = True
+        engine.response_cache = LLMResponseCache(db_path=None, skip_intents=["check_calendar"])
+        engine.intent_classifier = None
+        engine._call_openrouter_api = fake_call
+        first = await engine.process_message("Hello there!", {})
+        second = await engine.process_message("hello there", {})
+        assert first.message == second.message == "I can help you with your email and calendar."
+        assert len(calls) == 1
+
+        await engine.process_message("what's on my calendar this week", {})
+        await engine.process_message("what's on my calendar this week", {})
+        assert len(calls) == 3
+        stats = engine.response_cache.get_stats()
+        assert stats["hits"] == 1 and stats["skipped"] == 2
+
+        # Streaming turns share the cache; a hit is one delta
+        stream = engine.stream_message("HELLO THERE", {})
+        tokens = [t async for t in stream]
+        assert tokens == [first.message] and not stream.replaced
+        assert len(calls) == 3
+
+    asyncio.run(run())
+    print("✅ Engine cache test passed!")
+
+def test_fallback_reply_keyed_on_its_model():
+    """Test a reply from a fallback model is not served as the primary model's reply"""
+    calls = []
+
+    async def fake_call(messages, model=None, priority=None):
+        calls.append(messages[-1]["content"])
+        return ModelReply("I can help you with your email and calendar.", "openai/gpt-4o-mini")
+
+    async def run():
+        engine = AIEngine()
+        engine.use_openrouter = True
+        engine.response_cache = LLMResponseCache(db_path=None)
+        engine.intent_classifier = None
+        engine._call_openrouter_api = fake_call
+        await engine.process_message("Hello there!", {})
+        await engine.process_message("Hello there!", {})
+        assert len(calls) == 2  # the primary is healthy, so the fallback's reply is not reused
+        assert engine.response_cache.get_stats()["stores"] == 2
+
+    asyncio.run(run())
+    print("✅ Fallback cache key test passed!")
+
+if __name__ == "__main__":
+    test_key_normalization()
+    test_ttl_and_lru()
+    test_persists_across_restarts()
+    test_engine_serves_cached_reply()
+    test_fallback_reply_keyed_on_its_model()
@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+"""
+Test script for single-flight coalescing and prioritized LLM concurrency
+"""
+
+import os
+import sys
+import asyncio
+
+from aiohttp import web
+
+# Add the current directory to Python path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from llm_dispatch import LLMDispatcher, PRIORITY_BACKGROUND, PRIORITY_INTERACTIVE, llm_dispatcher
+from http_client_pool import shared_http_client
+from ai_engine import AIEngine
+
+async def _start_fake_openrouter(delay: float = 0.05, rate_limit_first: int = 0):
+    """Slow chat-completions endpoint that records how many calls it served at once"""
+    state = {"calls": 0, "active": 0, "peak": 0}
+
+    async def completions(request):
+        state["calls"] += 1
+        if state["calls"] <= rate_limit_first:
+            return web.json_response({"error": "slow down"}, status=429, headers={"Retry-After": "0.1"})
+        body = await request.json()
+        state["active"] += 1
+        state["peak"] = max(state["peak"], state["active"])
+        await asyncio.sleep(delay)
+        state["active"] -= 1
+        return web.json_response({"choices": [{"message": {"content": f"echo {body['messages'][-1]['content']}"}}]})
+
+    app = web.Application()
+    app.router.add_post("/api/v1/chat/completions", completions)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    return runner, f"http://127.0.0.1:{port}/api/v1/chat/completions", state
+
+def _engine(url: str) -> AIEngine:
+    engine = AIEngine()
+    engine.openrouter_api_key = "test-key"
+    engine.use_openrouter = True
+    engine.openrouter_api_url = url
+    return engine
+
+def test_identical_calls_share_one_request():
+    """Test concurrent identical calls are served by a single upstream request"""
+    async def run():
+        runner, url, state = await _start_fake_openrouter()
+        engine = _engine(url)
+        same = [{"role": "user", "content": "what's new?"}]
+        replies = await asyncio.gather(*[engine._call_openrouter_api(same) for _ in range(20)],
+                                       engine._call_openrouter_api([{"role": "user", "content": "other"}]))
+        assert replies[:20] == ["echo what's new?"] * 20 and replies[20] == "echo other"
+        assert state["calls"] == 2
+
+        # A caller that gives up does not cancel the call for the rest
+        first = asyncio.ensure_future(engine._call_openrouter_api(same))
+        second = asyncio.ensure_future(engine._call_openrouter_api(same))
+        await asyncio.sleep(0.01)
+        first.cancel()
+        assert await second == "echo what's new?"
+        assert state["calls"] == 3
+        await shared_http_client.close()
+        await runner.cleanup()
+
+    asyncio.run(run())
+    print("✅ Single-flight coalescing test passed!")
+
+def test_concurrency_limit_and_priority():
+    """Test the slot limit holds and interactive callers are served before background ones"""
+    async def run():
+        dispatcher = LLMDispatcher(max_concurrency=2)
+        order, running, peak = [], [0], [0]
+
+        async def call(name, priority):
+            async with dispatcher.slot(priority):
+                running[0] += 1
+                peak[0] = max(peak[0], running[0])
+                order.append(name)
+                await asyncio.sleep(0.02)
+                running[0] -= 1
+
+        tasks = [asyncio.ensure_future(call(f"bg{i}", PRIORITY_BACKGROUND)) for i in range(4)]
+        await asyncio.sleep(0.005)
+        tasks += [asyncio.ensure_future(call(f"chat{i}", PRIORITY_INTERACTIVE)) for i in range(2)]
+        await asyncio.sleep(0.005)
+        stats = dispatcher.get_stats()
+        assert stats["active"] == 2 and stats["waiting_background"] == 2 and stats["waiting_interactive"] == 2
+        await asyncio.gather(*tasks)
+        assert peak[0] == 2
+        assert order[:2] == ["bg0", "bg1"] and order[2:4] == ["chat0", "chat1"]
+
+        # A cancelled waiter gives its turn away instead of leaking the slot
+        blocker = asyncio.ensure_future(call("blocker", PRIORITY_BACKGROUND))
+        holder = asyncio.ensure_future(call("holder", PRIORITY_BACKGROUND))
+        await asyncio.sleep(0.005)
+        waiter = asyncio.ensure_future(call("cancelled", PRIORITY_INTERACTIVE))
+        await asyncio.sleep(0.005)
+        waiter.cancel()
+        await asyncio.gather(blocker, holder, return_exceptions=True)
+        await call("after", PRIORITY_INTERACTIVE)
+        assert "cancelled" not in order and dispatcher.get_stats()["active"] == 0
+
+    asyncio.run(run())
+    print("✅ Concurrency limit and priority test passed!")
+
+def test_interactive_caller_promotes_background_flight():
+    """Test joining a queued background flight from chat moves it ahead of other background work"""
+    async def run():
+        dispatcher = LLMDispatcher(max_concurrency=1)
+        order = []
+
+        async def upstream(name):
+            async with dispatcher.slot(PRIORITY_BACKGROUND):
+                order.append(name)
+                await asyncio.sleep(0.01)
+                return name
+
+        first = asyncio.ensure_future(upstream("running"))
+        await asyncio.sleep(0.001)
+        queued = asyncio.ensure_future(upstream("other background"))
+        flight = asyncio.ensure_future(dispatcher.coalesce("k", lambda: upstream("shared"), PRIORITY_BACKGROUND))
+        await asyncio.sleep(0.001)
+        joined = await dispatcher.coalesce("k", lambda: upstream("duplicate"), PRIORITY_INTERACTIVE)
+        await asyncio.gather(first, queued, flight)
+        assert joined == "shared"
+        assert order == ["running", "shared", "other background"]
+        assert dispatcher.get_stats()["coalesced"] == 1
+
+    asyncio.run(run())
+    print("✅ Priority promotion test passed!")
+
+def test_rate_limit_pauses_all_callers():
+    """Test a 429 pauses new upstream calls for its Retry-After, the call still succeeds and the circuit ignores it"""
+    async def run():
+        runner, url, state = await _start_fake_openrouter(delay=0.01, rate_limit_first=1)
+        engine = _engine(url)
+        cool_downs = llm_dispatcher.get_stats()["cool_downs"]
+        failures = engine.model_router.breaker(engine.openrouter_model).stats["failures"]
+        reply = await engine._call_openrouter_api([{"role": "user", "content": "hi"}])
+        assert reply == "echo hi"
+        assert state["calls"] == 2
+        assert llm_dispatcher.get_stats()["cool_downs"] == cool_downs + 1
+        # Rate limiting is the dispatcher's business, not a mark against the model
+        assert engine.model_router.breaker(engine.openrouter_model).stats["failures"] == failures
+        await shared_http_client.close()
+        await runner.cleanup()
+
+    asyncio.run(run())
+    print("✅ Rate limit cool-down test passed!")
+
+if __name__ == "__main__":
+    test_identical_calls_share_one_request()
+    test_concurrency_limit_and_priority()
+    test_interactive_caller_promotes_background_flight()
+    test_rate_limit_pauses_all_callers()
@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+"""
+Test script for LLM circuit breakers and model fallback routing
+"""
+
+import os
+import sys
+import time
+import asyncio
+
+from aiohttp import web
+
+# Add the current directory to Python path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from llm_routing import CircuitBreaker, ModelRouter, CLOSED, OPEN
+from http_client_pool import shared_http_client
+from ai_engine import AIEngine
+
+PRIMARY = "meta-llama/llama-3.1-8b-instruct"
+FALLBACK = "mistralai/mistral-7b-instruct"
+
+async def _start_fake_openrouter(broken_models):
+    """Chat-completions endpoint returning 503 for every model in ``broken_models``"""
+    state = {"calls": [], "probes": 0}
+
+    async def completions(request):
+        body = await request.json()
+        if body.get("max_tokens") == 1:
+            state["probes"] += 1
+        else:
+            state["calls"].append(body["model"])
+        if body["model"] in broken_models:
+            return web.json_response({"error": "unavailable"}, status=503)
+        return web.json_response({"choices": [{"message": {"content": f"{body['model']} can help with your email"}}]})
+
+    app = web.Application()
+    app.router.add_post("/api/v1/chat/completions", completions)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    return runner, f"http://127.0.0.1:{port}/api/v1/chat/completions", state
+
+def _engine(url: str, **breaker_options) -> AIEngine:
+    engine = AIEngine()
+    engine.openrouter_api_key = "test-key"
+    engine.use_openrouter = True
+    engine.openrouter_api_url = url
+    engine.response_cache = None
+    engine.intent_classifier = None
+    engine.model_router = ModelRouter([PRIMARY, FALLBACK], **breaker_options)
+    engine.model_router.set_probe(engine._probe_openrouter)
+    engine.openrouter_model = PRIMARY
+    return engine
+
+def test_breaker_window():
+    """Test the circuit opens on error rate or slow calls, and only with enough calls"""
+    breaker = CircuitBreaker("m", min_calls=4, failure_threshold=0.5, slow_call_seconds=1.0)
+    for ok in (True, True, False):
+        assert not breaker.record(ok, 0.1)
+    assert breaker.state == CLOSED  # 1/3 bad, below min_calls anyway
+    assert breaker.record(True, 2.5)  # slow success: 2/4 bad
+    assert breaker.state == OPEN and not breaker.allow()
+
+    breaker.probe_result(False)
+    assert breaker.state == OPEN and breaker.current_open_seconds == 30.0
+    breaker.probe_result(True)
+    assert breaker.state == CLOSED and breaker.current_open_seconds == 15.0
+
+    # Background batches are slow by design; their latency is not held against the model
+    for _ in range(4):
+        assert not breaker.record(True, 30.0, score_latency=False)
+    assert breaker.state == CLOSED and breaker.get_stats()["window_error_rate"] == 0.0
+
+    router = ModelRouter([PRIMARY, FALLBACK], min_calls=1)
+    assert router.pick() == PRIMARY
+    router.record(PRIMARY, False, 0.1)
+    assert router.pick() == FALLBACK and router.pick(PRIMARY) == FALLBACK
+    router.record(FALLBACK, False, 0.1)
+    assert router.pick() is None
+    assert router.get_stats()["circuits"][PRIMARY]["state"] == OPEN
+    print("✅ Circuit breaker window test passed!")
+
+def test_failure_streak_and_degraded_deadline():
+    """Test failures in a row open a quiet circuit and a degraded model gets a short deadline"""
+    breaker = CircuitBreaker("m", min_calls=20, consecutive_failures=3, slow_call_seconds=5.0)
+    assert breaker.call_timeout(30.0) == 30.0
+    assert not breaker.record(False, 0.1)
+    assert breaker.degraded() and breaker.call_timeout(30.0) == 5.0
+    assert not breaker.record(True, 0.1)  # a success resets the streak
+    assert not breaker.record(False, 0.1) and not breaker.record(False, 0.1)
+    assert breaker.record(False, 0.1)
+    assert breaker.state == OPEN and breaker.get_stats()["failure_streak"] == 0
+
+    breaker.probe_result(True)
+    assert breaker.state == CLOSED and breaker.degraded()  # still recovering
+    breaker.closed_at -= breaker.window_seconds
+    assert not breaker.degraded() and breaker.call_timeout(30.0) == 30.0
+
+    # route() answers like pick() without touching breaker stats
+    router = ModelRouter([PRIMARY, FALLBACK], consecutive_failures=1)
+    router.record(PRIMARY, False, 0.1)
+    rejected = router.breaker(PRIMARY).stats["rejected"]
+    assert router.route(PRIMARY) == FALLBACK
+    assert router.breaker(PRIMARY).stats["rejected"] == rejected
+    print("✅ Failure streak test passed!")
+
+def test_failing_model_routes_to_fallback():
+    """Test a failing primary opens its circuit and calls move to the fallback without backoff"""
+    async def run():
+        runner, url, state = await _start_fake_openrouter({PRIMARY})
+        engine = _engine(url, min_calls=1, open_seconds=60)
+        started = time.perf_counter()
+        reply = await engine._call_openrouter_api([{"role": "user", "content": "hi"}])
+        assert reply == f"{FALLBACK} can help with your email"
+        assert time.perf_counter() - started < 1.0
+        reply = await engine._call_openrouter_api([{"role": "user", "content": "again"}])
+        assert reply == f"{FALLBACK} can help with your email"
+        assert state["calls"] == [PRIMARY, FALLBACK, FALLBACK]
+        await engine.model_router.close()
+        await shared_http_client.close()
+        await runner.cleanup()
+
+    asyncio.run(run())
+    print("✅ Fallback routing test passed!")
+
+def test_open_circuits_fail_fast():
+    """Test chat gets the pattern-based reply at once while every circuit is open"""
+    async def run():
+        runner, url, state = await _start_fake_openrouter({PRIMARY, FALLBACK})
+        engine = _engine(url, min_calls=1, open_seconds=60)
+        await engine.process_message("schedule a meeting tomorrow", {})
+        calls = len(state["calls"])
+        assert calls == 2
+
+        started = time.perf_counter()
+        response = await engine.process_message("schedule a meeting tomorrow", {})
+        assert time.perf_counter() - started < 1.0
+        assert len(state["calls"]) == calls
+        assert response.message and response.intent.intent == "schedule_meeting"
+
+        stream = engine.stream_message("schedule a meeting tomorrow", {})
+        tokens = [t async for t in stream]
+        assert tokens == [] and not stream.streamed and stream.response.message
+        assert len(state["calls"]) == calls
+        await engine.model_router.close()
+        await shared_http_client.close()
+        await runner.cleanup()
+
+    asyncio.run(run())
+    print("✅ Fail-fast test passed!")
+
+def test_background_probe_closes_circuit():
+    """Test an open circuit is probed in the background and closes once the model recovers"""
+    async def run():
+        broken = {PRIMARY}
+        runner, url, state = await _start_fake_openrouter(broken)
+        engine = _engine(url, min_calls=1, open_seconds=0.05)
+        await engine._call_openrouter_api([{"role": "user", "content": "hi"}])
+        assert engine.model_router.breaker(PRIMARY).state != CLOSED
+
+        await asyncio.sleep(0.1)
+        assert state["probes"] >= 1  # still broken: probed and kept open
+        assert engine.model_router.breaker(PRIMARY).state != CLOSED
+        broken.clear()
+        await asyncio.sleep(0.3)
+        assert engine.model_router.breaker(PRIMARY).state == CLOSED
+
+        reply = await engine._call_openrouter_api([{"role": "user", "content": "back"}])
+        assert reply == f"{PRIMARY} can help with your email"
+        await engine.model_router.close()
+        await shared_http_client.close()
+        await runner.cleanup()
+
+    asyncio.run(run())
+    print("✅ Background probe test passed!")
+
+if __name__ == "__main__":
+    test_breaker_window()
+    test_failure_streak_and_degraded_deadline()
+    test_failing_model_routes_to_fallback()
+    test_open_circuits_fail_fast()
+    test_background_probe_closes_circuit()
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Test script for the compact brute-force login attempt tracker
+"""
+
+import os
+import sys
+from datetime import datetime, timedelta, timezone
+
+# Add the current directory to Python path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from security_manager import LoginAttemptTracker, SecurityManager, SecurityConfig
+from security_event_store import SecurityEventStore
+
+def test_lockout_after_max_failures():
+    """Test that the threshold triggers only once max failures land in the window"""
+    tracker = LoginAttemptTracker(max_failures=3, window_seconds=900)
+    now = 1_000_000
+
+    assert not tracker.record_failure("10.0.0.1", now)
+    assert not tracker.record_failure("10.0.0.1", now + 1)
+    assert tracker.record_failure("10.0.0.1", now + 2)
+    assert tracker.recent_failures("10.0.0.1", now + 2) == 3
+    print("✅ Lockout threshold test passed!")
+
+def test_failures_outside_window_do_not_count():
+    """Test that stale failures age out of the ring"""
+    tracker = LoginAttemptTracker(max_failures=3, window_seconds=900)
+    now = 1_000_000
+
+    tracker.record_failure("10.0.0.1", now)
+    tracker.record_failure("10.0.0.1", now + 1)
+    assert not tracker.record_failure("10.0.0.1", now + 1000)
+    assert tracker.recent_failures("10.0.0.1", now + 1000) == 1
+    print("✅ Sliding window test passed!")
+
+def test_memory_stays_bounded():
+    """Test that key count is capped and idle keys are evicted"""
+    tracker = LoginAttemptTracker(max_failures=5, window_seconds=900, max_keys=100)
+    now = 1_000_000
+
+    for i in range(1000):
+        tracker.record_failure(f"192.168.{i // 256}.{i % 256}", now)
+    assert len(tracker) == 100
+
+    assert tracker.evict_expired(now + 901) == 100
+    assert len(tracker) == 0
+    print("✅ Bounded memory test passed!")
+
+def test_security_manager_locks_ip_and_email():
+    """Test SecurityManager lockout integration"""
+    manager = SecurityManager(SecurityConfig(max_login_attempts=3))
+
+    for _ in range(2):
+        manager.record_login_attempt("10.0.0.2", "user@example.com", False, "pytest")
+    assert not manager.check_brute_force_protection("10.0.0.2")["is_locked"]
+
+    # Successful logins are not tracked
+    manager.record_login_attempt("10.0.0.2", "user@example.com", True, "pytest")
+    manager.record_login_attempt("10.0.0.2", "user@example.com", False, "pytest")
+
+    assert manager.check_brute_force_protection("10.0.0.2")["reason"] == "ip_lockout"
+    assert manager.check_brute_force_protection("10.0.0.9", "user@example.com")["reason"] == "account_lockout"
+    print("✅ SecurityManager lockout test passed!")
+
+def test_expired_lockouts_leave_in_expiry_order():
+    """Test ended lockouts are dropped soonest first and a renewed lockout survives its old expiry"""
+    manager = SecurityManager(event_store=SecurityEventStore(":memory:"))
+    now = datetime.now(timezone.utc)
+    for minutes, identifier in ((3, "c"), (1, "a"), (2, "b")):
+        manager._lock(identifier, now + timedelta(minutes=minutes))
+    manager._lock("a", now + timedelta(minutes=10))  # locked again before the first lockout ended
+
+    manager._evict_expired_lockouts(now + timedelta(minutes=2))
+    assert set(manager.locked_accounts) == {"a", "c"}
+    manager._evict_expired_lockouts(now + timedelta(minutes=5))
+    assert set(manager.locked_accounts) == {"a"} and len(manager._lockout_expiries) == 1
+    print("✅ Lockout expiry order test passed!")
+
+if __name__ == "__main__":
+    test_lockout_after_max_failures()
+    test_failures_outside_window_do_not_count()
+    test_memory_stays_bounded()
+    test_security_manager_locks_ip_and_email()
+    test_expired_lockouts_leave_in_expiry_order()
@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+Test script for the reusable meeting agent runtime and its session LRU
+"""
+
+import os
+import sys
+import asyncio
+
+# Add the current directory to Python path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from a2ui_integration.agent.agent_runtime import AgentRuntime
+
+class FakeSessionService:
+    """Stands in for ADK's InMemorySessionService"""
+
+    def __init__(self):
+        self.sessions = {}
+        self.deleted = []
+
+    async def delete_session(self, *, app_name, user_id, session_id):
+        self.sessions.pop((user_id, session_id), None)
+        self.deleted.append((user_id, session_id))
+
+class FakeRunner:
+    """Records every turn in its session, like run_debug on an ADK Runner"""
+
+    def __init__(self, session_service, delay: float = 0.0):
+        self.session_service = session_service
+        self.delay = delay
+        self.active = 0
+        self.max_active_per_session = 0
+
+    async def run_debug(self, user_messages, *, user_id, session_id, quiet=False):
+        history = self.session_service.sessions.setdefault((user_id, session_id), [])
+        history.append(user_messages)
+        self.active += 1
+        self.max_active_per_session = max(self.max_active_per_session, self.active)
+        await asyncio.sleep(self.delay)
+        self.active -= 1
+        return [f"{len(history)} turns: {' | '.join(history)}"]
+
+def _runtime(delay: float = 0.0, **options):
+    built = []
+
+    def build():
+        service = FakeSessionService()
+        runner = FakeRunner(service, delay)
+        built.append(runner)
+        return runner, service
+
+    return AgentRuntime(build, app_name="meeting_assistant", **options), built
+
+def test_runner_built_once_and_sessions_persist():
+    """Test one runner serves every turn and a session keeps its earlier turns"""
+    async def run():
+        runtime, built = _runtime()
+        await runtime.run("book a meeting", "ana@example.com", "s1")
+        events = await runtime.run("tomorrow at 3", "ana@example.com", "s1")
+        assert events == ["2 turns: book a meeting | tomorrow at 3"]
+        other = await runtime.run("hello", "raj@example.com", "s1")
+        assert other == ["1 turns: hello"]  # sessions are per user
+        default = await runtime.run("hi", "ana@example.com")
+        assert default == ["1 turns: hi"]
+        assert len(built) == 1
+        stats = runtime.get_stats()
+        assert stats["builds"] == 1 and stats["sessions"] == 3
+        assert stats["sessions_created"] == 3 and stats["sessions_reused"] == 1
+
+    asyncio.run(run())
+    print("✅ Runner reuse test passed!")
+
+def test_lru_and_idle_eviction():
+    """Test sessions beyond max_sessions and idle ones are deleted from the service"""
+    async def run():
+        runtime, built = _runtime(max_sessions=2, idle_seconds=60)
+        for conversation in ("a", "b", "c"):
+            await runtime.run("hi", "ana@example.com", conversation)
+        service = built[0].session_service
+        assert service.deleted == [("ana@example.com", "a")]
+        assert runtime.get_stats()["evicted_lru"] == 1
+
+        runtime.configure(idle_seconds=0.01)
+        await asyncio.sleep(0.02)
+        await runtime.run("again", "raj@example.com", "x")
+        assert ("ana@example.com", "b") in service.deleted and ("ana@example.com", "c") in service.deleted
+        assert runtime.get_stats()["sessions"] == 1 and runtime.get_stats()["evicted_idle"] == 2
+
+        await runtime.end_session("raj@example.com", "x")
+        assert runtime.get_stats()["sessions"] == 0
+
+    asyncio.run(run())
+    print("✅ Session eviction test passed!")
+
+def test_new_session_survives_full_busy_runtime():
+    """Test a new session is never evicted on arrival when every other session is mid-turn"""
+    async def run():
+        runtime, built = _runtime(delay=0.05, max_sessions=1)
+        busy = asyncio.ensure_future(runtime.run("long turn", "ana@example.com", "a"))
+        await asyncio.sleep(0.01)
+        events = await runtime.run("hi", "ana@example.com", "b")
+        await busy
+        assert events == ["1 turns: hi"]
+        service = built[0].session_service
+        assert service.deleted == [] and runtime.get_stats()["sessions"] == 2
+
+        await runtime.run("hi", "ana@example.com", "c")
+        assert service.deleted == [("ana@example.com", "a"), ("ana@example.com", "b")]
+        assert runtime.get_stats()["sessions"] == 1
+
+    asyncio.run(run())
+    print("✅ Busy runtime eviction test passed!")
+
+def test_turns_in_one_session_are_serialized():
+    """Test concurrent turns in a session run one at a time; a failed build is retried"""
+    async def run():
+        runtime, built = _runtime(delay=0.01)
+        await asyncio.gather(*(runtime.run(f"turn {i}", "ana@example.com", "s1") for i in range(4)))
+        assert built[0].max_active_per_session == 1
+        assert built[0].session_service.sessions[("ana@example.com", "s1")] == [f"turn {i}" for i in range(4)]
+
+        attempts = []
+
+        def failing_build():
+            attempts.append(1)
+            raise ValueError("GOOGLE_API_KEY environment variable is not set")
+
+        broken = AgentRuntime(failing_build, app_name="meeting_assistant")
+        for _ in range(2):
+            try:
+                await broken.run("hi", "ana@example.com")
+                assert False, "expected the build error"
+            except ValueError:
+                pass
+        assert len(attempts) == 2 and broken.get_stats()["sessions"] == 0
+
+    asyncio.run(run())
+    print("✅ Session serialization test passed!")
+
+if __name__ == "__main__":
+    test_runner_built_once_and_sessions_persist()
+    test_lru_and_idle_eviction()
+    test_new_session_survives_full_busy_runtime()
+    test_turns_in_one_session_are_serialized()
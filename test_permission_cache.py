@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Test script for the AuthManager permission and scope cache
+"""
+
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+# Add the current directory to Python path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import database
+from database import DatabaseManager
+from auth import AuthManager
+
+class CountingDatabase(DatabaseManager):
+    """DatabaseManager that counts SELECT queries"""
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.query_count = 0
+
+    def execute_query(self, query, params=None):
+        self.query_count += 1
+        return super().execute_query(query, params)
+
+def _setup(tmp_dir):
+    db = CountingDatabase(os.path.join(tmp_dir, "auth_test.db"))
+    db.migrate_database((Path(database.__file__).parent / "schema.sql").read_text())
+    database.db_manager = db
+    auth = AuthManager(secret_key="test-secret-key-for-permission-cache")
+    db.execute_update("INSERT INTO tenants (name, slug) VALUES (?, ?)", ("Acme", "acme"))
+    db.execute_update("INSERT INTO tenants (name, slug) VALUES (?, ?)", ("Beta", "beta"))
+    users = []
+    for i in range(3):
+        user = auth.create_user(f"user{i}@example.com", f"user{i}", "Secret123!", tenant_id=1)
+        users.append(user["id"])
+    db.execute_update("INSERT INTO user_tenants (user_id, tenant_id, role) VALUES (?, ?, ?)", (users[0], 2, "admin"))
+    return db, auth, users
+
+def test_permissions_are_cached():
+    """Test repeated lookups do not hit the database"""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db, auth, users = _setup(tmp_dir)
+        auth.invalidate_user_permissions()
+
+        first = auth.get_user_permissions(users[0], tenant_id=2)
+        assert first["scopes"] == ["read", "write", "delete", "admin", "manage_users", "manage_tenants"]
+        assert {r["tenant"] for r in first["global_roles"]} == {"acme", "beta"}
+
+        before = db.query_count
+        assert auth.get_user_permissions(users[0], tenant_id=1)["scopes"] == ["read", "write"]
+        assert auth.get_user_permissions(users[0])["tenant_role"] is None
+        assert db.query_count == before
+        db.close()
+    print("✅ Permission cache hit test passed!")
+
+def test_role_change_invalidates():
+    """Test set_user_role drops stale cache entries"""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db, auth, users = _setup(tmp_dir)
+        assert auth.get_user_permissions(users[1], tenant_id=1)["scopes"] == ["read", "write"]
+
+        assert auth.set_user_role(users[1], 1, "guest")
+        assert auth.get_user_permissions(users[1], tenant_id=1)["scopes"] == ["read"]
+        db.close()
+    print("✅ Role change invalidation test passed!")
+
+def test_batch_load_and_fast_path():
+    """Test batch warm-up and authenticate_and_authorize"""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db, auth, users = _setup(tmp_dir)
+        auth.invalidate_user_permissions()
+
+        before = db.query_count
+        auth.load_user_permissions(users)
+        assert db.query_count == before + 1
+        for user_id in users:
+            auth.get_user_permissions(user_id)
+        assert db.query_count == before + 1
+
+        assert auth.warm_user_permissions(users) == 0  # all cached: no query
+        auth.invalidate_user_permissions(users[0])
+        assert auth.warm_user_permissions(users) == 1
+        assert db.query_count == before + 2
+
+        # Large warm-ups are split to stay under SQLite's parameter limit
+        many = list(range(10_000, 11_200))
+        assert len(auth.load_user_permissions(many)) == 1200
+        assert db.query_count == before + 5
+
+        token = auth.create_token(users[2], 'access')
+        user = auth.authenticate_and_authorize(token, required_scopes=["read"])
+        assert user["id"] == users[2]
+        assert user["permissions"]["scopes"] == ["read", "write"]
+        assert auth.authenticate_and_authorize(token, required_scopes=["admin"]) is None
+        db.close()
+    print("✅ Batch load and fast path test passed!")
+
+if __name__ == "__main__":
+    test_permissions_are_cached()
+    test_role_change_invalidates()
+    test_batch_load_and_fast_path()
@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+Test script for token-budgeted prompt assembly
+"""
+
+import os
+import sys
+import asyncio
+
+# Add the current directory to Python path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from prompt_assembler import PromptAssembler, estimate_tokens
+from ai_engine import AIEngine
+import ai_engine as ai_engine_module
+
+BASE = "You are dhii, an AI assistant for email and calendar management."
+GUIDELINES = "Keep responses concise."
+
+def _history(turns: int, words: int = 10):
+    history = []
+    for i in range(turns):
+        history.append({"role": "user", "content": f"request {i} " + "word " * words})
+        history.append({"role": "assistant", "content": f"reply {i} " + "word " * words})
+    return history
+
+def test_static_prefix_is_memoized():
+    """Test the static prefix is built once and per-turn context follows it"""
+    assembler = PromptAssembler()
+    first = assembler.assemble(BASE, GUIDELINES, "Current time: 09:00", "hello")
+    second = assembler.assemble(BASE, GUIDELINES, "Current time: 09:01", "hi")
+    prefix, tokens = assembler.static_prefix(BASE, GUIDELINES)
+    assert assembler.static_prefix(BASE, GUIDELINES)[0] is prefix
+    assert tokens == estimate_tokens(prefix)
+    for prompt in (first, second):
+        assert prompt.messages[0]["content"].startswith(prefix)
+        assert prompt.messages[-1] == {"role": "user", "content": prompt.messages[-1]["content"]}
+    assert first.messages[0]["content"].endswith("Current Context: Current time: 09:00")
+    assert second.messages[-1]["content"] == "hi"
+    assert assembler.get_stats()["cached_prefixes"] == 1
+    print("✅ Static prefix test passed!")
+
+def test_history_fits_budget():
+    """Test recent turns are kept newest first and older ones are summarized within the budget"""
+    assembler = PromptAssembler(budget_tokens=200, max_turn_tokens=50, max_history_turns=20)
+    prompt = assembler.assemble(BASE, GUIDELINES, "", "and now?", _history(8))
+    assert prompt.tokens <= prompt.budget and not prompt.over_budget
+    assert 0 < prompt.history_kept < 16
+    kept = prompt.messages[1:-1]
+    assert kept[-1]["content"].startswith("reply 7")  # newest turn survives
+    assert prompt.history_summarized > 0
+    assert "Earlier in this conversation the user asked: " in prompt.messages[0]["content"]
+    assert prompt.history_kept + prompt.history_summarized + prompt.history_dropped == 16
+
+    # A single huge turn is clipped rather than crowding out everything else
+    long_turn = [{"role": "user", "content": "x " * 2000}]
+    clipped = assembler.assemble(BASE, GUIDELINES, "", "ok", long_turn).messages[1]["content"]
+    assert estimate_tokens(clipped) <= 51 and clipped.endswith("…")
+
+    # The new message always goes out, even when it alone exceeds the budget
+    huge = assembler.assemble(BASE, GUIDELINES, "", "y" * 4000, _history(2))
+    assert huge.over_budget and huge.history_kept == 0 and huge.messages[-1]["content"] == "y" * 4000
+    assert assembler.get_stats()["over_budget"] == 1
+    print("✅ History budget test passed!")
+
+def test_engine_prompt_uses_real_history():
+    """Test the engine sends real chat turns, not synthetic padding, and reports prompt size"""
+    sent = []
+    lookups = []
+
+    async def fake_call(messages, model=None, priority=None):
+        sent.append(messages)
+        return "Sure, I can help with that meeting."
+
+    def fake_accounts(user_id):
+        lookups.append(user_id)
+        return [{"email": "ana@example.com"}]
+
+    async def run():
+        engine = AIEngine()
+        engine.use_openrouter = True
+        engine.response_cache = None
+        engine.intent_classifier = None
+        engine.prompt_assembler = PromptAssembler()
+        engine._call_openrouter_api = fake_call
+        context = {
+            "user_id": "u1",
+            "message_history": [
+                {"sender": "user", "content": "Who is on the design review?", "timestamp": "t1"},
+                {"sender": "ai", "content": "Ana and Raj.", "timestamp": "t2"},
+                {"sender": "system", "content": "Raj joined", "timestamp": "t3"},
+                {"sender": "user", "content": "thanks, how are you?", "timestamp": "t4"},
+            ],
+            "conversation_history": [{"intent": "schedule_meeting", "entities": {}}],
+        }
+        response = await engine.process_message("thanks, how are you?", context)
+        messages = sent[0]
+        assert [m["role"] for m in messages] == ["system", "user", "assistant", "user"]
+        assert messages[1]["content"] == "Who is on the design review?"
+        assert messages[-1]["content"] == "thanks, how are you?"
+        assert not any("I processed that request" in m["content"] for m in messages)
+        assert "User has 1 email account(s) configured" in messages[0]["content"]
+        assert "Recent user activities: schedule_meeting" in messages[0]["content"]
+        assert response.prompt_tokens == engine.prompt_assembler.get_stats()["max_prompt_tokens"] > 0
+
+        stream = engine.stream_message("and tomorrow?", context)
+        assert "".join([t async for t in fake_stream_tokens(stream)]) == ""
+        assert stream.response.prompt_tokens > 0
+        assert lookups == ["u1"]  # account status reused within its TTL
+
+    async def fake_stream_tokens(stream):
+        async def no_stream(messages, model=None, priority=None, on_model=None):
+            sent.append(messages)
+            return
+            yield
+        stream.engine._stream_openrouter_api = no_stream
+        async for token in stream:
+            yield token
+
+    original = ai_engine_module.email_manager.get_email_accounts
+    ai_engine_module.email_manager.get_email_accounts = fake_accounts
+    try:
+        asyncio.run(run())
+    finally:
+        ai_engine_module.email_manager.get_email_accounts = original
+    print("✅ Engine prompt history test passed!")
+
+if __name__ == "__main__":
+    test_static_prefix_is_memoized()
+    test_history_fits_budget()
+    test_engine_prompt_uses_real_history()
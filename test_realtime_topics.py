@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""
+Test script for topic subscriptions and targeted realtime updates
+"""
+
+import os
+import sys
+import json
+import asyncio
+import tempfile
+import threading
+from datetime import datetime, timedelta, timezone
+
+# Add the current directory to Python path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import realtime_topics
+from realtime_topics import TopicRegistry, mailbox_topic, calendar_topic
+from enhanced_websocket_manager import EnhancedWebSocketManager
+from calendar_manager import CalendarManager, CalendarEvent
+
+class FakeWebSocket:
+    """Minimal stand-in for a Starlette WebSocket"""
+    def __init__(self):
+        self.sent = []
+        self.client_state = type("State", (), {"CONNECTED": True})()
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, data):
+        self.sent.append(json.loads(data))
+
+    async def close(self):
+        pass
+
+def _topic_frames(websocket):
+    return [frame for frame in websocket.sent if "topic" in frame]
+
+def test_registry_index():
+    """Test the two-way index reports first and last subscribers"""
+    registry = TopicRegistry(max_topics_per_client=2)
+    assert registry.subscribe("a", "calendar:1")
+    assert not registry.subscribe("b", "calendar:1")
+    assert not registry.subscribe("a", "calendar:1")
+    assert registry.subscribers("calendar:1") == {"a", "b"}
+
+    assert not registry.unsubscribe("a", "calendar:1")
+    assert registry.unsubscribe("b", "calendar:1")
+    assert "calendar:1" not in registry
+
+    registry.subscribe("a", "plugins")
+    registry.subscribe("a", "mailbox:1:INBOX")
+    try:
+        registry.subscribe("a", "plugin:x")
+        assert False, "expected ValueError"
+    except ValueError:
+        pass
+    assert sorted(registry.remove_client("a")) == ["mailbox:1:INBOX", "plugins"]
+    assert registry.stats() == {"topics": 0, "subscribed_clients": 0, "subscriptions": 0}
+    print("✅ Topic registry test passed!")
+
+def test_topic_fan_out_reaches_only_subscribers():
+    """Test published events go to subscribers only, including from worker threads"""
+    async def run():
+        manager = EnhancedWebSocketManager()
+        inbox, other, idle = FakeWebSocket(), FakeWebSocket(), FakeWebSocket()
+        await manager.connect(inbox, "inbox", "s1")
+        await manager.connect(other, "other", "s2")
+        await manager.connect(idle, "idle", "s3")
+        manager.subscribe_topic("inbox", mailbox_topic(7, "INBOX"))
+        manager.subscribe_topic("other", mailbox_topic(8, "INBOX"))
+
+        realtime_topics.add_topic_sink(manager.publish_topic)
+        try:
+            realtime_topics.publish(mailbox_topic(7, "INBOX"), {"type": "mailbox_update", "count": 2})
+            # IMAP sync publishes from a worker thread
+            worker = threading.Thread(target=realtime_topics.publish, args=(
+                mailbox_topic(8, "INBOX"), {"type": "mailbox_update", "count": 1}))
+            worker.start()
+            worker.join()
+            await asyncio.sleep(0.05)
+        finally:
+            realtime_topics.remove_topic_sink(manager.publish_topic)
+
+        assert [f["count"] for f in _topic_frames(inbox)] == [2]
+        assert _topic_frames(inbox)[0]["topic"] == "mailbox:7:INBOX"
+        assert [f["count"] for f in _topic_frames(other)] == [1]
+        assert _topic_frames(idle) == []
+        for client_id in ("inbox", "other", "idle"):
+            await manager.disconnect(client_id)
+        assert manager.topics.stats()["topics"] == 0
+
+    asyncio.run(run())
+    print("✅ Topic fan-out test passed!")
+
+def test_subscriptions_dropped_with_identity():
+    """Test losing the identity drops the client's topic subscriptions"""
+    async def run():
+        manager = EnhancedWebSocketManager()
+        websocket = FakeWebSocket()
+        await manager.connect(websocket, "c1", "s1")
+        manager.bind_identity("c1", 42, "tok-1", datetime.now(timezone.utc) + timedelta(hours=1), "token-a")
+        manager.subscribe_topic("c1", calendar_topic(42))
+        assert manager.topics.subscribers("calendar:42") == {"c1"}
+
+        manager.clear_identity("c1", "token_revoked")
+        assert "calendar:42" not in manager.topics
+        await manager.disconnect("c1")
+
+    asyncio.run(run())
+    print("✅ Identity cleanup test passed!")
+
+def test_calendar_changes_publish_to_owner_topic():
+    """Test calendar writes publish calendar_update events on the owner's topic"""
+    events = []
+    sink = lambda topic, event: events.append((topic, event["change"]))
+    realtime_topics.add_topic_sink(sink)
+    try:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            calendar = CalendarManager(os.path.join(tmp_dir, "calendar.db"))
+            start = datetime.now(timezone.utc) + timedelta(days=1)
+            event_id = calendar.create_event(CalendarEvent(
+                title="Sync", start_time=start, end_time=start + timedelta(hours=1), organizer="alice@example.com"
+            ), 5)
+            calendar.update_event(event_id, {"title": "Team sync"})
+            calendar.delete_event(event_id)
+    finally:
+        realtime_topics.remove_topic_sink(sink)
+
+    assert events == [("calendar:5", "created"), ("calendar:5", "updated"), ("calendar:5", "deleted")]
+    print("✅ Calendar producer test passed!")
+
+if __name__ == "__main__":
+    test_registry_index()
+    test_topic_fan_out_reaches_only_subscribers()
+    test_subscriptions_dropped_with_identity()
+    test_calendar_changes_publish_to_owner_topic()
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+Test script for the persistent security event log
+"""
+
+import os
+import sys
+import tempfile
+from datetime import datetime, timedelta, timezone
+
+# Add the current directory to Python path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from security_event_store import SecurityEventStore
+from security_manager import SecurityManager
+
+def _manager(tmp_dir):
+    store = SecurityEventStore(db_path=os.path.join(tmp_dir, "security_events.db"), flush_interval=0.01)
+    return SecurityManager(event_store=store), store
+
+def test_cursor_pagination():
+    """Test that pages are newest-first, disjoint and complete"""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        manager, store = _manager(tmp_dir)
+        for i in range(25):
+            manager.log_security_event("login_failed", "10.0.0.1", f"user{i % 2}@example.com", "pytest", {"n": i})
+        assert store.flush()
+
+        seen = []
+        cursor = None
+        while True:
+            events, cursor = manager.get_security_events_page(cursor=cursor, limit=10)
+            seen.extend(e.details["n"] for e in events)
+            if cursor is None:
+                break
+        assert seen == list(range(24, -1, -1))
+
+        events, _ = manager.get_security_events_page(user_email="user1@example.com", limit=100)
+        assert len(events) == 12
+        store.close()
+    print("✅ Cursor pagination test passed!")
+
+def test_summary_uses_rollups():
+    """Test summary counts come from the rollup table"""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        manager, store = _manager(tmp_dir)
+        manager.log_security_event("login_failed", "10.0.0.1", None, "pytest", {})
+        manager.log_security_event("login_failed", "10.0.0.1", None, "pytest", {})
+        manager.log_security_event("token_forged", "10.0.0.1", None, "pytest", {}, "critical")
+        assert store.flush()
+
+        summary = manager.get_security_summary()
+        assert summary["total_events"] == 3
+        assert summary["events_last_24h"] == 3
+        assert summary["failed_login_attempts"] == 2
+        assert summary["critical_events"] == 1
+        store.close()
+    print("✅ Rollup summary test passed!")
+
+def test_events_survive_restart_and_retention():
+    """Test persistence across store instances and retention cleanup"""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        manager, store = _manager(tmp_dir)
+        manager.log_security_event("login_success", "10.0.0.1", "a@example.com", "pytest", {})
+        store.close()
+
+        manager, store = _manager(tmp_dir)
+        assert len(manager.get_security_events()) == 1
+
+        store.delete_before(datetime.now(timezone.utc) + timedelta(hours=2))
+        assert manager.get_security_events() == []
+        assert manager.get_security_summary()["total_events"] == 0
+        store.close()
+    print("✅ Persistence and retention test passed!")
+
+if __name__ == "__main__":
+    test_cursor_pagination()
+    test_summary_uses_rollups()
+    test_events_survive_restart_and_retention()
@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""
+Test script for persistent, resumable session history
+"""
+
+import os
+import sys
+import json
+import asyncio
+import tempfile
+from datetime import datetime, timedelta, timezone
+
+# Add the current directory to Python path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from session_history import SessionHistory
+from enhanced_websocket_manager import EnhancedWebSocketManager, ChatMessage
+
+class FakeWebSocket:
+    """Minimal stand-in for a Starlette WebSocket"""
+    def __init__(self):
+        self.sent = []
+        self.client_state = type("State", (), {"CONNECTED": True})()
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, data):
+        self.sent.append(json.loads(data))
+
+    async def close(self):
+        pass
+
+def test_ring_and_journal():
+    """Test the bounded ring and delta reads that merge the journal with unflushed appends"""
+    async def run():
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            history = SessionHistory(os.path.join(tmp_dir, "history.db"), ring_size=5)
+            records = [history.append("s1", f"m{i}", "user", f"hello {i}") for i in range(12)]
+            seqs = [r.seq for r in records]
+            assert seqs == sorted(seqs) and len(set(seqs)) == 12
+
+            assert [m.id for m in await history.recent("s1")] == ["m7", "m8", "m9", "m10", "m11"]
+            assert [m.id for m in await history.recent("s1", 2)] == ["m10", "m11"]
+            assert [m.id for m in await history.since("s1", seqs[9])] == ["m10", "m11"]
+
+            history.flush()
+            # The client is behind the ring: the gap comes from the journal
+            assert [m.id for m in await history.since("s1", seqs[2])] == [f"m{i}" for i in range(3, 12)]
+            assert [m.id for m in await history.since("s1", seqs[2], limit=3)] == ["m3", "m4", "m5"]
+            assert await history.since("s1", seqs[-1]) == []
+            history.close()
+
+    asyncio.run(run())
+    print("✅ Ring and journal test passed!")
+
+def test_history_survives_restart():
+    """Test a new process sees the journal, owners and keeps seqs increasing"""
+    async def run():
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "history.db")
+            first = SessionHistory(path)
+            assert await first.claim("s1", 7) == "7"
+            last = [first.append("s1", f"m{i}", "ai", "reply", metadata={"intent": "chat"}) for i in range(3)][-1]
+            first.close()
+
+            second = SessionHistory(path)
+            # The first append does not read the journal; recent() fills the ring from it
+            appended = second.append("s1", "m3", "user", "again")
+            assert appended.seq > last.seq
+            restored = await second.recent("s1")
+            assert [m.id for m in restored] == ["m0", "m1", "m2", "m3"]
+            assert restored[0].metadata == {"intent": "chat"}
+            assert await second.last_seq("s1") == appended.seq
+            assert await second.owner("s1") == "7" and await second.claim("s1", 8) == "7"
+
+            removed = second.delete_before(datetime.now(timezone.utc))
+            assert removed == 4
+            second.close()
+
+    asyncio.run(run())
+    print("✅ Restart persistence test passed!")
+
+def test_other_workers_messages_are_replayed():
+    """Test delta reads see messages another worker journaled after this ring was filled"""
+    async def run():
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "history.db")
+            worker_a, worker_b = SessionHistory(path), SessionHistory(path)
+            first = worker_a.append("s1", "m0", "user", "hi")
+            worker_a.flush()
+            assert [m.id for m in await worker_b.recent("s1")] == ["m0"]
+
+            worker_a.append("s1", "m1", "ai", "hello")
+            worker_a.flush()
+            assert [m.id for m in await worker_b.since("s1", first.seq)] == ["m1"]
+            worker_a.close()
+            worker_b.close()
+
+    asyncio.run(run())
+    print("✅ Cross-worker replay test passed!")
+
+def test_replay_history_delta():
+    """Test only a session's authenticated owner gets the history_delta frame"""
+    async def run():
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            manager = EnhancedWebSocketManager(history=SessionHistory(os.path.join(tmp_dir, "h.db")))
+            assert await manager.claim_session("chat-1", 7)
+            records = []
+            for i in range(4):
+                records.append(manager.add_message("chat-1", ChatMessage(
+                    id=f"msg_{i}", sender="user" if i % 2 == 0 else "ai", content=f"text {i}",
+                    timestamp=datetime.now(timezone.utc), session_id="chat-1"
+                )))
+            expires = datetime.now(timezone.utc) + timedelta(hours=1)
+
+            websocket = FakeWebSocket()
+            await manager.connect(websocket, "c1", "conn-1")
+            # Knowing the session id is not enough
+            assert await manager.replay_history("c1", "chat-1", records[1].seq) == 0
+            manager.bind_identity("c1", 8, "token-8", expires)
+            assert await manager.replay_history("c1", "chat-1", records[1].seq) == 0
+            assert not await manager.claim_session("chat-1", 8)
+            assert await manager.get_session_messages("chat-1", 8) == []
+            await asyncio.sleep(0.01)
+            assert [m["type"] for m in websocket.sent[-2:]] == ["error", "error"]
+
+            manager.bind_identity("c1", 7, "token-7", expires)
+            assert await manager.replay_history("c1", "chat-1", records[1].seq) == 2
+            await asyncio.sleep(0.01)
+
+            delta = websocket.sent[-1]
+            assert delta["type"] == "history_delta"
+            assert [m["message_id"] for m in delta["messages"]] == ["msg_2", "msg_3"]
+            assert delta["last_seq"] == records[3].seq
+            assert delta["complete"]
+            assert len(await manager.get_session_messages("chat-1", 7)) == 4
+
+            # Anonymous sessions take anyone's messages but are never read back
+            assert await manager.claim_session("anon-1", None) and await manager.claim_session("anon-1", 7)
+            assert await manager.get_session_messages("anon-1", 7) == []
+            await manager.disconnect("c1")
+            manager.history.close()
+
+    asyncio.run(run())
+    print("✅ History delta replay test passed!")
+
+if __name__ == "__main__":
+    test_ring_and_journal()
+    test_history_survives_restart()
+    test_other_workers_messages_are_replayed()
+    test_replay_history_delta()
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Test script for connection-scoped websocket authentication
+"""
+
+import os
+import sys
+import json
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+# Add the current directory to Python path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from enhanced_websocket_manager import EnhancedWebSocketManager
+
+class FakeWebSocket:
+    """Minimal stand-in for a Starlette WebSocket"""
+    def __init__(self):
+        self.sent = []
+        self.client_state = type("State", (), {"CONNECTED": True})()
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, data):
+        self.sent.append(json.loads(data))
+
+    async def close(self):
+        pass
+
+async def _connect(manager, client_id="c1"):
+    websocket = FakeWebSocket()
+    connection = await manager.connect(websocket, client_id, f"session_{client_id}")
+    return websocket, connection
+
+def test_identity_bound_until_expiry():
+    """Test that the identity expires on its timer and the client is re-challenged"""
+    async def run():
+        manager = EnhancedWebSocketManager()
+        websocket, connection = await _connect(manager)
+
+        expires_at = datetime.now(timezone.utc) + timedelta(milliseconds=50)
+        assert manager.bind_identity("c1", 42, "tok-1", expires_at, "token-a")
+        assert connection.has_valid_identity("token-a")
+        assert not connection.has_valid_identity("token-b")
+        assert manager.user_connections[42] == ["c1"]
+
+        await asyncio.sleep(0.1)
+        assert not connection.is_authenticated
+        assert 42 not in manager.user_connections
+        assert websocket.sent[-1]["type"] == "auth_required"
+        assert websocket.sent[-1]["reason"] == "token_expired"
+        await manager.disconnect("c1")
+
+    asyncio.run(run())
+    print("✅ Identity expiry test passed!")
+
+def test_revocation_clears_identity():
+    """Test that revoking a token or a user re-challenges matching sockets"""
+    async def run():
+        manager = EnhancedWebSocketManager()
+        _, first = await _connect(manager, "c1")
+        second_ws, second = await _connect(manager, "c2")
+        expires_at = datetime.now(timezone.utc) + timedelta(hours=1)
+        manager.bind_identity("c1", 7, "tok-1", expires_at, "token-a")
+        manager.bind_identity("c2", 7, "tok-2", expires_at, "token-b")
+
+        manager.revoke_identity(token_id="tok-1")
+        assert not first.is_authenticated
+        assert second.is_authenticated
+
+        manager.revoke_identity(user_id=7)
+        assert not second.is_authenticated
+        await asyncio.sleep(0.01)
+        assert second_ws.sent[-1]["reason"] == "token_revoked"
+        await manager.disconnect("c1")
+        await manager.disconnect("c2")
+
+    asyncio.run(run())
+    print("✅ Revocation test passed!")
+
+if __name__ == "__main__":
+    test_identity_bound_until_expiry()
+    test_revocation_clears_identity()
@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+"""
+Test script for the cross-worker websocket message bus
+"""
+
+import os
+import sys
+import json
+import asyncio
+import tempfile
+
+# Add the current directory to Python path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from websocket_bus import WebSocketBus, WebSocketBusBroker
+from enhanced_websocket_manager import EnhancedWebSocketManager
+
+class FakeWebSocket:
+    """Minimal stand-in for a Starlette WebSocket"""
+    def __init__(self):
+        self.sent = []
+        self.client_state = type("State", (), {"CONNECTED": True})()
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, data):
+        self.sent.append(json.loads(data))
+
+    async def close(self):
+        pass
+
+def _messages(websocket, message_type):
+    return [m for m in websocket.sent if m.get("type") == message_type]
+
+def test_messages_cross_workers():
+    """Test user, session and broadcast messages reach sockets on another worker"""
+    async def run():
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            socket_path = os.path.join(tmp_dir, "bus.sock")
+            bus_a, bus_b = WebSocketBus(socket_path), WebSocketBus(socket_path)
+            await bus_a.start()
+            await bus_b.start()
+            assert bus_a.is_broker and not bus_b.is_broker
+
+            worker_a, worker_b = EnhancedWebSocketManager(), EnhancedWebSocketManager()
+            worker_a.attach_bus(bus_a)
+            worker_b.attach_bus(bus_b)
+
+            ws_a, ws_b = FakeWebSocket(), FakeWebSocket()
+            await worker_a.connect(ws_a, "a1", "shared")
+            await worker_b.connect(ws_b, "b1", "shared")
+            worker_b.update_user_authentication("b1", 7, True)
+            assert "ws:user:7" in bus_b.topics and "ws:user:7" not in bus_a.topics
+            await asyncio.sleep(0.05)
+
+            await worker_a.send_to_user(7, {"type": "notice", "n": 1})
+            await worker_a.send_to_session("shared", {"type": "session_note"}, exclude_client="a1")
+            await worker_b.broadcast({"type": "announcement"})
+            await asyncio.sleep(0.05)
+
+            assert _messages(ws_b, "notice") == [{"type": "notice", "n": 1}]
+            assert len(_messages(ws_b, "session_note")) == 1
+            assert not _messages(ws_a, "session_note")
+            assert len(_messages(ws_a, "announcement")) == 1
+            assert len(_messages(ws_b, "announcement")) == 1
+
+            # Once the last local socket for a topic leaves, the worker unsubscribes
+            await worker_b.disconnect("b1")
+            assert not bus_b.topics
+
+            await worker_a.disconnect("a1")
+            await bus_b.stop()
+            await bus_a.stop()
+
+    asyncio.run(run())
+    print("✅ Cross-worker delivery test passed!")
+
+def test_broker_caps_slow_subscriber():
+    """Test the broker drops frames for a subscriber that stopped reading"""
+    async def run():
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            socket_path = os.path.join(tmp_dir, "bus.sock")
+            broker = WebSocketBusBroker(socket_path, max_buffer_bytes=64 * 1024)
+            await broker.start()
+            _, stalled = await asyncio.open_unix_connection(socket_path)
+            stalled.write(b'{"op":"sub","topic":"ws:broadcast"}\n')
+            _, publisher = await asyncio.open_unix_connection(socket_path)
+            await asyncio.sleep(0.05)
+
+            frame = json.dumps({"op": "pub", "topic": "ws:broadcast", "message": {"x": "y" * 4096}}) + "\n"
+            for _ in range(2000):
+                publisher.write(frame.encode())
+                await publisher.drain()
+            await asyncio.sleep(0.1)
+
+            assert broker.frames_routed == 2000 and broker.frames_dropped > 0
+            (subscriber,) = broker.subscribers["ws:broadcast"]
+            assert subscriber.transport.get_write_buffer_size() <= 64 * 1024 + len(frame)
+            publisher.close()
+            stalled.close()
+            await broker.stop()
+
+    asyncio.run(run())
+    print("✅ Slow subscriber cap test passed!")
+
+def test_a2ui_updates_cross_workers():
+    """Test A2UI updates reach a user whose socket is on another worker"""
+    from a2ui_integration.a2ui_connections import A2UIConnectionManager
+
+    class FakeA2UISocket(FakeWebSocket):
+        headers = {}
+        query_params = {}
+
+        async def accept(self, subprotocol=None):
+            pass
+
+    async def run():
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            socket_path = os.path.join(tmp_dir, "bus.sock")
+            bus_a, bus_b = WebSocketBus(socket_path), WebSocketBus(socket_path)
+            await bus_a.start()
+            await bus_b.start()
+            manager_a, manager_b = A2UIConnectionManager(), A2UIConnectionManager()
+            manager_a.attach_bus(bus_a)
+            manager_b.attach_bus(bus_b)
+
+            websocket = FakeA2UISocket()
+            await manager_b.connect(websocket, "ana@example.com")
+            await asyncio.sleep(0.05)
+            await manager_a.send_a2ui_update("ana@example.com", '{"components": []}')
+            await asyncio.sleep(0.05)
+            assert [m["a2ui_json"] for m in _messages(websocket, "a2ui_update")] == ['{"components": []}']
+
+            manager_b.disconnect(websocket, "ana@example.com")
+            await bus_b.stop()
+            await bus_a.stop()
+
+    asyncio.run(run())
+    print("✅ A2UI cross-worker delivery test passed!")
+
+def test_broker_failover():
+    """Test a client takes over the broker role and resubscribes when it dies"""
+    async def run():
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            socket_path = os.path.join(tmp_dir, "bus.sock")
+            bus_a = WebSocketBus(socket_path, reconnect_delay=0.01)
+            bus_b = WebSocketBus(socket_path, reconnect_delay=0.01)
+            bus_c = WebSocketBus(socket_path, reconnect_delay=0.01)
+            for bus in (bus_a, bus_b, bus_c):
+                await bus.start()
+
+            received = []
+            async def handler(topic, message):
+                received.append((topic, message))
+            bus_b.add_handler("ws:", handler)
+            bus_b.subscribe("ws:user:1")
+
+            await bus_a.stop()
+            await asyncio.sleep(0.2)
+            assert bus_b.is_broker or bus_c.is_broker
+            assert bus_b.connected and bus_c.connected
+
+            bus_c.publish("ws:user:1", {"hello": "world"})
+            await asyncio.sleep(0.05)
+            assert received == [("ws:user:1", {"hello": "world"})]
+
+            await bus_c.stop()
+            await bus_b.stop()
+
+    asyncio.run(run())
+    print("✅ Broker failover test passed!")
+
+if __name__ == "__main__":
+    test_messages_cross_workers()
+    test_broker_caps_slow_subscriber()
+    test_a2ui_updates_cross_workers()
+    test_broker_failover()
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+Test script for negotiated websocket payload encodings
+"""
+
+import os
+import sys
+import json
+import asyncio
+
+# Add the current directory to Python path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from websocket_codec import WireEncoding, negotiate_encoding, encode_payload, decode_payload, codec_manifest
+from enhanced_websocket_manager import EnhancedWebSocketManager, OutboundFrame
+
+def _a2ui_tree(rows: int):
+    components = [
+        {"id": f"row_{i}", "component": {"Row": {"children": {"explicitList": [f"title_{i}", f"open_{i}"]},
+                                                 "distribution": "spaceBetween"}}}
+        for i in range(rows)
+    ] + [
+        {"id": f"title_{i}", "component": {"Text": {"text": {"literalString": f"Team sync #{i} with Alice"},
+                                                    "usageHint": "body"}}}
+        for i in range(rows)
+    ]
+    return {"type": "a2ui_update", "a2ui": [{"surfaceUpdate": {"surfaceId": "main", "components": components}}],
+            "timestamp": "2026-01-01T00:00:00"}
+
+class FakeWebSocket:
+    """Stand-in WebSocket recording text and binary frames"""
+    def __init__(self, subprotocols=None):
+        self.scope = {"subprotocols": subprotocols or []}
+        self.query_params = {}
+        self.accepted_subprotocol = None
+        self.frames = []
+        self.client_state = type("State", (), {"CONNECTED": True})()
+
+    async def accept(self, subprotocol=None):
+        self.accepted_subprotocol = subprotocol
+
+    async def send_text(self, data):
+        self.frames.append(data)
+
+    async def send_bytes(self, data):
+        self.frames.append(data)
+
+    async def close(self):
+        pass
+
+def test_round_trip_and_size():
+    """Test every encoding round-trips and binary encodings shrink large UI trees"""
+    message = _a2ui_tree(40)
+    json_size = len(json.dumps(message))
+    sizes = {}
+    for encoding in WireEncoding:
+        payload = encode_payload(message, encoding)
+        assert isinstance(payload, str) == (encoding is WireEncoding.JSON)
+        assert decode_payload(payload, encoding) == message
+        sizes[encoding] = len(payload)
+
+    assert sizes[WireEncoding.MSGPACK] < json_size
+    assert sizes[WireEncoding.MSGPACK_DEFLATE] < json_size / 5
+    assert sizes[WireEncoding.JSON_DEFLATE] < json_size / 5
+
+    # Small frames skip compression but keep the flag byte
+    small = {"type": "heartbeat_ping", "timestamp": "now"}
+    assert decode_payload(encode_payload(small, WireEncoding.JSON_DEFLATE), WireEncoding.JSON_DEFLATE) == small
+
+    # Text frames from clients are always JSON
+    assert decode_payload('{"type": "resume"}', WireEncoding.MSGPACK) == {"type": "resume"}
+    try:
+        decode_payload(b"\x07garbage", WireEncoding.MSGPACK_DEFLATE)
+        assert False, "expected ValueError"
+    except ValueError:
+        pass
+    print("✅ Encoding round-trip test passed!")
+
+def test_negotiation():
+    """Test subprotocol and query parameter negotiation"""
+    encoding, subprotocol = negotiate_encoding(FakeWebSocket(["chat", "dhii.msgpack.deflate.v1"]))
+    assert encoding is WireEncoding.MSGPACK_DEFLATE and subprotocol == "dhii.msgpack.deflate.v1"
+
+    websocket = FakeWebSocket()
+    websocket.query_params = {"encoding": "msgpack"}
+    assert negotiate_encoding(websocket) == (WireEncoding.MSGPACK, None)
+    websocket.query_params = {"encoding": "bogus"}
+    assert negotiate_encoding(websocket) == (WireEncoding.JSON, None)
+
+    manifest = codec_manifest()
+    assert manifest["subprotocols"]["dhii.json.deflate.v1"] == "json+deflate"
+    assert manifest["deflate"]["dictionaries"]["json"]
+    print("✅ Encoding negotiation test passed!")
+
+def test_fan_out_encodes_once_per_encoding():
+    """Test mixed-encoding fan-out shares one payload per encoding"""
+    async def run():
+        manager = EnhancedWebSocketManager()
+        plain, packed_a, packed_b = FakeWebSocket(), FakeWebSocket(["dhii.msgpack.v1"]), FakeWebSocket(["dhii.msgpack.v1"])
+        await manager.connect(plain, "p", "s1")
+        await manager.connect(packed_a, "a", "s1")
+        await manager.connect(packed_b, "b", "s1")
+        assert packed_a.accepted_subprotocol == "dhii.msgpack.v1"
+
+        message = _a2ui_tree(5)
+        await manager.send_to_session("s1", message)
+        await asyncio.sleep(0.01)
+        assert json.loads(plain.frames[-1]) == message
+        assert packed_a.frames[-1] is packed_b.frames[-1]
+        assert decode_payload(packed_a.frames[-1], WireEncoding.MSGPACK) == message
+
+        frame = OutboundFrame(message)
+        assert frame.payload(WireEncoding.MSGPACK) is frame.payload(WireEncoding.MSGPACK)
+        for client_id in ("p", "a", "b"):
+            await manager.disconnect(client_id)
+
+    asyncio.run(run())
+    print("✅ Per-encoding fan-out test passed!")
+
+if __name__ == "__main__":
+    test_round_trip_and_size()
+    test_negotiation()
+    test_fan_out_encodes_once_per_encoding()
@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+Test script for the timer-wheel websocket heartbeat
+"""
+
+import os
+import sys
+import json
+import time
+import asyncio
+
+# Add the current directory to Python path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from enhanced_websocket_manager import EnhancedWebSocketManager, HeartbeatWheel
+
+class FakeWebSocket:
+    """Minimal stand-in for a Starlette WebSocket"""
+    def __init__(self):
+        self.sent = []
+        self.closed = False
+        self.client_state = type("State", (), {"CONNECTED": True})()
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, data):
+        self.sent.append(json.loads(data))
+
+    async def close(self):
+        self.closed = True
+
+def test_wheel_expiry():
+    """Test scheduling, cancelling and multi-revolution deadlines"""
+    wheel = HeartbeatWheel(tick_interval=1.0, slots=8)
+    wheel.schedule("a", 2)
+    wheel.schedule("b", 2)
+    wheel.schedule("c", 10)  # more than one revolution away
+    wheel.cancel("b")
+
+    expired = []
+    for _ in range(10):
+        expired.append(wheel.advance())
+    assert expired[1] == ["a"]
+    assert expired[9] == ["c"]
+    assert sum(len(e) for e in expired) == 2
+    assert len(wheel) == 0
+
+    wheel.schedule("a", 3)
+    wheel.schedule("a", 1)  # rescheduling replaces the old deadline
+    assert wheel.advance() == ["a"]
+    assert len(wheel) == 0
+    print("✅ Timer wheel expiry test passed!")
+
+def test_pong_tracking_and_eviction():
+    """Test pinging, pong tracking, heartbeat timeout and idle eviction"""
+    async def run():
+        manager = EnhancedWebSocketManager()
+        manager.heartbeat_wheel = HeartbeatWheel(tick_interval=0.01)
+        manager.heartbeat_interval = 0.05
+        manager.pong_timeout = 0.03
+
+        alive_ws, silent_ws = FakeWebSocket(), FakeWebSocket()
+        alive = await manager.connect(alive_ws, "alive", "s1")
+        await manager.connect(silent_ws, "silent", "s1")
+
+        deadline = time.monotonic() + 0.5
+        while time.monotonic() < deadline:
+            await asyncio.sleep(0.01)
+            if alive.pong_pending:
+                alive.record_pong()
+
+        assert "alive" in manager.connections
+        assert "silent" not in manager.connections
+        assert silent_ws.closed
+        assert sum(1 for m in alive_ws.sent if m["type"] == "heartbeat_ping") >= 3
+        stats = manager.get_connection_stats()["heartbeat"]
+        assert stats["heartbeat_timeouts"] == 1
+        assert stats["scheduled"] == 1
+
+        # A connection that answers pings but never sends a message goes idle
+        manager.idle_timeout = 0.05
+        alive.last_client_message = time.monotonic() - 1
+        deadline = time.monotonic() + 0.3
+        while "alive" in manager.connections and time.monotonic() < deadline:
+            await asyncio.sleep(0.01)
+            if alive.pong_pending:
+                alive.record_pong()
+        assert "alive" not in manager.connections
+        assert manager.heartbeat_stats["idle_timeouts"] == 1
+
+        # An eviction racing the receive loop's own disconnect removes the connection once
+        await manager.connect(FakeWebSocket(), "racer", "s2")
+        await asyncio.gather(manager.disconnect("racer"), manager._evict(["racer"], "Idle timeout"),
+                             manager.disconnect("racer"))
+        assert "racer" not in manager.connections and "s2" not in manager.session_connections
+        await manager.stop_heartbeat_task()
+
+    asyncio.run(run())
+    print("✅ Pong tracking and eviction test passed!")
+
+def test_idle_connections_need_no_tasks():
+    """Test that idle connections hold no per-connection tasks"""
+    async def run():
+        manager = EnhancedWebSocketManager()
+        for i in range(5000):
+            await manager.connect(FakeWebSocket(), f"c{i}", f"s{i}")
+        await asyncio.sleep(0.05)  # writers flush the welcome frames and exit
+
+        # Only the manager's cleanup and heartbeat tasks (plus this one) remain
+        assert len(asyncio.all_tasks()) <= 3
+        assert len(manager.heartbeat_wheel) == 5000
+
+        start = time.perf_counter()
+        for _ in range(100):
+            manager.heartbeat_wheel.advance()
+        assert time.perf_counter() - start < 0.05
+        await manager.stop_heartbeat_task()
+        await manager.stop_cleanup_task()
+
+    asyncio.run(run())
+    print("✅ Idle connection overhead test passed!")
+
+if __name__ == "__main__":
+    test_wheel_expiry()
+    test_pong_tracking_and_eviction()
+    test_idle_connections_need_no_tasks()
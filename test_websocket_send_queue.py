@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Test script for per-connection bounded send queues
+"""
+
+import os
+import sys
+import json
+import asyncio
+
+# Add the current directory to Python path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from enhanced_websocket_manager import EnhancedWebSocketManager, OverflowPolicy
+
+class FakeWebSocket:
+    """Stand-in WebSocket; a blocked one never finishes sending"""
+    def __init__(self, blocked: bool = False):
+        self.sent = []
+        self.blocked = blocked
+        self.closed = False
+        self.client_state = type("State", (), {"CONNECTED": True})()
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, data):
+        if self.blocked:
+            await asyncio.Event().wait()
+        self.sent.append(json.loads(data))
+
+    async def close(self):
+        self.closed = True
+
+def test_slow_client_does_not_block_broadcast():
+    """Test fan-out returns immediately and fast clients are served"""
+    async def run():
+        manager = EnhancedWebSocketManager(send_queue_size=8)
+        fast = FakeWebSocket()
+        slow = FakeWebSocket(blocked=True)
+        await manager.connect(fast, "fast", "s1")
+        await manager.connect(slow, "slow", "s1")
+
+        await asyncio.wait_for(manager.broadcast({"type": "notice", "n": 1}), timeout=0.1)
+        await asyncio.sleep(0.01)
+        assert fast.sent[-1] == {"type": "notice", "n": 1}
+
+        stats = manager.get_connection_stats()["send_queue"]
+        assert stats["total_queued_messages"] >= 1
+        await manager.disconnect("fast")
+        await manager.disconnect("slow")
+
+    asyncio.run(run())
+    print("✅ Slow consumer isolation test passed!")
+
+def test_overflow_policies():
+    """Test drop-oldest, coalesce and disconnect policies"""
+    async def run():
+        for policy in OverflowPolicy:
+            manager = EnhancedWebSocketManager(send_queue_size=3, overflow_policy=policy)
+            websocket = FakeWebSocket(blocked=True)
+            connection = await manager.connect(websocket, "c1", "s1")
+            await asyncio.sleep(0)  # writer takes the welcome message and blocks on it
+
+            for n in range(3):
+                await manager.send_to_client("c1", {"type": "progress" if n else "chat", "n": n})
+            await manager.send_to_client("c1", {"type": "progress", "n": 3})
+
+            queued = [json.loads(frame.data)["n"] for frame in connection.send_queue]
+            if policy == OverflowPolicy.DROP_OLDEST:
+                assert queued == [1, 2, 3]
+                assert connection.dropped_messages == 1
+            elif policy == OverflowPolicy.COALESCE:
+                assert queued == [0, 1, 3]
+                assert connection.coalesced_messages == 1
+            else:
+                await asyncio.sleep(0.01)
+                assert connection.slow_consumer_disconnect
+                assert websocket.closed
+                assert manager.get_connection_stats()["send_queue"]["slow_consumer_disconnects"] == 1
+            await manager.disconnect("c1")
+
+    asyncio.run(run())
+    print("✅ Overflow policy test passed!")
+
+def test_fan_out_encodes_once():
+    """Test that every recipient of a broadcast shares one encoded frame"""
+    async def run():
+        manager = EnhancedWebSocketManager()
+        sockets = [FakeWebSocket(blocked=True) for _ in range(3)]
+        connections = [await manager.connect(ws, f"c{i}", "s1") for i, ws in enumerate(sockets)]
+        await asyncio.sleep(0)
+
+        await manager.send_to_session("s1", {"type": "notice", "text": "hi"}, exclude_client="c2")
+        frames = [conn.send_queue[-1] for conn in connections[:2]]
+        assert frames[0] is frames[1]
+        assert json.loads(frames[0].data) == {"type": "notice", "text": "hi"}
+        assert not connections[2].send_queue
+        for i in range(3):
+            await manager.disconnect(f"c{i}")
+
+    asyncio.run(run())
+    print("✅ Serialize-once fan-out test passed!")
+
+if __name__ == "__main__":
+    test_slow_client_does_not_block_broadcast()
+    test_overflow_policies()
+    test_fan_out_encodes_once()
@@ -4,8 +4,10 @@ Test script for WhatsApp integration
 Tests the WhatsApp analyzer functionality
 """
 
+import os
 import asyncio
 import json
+import tempfile
 from datetime import datetime
 from a2ui_integration.whatsapp_analyzer import WhatsAppAnalyzer
 from a2ui_integration.plugin_manager import PluginManager
@@ -76,8 +78,9 @@ async def test_plugin_manager():
     """Test the plugin manager functionality"""
     print("\n🔌 Testing Plugin Manager...")
     
-    # Initialize plugin manager
-    pm = PluginManager()
+    # Initialize plugin manager on a throwaway database
+    tmp = tempfile.mkdtemp()
+    pm = PluginManager(db_path=os.path.join(tmp, "plugins.db"))
     
     # Test 1: Initialize skill store
     print("\n1. Testing skill store initialization...")
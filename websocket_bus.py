@@ -0,0 +1,269 @@
+"""
+dhii Mail - WebSocket Message Bus
+Local inter-process pub/sub so that every uvicorn worker can reach sockets held by
+the others. One worker hosts a tiny broker on a Unix domain socket (elected with a
+file lock); every worker, including the host, connects to it as a client and only
+subscribes to the user/session/broadcast topics it has local sockets for.
+"""
+
+import os
+import json
+import uuid
+import fcntl
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+BusHandler = Callable[[str, Dict[str, Any]], Awaitable[None]]
+
+# Frames queued by the broker for one subscriber before further frames to it are dropped
+BROKER_MAX_BUFFER_BYTES = 1 << 20
+
+def _encode_frame(frame: Dict[str, Any]) -> bytes:
+    return json.dumps(frame, separators=(",", ":")).encode("utf-8") + b"\n"
+
+class WebSocketBusBroker:
+    """Topic router: forwards each published frame to the other subscribers of its topic"""
+
+    def __init__(self, socket_path: str, max_buffer_bytes: int = BROKER_MAX_BUFFER_BYTES):
+        self.socket_path = socket_path
+        self.max_buffer_bytes = max_buffer_bytes
+        self.server: Optional[asyncio.AbstractServer] = None
+        self.subscribers: Dict[str, Set[asyncio.StreamWriter]] = {}
+        self.clients: Set[asyncio.StreamWriter] = set()
+        self.frames_routed = 0
+        self.frames_dropped = 0
+        self._closing = False
+
+    async def start(self):
+        if os.path.exists(self.socket_path):
+            # Left behind by a broker that died; we hold the election lock, so it is stale
+            os.unlink(self.socket_path)
+        self.server = await asyncio.start_unix_server(self._handle_client, path=self.socket_path)
+        logger.info(f"WebSocket bus broker listening on {self.socket_path}")
+
+    async def stop(self):
+        self._closing = True
+        if self.server:
+            self.server.close()
+        # Closing every client connection is what tells the other workers to re-elect
+        for writer in list(self.clients):
+            writer.close()
+        if self.server:
+            await self.server.wait_closed()
+            self.server = None
+        self.subscribers.clear()
+
+    async def _handle_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        if self._closing:
+            # Accepted just before shutdown; the handler only runs now
+            writer.close()
+            return
+        topics: Set[str] = set()
+        self.clients.add(writer)
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    frame = json.loads(line)
+                except json.JSONDecodeError:
+                    logger.warning("WebSocket bus broker received an invalid frame")
+                    continue
+
+                op = frame.get("op")
+                topic = frame.get("topic")
+                if op == "sub":
+                    self.subscribers.setdefault(topic, set()).add(writer)
+                    topics.add(topic)
+                elif op == "unsub":
+                    self._unsubscribe(topic, writer)
+                    topics.discard(topic)
+                elif op == "pub":
+                    for subscriber in self.subscribers.get(topic, ()):
+                        if subscriber is writer:
+                            continue
+                        # Writes are never awaited here, so a worker that stops
+                        # reading gets frames dropped instead of an unbounded buffer
+                        if subscriber.transport.get_write_buffer_size() > self.max_buffer_bytes:
+                            self.frames_dropped += 1
+                            continue
+                        subscriber.write(line)
+                    self.frames_routed += 1
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.CancelledError):
+            pass
+        finally:
+            self.clients.discard(writer)
+            for topic in topics:
+                self._unsubscribe(topic, writer)
+            writer.close()
+
+    def _unsubscribe(self, topic: str, writer: asyncio.StreamWriter):
+        writers = self.subscribers.get(topic)
+        if writers is not None:
+            writers.discard(writer)
+            if not writers:
+                del self.subscribers[topic]
+
+class WebSocketBus:
+    """Per-worker bus client with automatic broker election and reconnection"""
+
+    def __init__(self, socket_path: str, reconnect_delay: float = 0.5):
+        self.socket_path = socket_path
+        self.lock_path = socket_path + ".lock"
+        self.reconnect_delay = reconnect_delay
+        self.worker_id = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self.topics: Set[str] = set()
+        self.handlers: Dict[str, BusHandler] = {}
+        self.broker: Optional[WebSocketBusBroker] = None
+        self._lock_file = None
+        self._reader: Optional[asyncio.StreamReader] = None
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._reader_task: Optional[asyncio.Task] = None
+        self._closing = False
+        self.stats = {"published": 0, "received": 0, "reconnects": 0}
+
+    @property
+    def connected(self) -> bool:
+        return self._writer is not None and not self._writer.is_closing()
+
+    @property
+    def is_broker(self) -> bool:
+        return self.broker is not None
+
+    def add_handler(self, topic_prefix: str, handler: BusHandler):
+        """Route frames whose topic starts with ``topic_prefix`` to ``handler``"""
+        self.handlers[topic_prefix] = handler
+
+    async def start(self):
+        """Join the bus, hosting the broker if no other worker does"""
+        self._closing = False
+        await self._connect()
+        self._reader_task = asyncio.create_task(self._read_loop())
+
+    async def stop(self):
+        """Leave the bus and shut down the broker if this worker hosts it"""
+        self._closing = True
+        if self._reader_task:
+            self._reader_task.cancel()
+            try:
+                await self._reader_task
+            except asyncio.CancelledError:
+                pass
+            self._reader_task = None
+        if self._writer:
+            self._writer.close()
+            self._writer = None
+        if self.broker:
+            await self.broker.stop()
+            self.broker = None
+        if self._lock_file:
+            fcntl.flock(self._lock_file, fcntl.LOCK_UN)
+            self._lock_file.close()
+            self._lock_file = None
+
+    def subscribe(self, topic: str):
+        if topic in self.topics:
+            return
+        self.topics.add(topic)
+        self._send({"op": "sub", "topic": topic})
+
+    def unsubscribe(self, topic: str):
+        if topic not in self.topics:
+            return
+        self.topics.discard(topic)
+        self._send({"op": "unsub", "topic": topic})
+
+    def publish(self, topic: str, message: Dict[str, Any]):
+        """Send a message to the other workers subscribed to ``topic``; never blocks"""
+        if self._send({"op": "pub", "topic": topic, "origin": self.worker_id, "message": message}):
+            self.stats["published"] += 1
+
+    def _send(self, frame: Dict[str, Any]) -> bool:
+        if not self.connected:
+            return False
+        try:
+            self._writer.write(_encode_frame(frame))
+            return True
+        except Exception as e:
+            logger.warning(f"WebSocket bus write failed: {e}")
+            return False
+
+    def _try_become_broker(self) -> bool:
+        """Take the election lock; the holder hosts the broker until it exits"""
+        if self._lock_file is not None:
+            return True
+        lock_file = open(self.lock_path, "a+")
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return False
+        self._lock_file = lock_file
+        return True
+
+    async def _connect(self):
+        while True:
+            if self.broker is None and self._try_become_broker():
+                self.broker = WebSocketBusBroker(self.socket_path)
+                await self.broker.start()
+            try:
+                self._reader, self._writer = await asyncio.open_unix_connection(self.socket_path)
+                break
+            except (FileNotFoundError, ConnectionRefusedError):
+                # Another worker won the election but is not listening yet
+                await asyncio.sleep(self.reconnect_delay)
+
+        for topic in self.topics:
+            self._send({"op": "sub", "topic": topic})
+        role = "broker" if self.is_broker else "client"
+        logger.info(f"WebSocket bus connected as {role} (worker {self.worker_id})")
+
+    async def _read_loop(self):
+        try:
+            while not self._closing:
+                line = await self._reader.readline()
+                if not line:
+                    if self._closing:
+                        break
+                    # Broker went away: re-elect and resubscribe
+                    logger.warning("WebSocket bus connection lost, reconnecting")
+                    self.stats["reconnects"] += 1
+                    self._writer.close()
+                    await asyncio.sleep(self.reconnect_delay)
+                    await self._connect()
+                    continue
+                await self._dispatch(line)
+        except asyncio.CancelledError:
+            pass
+
+    async def _dispatch(self, line: bytes):
+        try:
+            frame = json.loads(line)
+        except json.JSONDecodeError:
+            return
+        if frame.get("op") != "pub" or frame.get("origin") == self.worker_id:
+            return
+        topic = frame.get("topic", "")
+        self.stats["received"] += 1
+        for prefix, handler in self.handlers.items():
+            if topic.startswith(prefix):
+                try:
+                    await handler(topic, frame.get("message") or {})
+                except Exception as e:
+                    logger.error(f"WebSocket bus handler failed for {topic}: {e}")
+                break
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "worker_id": self.worker_id,
+            "connected": self.connected,
+            "is_broker": self.is_broker,
+            "subscribed_topics": len(self.topics),
+            **self.stats,
+            **({"broker_frames_routed": self.broker.frames_routed,
+                "broker_frames_dropped": self.broker.frames_dropped} if self.broker else {})
+        }
@@ -0,0 +1,206 @@
+"""
+dhii Mail - WebSocket Wire Codec
+Negotiated payload encodings for the chat and A2UI websockets. Clients pick an
+encoding with a ``Sec-WebSocket-Protocol`` subprotocol (or an ``encoding`` query
+parameter); everyone else keeps receiving plain JSON text frames.
+
+Binary encodings are MessagePack and/or raw deflate. Deflate runs per message
+with a small window and a preset dictionary primed with the static fragments
+every A2UI tree and chat frame repeats, so even short updates compress well
+without keeping a compression context per socket.
+"""
+
+import json
+import zlib
+import base64
+import logging
+from enum import Enum
+from functools import lru_cache
+from typing import Any, Dict, Optional, Tuple, Union
+from fastapi import WebSocketDisconnect
+
+try:
+    import msgpack
+except ImportError:  # optional binary encoding
+    msgpack = None
+
+logger = logging.getLogger(__name__)
+
+# Per-message deflate parameters. A 4 KiB window covers the repetition inside a
+# typical A2UI tree while keeping zlib state at ~20 KiB instead of ~256 KiB.
+DEFLATE_WINDOW_BITS = 12
+DEFLATE_MEM_LEVEL = 5
+DEFLATE_LEVEL = 6
+# Smaller payloads are sent uncompressed; deflate overhead outweighs the gain
+DEFLATE_MIN_SIZE = 256
+# Largest client frame we are willing to inflate
+MAX_INFLATED_SIZE = 1024 * 1024
+
+# First byte of every deflate-encoded frame
+_RAW = 0x00
+_DEFLATED = 0x01
+
+class WireEncoding(str, Enum):
+    """Payload encoding negotiated for one websocket"""
+    JSON = "json"
+    MSGPACK = "msgpack"
+    JSON_DEFLATE = "json+deflate"
+    MSGPACK_DEFLATE = "msgpack+deflate"
+
+    @property
+    def binary(self) -> bool:
+        return self is not WireEncoding.JSON
+
+    @property
+    def uses_msgpack(self) -> bool:
+        return self in (WireEncoding.MSGPACK, WireEncoding.MSGPACK_DEFLATE)
+
+    @property
+    def uses_deflate(self) -> bool:
+        return self in (WireEncoding.JSON_DEFLATE, WireEncoding.MSGPACK_DEFLATE)
+
+    @property
+    def available(self) -> bool:
+        return msgpack is not None or not self.uses_msgpack
+
+# Subprotocol names carry the fragment dictionary version; bump it together
+# with STATIC_FRAGMENTS so old clients fall back to a fresh negotiation.
+SUBPROTOCOLS: Dict[str, WireEncoding] = {
+    "dhii.json.v1": WireEncoding.JSON,
+    "dhii.msgpack.v1": WireEncoding.MSGPACK,
+    "dhii.json.deflate.v1": WireEncoding.JSON_DEFLATE,
+    "dhii.msgpack.deflate.v1": WireEncoding.MSGPACK_DEFLATE,
+}
+
+# Skeletons of the frames the server sends most; their keys, component names
+# and style values seed the deflate dictionary.
+STATIC_FRAGMENTS = [
+    {"type": "a2ui_update", "a2ui": [], "timestamp": ""},
+    {"type": "a2ui_response", "a2ui": [], "session_id": "", "timestamp": ""},
+    {"beginRendering": {"surfaceId": "", "root": "", "styles": {"primaryColor": "#3b82f6", "font": "Inter"}}},
+    {"surfaceUpdate": {"surfaceId": "", "components": [
+        {"id": "", "component": {"Column": {"children": {"explicitList": []}}}},
+        {"id": "", "component": {"Row": {"children": {"explicitList": []}, "distribution": "spaceBetween"}}},
+        {"id": "", "component": {"Card": {"child": ""}}},
+        {"id": "", "component": {"Text": {"text": {"literalString": ""}, "usageHint": "h2"}}},
+        {"id": "", "component": {"Button": {"child": "", "action": {"name": "", "context": []}, "primary": True}}},
+        {"id": "", "component": {"List": {"children": {"explicitList": []}, "direction": "vertical"}}},
+        {"id": "", "component": {"TextField": {"label": {"literalString": ""}, "text": {"path": ""}}}},
+    ]}},
+    {"dataModelUpdate": {"surfaceId": "", "contents": []}},
+    {"type": "ai_message", "message": "", "sender": "ai", "timestamp": "", "message_id": "", "seq": 0,
+     "session_id": "", "intent": "", "confidence": 0.0, "requires_input": False, "actions": [],
+     "ui_components": {}},
+    {"type": "user_message", "message": "", "sender": "user", "timestamp": "", "message_id": "", "seq": 0,
+     "session_id": ""},
+    {"type": "history_delta", "session_id": "", "since": 0, "messages": [], "last_seq": 0, "complete": True},
+    {"type": "heartbeat_ping", "timestamp": ""},
+]
+
+def _serialize(message: Any, use_msgpack: bool) -> bytes:
+    if use_msgpack:
+        return msgpack.packb(message, use_bin_type=True, default=str)
+    return json.dumps(message, separators=(",", ":"), default=str).encode("utf-8")
+
+@lru_cache(maxsize=2)
+def fragment_dictionary(use_msgpack: bool) -> bytes:
+    """Preset deflate dictionary built from STATIC_FRAGMENTS"""
+    # zlib favours the end of the dictionary, so the most common frames go last
+    return b"".join(_serialize(fragment, use_msgpack) for fragment in reversed(STATIC_FRAGMENTS))
+
+def negotiate_encoding(websocket) -> Tuple[WireEncoding, Optional[str]]:
+    """Pick the encoding for a websocket; returns it and the subprotocol to accept"""
+    scope = getattr(websocket, "scope", None) or {}
+    for subprotocol in scope.get("subprotocols") or []:
+        encoding = SUBPROTOCOLS.get(subprotocol)
+        if encoding is not None and encoding.available:
+            return encoding, subprotocol
+
+    query_params = getattr(websocket, "query_params", None)
+    requested = query_params.get("encoding") if query_params is not None else None
+    if requested:
+        try:
+            encoding = WireEncoding(requested)
+            if encoding.available:
+                return encoding, None
+        except ValueError:
+            pass
+        logger.debug(f"Unsupported websocket encoding requested: {requested}")
+    return WireEncoding.JSON, None
+
+def encode_payload(message: Dict[str, Any], encoding: WireEncoding,
+                   json_text: Optional[str] = None) -> Union[str, bytes]:
+    """Encode a message for the wire: ``str`` for text frames, ``bytes`` for binary"""
+    if encoding is WireEncoding.JSON:
+        return json_text if json_text is not None else json.dumps(message)
+
+    if encoding.uses_msgpack:
+        body = _serialize(message, True)
+    elif json_text is not None:
+        body = json_text.encode("utf-8")
+    else:
+        body = _serialize(message, False)
+    if not encoding.uses_deflate:
+        return body
+
+    if len(body) < DEFLATE_MIN_SIZE:
+        return bytes((_RAW,)) + body
+    compressor = zlib.compressobj(DEFLATE_LEVEL, zlib.DEFLATED, -DEFLATE_WINDOW_BITS,
+                                  DEFLATE_MEM_LEVEL, zdict=fragment_dictionary(encoding.uses_msgpack))
+    return bytes((_DEFLATED,)) + compressor.compress(body) + compressor.flush()
+
+def decode_payload(data: Union[str, bytes], encoding: WireEncoding) -> Any:
+    """Decode a client frame; text frames are always JSON"""
+    if isinstance(data, str):
+        return json.loads(data)
+    body = data
+    if encoding.uses_deflate:
+        if not body:
+            raise ValueError("Empty frame")
+        flag, body = body[0], body[1:]
+        if flag == _DEFLATED:
+            decompressor = zlib.decompressobj(-DEFLATE_WINDOW_BITS, zdict=fragment_dictionary(encoding.uses_msgpack))
+            try:
+                body = decompressor.decompress(body, MAX_INFLATED_SIZE)
+            except zlib.error as e:
+                raise ValueError(f"Invalid deflate frame: {e}")
+            if decompressor.unconsumed_tail:
+                raise ValueError("Inflated frame too large")
+        elif flag != _RAW:
+            raise ValueError(f"Unknown frame flag: {flag}")
+    if encoding.uses_msgpack:
+        try:
+            return msgpack.unpackb(body, raw=False)
+        except Exception as e:
+            raise ValueError(f"Invalid MessagePack frame: {e}")
+    return json.loads(body)
+
+async def send_payload(websocket, payload: Union[str, bytes]):
+    """Send an encoded payload as a text or binary frame"""
+    if isinstance(payload, bytes):
+        await websocket.send_bytes(payload)
+    else:
+        await websocket.send_text(payload)
+
+async def receive_frame(websocket) -> Union[str, bytes]:
+    """Receive the next text or binary frame"""
+    message = await websocket.receive()
+    if message["type"] == "websocket.disconnect":
+        raise WebSocketDisconnect(message.get("code", 1000), message.get("reason"))
+    text = message.get("text")
+    return text if text is not None else message.get("bytes", b"")
+
+def codec_manifest() -> Dict[str, Any]:
+    """What a client needs to speak the binary encodings"""
+    return {
+        "subprotocols": {name: encoding.value for name, encoding in SUBPROTOCOLS.items() if encoding.available},
+        "deflate": {
+            "window_bits": DEFLATE_WINDOW_BITS,
+            "min_size": DEFLATE_MIN_SIZE,
+            "frame_flags": {"raw": _RAW, "deflated": _DEFLATED},
+            "dictionaries": {
+                "json": base64.b64encode(fragment_dictionary(False)).decode("ascii"),
+                **({"msgpack": base64.b64encode(fragment_dictionary(True)).decode("ascii")} if msgpack else {})
+            }
+        }
+    }